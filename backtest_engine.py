@@ -0,0 +1,375 @@
+"""
+과거 월말 리밸런싱 백테스트 엔진
+
+여러 해의 eps/foreign/시가총액 패널 하나로 매 월말 기준일마다
+EPS 필터 → 외국인 수급강도 → 1/2개월 수급 상위 → 최종 비중 단계를 다시 계산해
+구성종목/비중 이력을 만든다.
+
+기준일마다 raw_data 파일을 새로 받아 파싱하는 대신, 기준일 시점의 데이터 구간
+(B5 = 월간 분석과 같은 fetch_start_date, 기본 기준일 1년 전 ~ B6 = 기준일)을 전체 패널의 행 구간으로만 다룬다.
+- 종목별 유효 데이터 개수 / 마지막 유효 행: 누적 개수와 누적 최대 행 배열로 전체 기준일을 한 번에 계산
+- 창 평균: WindowMeanKernel로 전 종목을 한 번에 계산 (창이 걸친 행 구간만 사용), 기준일마다 창 길이별로
+  한 번만 계산해 선정 기준값(SelectionParameters)이 달라도 다시 사용 (parameter_sweep)
+각 단계의 선정 규칙(30개 미만 데이터부족, 동점은 앞 순서 우선 등)은 월간 분석과 동일하다.
+"""
+
+import calendar
+from datetime import datetime
+
+import numpy as np
+
+from panel_data import as_panel
+from scoring_kernel import WindowMeanKernel
+from ranking_engine import StageRanking
+from result_excel_writer import StreamingResultWriter, SCORE_FORMAT, INTENSITY_FORMAT
+from selection_parameters import DEFAULT_PARAMETERS, FETCH_MARGIN_MONTHS, fetch_start_date
+
+
+def month_end_dates(first_date, last_date):
+    """첫 날짜가 속한 달부터 마지막 날짜가 속한 달까지의 월말(달력 기준) 날짜 목록"""
+    month_ends = []
+    year, month = first_date.year, first_date.month
+    while (year, month) <= (last_date.year, last_date.month):
+        month_ends.append(datetime(year, month, calendar.monthrange(year, month)[1]))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return month_ends
+
+
+class AsOfIndex:
+    """기준일 시점 데이터 구간의 종목별 유효 개수 / 마지막 유효 행 (전체 기준일 일괄 계산용)"""
+
+    def __init__(self, panel):
+        self.panel = panel
+        valid = ~np.isnan(panel.values)
+        # count_prefix[r]: 0 ~ r-1행의 유효 개수
+        self.count_prefix = np.zeros((panel.n_dates + 1, panel.n_stocks), dtype=np.int64)
+        np.cumsum(valid, axis=0, out=self.count_prefix[1:])
+        # last_valid_upto[r]: r행까지의 마지막 유효 행 (없으면 -1)
+        rows = np.where(valid, np.arange(panel.n_dates)[:, None], -1)
+        self.last_valid_upto = np.maximum.accumulate(rows, axis=0) if panel.n_dates else rows
+
+    def rows_for(self, fetch_start_dates, as_of_dates):
+        """기준일별 데이터 구간 [시작 행, 종료 행] - B5 당일 또는 이후 첫 거래일부터 B6 이전 마지막 거래일까지"""
+        dates = self.panel.dates
+        start_rows = np.searchsorted(dates, np.asarray(fetch_start_dates, dtype='datetime64[D]'), side='left')
+        end_rows = np.searchsorted(dates, np.asarray(as_of_dates, dtype='datetime64[D]'), side='right') - 1
+        return start_rows, end_rows
+
+    def valid_counts(self, start_rows, end_rows):
+        """기준일별 × 종목별 유효 데이터 개수 (기준일 수, 종목 수)"""
+        start_rows = np.asarray(start_rows)
+        end_rows = np.asarray(end_rows)
+        counts = self.count_prefix[end_rows + 1] - self.count_prefix[start_rows]
+        counts[end_rows < start_rows] = 0
+        return counts
+
+    def last_valid_rows(self, start_rows, end_rows):
+        """기준일별 × 종목별 마지막 유효 행 (구간 안에 데이터가 없으면 -1)"""
+        last_rows = self.last_valid_upto[np.clip(end_rows, 0, None)]
+        last_rows = np.where(last_rows >= np.asarray(start_rows)[:, None], last_rows, -1)
+        last_rows[np.asarray(end_rows) < 0] = -1
+        return last_rows
+
+
+class RebalanceWindows:
+    """기준일 한 개의 종목별 창 평균 캐시
+
+    창 평균은 창 길이(개월)마다 구간 안에 데이터가 있는 전체 종목에 대해 한 번만 계산하고
+    선정 기준값(상위 종목 수, 최소 유효 개수, 창 조합)이 달라도 그대로 다시 사용한다.
+    종목별 평균은 다른 종목과 무관하므로 일부 종목만 계산한 값과 같다.
+    """
+
+    def __init__(self, engine, eps_state, foreign_state, cap_state):
+        self.engine = engine
+        self.eps_counts, self.eps_last, self.eps_start = eps_state
+        self.foreign_counts, self.foreign_last, self.foreign_start = foreign_state
+        self.cap_counts, self.cap_start = cap_state
+
+        # EPS 점수 대상: 구간 안에 데이터가 있는 종목 (중복 종목코드는 첫 열만)
+        panel = engine.eps_panel
+        self.eps_columns = np.array([i for i, code in enumerate(panel.codes)
+                                     if self.eps_counts[i] > 0 and panel.code_index[code] == i], dtype=np.int64)
+        self.eps_codes = [panel.codes[column] for column in self.eps_columns]
+
+        # 수급 지표 대상: 외국인/시가총액 모두 구간 안에 데이터가 있는 종목
+        cap_index = engine.cap_panel.code_index
+        self.flow_codes = [code for code, column in engine.foreign_panel.code_index.items()
+                           if code in cap_index and self.foreign_counts[column] > 0
+                           and self.cap_counts[cap_index[code]] > 0]
+        self.flow_positions = {code: i for i, code in enumerate(self.flow_codes)}
+        self.foreign_columns = np.array([engine.foreign_panel.code_index[code] for code in self.flow_codes],
+                                        dtype=np.int64)
+        self.cap_columns = np.array([cap_index[code] for code in self.flow_codes], dtype=np.int64)
+        self.flow_valid_counts = np.minimum(self.foreign_counts[self.foreign_columns],
+                                            self.cap_counts[self.cap_columns])
+
+        self._eps_means = {}
+        self._eps_scores = {}
+        self._flow_ratios = {}
+
+    @staticmethod
+    def _window_rows(kernel, columns, last_rows, start_row, months_back):
+        """기준일 데이터 구간 안에서 종목별 마지막 유효일 기준 N개월 창 (시작 행, 종료 행)"""
+        end_rows = last_rows[columns]
+        start_rows = kernel.calendar.window_start_rows(end_rows, months_back)
+        return np.maximum(start_rows, start_row), end_rows
+
+    def eps_means(self, months):
+        """eps_columns 순서의 N개월 EPS 평균 (빈 셀 제외)"""
+        if months not in self._eps_means:
+            kernel = self.engine.eps_kernel
+            start_rows, end_rows = self._window_rows(kernel, self.eps_columns, self.eps_last, self.eps_start, months)
+            self._eps_means[months] = kernel.window_means(self.eps_columns, start_rows, end_rows)[0]
+        return self._eps_means[months]
+
+    def eps_scores(self, short_months, long_months):
+        """eps_columns 순서의 EPS 점수: (단기 평균 - 장기 평균) / abs(장기 평균)"""
+        key = (short_months, long_months)
+        if key not in self._eps_scores:
+            short_avgs, long_avgs = self.eps_means(short_months), self.eps_means(long_months)
+            denominators = np.abs(long_avgs)
+            self._eps_scores[key] = np.divide(short_avgs - long_avgs, denominators,
+                                              out=np.zeros(len(self.eps_columns)), where=denominators > 1e-6)
+        return self._eps_scores[key]
+
+    def flow_ratios(self, months):
+        """flow_codes 순서의 N개월 외국인 순매수 평균 / 시가총액 평균 (외국인 마지막 날짜 기준)"""
+        if months not in self._flow_ratios:
+            engine = self.engine
+            start_rows, end_rows = self._window_rows(engine.foreign_kernel, self.foreign_columns,
+                                                     self.foreign_last, self.foreign_start, months)
+            foreign_avgs, _ = engine.foreign_kernel.window_means(self.foreign_columns, start_rows, end_rows)
+            cap_start_rows, cap_end_rows = engine.cap_panel.calendar.align_rows(
+                engine.foreign_panel.calendar, start_rows, end_rows)
+            cap_avgs, _ = engine.cap_kernel.window_means(self.cap_columns, np.maximum(cap_start_rows, self.cap_start),
+                                                         cap_end_rows)
+            self._flow_ratios[months] = np.divide(foreign_avgs, cap_avgs, out=np.zeros(len(self.flow_codes)),
+                                                  where=cap_avgs > 1e-6)
+        return self._flow_ratios[months]
+
+    def flow_scores(self, stock_codes, months_list, min_valid_count):
+        """외국인/시가총액 데이터가 모두 최소 개수 이상인 종목(입력 순서)과 창 길이별 지표"""
+        positions = [self.flow_positions.get(code) for code in stock_codes]
+        eligible = [(code, position) for code, position in zip(stock_codes, positions)
+                    if position is not None and self.flow_valid_counts[position] >= min_valid_count]
+        eligible_codes = [code for code, _ in eligible]
+        eligible_positions = np.array([position for _, position in eligible], dtype=np.int64)
+        return eligible_codes, {months: self.flow_ratios(months)[eligible_positions] for months in months_list}
+
+
+class BacktestResult:
+    """월말 리밸런싱 백테스트 결과 (구성종목/비중 이력)"""
+
+    HISTORY_HEADERS = ["기준일", "순위", "종목코드", "종목명", "최종비중", "선정횟수",
+                       "1개월순위", "2개월순위", "1개월점수", "2개월점수", "EPS점수", "6개월수급지표"]
+
+    def __init__(self):
+        self.rebalance_dates = []
+        self.records = []
+        self.summaries = []
+        # 일별 지수 (index_calculator.IndexLevelResult, 계산한 경우에만)
+        self.index_levels = None
+
+    def add_rebalance(self, rebalance_date, constituents, summary):
+        self.rebalance_dates.append(rebalance_date)
+        for rank, data in enumerate(constituents, 1):
+            record = {'rebalance_date': rebalance_date, 'rank': rank}
+            record.update(data)
+            self.records.append(record)
+        self.summaries.append(dict(summary, rebalance_date=rebalance_date))
+
+    def constituents(self, rebalance_date):
+        """기준일의 구성종목 레코드 (비중 순위 순서)"""
+        return [record for record in self.records if record['rebalance_date'] == rebalance_date]
+
+    def weight_matrix(self):
+        """(기준일 목록, 종목코드 목록, 비중 행렬[기준일, 종목]) - 미편입은 0"""
+        codes = list(dict.fromkeys(record['code'] for record in self.records))
+        code_index = {code: i for i, code in enumerate(codes)}
+        date_index = {rebalance_date: i for i, rebalance_date in enumerate(self.rebalance_dates)}
+        weights = np.zeros((len(self.rebalance_dates), len(codes)))
+        for record in self.records:
+            weights[date_index[record['rebalance_date']], code_index[record['code']]] = record['final_weight']
+        return self.rebalance_dates, codes, weights
+
+    def history_rows(self):
+        for record in self.records:
+            yield [record['rebalance_date'].strftime('%Y-%m-%d'), record['rank'], record['code'], record['name'],
+                   record['final_weight'], record['selection_count'],
+                   record['one_month_rank'] or "-", record['two_month_rank'] or "-",
+                   record['one_month_score'], record['two_month_score'],
+                   record['eps_score'], record['intensity_score']]
+
+    def save_excel(self, output_path):
+        """이력/요약 시트(일별 지수를 계산했으면 지수 시트 포함)를 가진 결과 엑셀 저장"""
+        writer = StreamingResultWriter()
+        writer.add_sheet("구성종목이력", self.HISTORY_HEADERS, self.history_rows(),
+                         {4: SCORE_FORMAT, 8: INTENSITY_FORMAT, 9: INTENSITY_FORMAT,
+                          10: SCORE_FORMAT, 11: INTENSITY_FORMAT})
+        writer.add_sheet(
+            "기준일별요약",
+            ["기준일", "EPS 계산 종목 수", "EPS 필터 통과 종목 수", "최종 선정 종목 수",
+             "1개월 상위 종목 수", "2개월 상위 종목 수", "최종 비중 계산 종목 수"],
+            ([summary['rebalance_date'].strftime('%Y-%m-%d'), summary['eps_count'], summary['eps_selected'],
+              summary['intensity_selected'], summary['one_month_selected'], summary['two_month_selected'],
+              summary['constituent_count']] for summary in self.summaries)
+        )
+        if self.index_levels is not None:
+            self.index_levels.add_sheets(writer)
+        writer.save(output_path)
+
+
+class BacktestEngine:
+    """전체 기간 패널로 매 월말 리밸런싱을 재계산하는 백테스트 엔진"""
+
+    def __init__(self, eps_data, foreign_data, market_cap_data, parameters=None,
+                 fetch_margin_months=FETCH_MARGIN_MONTHS, full_year_fetch=True):
+        self.eps_panel = as_panel(eps_data, "eps")
+        self.foreign_panel = as_panel(foreign_data, "foreign")
+        self.cap_panel = as_panel(market_cap_data, "market_cap")
+        self.parameters = parameters or DEFAULT_PARAMETERS
+        # 기준일별 데이터 구간(B5) - 월간 분석 스케줄러의 받기 구간 설정과 같아야 데이터부족 판정이 같음
+        self.fetch_margin_months = fetch_margin_months
+        self.full_year_fetch = full_year_fetch
+
+        self.eps_index = AsOfIndex(self.eps_panel)
+        self.foreign_index = AsOfIndex(self.foreign_panel)
+        self.cap_index = AsOfIndex(self.cap_panel)
+        self.eps_kernel = WindowMeanKernel(self.eps_panel)
+        self.foreign_kernel = WindowMeanKernel(self.foreign_panel)
+        self.cap_kernel = WindowMeanKernel(self.cap_panel)
+
+    def fetch_start(self, as_of_date, parameters=None):
+        """기준일의 데이터 받기 시작일(B5) - 월간 분석의 date_cell_values와 같은 계산"""
+        return fetch_start_date(as_of_date, parameters or self.parameters, self.fetch_margin_months,
+                                self.full_year_fetch)
+
+    def rebalance_dates(self, start_date=None, end_date=None, require_full_lookback=True):
+        """백테스트 기준일(월말) 목록 - 기본은 데이터 받기 시작일(B5)이 패널 안에 있는 월말부터"""
+        if self.eps_panel.n_dates == 0:
+            return []
+        first_date = self.eps_panel.dates[0].astype(datetime)
+        last_date = self.eps_panel.dates[-1].astype(datetime)
+        first_date = datetime(first_date.year, first_date.month, first_date.day)
+        last_date = datetime(last_date.year, last_date.month, last_date.day)
+
+        dates = month_end_dates(first_date, last_date)
+        if require_full_lookback:
+            dates = [date for date in dates if self.fetch_start(date) >= first_date]
+        if start_date is not None:
+            dates = [date for date in dates if date >= start_date]
+        if end_date is not None:
+            dates = [date for date in dates if date <= end_date]
+        return dates
+
+    def select_constituents(self, windows, parameters, stage_codes=None):
+        """기준일 한 개의 선정 단계 실행 → (구성종목 레코드 목록, 요약)
+
+        stage_codes: dict를 주면 단계별 선정 종목코드('eps', 'intensity', 'one_month', 'two_month')를 채움
+        """
+        panel = self.eps_panel
+        min_valid_count = parameters.min_valid_count
+
+        # 1. EPS 필터: 데이터가 있는 종목 중 최소 개수 이상만 점수 계산 (나머지는 데이터부족 = 0점)
+        stock_columns = windows.eps_columns
+        sufficient = windows.eps_counts[stock_columns] >= min_valid_count
+        eps_scores = np.where(sufficient, windows.eps_scores(parameters.eps_short_months,
+                                                             parameters.eps_long_months), 0.0)
+
+        eps_codes = windows.eps_codes
+        eps_ranking = StageRanking(eps_codes, eps_scores, parameters.eps_top_k)
+        eps_selected = eps_ranking.selected_codes()
+
+        # 2. 외국인 수급강도: 데이터부족 종목은 지표 0으로 순위에 포함
+        eligible_codes, scores = windows.flow_scores(eps_selected, [parameters.intensity_months], min_valid_count)
+        intensity_score_of = dict(zip(eligible_codes, scores[parameters.intensity_months]))
+        intensity_scores = np.array([intensity_score_of.get(code, 0.0) for code in eps_selected])
+        intensity_ranking = StageRanking(eps_selected, intensity_scores, parameters.intensity_top_k)
+        intensity_selected = intensity_ranking.selected_codes()
+
+        # 3. 단기 / 장기 외국인 수급 상위 종목
+        short_months, long_months = parameters.flow_short_months, parameters.flow_long_months
+        eligible_codes, scores = windows.flow_scores(intensity_selected, [short_months, long_months],
+                                                     min_valid_count)
+        one_month_ranking = StageRanking(eligible_codes, scores[short_months], parameters.flow_top_k)
+        two_month_ranking = StageRanking(eligible_codes, scores[long_months], parameters.flow_top_k)
+        one_month_selected = one_month_ranking.selected_codes()
+        two_month_selected = two_month_ranking.selected_codes()
+
+        # 4. 최종 비중: 선정 횟수 / (단기 + 장기 선정 종목 수)
+        selection_counts = {}
+        for stock_code in one_month_selected + two_month_selected:
+            selection_counts[stock_code] = selection_counts.get(stock_code, 0) + 1
+        total_selection_count = len(one_month_selected) + len(two_month_selected)
+        codes = list(selection_counts.keys())
+        weights = [selection_counts[code] / total_selection_count for code in codes]
+        weight_ranking = StageRanking(codes, weights, len(codes))
+        if stage_codes is not None:
+            stage_codes.update(eps=eps_selected, intensity=intensity_selected,
+                               one_month=one_month_selected, two_month=two_month_selected)
+
+        eps_score_of = dict(zip(eps_codes, eps_scores))
+        intensity_score_of = dict(zip(eps_selected, intensity_scores))
+        one_month_score_of = dict(zip(eligible_codes, scores[short_months]))
+        two_month_score_of = dict(zip(eligible_codes, scores[long_months]))
+        constituents = []
+        for stock_code in weight_ranking.selected_codes():
+            one_month_rank = one_month_ranking.selected_rank_of(stock_code)
+            two_month_rank = two_month_ranking.selected_rank_of(stock_code)
+            constituents.append({
+                'code': stock_code,
+                'name': panel.name_of(stock_code),
+                'final_weight': selection_counts[stock_code] / total_selection_count,
+                'selection_count': selection_counts[stock_code],
+                'one_month_rank': one_month_rank,
+                'two_month_rank': two_month_rank,
+                'one_month_score': float(one_month_score_of[stock_code]) if one_month_rank else 0,
+                'two_month_score': float(two_month_score_of[stock_code]) if two_month_rank else 0,
+                'eps_score': float(eps_score_of[stock_code]),
+                'intensity_score': float(intensity_score_of[stock_code])
+            })
+
+        summary = {
+            'eps_count': len(eps_codes),
+            'eps_selected': len(eps_selected),
+            'intensity_selected': len(intensity_selected),
+            'one_month_selected': len(one_month_selected),
+            'two_month_selected': len(two_month_selected),
+            'constituent_count': len(constituents)
+        }
+        return constituents, summary
+
+    def as_of_windows(self, rebalance_dates, parameters=None):
+        """기준일별 RebalanceWindows (전체 기준일의 데이터 구간 / 유효 개수 / 마지막 유효 행은 한 번에 계산)
+
+        parameters: 받기 구간을 가장 긴 창으로 줄인 경우(full_year_fetch=False) 구간 계산에 쓸 기준값
+        """
+        if not rebalance_dates:
+            return []
+        as_of_dates = [np.datetime64(date.strftime('%Y-%m-%d'), 'D') for date in rebalance_dates]
+        fetch_start_dates = [np.datetime64(self.fetch_start(date, parameters).strftime('%Y-%m-%d'), 'D')
+                             for date in rebalance_dates]
+
+        per_panel = []
+        for index in (self.eps_index, self.foreign_index, self.cap_index):
+            start_rows, end_rows = index.rows_for(fetch_start_dates, as_of_dates)
+            per_panel.append((start_rows, index.valid_counts(start_rows, end_rows),
+                              index.last_valid_rows(start_rows, end_rows)))
+        (eps_starts, eps_counts, eps_last), (foreign_starts, foreign_counts, foreign_last), \
+            (cap_starts, cap_counts, _) = per_panel
+
+        return [RebalanceWindows(self, (eps_counts[t], eps_last[t], eps_starts[t]),
+                                 (foreign_counts[t], foreign_last[t], foreign_starts[t]),
+                                 (cap_counts[t], cap_starts[t]))
+                for t in range(len(rebalance_dates))]
+
+    def run(self, rebalance_dates=None, parameters=None):
+        """기준일(월말) 목록 전체에 대해 리밸런싱 재계산"""
+        if rebalance_dates is None:
+            rebalance_dates = self.rebalance_dates()
+        parameters = parameters or self.parameters
+        result = BacktestResult()
+        for rebalance_date, windows in zip(rebalance_dates, self.as_of_windows(rebalance_dates, parameters)):
+            constituents, summary = self.select_constituents(windows, parameters)
+            result.add_rebalance(rebalance_date, constituents, summary)
+        return result
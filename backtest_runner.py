@@ -0,0 +1,289 @@
+"""
+백테스트 / 선정 기준값 조합 평가 / 선정 안정성 평가 실행
+
+raw_data 파일 하나(여러 해 기간)를 로드해 전체 종목 열의 eps/foreign/시가총액 패널로 BacktestEngine을 만들고,
+그 엔진으로 월말 리밸런싱 백테스트(backtest_engine), 기준값 조합 평가(parameter_sweep),
+입력 교란 안정성 평가(robustness_runner)를 실행한다. 단계 계측 보고서와 결과 엑셀 저장은 월간 분석과 같다.
+DeepSearchForeignBuyingTop20IndexSystem / MonthlyRebalancingScheduler의 같은 이름 메서드가 이 함수들을 호출한다.
+"""
+
+import os
+import time
+
+from backtest_engine import BacktestEngine
+from index_calculator import backtest_index_levels
+from parameter_sweep import ParameterSweep
+from robustness_runner import RobustnessRunner, Perturbation
+
+
+def build_backtest_engine(system, sheets, report):
+    """전체 종목 열의 eps/foreign/시가총액 패널로 BacktestEngine 생성 (기준일마다 구성 종목이 달라지므로 열 선택 없음)"""
+    with report.stage("parallel_parse") as record:
+        record.counts["executed"] = system.prefetch_sheets(
+            [(sheets.get('eps_sheet'), "eps"), (sheets.get('foreign_sheet'), "foreign"),
+             (sheets.get('market_cap_sheet'), "market_cap")])
+    panels = {}
+    for sheet_key, data_type in (('eps_sheet', "eps"), ('foreign_sheet', "foreign"),
+                                 ('market_cap_sheet', "market_cap")):
+        with report.stage(f"parse.{data_type}") as record:
+            panels[data_type], total_stock_count = system.parse_data(sheets.get(sheet_key, ''), data_type)
+            system.record_panel_counts(record, panels[data_type], total_stock_count)
+    eps_data, foreign_data, market_cap_data = panels["eps"], panels["foreign"], panels["market_cap"]
+    if not eps_data or not foreign_data or not market_cap_data:
+        print("필요한 데이터가 부족합니다.")
+        return None
+    return BacktestEngine(eps_data, foreign_data, market_cap_data, system.parameters, system.fetch_margin_months,
+                          system.full_year_fetch)
+
+
+def run_backtest(system, use_market_cap=True, start_date=None, end_date=None, output_path=None, price_panel=None):
+    """전체 기간 raw_data로 매 월말 리밸런싱을 한 번에 재계산해 구성종목/비중 이력 생성 (price_panel: 지수(PR)용 종가 패널)"""
+    output_path = output_path or system.output_excel_path
+    report = system.start_run_report("backtest", outputs=[output_path])
+    result = None
+    try:
+        result = _run_backtest(system, use_market_cap, start_date, end_date, output_path, report, price_panel)
+        return result
+    finally:
+        system.finish_run_report(report, result is not None, [output_path])
+
+
+def _run_backtest(system, use_market_cap, start_date, end_date, output_path, report, price_panel=None):
+    start_time = time.time()
+
+    with report.stage("load") as record:
+        if not system.load_source_excel_file():
+            record.status = "failed"
+            return None
+        record.counts["sheets"] = len(system.source_sheetnames)
+
+    cap_type = "시가총액" if use_market_cap else "유동시가총액"
+    print("=" * 80)
+    print("DeepSearch 외인수급Top20 지수 (PR) 월말 리밸런싱 백테스트 시작")
+    print(f"사용 데이터: {cap_type}")
+    print("=" * 80)
+
+    try:
+        sheets = system.find_data_sheets(use_market_cap)
+        if not sheets:
+            return None
+
+        engine = build_backtest_engine(system, sheets, report)
+        if engine is None:
+            return None
+        rebalance_dates = engine.rebalance_dates(start_date, end_date)
+        if not rebalance_dates:
+            print("백테스트 기준일이 없습니다 (기준일의 데이터 받기 시작일(B5) 이후 데이터가 필요합니다).")
+            return None
+
+        print(f"백테스트 기준일: {rebalance_dates[0].strftime('%Y-%m-%d')} ~ "
+              f"{rebalance_dates[-1].strftime('%Y-%m-%d')} ({len(rebalance_dates)}개월)")
+        with report.stage("backtest") as record:
+            result = engine.run(rebalance_dates)
+            record.counts.update(rebalance_dates=len(result.rebalance_dates), records=len(result.records))
+
+        with report.stage("index_levels") as record:
+            result.index_levels = backtest_index_levels(result, engine.cap_panel, price_panel)
+            record.counts["days"] = len(result.index_levels) if result.index_levels is not None else 0
+
+        with report.stage("write_result"):
+            result.save_excel(output_path)
+        execution_time = time.time() - start_time
+
+        print("=" * 80)
+        print("DeepSearch 외인수급Top20 지수 (PR) 월말 리밸런싱 백테스트 완료!")
+        print(f"- 사용 데이터: {cap_type}")
+        print(f"- 리밸런싱 횟수: {len(result.rebalance_dates)}")
+        print(f"- 구성종목 이력 행 수: {len(result.records)}")
+        if result.index_levels is not None:
+            index_levels = result.index_levels
+            print(f"- {index_levels.label}: {index_levels.levels[-1]:.2f} ({len(index_levels)}영업일, "
+                  f"기준 {str(index_levels.dates[0])} = {index_levels.levels[0]:.0f})")
+        print(f"- 실행 시간: {execution_time:.2f}초")
+        print(f"- 결과 파일: {output_path}")
+        print("=" * 80)
+
+        return result
+
+    except Exception as e:
+        print(f"백테스트 실행 실패: {e}")
+        return None
+    finally:
+        system.close_source_excel_file()
+
+
+def run_backtest_file(scheduler, filename, use_market_cap=True, start_date=None, end_date=None, price_panel=None):
+    """여러 해 기간의 raw_data 파일로 월말 리밸런싱 백테스트 실행 (price_panel이 없으면 시가총액 근사지수)"""
+    # 시스템 모듈과의 순환 import를 피하기 위해 함수 안에서 import
+    from monthly_rebalancing_scheduler import DeepSearchForeignBuyingTop20IndexSystem
+
+    try:
+        input_file = os.path.join(scheduler.base_directory, filename)
+        result_filename = scheduler.get_backtest_filename(filename, use_market_cap)
+        output_file = os.path.join(scheduler.base_directory, result_filename)
+
+        print(f"백테스트 시작: {filename}")
+        print(f"결과 파일: {result_filename}")
+
+        system = DeepSearchForeignBuyingTop20IndexSystem(input_file, output_file, scheduler.reader_engine,
+                                                         scheduler.use_cache,
+                                                         incremental=scheduler.incremental,
+                                                         parse_workers=scheduler.parse_workers,
+                                                         run_report=scheduler.run_report,
+                                                         trace_memory=scheduler.trace_memory,
+                                                         report_logger=scheduler.report_logger,
+                                                         parameters=scheduler.parameters,
+                                                         fetch_margin_months=scheduler.fetch_margin_months,
+                                                         full_year_fetch=scheduler.full_year_fetch)
+        with scheduler.stage("backtest"):
+            result = run_backtest(system, use_market_cap, start_date, end_date, price_panel=price_panel)
+
+        if result is not None:
+            print(f"백테스트 완료: {result_filename}")
+        else:
+            print(f"백테스트 실패: {filename}")
+        return result
+
+    except Exception as e:
+        print(f"백테스트 실행 중 오류 발생: {e}")
+        return None
+
+
+def run_parameter_sweep(system, parameter_sets, use_market_cap=True, rebalance_dates=None, output_path=None):
+    """선정 기준값 조합(parameter_grid) 전체를 한 번 로드한 패널로 평가 (기준일 기본: 패널 마지막 월말)"""
+    report = system.start_run_report("parameter_sweep", outputs=[output_path] if output_path else [],
+                                   parameter_sets=len(parameter_sets))
+    result = None
+    try:
+        result = _run_parameter_sweep(system, parameter_sets, use_market_cap, rebalance_dates, output_path, report)
+        return result
+    finally:
+        system.finish_run_report(report, result is not None, [output_path])
+
+
+def _run_parameter_sweep(system, parameter_sets, use_market_cap, rebalance_dates, output_path, report):
+    start_time = time.time()
+
+    with report.stage("load") as record:
+        if not system.load_source_excel_file():
+            record.status = "failed"
+            return None
+        record.counts["sheets"] = len(system.source_sheetnames)
+
+    cap_type = "시가총액" if use_market_cap else "유동시가총액"
+    print("=" * 80)
+    print("DeepSearch 외인수급Top20 지수 (PR) 선정 기준값 조합 평가 시작")
+    print(f"사용 데이터: {cap_type}")
+    print(f"기준값 조합 수: {len(parameter_sets)}")
+    print("=" * 80)
+
+    try:
+        sheets = system.find_data_sheets(use_market_cap)
+        if not sheets:
+            return None
+
+        engine = build_backtest_engine(system, sheets, report)
+        if engine is None:
+            return None
+
+        sweep = ParameterSweep(engine)
+        rebalance_dates = sweep.default_dates() if rebalance_dates is None else rebalance_dates
+        if not rebalance_dates:
+            print("평가 기준일이 없습니다.")
+            return None
+
+        with report.stage("parameter_sweep") as record:
+            result = sweep.run(parameter_sets, rebalance_dates)
+            record.counts.update(parameter_sets=len(parameter_sets), rebalance_dates=len(rebalance_dates),
+                                 records=len(result.records))
+
+        if output_path:
+            with report.stage("write_result"):
+                result.save_excel(output_path)
+        execution_time = time.time() - start_time
+
+        print("=" * 80)
+        print("DeepSearch 외인수급Top20 지수 (PR) 선정 기준값 조합 평가 완료!")
+        print(f"- 사용 데이터: {cap_type}")
+        print(f"- 기준값 조합 수: {len(parameter_sets)}")
+        print(f"- 기준일: {', '.join(date.strftime('%Y-%m-%d') for date in rebalance_dates)}")
+        print(f"- 구성종목 표 행 수: {len(result.records)}")
+        print(f"- 실행 시간: {execution_time:.2f}초")
+        if output_path:
+            print(f"- 결과 파일: {output_path}")
+        print("=" * 80)
+
+        return result
+
+    except Exception as e:
+        print(f"기준값 조합 평가 실패: {e}")
+        return None
+    finally:
+        system.close_source_excel_file()
+
+
+def run_robustness(system, runs=1000, perturbation=None, use_market_cap=True, as_of_date=None, max_workers=None,
+                   seed=0, output_path=None):
+    """외국인 수급/EPS 입력을 교란한 선정을 runs번 반복해 종목별 단계 선정 빈도 집계 (기준일 기본: 패널 마지막 월말)"""
+    report = system.start_run_report("robustness", outputs=[output_path] if output_path else [], runs=runs)
+    result = None
+    try:
+        result = _run_robustness(system, runs, perturbation or Perturbation(), use_market_cap, as_of_date,
+                                 max_workers, seed, output_path, report)
+        return result
+    finally:
+        system.finish_run_report(report, result is not None, [output_path])
+
+
+def _run_robustness(system, runs, perturbation, use_market_cap, as_of_date, max_workers, seed, output_path, report):
+    start_time = time.time()
+
+    with report.stage("load") as record:
+        if not system.load_source_excel_file():
+            record.status = "failed"
+            return None
+        record.counts["sheets"] = len(system.source_sheetnames)
+
+    cap_type = "시가총액" if use_market_cap else "유동시가총액"
+    print("=" * 80)
+    print("DeepSearch 외인수급Top20 지수 (PR) 선정 안정성 평가 시작")
+    print(f"사용 데이터: {cap_type}")
+    print(f"교란 실행 횟수: {runs} ({perturbation})")
+    print("=" * 80)
+
+    try:
+        sheets = system.find_data_sheets(use_market_cap)
+        if not sheets:
+            return None
+
+        engine = build_backtest_engine(system, sheets, report)
+        if engine is None:
+            return None
+
+        with report.stage("robustness") as record:
+            result = RobustnessRunner(engine, max_workers).run(runs, perturbation, as_of_date, seed=seed)
+            record.counts.update(runs=runs, stocks=len(result.codes))
+
+        if output_path:
+            with report.stage("write_result"):
+                result.save_excel(output_path)
+        execution_time = time.time() - start_time
+
+        print("=" * 80)
+        print("DeepSearch 외인수급Top20 지수 (PR) 선정 안정성 평가 완료!")
+        print(f"- 기준일: {result.as_of_date.strftime('%Y-%m-%d')}")
+        print(f"- 교란 없는 구성종목 수: {len(result.baseline_constituents)}")
+        print(f"- 구성종목 동일 비율: {result.exact_match_rate:.1%}, 평균 중복도: {result.mean_overlap:.3f}")
+        print(f"- 90% 이상 선정 종목 수: {len(result.stable_codes(0.9))}")
+        print(f"- 실행 시간: {execution_time:.2f}초")
+        if output_path:
+            print(f"- 결과 파일: {output_path}")
+        print("=" * 80)
+
+        return result
+
+    except Exception as e:
+        print(f"선정 안정성 평가 실패: {e}")
+        return None
+    finally:
+        system.close_source_excel_file()
@@ -0,0 +1,342 @@
+"""
+DeepSearch 외인수급Top20 지수 월말 리밸런싱 일괄 처리 (비대화형)
+
+시작 월 ~ 종료 월의 월말마다 raw_data 파일을 찾고(없으면 선택적으로 직전 파일을 복사해
+날짜 업데이트 + Quantiwise refresh로 생성) 시가총액/유동시가총액 분석을 프로세스 풀에서 동시에 실행한다.
+파일 준비(refresh)와 분석은 크기가 제한된 대기열로 이어진 파이프라인이라 refresh 대기 중에도
+앞서 준비된 파일의 분석이 진행된다. 단계별 동시 실행 수는 refresh_workers / analysis_workers로 지정한다.
+
+사용 예:
+    python batch_rebalancing.py --start 2025-01 --end 2025-08
+    python batch_rebalancing.py --start 2025-09 --end 2025-12 --produce-missing --cap market --workers 2 --queue-size 1
+"""
+
+import io
+import os
+import sys
+import time
+import calendar
+import queue
+import threading
+import contextlib
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from parallel_parser import default_worker_count
+from selection_parameters import FETCH_MARGIN_MONTHS
+from refresh_backend import com_thread_scope
+from excel_session_pool import ExcelSessionPool, Win32ExcelSession
+from monthly_rebalancing_scheduler import MonthlyRebalancingScheduler
+
+CAP_TYPE_OPTIONS = {
+    "both": (True, True, "시가총액 + 유동시가총액"),
+    "market": (True, False, "시가총액"),
+    "ff": (False, False, "유동시가총액"),
+}
+
+
+def month_end_dates(start_month, end_month):
+    """'YYYY-MM' 두 개 사이(양 끝 포함) 각 월의 말일 목록"""
+    start = datetime.strptime(start_month, '%Y-%m')
+    end = datetime.strptime(end_month, '%Y-%m')
+    if start > end:
+        raise ValueError(f"시작 월({start_month})이 종료 월({end_month})보다 늦습니다.")
+    dates = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        dates.append(datetime(year, month, calendar.monthrange(year, month)[1]))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return dates
+
+
+class BatchMonthResult:
+    """월 하나의 일괄 처리 결과"""
+
+    def __init__(self, target_date, filename=None):
+        self.target_date = target_date
+        self.filename = filename
+        self.success = False
+        self.failed_step = None
+        self.error = None
+        self.seconds = 0.0
+        self.log = ""
+
+    @property
+    def label(self):
+        return self.target_date.strftime('%Y-%m-%d')
+
+
+def previous_raw_file(scheduler, target_date):
+    """대상 날짜 직전 날짜의 raw_data 파일명 (없으면 None)"""
+    files = scheduler.raw_data_files()
+    earlier = [date for date in files if date < target_date]
+    return files[max(earlier)] if earlier else None
+
+
+def produce_raw_file(scheduler, target_date, automation_mode="macro", source_filename=None, on_refreshed=None):
+    """대상 날짜 raw_data 파일 생성 (직전 파일 복사 → B5/B6 업데이트 → refresh, 실패하면 삭제 후 None)"""
+    if source_filename is None:
+        source_filename = previous_raw_file(scheduler, target_date)
+    if source_filename is None:
+        print(f"{target_date.strftime('%Y-%m-%d')} 이전 날짜의 raw_data 파일이 없어 새 파일을 만들 수 없습니다.")
+        return None
+
+    b5_value, b6_value = scheduler.date_cell_values(target_date)
+    new_filename, _ = scheduler.copy_file_with_custom_date(source_filename, target_date)
+    if not new_filename:
+        return None
+
+    if scheduler.update_dates_in_excel(new_filename, b5_value, b6_value):
+        if scheduler.open_excel_and_refresh_data(new_filename, automation_mode, on_refreshed):
+            return new_filename
+
+    try:
+        os.remove(os.path.join(scheduler.base_directory, new_filename))
+        print(f"에러 발생으로 인한 파일 정리: {new_filename} 삭제 완료")
+    except OSError as e:
+        print(f"파일 삭제 중 오류 발생: {e}")
+    return None
+
+
+def _run_month_analysis(settings, filename, use_market_cap, both_cap_types):
+    """워커 프로세스: raw_data 파일 한 개 분석 → (성공 여부, 오류, 실행 시간, 분석 로그)"""
+    log = io.StringIO()
+    start_time = time.time()
+    error = None
+    with contextlib.redirect_stdout(log):
+        try:
+            scheduler = MonthlyRebalancingScheduler(**settings)
+            success = scheduler.run_analysis(filename, use_market_cap, both_cap_types)
+            if not success:
+                error = "데이터 분석 실패"
+        except Exception as e:
+            success = False
+            error = f"분석 실행 중 오류 발생: {e}"
+    return success, error, time.time() - start_time, log.getvalue()
+
+
+def run_batch(start_month, end_month, cap_type="both", base_directory="excel_data", reader_engine="openpyxl",
+              use_cache=True, produce_missing=False, analysis_workers=None, automation_mode="macro",
+              refresh_workers=1, queue_size=None, scheduler=None):
+    """월 범위 일괄 분석 → 월별 BatchMonthResult 목록 (월 순서)
+
+    파일 준비(refresh) 단계와 분석 단계를 파이프라인으로 실행한다. 준비된 파일은 크기 queue_size의
+    대기열에 넣고 분석 스레드가 꺼내 프로세스 풀에서 분석하므로, N번째 파일 분석 중에 N+1번째 파일
+    refresh가 진행된다. 대기열이 가득 차면 refresh 단계가 기다린다 (backpressure).
+
+    refresh_workers: 동시 refresh 수 (2 이상이면 refresh 스레드마다 COM 초기화, 세션 풀은 스레드마다 세션 하나)
+    analysis_workers: 동시 분석 프로세스 수 (기본: 월 수와 CPU 코어 수 중 작은 값)
+    queue_size: 분석 대기열 크기 (기본: analysis_workers)
+    scheduler: refresh 백엔드 등을 바꾼 MonthlyRebalancingScheduler (기본: base_directory 설정으로 생성)
+    """
+    use_market_cap, both_cap_types, cap_type_name = CAP_TYPE_OPTIONS[cap_type]
+    scheduler = scheduler or MonthlyRebalancingScheduler(base_directory, reader_engine, use_cache)
+    target_dates = month_end_dates(start_month, end_month)
+    analysis_workers = analysis_workers or default_worker_count(len(target_dates))
+    queue_size = queue_size or analysis_workers
+
+    print("=" * 80)
+    print("DeepSearch 외인수급Top20 지수 월말 리밸런싱 일괄 처리")
+    print(f"- 대상 기간: {start_month} ~ {end_month} ({len(target_dates)}개월)")
+    print(f"- 시가총액 타입: {cap_type_name}")
+    print(f"- 없는 파일 생성: {'예' if produce_missing else '아니오'}")
+    if produce_missing:
+        print(f"- 데이터 받기 구간 (B5): {scheduler.fetch_window_description()}")
+    print(f"- 동시 실행: refresh {refresh_workers}개, 분석 {analysis_workers}개 (대기열 {queue_size}개)")
+    print("=" * 80)
+
+    existing_files = scheduler.raw_data_files()
+    results = [BatchMonthResult(target_date, existing_files.get(target_date)) for target_date in target_dates]
+
+    # 워커 안에서 다시 시트 병렬 파싱을 하지 않도록 parse_workers=1, 여러 프로세스가 같은
+    # 누적 패널 저장소(.panel_store)를 동시에 덮어쓰지 않도록 병렬 분석 시 incremental 끔
+    settings = {"base_directory": scheduler.base_directory, "reader_engine": scheduler.reader_engine,
+                "use_cache": scheduler.use_cache, "incremental": scheduler.incremental and analysis_workers <= 1,
+                "parse_workers": 1, "parameters": scheduler.parameters}
+    ready = queue.Queue(maxsize=queue_size)
+    progress = _BatchProgress()
+
+    with ProcessPoolExecutor(max_workers=analysis_workers) as executor:
+        analysis_threads = [threading.Thread(target=_analysis_stage, daemon=True,
+                                             args=(ready, executor, settings, use_market_cap, both_cap_types,
+                                                   progress))
+                            for _ in range(analysis_workers)]
+        for thread in analysis_threads:
+            thread.start()
+        try:
+            _refresh_stage(scheduler, results, existing_files, produce_missing, automation_mode, refresh_workers,
+                           ready)
+        finally:
+            for _ in analysis_threads:
+                ready.put(None)
+            for thread in analysis_threads:
+                thread.join()
+
+    print_batch_summary(results)
+    return results
+
+
+class _BatchProgress:
+    """분석 스레드 간 진행 건수 공유"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.done = 0
+
+
+def _refresh_stage(scheduler, results, existing_files, produce_missing, automation_mode, refresh_workers, ready):
+    """파일 준비 단계: 있는 파일은 바로, 없는 파일은 생성(refresh) 후 분석 대기열에 넣음 (월 순서)"""
+
+    def produce(result, source_filename=None):
+        print(f"\n[{result.label}] raw_data 파일 생성 중...")
+        start_time = time.time()
+        result.filename = produce_raw_file(scheduler, result.target_date, automation_mode, source_filename)
+        result.seconds += time.time() - start_time
+        if not result.filename:
+            result.failed_step = "파일 생성"
+            result.error = "raw_data 파일 생성 실패 (복사/날짜 업데이트/refresh)"
+            return
+        ready.put(result)
+
+    def refresh_thread(jobs):
+        # COM 객체는 만든 스레드에서만 쓰므로 스레드마다 COM 초기화, 이 스레드가 빌린 Excel 세션도 여기서 종료
+        with com_thread_scope():
+            try:
+                while True:
+                    job = jobs.get()
+                    if job is None:
+                        return
+                    result, source_filename = job
+                    try:
+                        produce(result, source_filename)
+                    except Exception as e:
+                        result.failed_step = "파일 생성"
+                        result.error = f"raw_data 파일 생성 중 오류 발생: {e}"
+            finally:
+                if scheduler.session_pool is not None:
+                    scheduler.session_pool.close_thread_session()
+
+    refresh_jobs = queue.Queue()
+    refresh_threads = []
+    if produce_missing and refresh_workers > 1:
+        refresh_threads = [threading.Thread(target=refresh_thread, args=(refresh_jobs,), name=f"refresh-{index}")
+                           for index in range(refresh_workers)]
+        for thread in refresh_threads:
+            thread.start()
+    try:
+        for result in results:
+            if result.filename:
+                ready.put(result)
+            elif not produce_missing:
+                result.failed_step = "파일 확인"
+                result.error = (f"raw_data 파일 없음: "
+                                f"{scheduler.file_prefix}{result.target_date.strftime('%Y%m%d')}.xlsx")
+            elif not refresh_threads:
+                # 순서대로 생성 - 다음 달은 방금 만든 파일을 복사
+                produce(result)
+            else:
+                # 동시 생성 - 다른 스레드가 만드는 중인 파일 대신 시작 시점에 있던 직전 파일을 복사
+                earlier = [date for date in existing_files if date < result.target_date]
+                if not earlier:
+                    result.failed_step = "파일 생성"
+                    result.error = "복사할 직전 raw_data 파일 없음"
+                    continue
+                refresh_jobs.put((result, existing_files[max(earlier)]))
+    finally:
+        for _ in refresh_threads:
+            refresh_jobs.put(None)
+        for thread in refresh_threads:
+            thread.join()
+
+
+def _analysis_stage(ready, executor, settings, use_market_cap, both_cap_types, progress):
+    """분석 단계 스레드: 대기열에서 꺼낸 파일을 프로세스 풀에서 분석 (None을 받으면 종료)"""
+    while True:
+        result = ready.get()
+        if result is None:
+            return
+        try:
+            success, error, seconds, log = executor.submit(
+                _run_month_analysis, settings, result.filename, use_market_cap, both_cap_types).result()
+        except Exception as e:
+            success, error, seconds, log = False, f"분석 프로세스 오류: {e}", 0.0, ""
+        result.success = success
+        result.error = error
+        result.seconds += seconds
+        result.log = log
+        if not success:
+            result.failed_step = "분석"
+        with progress.lock:
+            progress.done += 1
+            print(f"   - [분석 {progress.done}] {result.label} {'완료' if success else '실패'} ({seconds:.1f}초)")
+
+
+def print_batch_summary(results):
+    """일괄 처리 결과 요약 (실패한 월은 단계, 원인, 분석 로그 마지막 줄 출력)"""
+    failures = [result for result in results if not result.success]
+    print("=" * 80)
+    print(f"일괄 처리 완료: {len(results)}개월 중 {len(results) - len(failures)}개월 성공, {len(failures)}개월 실패")
+    for result in results:
+        if result.success:
+            print(f"   - {result.label}: 성공 ({result.seconds:.1f}초) {result.filename}")
+    if failures:
+        print("실패 목록:")
+        for result in failures:
+            print(f"   - {result.label} [{result.failed_step}]: {result.error}")
+            log_lines = [line for line in result.log.splitlines() if line.strip()]
+            for line in log_lines[-3:]:
+                print(f"       {line}")
+    print("=" * 80)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DeepSearch 외인수급Top20 지수 월말 리밸런싱 일괄 처리")
+    parser.add_argument("--start", required=True, help="시작 월 (YYYY-MM)")
+    parser.add_argument("--end", required=True, help="종료 월 (YYYY-MM)")
+    parser.add_argument("--cap", default="both", choices=sorted(CAP_TYPE_OPTIONS),
+                        help="both: 시가총액 + 유동시가총액, market: 시가총액, ff: 유동시가총액")
+    parser.add_argument("--base-directory", default="excel_data")
+    parser.add_argument("--engine", default="openpyxl", choices=["openpyxl", "xml"])
+    parser.add_argument("--no-cache", action="store_true", help="파싱 결과 캐시 사용 안 함")
+    parser.add_argument("--incremental", action="store_true",
+                        help="시트별 누적 패널 저장소 사용 (마지막 저장 행 대조 후 새 거래일 행만 읽어 추가, 순차 분석일 때만)")
+    parser.add_argument("--produce-missing", action="store_true",
+                        help="없는 월말 raw_data 파일을 직전 파일 복사 + Quantiwise refresh로 생성")
+    parser.add_argument("--workers", type=int, help="분석 프로세스 수 (기본: 월 수와 CPU 코어 수 중 작은 값)")
+    parser.add_argument("--refresh-workers", type=int, default=1, help="동시 refresh 수 (Excel 인스턴스 하나면 1)")
+    parser.add_argument("--queue-size", type=int, help="refresh 완료 후 분석 대기 파일 수 상한 (기본: 분석 프로세스 수)")
+    parser.add_argument("--reuse-excel", action="store_true",
+                        help="파일마다 Excel을 새로 띄우지 않고 추가 기능이 로드된 Excel 세션을 재사용")
+    parser.add_argument("--max-workbooks", type=int, default=20, help="Excel 세션 하나가 처리할 파일 수 (넘으면 재시작)")
+    parser.add_argument("--trimmed-fetch", action="store_true",
+                        help="새 파일 B5를 1년 전 대신 가장 긴 창 + 여유 개월의 월초로 설정 (데이터부족 판정이 달라질 수 있음)")
+    parser.add_argument("--fetch-margin-months", type=int, default=FETCH_MARGIN_MONTHS,
+                        help="--trimmed-fetch일 때 가장 긴 창 시작 월보다 더 받을 개월 수")
+    args = parser.parse_args()
+    if args.fetch_margin_months < 0:
+        parser.error("--fetch-margin-months는 0 이상이어야 합니다.")
+
+    # 세션 풀은 refresh 동시 실행 수만큼 Excel 프로세스를 따로 띄움
+    session_pool = ExcelSessionPool(Win32ExcelSession, args.refresh_workers, args.max_workbooks) \
+        if args.reuse_excel else None
+    scheduler = MonthlyRebalancingScheduler(args.base_directory, args.engine, not args.no_cache,
+                                            incremental=args.incremental, session_pool=session_pool,
+                                            fetch_margin_months=args.fetch_margin_months,
+                                            full_year_fetch=not args.trimmed_fetch)
+    try:
+        results = run_batch(args.start, args.end, args.cap, produce_missing=args.produce_missing,
+                            analysis_workers=args.workers, refresh_workers=args.refresh_workers,
+                            queue_size=args.queue_size, scheduler=scheduler)
+    except ValueError as e:
+        print(f"입력 형식 오류가 발생했습니다: {e}")
+        return 2
+    finally:
+        if session_pool is not None:
+            session_pool.close()
+    return 0 if all(result.success for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
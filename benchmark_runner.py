@@ -0,0 +1,228 @@
+"""
+DeepSearch 외인수급Top20 지수 시스템 규모별 벤치마크
+
+synthetic_workbook으로 종목 수 × 기간(년)별 가상 raw_data 워크북을 만들고
+run_full_stock_system의 실행 보고서(run_report)에서 단계(로드, 시트 파싱, EPS 필터, 수급강도,
+월별 수급, 비중, 결과 저장)별 경과 시간, CPU 시간, 메모리 최대 증가량(tracemalloc)을 모아 JSON으로 저장한다.
+이전 버전의 JSON과 비교하면 단계별 성능 저하를 확인할 수 있다.
+
+사용 예:
+    python benchmark_runner.py --stocks 500 2500 10000 --years 1 5 --compare benchmark_results/이전.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import contextlib
+import subprocess
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+
+from synthetic_workbook import generate_raw_workbook
+from monthly_rebalancing_scheduler import DeepSearchForeignBuyingTop20IndexSystem
+
+DEFAULT_STOCK_COUNTS = (500, 1000, 2500, 5000, 10000)
+DEFAULT_YEARS = (1, 2, 3, 5)
+TRADING_DAYS_PER_YEAR = 250
+BENCHMARK_FORMAT_VERSION = 1
+
+def environment_info():
+    """결과 비교용 실행 환경 정보 (git 커밋, 파이썬/라이브러리 버전, CPU 수)"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "openpyxl": openpyxl.__version__,
+    }
+
+
+def run_case(work_directory, stock_count, years, empty_density=0.02, reader_engine="xml", parse_workers=1,
+             trace_memory=True, seed=0):
+    """가상 워크북 한 개 생성 후 전체 종목 시스템 실행, 단계별 측정 결과 반환"""
+    day_count = years * TRADING_DAYS_PER_YEAR
+    source_path = os.path.join(work_directory, f"raw_data_{stock_count}x{day_count}_{empty_density}_{seed}.xlsx")
+    output_path = os.path.join(work_directory, f"result_{stock_count}x{day_count}_{reader_engine}.xlsx")
+
+    generate_start = time.perf_counter()
+    if not os.path.exists(source_path):
+        generate_raw_workbook(source_path, stock_count, day_count, empty_density, seed=seed)
+    generate_seconds = time.perf_counter() - generate_start
+
+    # 시간 측정과 메모리 측정(tracemalloc은 실행을 크게 느리게 함)은 따로 실행
+    timing = _run_system(source_path, output_path, reader_engine, parse_workers, trace_memory=False)
+    memory = _run_system(source_path, output_path, reader_engine, parse_workers, trace_memory=True) \
+        if trace_memory else None
+
+    stages = timing["stages"]
+    for stage_name, stage in stages.items():
+        if memory is not None and stage_name in memory["stages"]:
+            stage["peak_memory_mb"] = memory["stages"][stage_name]["peak_memory_mb"]
+
+    return {
+        "stock_count": stock_count,
+        "years": years,
+        "day_count": day_count,
+        "empty_density": empty_density,
+        "reader_engine": reader_engine,
+        "parse_workers": parse_workers,
+        "success": timing["success"],
+        "workbook_bytes": os.path.getsize(source_path),
+        "generate_seconds": round(generate_seconds, 6),
+        "total_wall_seconds": timing["wall_seconds"],
+        "total_cpu_seconds": timing["cpu_seconds"],
+        "peak_memory_mb": None if memory is None else memory["peak_memory_mb"],
+        "stages": stages,
+    }
+
+
+def _run_system(source_path, output_path, reader_engine, parse_workers, trace_memory):
+    """전체 종목 시스템 1회 실행 후 실행 보고서의 단계별 계측값 추출
+
+    캐시/누적 패널 없이 매번 전체 파싱 비용을 측정한다.
+    """
+    system = DeepSearchForeignBuyingTop20IndexSystem(source_path, output_path, reader_engine, use_cache=False,
+                                                     incremental=False, parse_workers=parse_workers,
+                                                     trace_memory=trace_memory)
+    with contextlib.redirect_stdout(io.StringIO()):
+        success = system.run_full_stock_system(True)
+    report = system.last_run_report.to_dict()
+
+    stages = {}
+    for record in report["stages"]:
+        stage = stages.setdefault(record["name"], {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                   "peak_memory_mb": None, "counts": record["counts"]})
+        stage["calls"] += 1
+        stage["wall_seconds"] = round(stage["wall_seconds"] + (record["wall_seconds"] or 0.0), 6)
+        stage["cpu_seconds"] = round(stage["cpu_seconds"] + (record["cpu_seconds"] or 0.0), 6)
+        if record["peak_memory_mb"] is not None:
+            stage["peak_memory_mb"] = max(stage["peak_memory_mb"] or 0.0, record["peak_memory_mb"])
+
+    return {
+        "success": bool(success),
+        "wall_seconds": report["wall_seconds"],
+        "cpu_seconds": report["cpu_seconds"],
+        "peak_memory_mb": report["peak_memory_mb"],
+        "stages": stages,
+    }
+
+
+def case_key(case):
+    return (case["stock_count"], case["years"], case["empty_density"], case["reader_engine"], case["parse_workers"])
+
+
+def run_benchmark(stock_counts=DEFAULT_STOCK_COUNTS, years_list=DEFAULT_YEARS, reader_engines=("xml",),
+                  empty_density=0.02, parse_workers=1, trace_memory=True, work_directory=None, seed=0):
+    """종목 수 × 기간 × 리더 엔진 조합별 벤치마크 실행 → 보고서 dict"""
+    report = {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": environment_info(),
+        "cases": [],
+    }
+    temporary = work_directory is None
+    work_directory = work_directory or tempfile.mkdtemp(prefix="deepsearch_benchmark_")
+    os.makedirs(work_directory, exist_ok=True)
+    try:
+        for years in years_list:
+            for stock_count in stock_counts:
+                for reader_engine in reader_engines:
+                    case = run_case(work_directory, stock_count, years, empty_density, reader_engine,
+                                    parse_workers, trace_memory, seed)
+                    report["cases"].append(case)
+                    print(f"{stock_count:>6}개 종목 × {years}년 [{reader_engine}]: "
+                          f"{case['total_wall_seconds']:.2f}초 (CPU {case['total_cpu_seconds']:.2f}초"
+                          + (f", 최대 메모리 {case['peak_memory_mb']:.1f}MB" if case['peak_memory_mb'] is not None else "")
+                          + ")" + ("" if case["success"] else " - 실행 실패"))
+                # 다음 기간으로 넘어가기 전에 이번 기간의 워크북 정리 (큰 파일이 쌓이지 않도록)
+                if temporary:
+                    for file_name in os.listdir(work_directory):
+                        os.remove(os.path.join(work_directory, file_name))
+    finally:
+        if temporary:
+            shutil.rmtree(work_directory, ignore_errors=True)
+    return report
+
+
+def save_report(report, output_path):
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+def load_report(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def compare_reports(previous, current, tolerance=0.2, min_seconds=0.05):
+    """이전 보고서 대비 단계별 경과 시간이 tolerance(비율) 넘게 늘어난 항목 목록
+
+    min_seconds보다 짧은 단계는 측정 오차가 커서 비교하지 않는다.
+    반환: [(케이스 설명, 단계명, 이전 초, 현재 초)]
+    """
+    previous_cases = {case_key(case): case for case in previous.get("cases", [])}
+    regressions = []
+    for case in current.get("cases", []):
+        before = previous_cases.get(case_key(case))
+        if before is None:
+            continue
+        label = f"{case['stock_count']}개 종목 × {case['years']}년 [{case['reader_engine']}]"
+        timings = [("total", before["total_wall_seconds"], case["total_wall_seconds"])]
+        for stage_name, stage in case["stages"].items():
+            if stage_name in before["stages"]:
+                timings.append((stage_name, before["stages"][stage_name]["wall_seconds"], stage["wall_seconds"]))
+        for stage_name, before_seconds, current_seconds in timings:
+            if max(before_seconds, current_seconds) >= min_seconds and current_seconds > before_seconds * (1 + tolerance):
+                regressions.append((label, stage_name, before_seconds, current_seconds))
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DeepSearch 외인수급Top20 지수 시스템 규모별 벤치마크")
+    parser.add_argument("--stocks", type=int, nargs="+", default=list(DEFAULT_STOCK_COUNTS))
+    parser.add_argument("--years", type=int, nargs="+", default=list(DEFAULT_YEARS))
+    parser.add_argument("--engines", nargs="+", default=["xml"], choices=["xml", "openpyxl"])
+    parser.add_argument("--empty-density", type=float, default=0.02)
+    parser.add_argument("--parse-workers", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="tracemalloc 메모리 측정 실행 생략")
+    parser.add_argument("--work-directory", help="가상 워크북 보관 폴더 (지정하면 재사용/유지)")
+    parser.add_argument("--output", help="결과 JSON 경로 (기본: benchmark_results/benchmark_YYYYMMDD_HHMMSS.json)")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON 경로")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run_benchmark(args.stocks, args.years, args.engines, args.empty_density, args.parse_workers,
+                           not args.no_memory, args.work_directory)
+    output_path = args.output or os.path.join(
+        "benchmark_results", f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    save_report(report, output_path)
+    print(f"벤치마크 결과 저장: {output_path}")
+
+    if args.compare:
+        regressions = compare_reports(load_report(args.compare), report, args.tolerance)
+        if not regressions:
+            print(f"성능 저하 없음 (기준: {args.compare}, 허용 {args.tolerance:.0%})")
+        for label, stage_name, before_seconds, current_seconds in regressions:
+            print(f"[성능 저하] {label} {stage_name}: {before_seconds:.3f}초 → {current_seconds:.3f}초")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Excel 애플리케이션 세션 풀
+
+파일마다 Excel을 새로 띄우고(Dispatch) 끄면(Quit) 애플리케이션 시작과 Quantiwise 추가 기능 로드 비용을
+매번 치른다. 세션 풀은 추가 기능까지 로드된 Excel 인스턴스를 여러 파일에 걸쳐 재사용한다.
+- 빌려줄 때 상태 확인(health check): 응답하지 않는 세션은 버리고 새로 시작
+- 재시작(recycle): 통합 문서를 max_workbooks개 처리했거나 처리 중 실패한 세션은 반납 시 종료
+- 동시 사용: 세션은 최대 max_sessions개, 모두 사용 중이면 반납될 때까지 대기
+- 스레드 고정: COM 객체는 만든 스레드(아파트)에서만 쓸 수 있으므로 세션은 시작한 스레드에서만 빌리고 반납하고 종료한다.
+  스레드마다 세션은 하나이며, 작업 스레드는 COM 초기화(com_thread_scope) 안에서 세션을 쓰고 끝날 때
+  close_thread_session으로 자기 세션을 종료한다
+
+Win32ExcelSession은 DispatchEx로 세션마다 별도 Excel 프로세스를 띄우고, FakeExcelSession은
+Excel 없이 풀 로직을 검증할 수 있는 가상 세션이다.
+"""
+
+import threading
+
+from refresh_backend import Win32RefreshBackend
+
+
+class ExcelSession:
+    """Excel 애플리케이션 세션 기본 클래스"""
+
+    def __init__(self):
+        self.workbook_count = 0
+        self.failed = False
+        # 세션을 시작한 스레드 (이 스레드에서만 사용/종료)
+        self.owner_thread = None
+
+    def start(self):
+        raise NotImplementedError
+
+    def is_healthy(self):
+        raise NotImplementedError
+
+    def create_backend(self):
+        """이 세션의 애플리케이션을 쓰는 refresh 백엔드 (백엔드 close는 통합 문서만 닫음)"""
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+
+class Win32ExcelSession(ExcelSession):
+    """pywin32 Excel 세션 (세션마다 별도 Excel 프로세스)
+
+    addin_names: 시작 시 다시 로드할 추가 기능 이름(일부 문자열) 목록, None이면 설치된 추가 기능 전체
+    (자동화로 시작한 Excel은 설치된 추가 기능을 자동으로 로드하지 않음)
+    """
+
+    def __init__(self, visible=True, addin_names=None):
+        super().__init__()
+        self.visible = visible
+        self.addin_names = addin_names
+        self.excel = None
+
+    def start(self):
+        import win32com.client as win32
+
+        self.excel = win32.DispatchEx("Excel.Application")
+        self.excel.Visible = self.visible
+        # 풀에서 재사용하는 세션은 저장 확인 창 등으로 멈추면 안 됨
+        self.excel.DisplayAlerts = False
+        self._load_addins()
+
+    def _matches(self, name):
+        return self.addin_names is None or any(addin_name.lower() in str(name).lower()
+                                               for addin_name in self.addin_names)
+
+    def _load_addins(self):
+        for index in range(1, self.excel.AddIns.Count + 1):
+            addin = self.excel.AddIns(index)
+            if addin.Installed and self._matches(addin.Name):
+                self.excel.Workbooks.Open(addin.FullName)
+        for index in range(1, self.excel.COMAddIns.Count + 1):
+            com_addin = self.excel.COMAddIns(index)
+            if not com_addin.Connect and self._matches(com_addin.Description):
+                com_addin.Connect = True
+
+    def is_healthy(self):
+        if self.excel is None:
+            return False
+        try:
+            # 프로세스가 죽었거나 멈춘 경우 COM 호출이 실패
+            self.excel.Workbooks.Count
+            return bool(self.excel.Ready)
+        except Exception:
+            return False
+
+    def create_backend(self):
+        return Win32RefreshBackend(self.visible, application=self.excel)
+
+    def close(self):
+        if self.excel is None:
+            return
+        try:
+            self.excel.Quit()
+        except Exception as e:
+            print(f"Excel 세션 종료 중 오류: {e}")
+        self.excel = None
+
+
+class FakeExcelSession(ExcelSession):
+    """가상 Excel 세션 (풀 로직 검증용)
+
+    backend_factory: 통합 문서마다 만들 refresh 백엔드 (예: FakeRefreshBackend)
+    fail_after: 이 개수만큼 백엔드를 만든 뒤에는 상태 확인 실패 (응답 없는 Excel 흉내)
+    """
+
+    def __init__(self, backend_factory, fail_after=None):
+        super().__init__()
+        self.backend_factory = backend_factory
+        self.fail_after = fail_after
+        self.started = False
+        self.closed = False
+        self.closed_thread = None
+        self.backends_created = 0
+
+    def start(self):
+        self.started = True
+
+    def is_healthy(self):
+        if not self.started or self.closed:
+            return False
+        return self.fail_after is None or self.backends_created < self.fail_after
+
+    def create_backend(self):
+        self.backends_created += 1
+        return self.backend_factory()
+
+    def close(self):
+        self.closed = True
+        self.closed_thread = threading.get_ident()
+
+
+class ExcelSessionPool:
+    """Excel 세션 풀 (스레드마다 세션 하나)
+
+    session_factory: 새 ExcelSession을 만드는 함수 (예: Win32ExcelSession)
+    max_sessions: 동시에 띄울 세션 수 상한 (세션을 쓰는 스레드 수 이상이어야 함)
+    max_workbooks: 세션 하나가 처리할 통합 문서 수 (넘으면 반납 시 재시작)
+    """
+
+    def __init__(self, session_factory, max_sessions=1, max_workbooks=20):
+        self.session_factory = session_factory
+        self.max_sessions = max_sessions
+        self.max_workbooks = max_workbooks
+        # 스레드별 대기 중인 세션 {스레드 id: 세션}
+        self.idle_sessions = {}
+        self.session_count = 0
+        self.started_count = 0
+        self.recycled_count = 0
+        self.closed = False
+        self._condition = threading.Condition()
+
+    def _start_session(self):
+        session = self.session_factory()
+        session.owner_thread = threading.get_ident()
+        try:
+            session.start()
+        except BaseException:
+            session.close()
+            raise
+        self.started_count += 1
+        return session
+
+    @staticmethod
+    def _check_owner(session):
+        if session.owner_thread != threading.get_ident():
+            raise RuntimeError("Excel 세션은 시작한 스레드에서만 사용할 수 있습니다.")
+
+    def acquire(self):
+        """이 스레드의 상태 확인을 통과한 세션 (없으면 새로 시작, 상한이면 다른 스레드 세션이 종료될 때까지 대기)"""
+        owner = threading.get_ident()
+        with self._condition:
+            while True:
+                if self.closed:
+                    raise RuntimeError("세션 풀이 이미 종료되었습니다.")
+                session = self.idle_sessions.pop(owner, None)
+                if session is not None:
+                    if session.is_healthy():
+                        session.failed = False
+                        return session
+                    print("응답하지 않는 Excel 세션을 종료하고 새로 시작합니다.")
+                    self._discard(session)
+                    continue
+                if self.session_count < self.max_sessions:
+                    # 시작 중에도 자리를 차지해 상한을 넘지 않도록 먼저 센다
+                    self.session_count += 1
+                    break
+                self._condition.wait()
+
+        try:
+            return self._start_session()
+        except BaseException:
+            with self._condition:
+                self.session_count -= 1
+                self._condition.notify_all()
+            raise
+
+    def release(self, session, failed=False):
+        """세션 반납 (실패했거나 처리 문서 수가 상한이면 이 스레드에서 종료해서 다음에 새로 시작)"""
+        self._check_owner(session)
+        session.workbook_count += 1
+        with self._condition:
+            if failed or session.failed or session.workbook_count >= self.max_workbooks or self.closed \
+                    or session.owner_thread in self.idle_sessions:
+                self._discard(session)
+            else:
+                self.idle_sessions[session.owner_thread] = session
+            self._condition.notify_all()
+
+    def _discard(self, session):
+        """세션 종료 후 풀에서 제거 (호출 시 _condition 보유, 세션을 시작한 스레드에서만 호출)"""
+        self.session_count -= 1
+        self.recycled_count += 1
+        session.close()
+
+    def close_thread_session(self):
+        """이 스레드의 대기 중인 세션 종료 (작업 스레드가 COM 해제 전에 호출)"""
+        with self._condition:
+            session = self.idle_sessions.pop(threading.get_ident(), None)
+            if session is not None:
+                self.session_count -= 1
+                session.close()
+            self._condition.notify_all()
+
+    def close(self):
+        """풀 종료: 이 스레드의 대기 중인 세션 종료 (사용 중인 세션은 반납될 때 종료)
+
+        다른 스레드가 시작한 세션은 그 스레드에서 close_thread_session으로 종료해야 한다.
+        남아 있으면 다른 아파트에서 Quit하지 않고 풀에서만 제거한다 (스레드의 COM 해제 시 참조가 풀려 Excel 종료).
+        """
+        self.close_thread_session()
+        with self._condition:
+            self.closed = True
+            if self.idle_sessions:
+                print(f"다른 스레드가 시작한 Excel 세션 {len(self.idle_sessions)}개는 해당 스레드에서 종료되지 않았습니다.")
+                self.session_count -= len(self.idle_sessions)
+                self.idle_sessions.clear()
+            self._condition.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,110 @@
+"""
+이력 저장소 추가 / 이력 저장소 백테스트 실행
+
+base_directory의 raw_data 파일을 날짜 순서대로 파싱해 HistoryStore에 스냅샷으로 추가하고(같은 내용의 파일과
+저장소 마지막 기준일 이전 파일은 건너뜀), 저장소의 전체 기간 최신 값으로 raw_data 파일을 다시 파싱하지 않고
+월말 리밸런싱 백테스트를 실행한다. MonthlyRebalancingScheduler의 같은 이름 메서드가 이 함수들을 호출한다.
+"""
+
+import os
+
+from panel_cache import file_digest
+from history_store import HistoryStore
+from backtest_engine import BacktestEngine
+from index_calculator import backtest_index_levels
+
+
+def ingest_history(scheduler, store=None):
+    """base_directory의 raw_data 파일을 날짜 순서대로 이력 저장소에 추가 → 추가한 스냅샷 수 (실패 시 None)"""
+    # 시스템 모듈과의 순환 import를 피하기 위해 함수 안에서 import
+    from monthly_rebalancing_scheduler import DeepSearchForeignBuyingTop20IndexSystem
+
+    try:
+        store = store or HistoryStore.for_directory(scheduler.base_directory)
+        raw_bytes = 0
+        added = 0
+        for target_date, filename in sorted(scheduler.raw_data_files().items()):
+            file_path = os.path.join(scheduler.base_directory, filename)
+            raw_bytes += os.path.getsize(file_path)
+            digest = file_digest(file_path)
+            existing = store.find_snapshot(digest)
+            if existing is not None:
+                print(f"이미 추가된 파일: {filename} (스냅샷 {existing.snapshot_id})")
+                continue
+            snapshots = store.snapshots()
+            if snapshots and target_date < snapshots[-1].as_of:
+                print(f"건너뜀: {filename} (이력 저장소 마지막 기준일 {snapshots[-1].as_of.strftime('%Y-%m-%d')} 이전)")
+                continue
+
+            system = DeepSearchForeignBuyingTop20IndexSystem(file_path, None, scheduler.reader_engine, scheduler.use_cache,
+                                                             incremental=False, parse_workers=1)
+            with scheduler.stage("history_ingest") as record:
+                if not system.load_source_excel_file():
+                    record.status = "failed"
+                    return None
+                try:
+                    sheet_panels = {}
+                    for use_market_cap in (True, False):
+                        for sheet_key, sheet_name in system.find_data_sheets(use_market_cap).items():
+                            data_type = "market_cap" if sheet_key == 'market_cap_sheet' else sheet_key[:-len('_sheet')]
+                            if (sheet_name, data_type) not in sheet_panels:
+                                panel, _ = system.parse_data(sheet_name, data_type)
+                                if panel is None:
+                                    record.status = "failed"
+                                    return None
+                                sheet_panels[(sheet_name, data_type)] = panel
+                finally:
+                    system.close_source_excel_file()
+                snapshot = store.ingest(target_date, sheet_panels, filename, digest)
+                record.counts.update(sheets=len(sheet_panels), snapshot=snapshot.snapshot_id)
+            added += 1
+            print(f"이력 저장소 추가: {filename} (스냅샷 {snapshot.snapshot_id})")
+
+        print(f"이력 저장소: 스냅샷 {len(store.snapshots())}개, 정정 기록 {store.revision_count()}개, "
+              f"{store.disk_bytes() / (1024 * 1024):.1f}MB (raw_data 파일 {raw_bytes / (1024 * 1024):.1f}MB)")
+        return added
+
+    except Exception as e:
+        print(f"이력 저장소 추가 중 오류 발생: {e}")
+        return None
+
+
+def run_history_backtest(scheduler, use_market_cap=True, start_date=None, end_date=None, store=None, price_panel=None):
+    """이력 저장소의 전체 기간 최신 값으로 월말 리밸런싱 백테스트 (raw_data 파일을 다시 파싱하지 않음)"""
+    try:
+        store = store or HistoryStore.for_directory(scheduler.base_directory)
+        last_snapshot = store.resolve_snapshot()
+        date_str = last_snapshot.as_of.strftime('%Y%m%d')
+        result_filename = f"{scheduler.result_prefix}backtest_history_{'' if use_market_cap else 'ff_'}{date_str}.xlsx"
+
+        # 시트 구분은 find_data_sheets와 동일 (시가총액: market_cap, 유동시가총액: market_ff_cap)
+        cap_marker = "market_cap" if use_market_cap else "market_ff_cap"
+        panels = {}
+        with scheduler.stage("history_load") as record:
+            for sheet_name, data_type in store.series_keys():
+                if data_type == "market_cap" and cap_marker not in sheet_name:
+                    continue
+                panels.setdefault(data_type, store.history_panel(sheet_name, data_type))
+            record.counts.update(rows=max((panel.n_dates for panel in panels.values()), default=0))
+        if not all(data_type in panels for data_type in ("eps", "foreign", "market_cap")):
+            print("이력 저장소에 eps/foreign/시가총액 시트가 모두 있어야 합니다.")
+            return None
+
+        engine = BacktestEngine(panels["eps"], panels["foreign"], panels["market_cap"], scheduler.parameters,
+                                scheduler.fetch_margin_months, scheduler.full_year_fetch)
+        rebalance_dates = engine.rebalance_dates(start_date, end_date)
+        if not rebalance_dates:
+            print("백테스트 기준일이 없습니다 (기준일의 데이터 받기 시작일(B5) 이후 데이터가 필요합니다).")
+            return None
+        with scheduler.stage("backtest") as record:
+            result = engine.run(rebalance_dates)
+            record.counts.update(rebalance_dates=len(result.rebalance_dates), records=len(result.records))
+        with scheduler.stage("index_levels"):
+            result.index_levels = backtest_index_levels(result, engine.cap_panel, price_panel)
+        result.save_excel(os.path.join(scheduler.base_directory, result_filename))
+        print(f"이력 저장소 백테스트 완료: {result_filename} ({len(result.rebalance_dates)}개월)")
+        return result
+
+    except Exception as e:
+        print(f"이력 저장소 백테스트 실행 중 오류 발생: {e}")
+        return None
@@ -0,0 +1,411 @@
+"""
+raw_data 스냅샷 이력 저장소 (중복 제거 + 정정 기록)
+
+매달 받는 raw_data 파일은 1년 구간이 대부분 겹치고, 손으로 만든 _backup 사본도 쌓인다.
+이력 저장소는 시트(eps/foreign/시가총액)별로 (날짜, 종목) 값을 한 벌만 보관하고,
+데이터 제공처가 과거 값을 정정한 칸은 정정 전 값을 정정 기록으로 남긴다.
+- 값: 연도별 청크 (.npy, 칸마다 최신 값) - np.load(mmap_mode='r')로 필요한 행만 읽음
+- 정정 기록: (날짜, 열, 정정 전 값, 정정한 스냅샷 번호) - 압축 .npz
+- 스냅샷: 파일별 날짜 목록, 종목 열 목록(파일 열 순서), 종목명 - 압축 .npz
+스냅샷 k의 패널은 최신 값에 k 이후 정정 기록을 되돌려(칸마다 k 이후 가장 이른 정정의 정정 전 값) 복원한다.
+
+manifest.json이 현재 파일 목록을 가리키며, 새 파일은 세대 번호를 붙여 쓰고 manifest를 마지막에 교체하므로
+추가 도중 실패해도 이전 상태가 그대로 유지된다.
+
+사용 예:
+    store = HistoryStore.for_directory("excel_data")
+    panel = store.snapshot_panel("eps_sheet", "eps", datetime(2025, 8, 31))   # 8월말 파일 그대로
+    history = store.history_panel("eps_sheet", "eps")                         # 전체 기간 최신 값
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime, date
+
+import numpy as np
+
+from panel_data import PanelData
+from panel_cache import write_atomic
+
+DEFAULT_HISTORY_DIRNAME = ".history_store"
+HISTORY_FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+
+
+def _year_of(dates):
+    return np.asarray(dates, dtype='datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+class HistorySnapshot:
+    """이력 저장소에 추가된 raw_data 파일 한 개"""
+
+    def __init__(self, snapshot_id, as_of, source=None, digest=None, ingested_at=None):
+        self.snapshot_id = snapshot_id
+        self.as_of = as_of
+        self.source = source
+        self.digest = digest
+        self.ingested_at = ingested_at
+
+    def to_dict(self):
+        return {"id": self.snapshot_id, "as_of": self.as_of.strftime('%Y-%m-%d'), "source": self.source,
+                "digest": self.digest, "ingested_at": self.ingested_at}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["id"], datetime.strptime(data["as_of"], '%Y-%m-%d'), data.get("source"),
+                   data.get("digest"), data.get("ingested_at"))
+
+    def __repr__(self):
+        return f"HistorySnapshot({self.snapshot_id}, {self.as_of.strftime('%Y-%m-%d')}, {self.source})"
+
+
+class HistoryStore:
+    """시트별 (날짜, 종목) 값 한 벌 + 정정 기록 + 스냅샷 목록"""
+
+    def __init__(self, store_directory):
+        self.store_directory = store_directory
+        self.manifest = self._load_manifest()
+
+    @classmethod
+    def for_directory(cls, base_directory):
+        """raw_data 폴더(excel_data/) 아래의 기본 저장소"""
+        return cls(os.path.join(base_directory, DEFAULT_HISTORY_DIRNAME))
+
+    def _load_manifest(self):
+        path = os.path.join(self.store_directory, MANIFEST_FILENAME)
+        if not os.path.exists(path):
+            return {"format_version": HISTORY_FORMAT_VERSION, "generation": 0, "snapshots": [], "series": {}}
+        with open(path, encoding="utf-8") as file:
+            manifest = json.load(file)
+        if manifest.get("format_version") != HISTORY_FORMAT_VERSION:
+            raise ValueError(f"지원하지 않는 이력 저장소 형식입니다: {manifest.get('format_version')}")
+        return manifest
+
+    # ----- 조회 -----
+
+    def snapshots(self):
+        return [HistorySnapshot.from_dict(data) for data in self.manifest["snapshots"]]
+
+    def series_keys(self):
+        """저장된 (시트명, 데이터 종류) 목록"""
+        return [(series["sheet_name"], series["data_type"]) for series in self.manifest["series"].values()]
+
+    def find_snapshot(self, digest):
+        """같은 파일 내용(해시)으로 추가된 스냅샷 (없으면 None)"""
+        for snapshot in self.snapshots():
+            if digest is not None and snapshot.digest == digest:
+                return snapshot
+        return None
+
+    def resolve_snapshot(self, snapshot=None):
+        """스냅샷 지정값 → HistorySnapshot
+
+        None: 마지막 스냅샷, int: 스냅샷 번호, datetime/date: 그 날짜까지 추가된 마지막 스냅샷 (시점 기준 조회)
+        """
+        snapshots = self.snapshots()
+        if not snapshots:
+            raise LookupError("이력 저장소에 스냅샷이 없습니다.")
+        if snapshot is None:
+            return snapshots[-1]
+        if isinstance(snapshot, HistorySnapshot):
+            return snapshot
+        if isinstance(snapshot, int):
+            for candidate in snapshots:
+                if candidate.snapshot_id == snapshot:
+                    return candidate
+            raise LookupError(f"스냅샷 번호가 없습니다: {snapshot}")
+        if isinstance(snapshot, date):
+            as_of = datetime(snapshot.year, snapshot.month, snapshot.day)
+            earlier = [candidate for candidate in snapshots if candidate.as_of <= as_of]
+            if not earlier:
+                raise LookupError(f"{as_of.strftime('%Y-%m-%d')} 이전 스냅샷이 없습니다.")
+            return earlier[-1]
+        raise TypeError(f"스냅샷 지정값 형식이 잘못되었습니다: {snapshot!r}")
+
+    def snapshot_panel(self, sheet_name, data_type, snapshot=None):
+        """스냅샷 시점의 패널 (그 파일을 파싱한 결과와 같은 날짜/열 순서/값, 해당 시트가 없으면 None)"""
+        snapshot = self.resolve_snapshot(snapshot)
+        series = self._series(sheet_name, data_type)
+        if series is None:
+            return None
+        meta = self._snapshot_meta(series).get(snapshot.snapshot_id)
+        if meta is None:
+            return None
+        dates, columns, names = meta
+
+        rows = np.searchsorted(self._dates(series), dates)
+        values = self._read_rows(series, rows, columns)
+
+        # 이 스냅샷 이후의 정정은 정정 전 값으로 되돌림 (칸마다 가장 이른 정정 기준)
+        revision_dates, revision_columns, revision_values, superseded_by = self._revisions(series)
+        later = superseded_by > snapshot.snapshot_id
+        if later.any():
+            revision_dates = revision_dates[later]
+            revision_columns = revision_columns[later]
+            revision_values = revision_values[later]
+            superseded_by = superseded_by[later]
+
+            row_positions = np.clip(np.searchsorted(dates, revision_dates), 0, max(len(dates) - 1, 0))
+            in_dates = (len(dates) > 0) & (dates[row_positions] == revision_dates)
+            column_positions = np.full(max(int(columns.max()) + 1 if len(columns) else 0,
+                                           int(revision_columns.max()) + 1), -1, dtype=np.int64)
+            column_positions[columns] = np.arange(len(columns))
+            column_positions = column_positions[revision_columns]
+            applies = in_dates & (column_positions >= 0)
+
+            cells = row_positions[applies] * max(len(columns), 1) + column_positions[applies]
+            order = np.lexsort((superseded_by[applies], cells))
+            _, first = np.unique(cells[order], return_index=True)
+            chosen = order[first]
+            values[row_positions[applies][chosen], column_positions[applies][chosen]] = revision_values[applies][chosen]
+
+        return PanelData(dates, values, [series["codes"][column] for column in columns], names, data_type)
+
+    def history_panel(self, sheet_name, data_type, first_date=None, last_date=None):
+        """전체(또는 [first_date, last_date]) 기간 × 전체 종목의 최신 값 패널 (여러 해 분석/백테스트용)"""
+        series = self._series(sheet_name, data_type)
+        if series is None:
+            return None
+        dates = self._dates(series)
+        start_row = 0 if first_date is None else np.searchsorted(dates, np.datetime64(first_date, 'D'), side='left')
+        end_row = len(dates) if last_date is None else np.searchsorted(dates, np.datetime64(last_date, 'D'),
+                                                                       side='right')
+        rows = np.arange(start_row, end_row)
+        columns = np.arange(len(series["codes"]))
+        return PanelData(dates[rows], self._read_rows(series, rows, columns), series["codes"], series["names"],
+                         data_type)
+
+    def revision_count(self, sheet_name=None, data_type=None):
+        """정정 기록 수 (시트 미지정 시 전체)"""
+        total = 0
+        for series in self.manifest["series"].values():
+            if sheet_name is None or (series["sheet_name"] == sheet_name and series["data_type"] == data_type):
+                total += len(self._revisions(series)[0])
+        return total
+
+    def disk_bytes(self):
+        """저장소가 사용하는 파일 크기 합계"""
+        total = 0
+        for directory, _, filenames in os.walk(self.store_directory):
+            total += sum(os.path.getsize(os.path.join(directory, filename)) for filename in filenames)
+        return total
+
+    # ----- 추가 -----
+
+    def ingest(self, as_of, sheet_panels, source=None, digest=None):
+        """raw_data 파일 한 개의 시트 패널들을 스냅샷으로 추가 → HistorySnapshot
+
+        sheet_panels: {(시트명, 데이터 종류): PanelData} - parse_sheet 결과 (전체 종목 열)
+        같은 내용(digest)의 파일은 다시 추가하지 않고 기존 스냅샷 반환.
+        정정 기록이 시점 순서를 따르도록 기준일(as_of)은 마지막 스냅샷 기준일 이후여야 한다.
+        """
+        existing = self.find_snapshot(digest)
+        if existing is not None:
+            return existing
+        snapshots = self.snapshots()
+        if snapshots and as_of < snapshots[-1].as_of:
+            raise ValueError(f"이력 저장소의 마지막 기준일({snapshots[-1].as_of.strftime('%Y-%m-%d')}) "
+                             f"이전 파일은 추가할 수 없습니다: {as_of.strftime('%Y-%m-%d')}")
+        for (sheet_name, data_type), panel in sheet_panels.items():
+            if len(set(panel.codes)) != len(panel.codes):
+                raise ValueError(f"{sheet_name} 시트에 중복 종목코드가 있어 이력 저장소에 추가할 수 없습니다.")
+            if panel.n_dates and not np.all(np.diff(panel.dates) > np.timedelta64(0, 'D')):
+                raise ValueError(f"{sheet_name} 시트의 날짜가 오름차순이 아니어서 이력 저장소에 추가할 수 없습니다.")
+
+        snapshot_id = snapshots[-1].snapshot_id + 1 if snapshots else 0
+        generation = self.manifest["generation"] + 1
+        snapshot = HistorySnapshot(snapshot_id, as_of, source, digest, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+        series_entries = dict(self.manifest["series"])
+        for (sheet_name, data_type), panel in sheet_panels.items():
+            key = f"{sheet_name}|{data_type}"
+            series_entries[key] = self._ingest_series(series_entries.get(key), sheet_name, data_type, panel,
+                                                      snapshot_id, generation)
+
+        manifest = {"format_version": HISTORY_FORMAT_VERSION, "generation": generation,
+                    "snapshots": self.manifest["snapshots"] + [snapshot.to_dict()], "series": series_entries}
+        content = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+        write_atomic(os.path.join(self.store_directory, MANIFEST_FILENAME), lambda file: file.write(content))
+        self.manifest = manifest
+        self._remove_unreferenced_files()
+        return snapshot
+
+    def _ingest_series(self, series, sheet_name, data_type, panel, snapshot_id, generation):
+        """시트 한 개 추가 → 새 series 항목 (바뀐 연도 청크만 새 세대 파일로 기록)"""
+        if series is None:
+            series = {"sheet_name": sheet_name, "data_type": data_type,
+                      "directory": self._series_directory_name(sheet_name, data_type),
+                      "codes": [], "names": [], "dates": None, "chunks": {}, "revisions": None, "snapshots": None}
+        old_dates = self._dates(series)
+        meta = self._snapshot_meta(series)
+
+        codes = list(series["codes"])
+        names = list(series["names"])
+        code_index = {code: i for i, code in enumerate(codes)}
+        for code, name in zip(panel.codes, panel.names):
+            if code in code_index:
+                # 종목명은 최신 파일 기준
+                names[code_index[code]] = name
+            else:
+                code_index[code] = len(codes)
+                codes.append(code)
+                names.append(name)
+        columns = np.array([code_index[code] for code in panel.codes], dtype=np.int64)
+        width = len(codes)
+
+        dates = np.union1d(old_dates, panel.dates)
+        date_years = _year_of(dates)
+        old_years = _year_of(old_dates)
+        panel_years = _year_of(panel.dates)
+        chunks = dict(series["chunks"])
+        new_revisions = []
+
+        for year in np.unique(panel_years):
+            year_dates = dates[date_years == year]
+            block = np.full((len(year_dates), width), np.nan)
+            if str(year) in chunks:
+                old_block = np.load(self._path(series, chunks[str(year)]))
+                block[np.searchsorted(year_dates, old_dates[old_years == year]), :old_block.shape[1]] = old_block
+
+            in_year = panel_years == year
+            panel_rows = np.searchsorted(year_dates, panel.dates[in_year])
+            old_values = block[np.ix_(panel_rows, columns)]
+            new_values = panel.values[in_year]
+            changed = ~((old_values == new_values) | (np.isnan(old_values) & np.isnan(new_values)))
+            if changed.any():
+                row_index, column_index = np.nonzero(changed)
+                changed_dates = panel.dates[in_year][row_index]
+                changed_columns = columns[column_index]
+                changed_old = old_values[row_index, column_index]
+                # 빈 칸 → 값: 이전 스냅샷이 본 적 있는 칸일 때만 정정 (새 거래일/신규 종목은 정정 아님)
+                restated = ~np.isnan(changed_old) | self._covered(meta, changed_dates, changed_columns)
+                if restated.any():
+                    new_revisions.append((changed_dates[restated], changed_columns[restated],
+                                          changed_old[restated], np.full(int(restated.sum()), snapshot_id)))
+            block[np.ix_(panel_rows, columns)] = new_values
+
+            filename = f"chunk_{year}_{generation}.npy"
+            write_atomic(self._path(series, filename), lambda file: np.save(file, block))
+            chunks[str(year)] = filename
+
+        updated = dict(series, codes=codes, names=names, chunks=chunks)
+        updated["dates"] = f"dates_{generation}.npy"
+        write_atomic(self._path(series, updated["dates"]), lambda file: np.save(file, dates))
+
+        if new_revisions:
+            old_revisions = self._revisions(series)
+            merged = [np.concatenate([old_revisions[i]] + [revision[i] for revision in new_revisions])
+                      for i in range(4)]
+            updated["revisions"] = f"revisions_{generation}.npz"
+            write_atomic(self._path(series, updated["revisions"]), lambda file: np.savez_compressed(
+                file, dates=merged[0], columns=merged[1], values=merged[2], superseded_by=merged[3]))
+
+        meta[snapshot_id] = (panel.dates, columns, list(panel.names))
+        updated["snapshots"] = f"snapshots_{generation}.npz"
+        snapshot_ids = sorted(meta)
+        write_atomic(self._path(series, updated["snapshots"]), lambda file: np.savez_compressed(
+            file,
+            snapshot_ids=np.array(snapshot_ids, dtype=np.int64),
+            date_counts=np.array([len(meta[i][0]) for i in snapshot_ids], dtype=np.int64),
+            dates=np.concatenate([meta[i][0] for i in snapshot_ids]).astype('datetime64[D]'),
+            column_counts=np.array([len(meta[i][1]) for i in snapshot_ids], dtype=np.int64),
+            columns=np.concatenate([meta[i][1] for i in snapshot_ids]).astype(np.int64),
+            names=np.array([name for i in snapshot_ids for name in meta[i][2]], dtype=str)
+        ))
+        return updated
+
+    @staticmethod
+    def _covered(meta, dates, columns):
+        """각 (날짜, 열) 칸이 이전 스냅샷 중 하나의 날짜/열 범위에 들어 있었는지"""
+        covered = np.zeros(len(dates), dtype=bool)
+        for snapshot_dates, snapshot_columns, _ in meta.values():
+            covered |= np.isin(dates, snapshot_dates) & np.isin(columns, snapshot_columns)
+        return covered
+
+    # ----- 파일 -----
+
+    @staticmethod
+    def _series_directory_name(sheet_name, data_type):
+        key = hashlib.sha256(f"{sheet_name}|{data_type}".encode('utf-8')).hexdigest()[:24]
+        return f"{data_type}_{key}"
+
+    def _series(self, sheet_name, data_type):
+        return self.manifest["series"].get(f"{sheet_name}|{data_type}")
+
+    def _path(self, series, filename):
+        return os.path.join(self.store_directory, series["directory"], filename)
+
+    def _dates(self, series):
+        if series["dates"] is None:
+            return np.zeros(0, dtype='datetime64[D]')
+        return np.load(self._path(series, series["dates"]))
+
+    def _revisions(self, series):
+        """(날짜, 열, 정정 전 값, 정정한 스냅샷 번호) 배열"""
+        if series["revisions"] is None:
+            return (np.zeros(0, dtype='datetime64[D]'), np.zeros(0, dtype=np.int64), np.zeros(0),
+                    np.zeros(0, dtype=np.int64))
+        with np.load(self._path(series, series["revisions"])) as archive:
+            return archive['dates'], archive['columns'], archive['values'], archive['superseded_by']
+
+    def _snapshot_meta(self, series):
+        """{스냅샷 번호: (날짜 배열, 열 번호 배열, 종목명 목록)}"""
+        if series["snapshots"] is None:
+            return {}
+        with np.load(self._path(series, series["snapshots"])) as archive:
+            date_bounds = np.concatenate([[0], np.cumsum(archive['date_counts'])])
+            column_bounds = np.concatenate([[0], np.cumsum(archive['column_counts'])])
+            dates, columns, names = archive['dates'], archive['columns'], archive['names'].tolist()
+            return {int(snapshot_id): (dates[date_bounds[i]:date_bounds[i + 1]],
+                                       columns[column_bounds[i]:column_bounds[i + 1]],
+                                       names[column_bounds[i]:column_bounds[i + 1]])
+                    for i, snapshot_id in enumerate(archive['snapshot_ids'])}
+
+    def _read_rows(self, series, rows, columns):
+        """날짜축 행(오름차순) × 열의 최신 값 (청크는 메모리 매핑으로 필요한 행만 읽음, 청크보다 뒤 열은 NaN)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        values = np.full((len(rows), len(columns)), np.nan)
+        if len(rows) == 0:
+            return values
+        dates = self._dates(series)
+        row_years = _year_of(dates[rows])
+        for year in np.unique(row_years):
+            chunk = np.load(self._path(series, series["chunks"][str(year)]), mmap_mode='r')
+            first_row = np.searchsorted(dates, np.datetime64(f"{year}-01-01", 'D'))
+            in_year = np.nonzero(row_years == year)[0]
+            in_chunk = np.nonzero(columns < chunk.shape[1])[0]
+            values[np.ix_(in_year, in_chunk)] = chunk[rows[in_year] - first_row][:, columns[in_chunk]]
+        return values
+
+    def _remove_unreferenced_files(self):
+        """manifest가 가리키지 않는 이전 세대 파일 삭제"""
+        for series in self.manifest["series"].values():
+            referenced = set(series["chunks"].values())
+            referenced.update(name for name in (series["dates"], series["revisions"], series["snapshots"]) if name)
+            directory = os.path.join(self.store_directory, series["directory"])
+            for filename in os.listdir(directory):
+                if filename not in referenced and not filename.endswith(".tmp"):
+                    try:
+                        os.remove(os.path.join(directory, filename))
+                    except OSError:
+                        pass
+
+
+def main():
+    import argparse
+    from monthly_rebalancing_scheduler import MonthlyRebalancingScheduler
+
+    parser = argparse.ArgumentParser(description="raw_data 파일을 이력 저장소에 추가 (같은 (날짜, 종목) 값은 한 벌만 보관)")
+    parser.add_argument("--base-directory", default="excel_data")
+    parser.add_argument("--engine", default="openpyxl", choices=["openpyxl", "xml"])
+    args = parser.parse_args()
+
+    scheduler = MonthlyRebalancingScheduler(args.base_directory, args.engine)
+    added = scheduler.ingest_history()
+    return 0 if added is not None else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
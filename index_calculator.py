@@ -0,0 +1,234 @@
+"""
+지수(PR) 일별 산출 엔진
+
+구성종목/비중 이력과 가격 패널로 DeepSearch 외인수급Top20 지수 (PR)의 일별 지수를 계산한다.
+방법론 (index_methodology/ 3장, 4.1절):
+- 지수 I_t = M_t / B_t × 기준지수(1,000)
+- 비교시가총액 M_t = Σ 지수포함가중치 × 가격 (리밸런싱 시점에 종목별 비중이 최종비중이 되도록 정함)
+- 기준시가총액 B_t: 리밸런싱마다 B_new = B_old × M_new / M_old 로 수정해 구성종목 변경이 지수를 움직이지 않게 함
+- 정기변경일: 선정일(월말) 익월 둘째 주 첫 월요일 (영업일이 아니면 다음 영업일), 직전 영업일 종가로 편입
+- 점진적 리밸런싱: 적용 비중 = (직전 적용 비중 + 최신 최종비중) / 2
+
+리밸런싱 구간마다 "지수포함가중치 / 편입일 가격" 행렬을 한 번 만들고, 날짜 × 구성종목 가격 행렬과의
+행별 내적으로 전체 기간 지수를 한 번에 계산한다 (기간 반복은 리밸런싱 횟수만큼의 비중 정리뿐).
+
+raw_data에는 종가/지수산정주식수 시트가 없으므로 종가 패널이 없으면 시가총액(또는 유동시가총액) 패널을
+가격 대신 쓴 시가총액 근사지수(cap_proxy)를 계산한다. 주식수 변동(유상증자 등)이 수익률에 섞이므로
+PR 지수가 아니며, 결과 시트/출력에도 근사지수로 표시한다.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from panel_data import as_panel
+from result_excel_writer import StreamingResultWriter, SCORE_FORMAT, AMOUNT_FORMAT
+
+# 방법론 기준지수
+BASE_INDEX_LEVEL = 1000.0
+LEVEL_FORMAT = "0.00"
+RETURN_FORMAT = "0.0000%"
+
+
+def rebalance_effective_date(selection_date):
+    """선정일(월말)의 정기변경일: 익월 둘째 주 첫 월요일 (8 ~ 14일 중 월요일)"""
+    year, month = (selection_date.year + 1, 1) if selection_date.month == 12 else (selection_date.year, selection_date.month + 1)
+    eighth_day = datetime(year, month, 8)
+    return eighth_day + timedelta(days=(7 - eighth_day.weekday()) % 7)
+
+
+def forward_filled(values):
+    """열별로 빈 값(NaN)을 직전 유효 값으로 채운 행렬 (첫 유효 값 이전은 NaN 유지)"""
+    valid = ~np.isnan(values)
+    rows = np.where(valid, np.arange(values.shape[0])[:, None], -1)
+    if values.shape[0]:
+        np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = values[np.clip(rows, 0, None), np.arange(values.shape[1])[None, :]]
+    filled[rows < 0] = np.nan
+    return filled
+
+
+class IndexLevelResult:
+    """일별 지수 산출 결과
+
+    dates: 편입 기준일(첫 리밸런싱 직전 영업일)부터의 날짜, levels: 지수, comparison_caps: 비교시가총액 M_t,
+    divisors: 기준시가총액 B_t, 리밸런싱별 선정일/정기변경일/적용 비중(codes 순서),
+    cap_proxy: 가격 대신 시가총액 패널로 계산한 근사지수 여부
+    """
+
+    def __init__(self, dates, levels, comparison_caps, divisors, selection_dates, effective_dates,
+                 codes, names, final_weights, applied_weights, cap_proxy=False):
+        self.dates = dates
+        self.levels = levels
+        self.comparison_caps = comparison_caps
+        self.divisors = divisors
+        self.selection_dates = selection_dates
+        self.effective_dates = effective_dates
+        self.codes = codes
+        self.names = names
+        self.final_weights = final_weights
+        self.applied_weights = applied_weights
+        self.cap_proxy = cap_proxy
+
+    @property
+    def label(self):
+        return "시가총액 근사지수" if self.cap_proxy else "지수(PR)"
+
+    def __len__(self):
+        return len(self.levels)
+
+    def daily_returns(self):
+        """일별 지수 수익률 (첫날은 0)"""
+        returns = np.zeros(len(self.levels))
+        if len(self.levels) > 1:
+            returns[1:] = self.levels[1:] / self.levels[:-1] - 1.0
+        return returns
+
+    def level_on(self, date):
+        """날짜(당일 또는 직전 영업일)의 지수 (산출 전이면 None)"""
+        row = np.searchsorted(self.dates, np.datetime64(date.strftime('%Y-%m-%d'), 'D'), side='right') - 1
+        return None if row < 0 else float(self.levels[row])
+
+    def level_rows(self):
+        returns = self.daily_returns()
+        for row, date in enumerate(self.dates.astype('datetime64[us]').astype(datetime)):
+            yield [date.strftime('%Y-%m-%d'), float(self.levels[row]), float(returns[row]),
+                   float(self.comparison_caps[row]), float(self.divisors[row])]
+
+    def weight_rows(self):
+        for k, selection_date in enumerate(self.selection_dates):
+            for column in np.flatnonzero(self.applied_weights[k] > 0):
+                yield [selection_date.strftime('%Y-%m-%d'), self.effective_dates[k].strftime('%Y-%m-%d'),
+                       self.codes[column], self.names[column],
+                       float(self.final_weights[k, column]), float(self.applied_weights[k, column])]
+
+    def add_sheets(self, writer):
+        """지수 이력 / 리밸런싱 적용 비중 시트를 작성기에 추가"""
+        sheet_name, level_header = ("근사지수이력", "근사지수") if self.cap_proxy else ("지수이력", "지수")
+        writer.add_sheet(sheet_name, ["날짜", level_header, "일간수익률", "비교시가총액", "기준시가총액"], self.level_rows(),
+                         {1: LEVEL_FORMAT, 2: RETURN_FORMAT, 3: AMOUNT_FORMAT, 4: AMOUNT_FORMAT})
+        writer.add_sheet("정기변경비중", ["선정일", "정기변경일", "종목코드", "종목명", "최종비중", "적용비중"],
+                         self.weight_rows(), {4: SCORE_FORMAT, 5: SCORE_FORMAT})
+
+    def save_excel(self, output_path):
+        writer = StreamingResultWriter()
+        self.add_sheets(writer)
+        writer.save(output_path)
+
+
+class IndexCalculator:
+    """가격 패널로 구성종목/비중 이력의 일별 지수 계산
+
+    price_data: 날짜×종목 가격 패널 (PanelData 또는 종목별 dict) - 빈 값은 직전 가격으로 채움
+    gradual: 점진적 리밸런싱 적용 여부 (False면 최종비중 그대로 편입)
+    cap_proxy: price_data가 시가총액 패널이면 True (결과를 PR 지수가 아닌 근사지수로 표시)
+    """
+
+    def __init__(self, price_data, base_level=BASE_INDEX_LEVEL, gradual=True, cap_proxy=False):
+        self.price_panel = as_panel(price_data, "price")
+        self.base_level = base_level
+        self.gradual = gradual
+        self.cap_proxy = cap_proxy
+        self._prices = None
+
+    @property
+    def prices(self):
+        if self._prices is None:
+            self._prices = forward_filled(self.price_panel.values)
+        return self._prices
+
+    def effective_rows(self, selection_dates):
+        """선정일별 정기변경일 행 (가격 날짜축 안의 다음 영업일, 패널 밖이면 -1)"""
+        effective_dates = np.array([np.datetime64(rebalance_effective_date(date).strftime('%Y-%m-%d'), 'D')
+                                    for date in selection_dates], dtype='datetime64[D]')
+        rows = np.searchsorted(self.price_panel.dates, effective_dates, side='left')
+        return np.where(rows < self.price_panel.n_dates, rows, -1)
+
+    def calculate_backtest(self, backtest_result):
+        """BacktestResult의 구성종목/비중 이력으로 지수 계산"""
+        rebalance_dates, codes, weights = backtest_result.weight_matrix()
+        return self.calculate(rebalance_dates, codes, weights)
+
+    def calculate(self, selection_dates, codes, weights):
+        """선정일별 최종비중 행렬(선정일 × codes)로 일별 지수 계산 (정기변경일이 패널 안인 리밸런싱만 반영)"""
+        panel = self.price_panel
+        weights = np.asarray(weights, dtype=np.float64).reshape(len(selection_dates), len(codes))
+
+        missing = [code for code in codes if code not in panel.code_index]
+        if missing:
+            print(f"가격 데이터가 없는 종목 {len(missing)}개는 지수에서 제외합니다: {', '.join(missing[:10])}")
+        keep = np.array([code in panel.code_index for code in codes], dtype=bool)
+        codes = [code for code, kept in zip(codes, keep) if kept]
+        columns = np.array([panel.code_index[code] for code in codes], dtype=np.int64)
+        final_weights = weights[:, keep]
+        prices = self.prices[:, columns]
+
+        # 정기변경일 기준 편입 행(직전 영업일 종가) - 패널 밖이거나 앞 리밸런싱보다 늦지 않으면 제외
+        effective_rows = self.effective_rows(selection_dates)
+        rebalances = []
+        for k, row in enumerate(effective_rows):
+            if row < 0 or not final_weights[k].any():
+                continue
+            anchor_row = max(int(row) - 1, 0)
+            if rebalances and anchor_row <= rebalances[-1][1]:
+                rebalances.pop()
+            rebalances.append((k, anchor_row))
+        if not rebalances:
+            print("정기변경일이 가격 데이터 기간 안에 있는 리밸런싱이 없습니다.")
+            return None
+
+        # 리밸런싱별 적용 비중: 편입일 가격이 없는 종목은 빼고 다시 100%로 조정, 점진적 리밸런싱은 직전 적용 비중과 평균
+        applied_rows = []
+        previous = None
+        for k, anchor_row in list(rebalances):
+            target = (previous + final_weights[k]) / 2.0 if self.gradual and previous is not None else final_weights[k].copy()
+            target[np.isnan(prices[anchor_row])] = 0.0
+            total = target.sum()
+            if total <= 0:
+                # 편입일 가격이 있는 종목이 없으면 이 리밸런싱은 건너뜀 (직전 비중 유지)
+                rebalances.remove((k, anchor_row))
+                continue
+            previous = target / total
+            applied_rows.append(previous)
+        if not rebalances:
+            print("편입일 가격이 있는 리밸런싱이 없습니다.")
+            return None
+        applied = np.array(applied_rows)
+
+        anchor_rows = np.array([anchor_row for _, anchor_row in rebalances], dtype=np.int64)
+        anchor_prices = prices[anchor_rows]
+        # 가격 1단위당 비중 (지수포함가중치 / 편입일 가격) - 미편입 종목은 0
+        held = applied > 0
+        unit_weights = np.divide(applied, anchor_prices, out=np.zeros_like(applied), where=held)
+        # 리밸런싱 시점의 비교시가총액 (편입 종목 가격 합)
+        anchor_caps = np.where(held, anchor_prices, 0.0).sum(axis=1)
+
+        # 행별 구간: (a_k, a_k+1] 구간은 k번째 비중 (첫 편입 행은 0번째 구간)
+        first_row = int(anchor_rows[0])
+        rows = np.arange(first_row, panel.n_dates)
+        segments = np.clip(np.searchsorted(anchor_rows, rows, side='left') - 1, 0, None)
+        day_prices = np.nan_to_num(prices[first_row:], nan=0.0)
+        relatives = np.einsum('tu,tu->t', day_prices, unit_weights[segments])
+
+        # 편입 행의 지수: 직전 구간 상대가치의 누적곱 (구간 경계에서 지수가 이어지도록)
+        boundary_relatives = np.einsum('ku,ku->k', day_prices[anchor_rows[1:] - first_row], unit_weights[:-1])
+        anchor_levels = self.base_level * np.concatenate(([1.0], np.cumprod(boundary_relatives)))
+
+        levels = anchor_levels[segments] * relatives
+        comparison_caps = anchor_caps[segments] * relatives
+        divisors = anchor_caps[segments] * self.base_level / anchor_levels[segments]
+
+        used = [k for k, _ in rebalances]
+        return IndexLevelResult(
+            panel.dates[first_row:], levels, comparison_caps, divisors,
+            [selection_dates[k] for k in used],
+            [panel.dates[effective_rows[k]].astype('datetime64[us]').astype(datetime) for k in used],
+            codes, [panel.name_of(code) for code in codes], final_weights[used], applied, self.cap_proxy)
+
+
+def backtest_index_levels(backtest_result, cap_panel, price_panel=None):
+    """백테스트 결과의 일별 지수: 종가 패널이 있으면 PR 지수, 없으면 시가총액 근사지수"""
+    if price_panel is not None:
+        return IndexCalculator(price_panel).calculate_backtest(backtest_result)
+    print("종가 패널이 없어 시가총액 패널로 근사지수를 계산합니다 (주식수 변동이 섞여 PR 지수와 다름).")
+    return IndexCalculator(cap_panel, cap_proxy=True).calculate_backtest(backtest_result)
@@ -11,37 +11,117 @@ DeepSearch 외인수급Top20 지수 (PR) 매달 리밸런싱 시스템
 
 import numpy as np
 import openpyxl
-from openpyxl import load_workbook, Workbook
+from raw_data_reader import open_raw_workbook, InMemoryWorkbookReader
+from panel_data import PanelData, as_panel
+from scoring_kernel import WindowMeanKernel, month_start_dates
+from panel_cache import PanelCache, file_digest, projection_key
+from panel_store import PanelStore
+from xlsx_date_patcher import patch_date_cells
+from refresh_backend import Win32RefreshBackend, RefreshWaiter
+from result_excel_writer import StreamingResultWriter, SCORE_FORMAT, INTENSITY_FORMAT, AMOUNT_FORMAT
+from ranking_engine import StageRanking
+from selection_parameters import DEFAULT_PARAMETERS, FETCH_MARGIN_MONTHS, fetch_start_date
+import backtest_runner
+import history_runner
+from parallel_parser import parse_sheets_parallel, default_worker_count, create_work_directory, remove_work_directory
+from run_report import RunReport, StageRecord, run_report_path
 import os
 import shutil
 from datetime import datetime
 import calendar
 import time
+import contextlib
 
 class DeepSearchForeignBuyingTop20IndexSystem:
     """DeepSearch 외인수급Top20 지수 분석 시스템"""
     
-    def __init__(self, source_excel_path, output_excel_path):
+    # parse_data 결과 형식이나 파싱 규칙이 바뀌면 올려서 기존 캐시를 무효화
+    PARSER_VERSION = 2
+    
+    # 증분 파싱 시 파일과 대조하는 누적 패널의 마지막 행 수
+    INCREMENTAL_CHECK_ROWS = 5
+    
+    def __init__(self, source_excel_path, output_excel_path, reader_engine="openpyxl", use_cache=True,
+                 column_projection=True, incremental=False, parse_workers=None, run_report=None,
+                 trace_memory=False, report_logger=None, parameters=None, source_reader=None,
+                 fetch_margin_months=FETCH_MARGIN_MONTHS, full_year_fetch=True):
         self.source_excel_path = source_excel_path
         self.output_excel_path = output_excel_path
-        self.source_workbook = None
+        self.reader_engine = reader_engine
+        self.column_projection = column_projection
+        # 이미 열린 리더 (refresh 직후 실행 중인 Excel에서 읽은 InMemoryWorkbookReader 등)
+        # 지정하면 파일을 읽지 않으며, 파일 내용 해시가 없으므로 파싱 캐시도 사용하지 않음
+        self.source_reader = source_reader
+        self.source_sheetnames = None
+        self.source_digest = None
+        if source_reader is not None:
+            use_cache = False
+        self.panel_cache = PanelCache.for_source(source_excel_path, self.PARSER_VERSION) if use_cache else None
+        # 시트별 누적 패널 (겹치는 기간을 검증하고 지난 파일 이후 새 거래일 행을 덧붙임, 기본 사용 안 함)
+        self.panel_store = PanelStore.for_source(source_excel_path) if incremental else None
+        # 시트 병렬 파싱 워커 수 (None: 파일 크기/CPU 코어 수로 자동 결정, 1: 순차 파싱)
+        self.parse_workers = parse_workers
+        # 병렬 파싱 결과 {(시트명, 데이터 종류): (패널, 전체 종목 수, 로드한 종목코드 집합 또는 None)}
+        self.prefetched_panels = {}
+        # 병렬 파싱 값 행렬 파일 폴더 (패널이 memory-map으로 참조하므로 리더를 닫을 때 삭제)
+        self.parse_work_directory = None
+        # 단계별 계측 (run_report: 스케줄러 보고서에 이어서 기록, trace_memory: tracemalloc 메모리 측정)
+        self.run_report = run_report
+        self.trace_memory = trace_memory
+        self.report_logger = report_logger
+        self.last_run_report = None
         self.output_workbook = None
+        # 선정 단계 기준값 (상위 종목 수, 창 길이) - 기본값은 지수 방법론 기준
+        self.parameters = parameters or DEFAULT_PARAMETERS
+        # 백테스트 기준일별 데이터 구간(B5) 계산용 받기 구간 설정 (스케줄러와 같은 값)
+        self.fetch_margin_months = fetch_margin_months
+        self.full_year_fetch = full_year_fetch
         
     def load_source_excel_file(self):
-        """소스 Excel 파일 로드"""
+        """소스 Excel 파일 로드 (캐시가 있으면 워크북을 열지 않고, 없으면 필요한 시트만 parse_data에서 스트리밍)"""
         try:
-            # UTF-8 인코딩으로 Excel 파일 로드
-            self.source_workbook = load_workbook(self.source_excel_path, data_only=True)
-            print(f"소스 Excel 파일 로드 완료")
+            if self.source_reader is not None and self.source_reader.in_memory:
+                self.source_sheetnames = list(self.source_reader.sheetnames)
+                print(f"소스 Excel 파일 로드 완료 (실행 중인 Excel 통합 문서 값 사용)")
+                return True
+            
+            if self.panel_cache is not None:
+                self.source_digest = file_digest(self.source_excel_path)
+                self.source_sheetnames = self.panel_cache.load_sheetnames(self.source_digest)
+                if self.source_sheetnames is not None:
+                    print(f"소스 Excel 파일 로드 완료 (파싱 캐시 사용)")
+                    return True
+            
+            self.open_source_reader()
+            self.source_sheetnames = list(self.source_reader.sheetnames)
+            if self.panel_cache is not None:
+                self.panel_cache.store_sheetnames(self.source_digest, self.source_sheetnames)
+            print(f"소스 Excel 파일 로드 완료 (리더 엔진: {self.reader_engine})")
             return True
         except Exception as e:
             print(f"소스 Excel 파일 로드 실패: {e}")
             return False
     
+    def open_source_reader(self):
+        """소스 Excel 파일 리더 열기 (이미 열려 있으면 그대로 사용)"""
+        if self.source_reader is None:
+            self.source_reader = open_raw_workbook(self.source_excel_path, self.reader_engine)
+        return self.source_reader
+    
+    def close_source_excel_file(self):
+        """소스 Excel 파일 리더 닫기"""
+        if self.source_reader is not None:
+            self.source_reader.close()
+            self.source_reader = None
+        self.prefetched_panels = {}
+        if self.parse_work_directory is not None:
+            remove_work_directory(self.parse_work_directory)
+            self.parse_work_directory = None
+    
     def find_data_sheets(self, use_market_cap=True):
         """데이터 시트 찾기"""
         sheets = {}
-        for sheet_name in self.source_workbook.sheetnames:
+        for sheet_name in self.source_sheetnames:
             if "eps" in sheet_name:
                 sheets['eps_sheet'] = sheet_name
             elif "foreign" in sheet_name:
@@ -54,253 +134,396 @@ class DeepSearchForeignBuyingTop20IndexSystem:
         print(f"발견된 시트: {list(sheets.keys())}")
         return sheets
     
-    def parse_data(self, sheet_name, data_type):
-        """데이터 파싱"""
+    @staticmethod
+    def parse_date_cell(date_cell):
+        """A열 날짜 셀 값을 datetime으로 변환 (변환 불가 시 None)"""
+        if isinstance(date_cell, datetime):
+            return date_cell
+        
+        # 문자열인 경우 다양한 형식으로 변환 시도
+        date_str = str(date_cell).strip()
+        
+        # 빈 문자열이나 비정상적인 문자열 제외
+        if date_str.upper() in ['DATE', '날짜', ''] or len(date_str) < 4:
+            return None
+        
+        try:
+            # 숫자만 있는 경우 (YYYYMMDD 형식)
+            if date_str.isdigit() and len(date_str) == 8:
+                return datetime.strptime(date_str, '%Y%m%d')
+            # 하이픈이나 슬래시가 있는 경우
+            if '-' in date_str or '/' in date_str:
+                clean_str = date_str.replace('-', '').replace('/', '').replace(' ', '')
+                if clean_str.isdigit() and len(clean_str) == 8:
+                    return datetime.strptime(clean_str, '%Y%m%d')
+                # 다른 형식 시도
+                for date_format in ('%Y-%m-%d', '%Y/%m/%d'):
+                    try:
+                        return datetime.strptime(date_str, date_format)
+                    except ValueError:
+                        continue
+        except ValueError:
+            pass
+        return None
+    
+    def parse_data(self, sheet_name, data_type, stock_codes=None):
+        """데이터 파싱 (stock_codes: 해당 종목 열만 로드, 이미 파싱한 파일이면 캐시된 패널 사용)"""
+        projection = projection_key(stock_codes)
+        if self.panel_cache is not None and self.source_digest is not None:
+            cached = self.panel_cache.load_panel(self.source_digest, sheet_name, data_type, projection)
+            if cached is not None:
+                panel, total_stock_count = cached
+                print(f"{data_type} 데이터 캐시 사용: {len(panel)}개 종목 (전체 {total_stock_count}개 중)")
+                if panel.n_dates:
+                    print(f"  [날짜] {data_type} 데이터 기간: {panel.dates[0]} ~ {panel.dates[-1]} ({panel.n_dates}일)")
+                return panel, total_stock_count
+        
+        prefetched = self.prefetched_panels.get((sheet_name, data_type))
+        if prefetched is not None and (prefetched[2] is None or
+                                       (stock_codes is not None and prefetched[2].issuperset(stock_codes))):
+            panel, total_stock_count, _ = prefetched
+            if stock_codes is not None:
+                panel = self.project_columns(panel, stock_codes)
+                print(f"{data_type} 데이터 병렬 파싱 결과 사용: {len(panel.codes)}개 종목 열 선택 (전체 {total_stock_count}개 중)")
+            else:
+                print(f"{data_type} 데이터 병렬 파싱 결과 사용: {len(panel)}개 종목 (전체 {total_stock_count}개 중)")
+        elif self.panel_store is not None:
+            panel, total_stock_count = self.parse_sheet_incremental(sheet_name, data_type, stock_codes)
+        else:
+            panel, total_stock_count = self.parse_sheet(sheet_name, data_type, stock_codes)
+        
+        if panel is not None and self.panel_cache is not None and self.source_digest is not None:
+            try:
+                self.panel_cache.store_panel(self.source_digest, sheet_name, data_type, panel,
+                                             total_stock_count, projection)
+            except OSError as e:
+                print(f"  [경고] {data_type} 파싱 캐시 저장 실패: {e}")
+        
+        return panel, total_stock_count
+    
+    def prefetch_sheets(self, sheet_jobs, stock_codes=None):
+        """처음 분석하는 파일이면 sheet_jobs [(시트명, 데이터 종류)] 시트들을 프로세스 풀로 미리 파싱"""
+        jobs = []
+        for sheet_name, data_type in sheet_jobs:
+            if sheet_name and (sheet_name, data_type) not in jobs and (sheet_name, data_type) not in self.prefetched_panels:
+                jobs.append((sheet_name, data_type))
+        if not jobs:
+            return False
+        
+        workers = min(self.parse_workers or default_worker_count(
+            len(jobs), self.source_excel_path, [sheet_name for sheet_name, _ in jobs]), len(jobs))
+        # 시트 목록을 파싱 캐시에서 읽은 파일(source_reader 없음)은 캐시된 패널을 사용
+        # 메모리에 읽어 둔 시트 값은 파일을 다시 파싱하지 않고 그대로 사용
+        if workers <= 1 or self.source_reader is None or self.source_reader.in_memory:
+            return False
+        
+        print(f"시트 병렬 파싱 시작: {len(jobs)}개 시트, 워커 {workers}개")
+        if self.parse_work_directory is None:
+            self.parse_work_directory = create_work_directory()
+        try:
+            results = parse_sheets_parallel(self.source_excel_path, self.reader_engine, jobs, self.parse_work_directory,
+                                            workers, incremental=self.panel_store is not None, stock_codes=stock_codes)
+        except Exception as e:
+            print(f"  [경고] 시트 병렬 파싱 실패, 순차 파싱으로 진행: {e}")
+            return False
+        
+        loaded_codes = None if stock_codes is None else frozenset(stock_codes)
+        for key, (panel, total_stock_count, log) in results.items():
+            print(log, end="")
+            if panel is not None:
+                self.prefetched_panels[key] = (panel, total_stock_count, loaded_codes)
+        return True
+    
+    @staticmethod
+    def project_columns(panel, stock_codes):
+        """지정 종목 열만 파일 열 순서대로 남긴 패널 (중복 종목코드 열도 그대로 유지)"""
+        wanted_codes = set(stock_codes)
+        columns = [i for i, code in enumerate(panel.codes) if code in wanted_codes]
+        return PanelData(panel.dates, panel.values[:, columns], [panel.codes[i] for i in columns],
+                         [panel.names[i] for i in columns], panel.data_type)
+    
+    def read_sheet_header(self, sheet_name):
+        """종목코드와 종목명 (8행, 9행) - (코드가 있는 실제 열 위치, 종목코드, 종목명 행)"""
+        reader = self.open_source_reader()
+        header_rows = list(reader.iter_rows(sheet_name, min_row=8, max_row=9))
+        code_row = header_rows[0] if len(header_rows) > 0 else ()
+        name_row = header_rows[1] if len(header_rows) > 1 else ()
+        
+        code_columns = []
+        stock_codes = []
+        for col_index in range(1, len(code_row)):
+            code_value = code_row[col_index]
+            if code_value and str(code_value).strip():
+                code_columns.append(col_index)
+                stock_codes.append(str(code_value).strip())
+        return code_columns, stock_codes, name_row
+    
+    @staticmethod
+    def header_stock_names(name_row, code_columns, stock_codes):
+        """종목명 행에서 종목별 이름 추출 (비어 있으면 종목_코드)"""
+        stock_names = []
+        for col_index, stock_code in zip(code_columns, stock_codes):
+            name_value = name_row[col_index] if col_index < len(name_row) else None
+            stock_names.append(str(name_value).strip() if name_value else f"종목_{stock_code}")
+        return stock_names
+    
+    def read_sheet_rows(self, sheet_name, code_columns, start_row=15):
+        """start_row부터 A열 날짜가 빌 때까지 읽은 (날짜 목록, 값 행렬, 데이터 행 수) - 마지막 datetime 행까지만 사용"""
+        reader = self.open_source_reader()
+        dates = []
+        value_rows = []
+        pending_rows = []
+        data_row_count = 0
+        
+        def consume_row(row):
+            parsed_date = self.parse_date_cell(row[0])
+            if parsed_date is None:
+                # 날짜 변환 실패 행은 날짜축에 맞출 수 없으므로 제외
+                return
+            cells = [row[col] if col < len(row) else None for col in code_columns]
+            try:
+                # 빈 셀(None)은 NaN으로 변환
+                row_values = np.array(cells, dtype=np.float64)
+            except (TypeError, ValueError):
+                # 숫자로 변환할 수 없는 셀이 섞인 경우 셀 단위로 NaN 처리
+                row_values = np.full(len(cells), np.nan)
+                for i, cell_value in enumerate(cells):
+                    try:
+                        row_values[i] = float(cell_value)
+                    except (TypeError, ValueError):
+                        pass
+            dates.append(parsed_date)
+            value_rows.append(row_values)
+        
+        needed_columns = set([0] + list(code_columns))
+        for row in reader.iter_rows(sheet_name, min_row=start_row, columns=needed_columns):
+            date_cell = row[0] if row else None
+            if date_cell is None:
+                break
+            pending_rows.append(row)
+            if isinstance(date_cell, datetime):
+                data_row_count += len(pending_rows)
+                for pending_row in pending_rows:
+                    consume_row(pending_row)
+                pending_rows = []
+        
+        if value_rows:
+            values = np.vstack(value_rows)
+        else:
+            values = np.empty((0, len(code_columns)))
+        return dates, values, data_row_count
+    
+    def parse_sheet(self, sheet_name, data_type, stock_codes=None):
+        """시트를 스트리밍하여 날짜×종목 패널 생성 (stock_codes 지정 시 해당 종목 열만 로드)"""
         try:
             print(f"{data_type} 데이터 파싱 중...")
             
-            worksheet = self.source_workbook[sheet_name]
-            max_row = worksheet.max_row
-            max_col = worksheet.max_column
-            
-            # 종목코드와 종목명 추출 (8행, 9행)
-            stock_codes = []
-            stock_names = {}
-            
-            for col in range(2, max_col + 1):
-                try:
-                    code_value = worksheet.cell(row=8, column=col).value
-                    name_value = worksheet.cell(row=9, column=col).value
-                    
-                    if code_value and str(code_value).strip():
-                        try:
-                            clean_code = str(code_value).strip()
-                            stock_codes.append(clean_code)
-                            if name_value:
-                                clean_name = str(name_value).strip()
-                                stock_names[clean_code] = clean_name
-                        except UnicodeError:
-                            # UTF-8 인코딩 오류 시 기본값 사용
-                            clean_code = f"종목_{col-2}"
-                            stock_codes.append(clean_code)
-                            stock_names[clean_code] = f"종목명_{col-2}"
-                except:
-                    continue
-            
-            print(f"종목코드 추출 완료: {len(stock_codes)}개")
+            # 외국인 순매수는 억 단위로 환산
+            scale = 100000000 if data_type == "foreign" else 1
             
-            # 시계열 데이터 추출 (15행부터 시작, DATE 헤더는 14행)
-            data = {}
-            start_row = 15  # 실제 데이터 시작 행 (DATE 헤더 다음)
+            # 종목코드와 종목명 (8행, 9행) - 실제 열 위치를 함께 보관
+            all_code_columns, all_stock_codes, name_row = self.read_sheet_header(sheet_name)
             
-            # 데이터가 있는 마지막 행을 동적으로 찾기
-            end_row = start_row
-            for row in range(start_row, max_row + 1):
-                date_cell = worksheet.cell(row=row, column=1).value
-                if date_cell is not None and isinstance(date_cell, datetime):
-                    end_row = row
-                elif date_cell is None:
-                    break
+            # 열 선택 로드: 필요한 종목의 열만 값 변환
+            if stock_codes is not None:
+                wanted_codes = set(stock_codes)
+                selected = [(col_index, stock_code) for col_index, stock_code in zip(all_code_columns, all_stock_codes)
+                            if stock_code in wanted_codes]
+                code_columns = [col_index for col_index, _ in selected]
+                stock_codes = [stock_code for _, stock_code in selected]
+            else:
+                code_columns = all_code_columns
+                stock_codes = all_stock_codes
             
-            print(f"  [정보] 데이터 범위: A{start_row} ~ A{end_row} (총 {end_row - start_row + 1}행)")
+            # 시계열 데이터 (15행부터 시작, DATE 헤더는 14행)
+            start_row = 15
+            dates, values, data_row_count = self.read_sheet_rows(sheet_name, code_columns, start_row)
+            stock_names = self.header_stock_names(name_row, code_columns, stock_codes)
             
-            # 날짜 정보 추출 (15행부터의 날짜들)
-            dates = []
-            for row in range(start_row, end_row + 1):
-                date_cell = worksheet.cell(row=row, column=1).value  # A열의 날짜
-                if date_cell is not None:
-                    try:
-                        # 날짜 형식 변환 (Excel 날짜 또는 문자열)
-                        if isinstance(date_cell, datetime):
-                            dates.append(date_cell)
-                        else:
-                            # 문자열인 경우 다양한 형식으로 변환 시도
-                            date_str = str(date_cell).strip()
-                            
-                            # 빈 문자열이나 비정상적인 문자열 제외
-                            if date_str.upper() in ['DATE', '날짜', ''] or len(date_str) < 4:
-                                continue
-                            
-                            # 숫자만 있는 경우 (YYYYMMDD 형식)
-                            if date_str.isdigit() and len(date_str) == 8:
-                                dates.append(datetime.strptime(date_str, '%Y%m%d'))
-                            # 하이픈이나 슬래시가 있는 경우
-                            elif '-' in date_str or '/' in date_str:
-                                clean_str = date_str.replace('-', '').replace('/', '').replace(' ', '')
-                                if clean_str.isdigit() and len(clean_str) == 8:
-                                    dates.append(datetime.strptime(clean_str, '%Y%m%d'))
-                                else:
-                                    # 다른 형식 시도
-                                    try:
-                                        dates.append(datetime.strptime(date_str, '%Y-%m-%d'))
-                                    except:
-                                        try:
-                                            dates.append(datetime.strptime(date_str, '%Y/%m/%d'))
-                                        except:
-                                            continue
-                            else:
-                                continue
-                    except Exception as e:
-                        # 변환 실패 시 해당 행 건너뛰기
-                        continue
+            print(f"종목코드 추출 완료: {len(all_stock_codes)}개")
+            if len(stock_codes) < len(all_stock_codes):
+                print(f"  [정보] 열 선택 로드: {len(all_stock_codes)}개 종목 중 {len(stock_codes)}개 종목 열만 로드")
+            print(f"  [정보] 데이터 범위: A{start_row} ~ A{start_row + max(data_row_count, 1) - 1} (총 {max(data_row_count, 1)}행)")
             
-            for i, stock_code in enumerate(stock_codes):
-                col = i + 2
-                values = []
-                valid_indices = []  # 유효한 데이터의 인덱스 저장
-                
-                for row in range(start_row, end_row + 1):
-                    try:
-                        cell_value = worksheet.cell(row=row, column=col).value
-                        if cell_value is not None:
-                            if data_type == "foreign":
-                                value = float(cell_value) * 100000000  # 외국인 순매수는 10000 곱하기
-                            else:
-                                value = float(cell_value)
-                            values.append(value)
-                            valid_indices.append(row - start_row)  # 0부터 시작하는 인덱스
-                        # 빈 셀은 제외 (0을 추가하지 않음)
-                    except:
-                        # 변환 실패한 경우도 제외
-                        pass
-                
-                if values:
-                    # 날짜와 값의 개수를 맞춤 (유효한 데이터만)
-                    valid_dates = []
-                    for idx in valid_indices:
-                        if idx < len(dates):
-                            valid_dates.append(dates[idx])
-                    
-                    data[stock_code] = {
-                        'name': stock_names.get(stock_code, f"종목_{stock_code}"),
-                        'values': np.array(values),
-                        'dates': valid_dates,
-                        'valid_indices': valid_indices  # 유효한 데이터의 인덱스 정보 추가
-                    }
+            panel = PanelData(dates, values * scale, stock_codes, stock_names, data_type)
             
-            print(f"{data_type} 데이터 추출 완료: {len(data)}개 종목 (전체 {len(stock_codes)}개 중)")
+            print(f"{data_type} 데이터 추출 완료: {len(panel.stock_columns())}개 종목 (전체 {len(stock_codes)}개 중)")
             
             # 데이터 날짜 범위 출력
             if dates:
-                try:
-                    start_date = dates[0] if isinstance(dates[0], datetime) else datetime.strptime(str(dates[0]), '%Y%m%d')
-                    end_date = dates[-1] if isinstance(dates[-1], datetime) else datetime.strptime(str(dates[-1]), '%Y%m%d')
-                    print(f"  [날짜] {data_type} 데이터 기간: {start_date.strftime('%Y-%m-%d')} ~ {end_date.strftime('%Y-%m-%d')} ({len(dates)}일)")
-                except:
-                    print(f"  [경고] {data_type} 데이터: 날짜 형식 오류")
+                print(f"  [날짜] {data_type} 데이터 기간: {dates[0].strftime('%Y-%m-%d')} ~ {dates[-1].strftime('%Y-%m-%d')} ({len(dates)}일)")
             else:
                 print(f"  [경고] {data_type} 데이터: 날짜 정보 없음")
             
-            return data, len(stock_codes)  # 데이터와 전체 종목 수 반환
+            return panel, len(all_stock_codes)  # 패널과 전체 종목 수 반환
             
         except Exception as e:
             print(f"[오류] {data_type} 데이터 파싱 실패: {e}")
             return None, 0
     
+    def parse_sheet_incremental(self, sheet_name, data_type, stock_codes=None):
+        """누적 패널의 마지막 행들이 파일과 같으면 그 뒤 행만 읽어 덧붙이고(다르면 전체 파싱) 이 파일 기간의 패널 반환
+        
+        마지막 INCREMENTAL_CHECK_ROWS개 저장 행만 대조하므로 그보다 앞선 과거 값 정정은 감지하지 못함
+        (정정 여부를 모두 확인하려면 증분 파싱을 끄고 실행)
+        """
+        try:
+            history = self.panel_store.load(sheet_name, data_type)
+            if history is None or history.n_dates == 0:
+                return self._parse_sheet_into_store(sheet_name, data_type, stock_codes, history, "누적 패널 없음")
+            
+            print(f"{data_type} 데이터 증분 파싱 중...")
+            scale = 100000000 if data_type == "foreign" else 1
+            code_columns, file_codes, name_row = self.read_sheet_header(sheet_name)
+            if len(set(file_codes)) != len(file_codes):
+                return self._parse_sheet_into_store(sheet_name, data_type, stock_codes, history, "중복 종목코드")
+            file_names = self.header_stock_names(name_row, code_columns, file_codes)
+            
+            # 첫 데이터 행 날짜로 저장소 날짜축에서의 위치를 찾고, 행마다 하루씩이라 가정해 마지막 저장 행 위치 계산
+            first_rows = list(self.open_source_reader().iter_rows(sheet_name, min_row=15, max_row=15, columns={0}))
+            first_date = self.parse_date_cell(first_rows[0][0]) if first_rows and first_rows[0] else None
+            if not isinstance(first_date, datetime):
+                return self._parse_sheet_into_store(sheet_name, data_type, stock_codes, history, "시작 날짜 없음")
+            first_date = np.datetime64(first_date, 'D')
+            start_index = int(np.searchsorted(history.dates, first_date))
+            if start_index >= history.n_dates or history.dates[start_index] != first_date:
+                return self._parse_sheet_into_store(sheet_name, data_type, stock_codes, history, "시작 날짜 불일치")
+            check_rows = min(self.INCREMENTAL_CHECK_ROWS, history.n_dates - start_index)
+            tail_index = history.n_dates - check_rows
+            
+            tail_dates, tail_values, _ = self.read_sheet_rows(sheet_name, code_columns,
+                                                              15 + tail_index - start_index)
+            tail_dates = np.array(tail_dates, dtype='datetime64[D]')
+            tail_values = tail_values * scale
+            
+            # 마지막 저장 행들은 날짜와 저장된 종목의 값이 그대로여야 함 (앞쪽 행이 빠지거나 늘면 날짜가 어긋남)
+            if len(tail_dates) < check_rows or not np.array_equal(tail_dates[:check_rows], history.dates[tail_index:]):
+                return self._parse_sheet_into_store(sheet_name, data_type, stock_codes, history, "날짜축 불일치")
+            known = [i for i, code in enumerate(file_codes) if code in history.code_index]
+            stored_values = history.values[tail_index:][:, [history.code_index[file_codes[i]] for i in known]]
+            if not np.array_equal(stored_values, tail_values[:check_rows][:, known], equal_nan=True):
+                return self._parse_sheet_into_store(sheet_name, data_type, stock_codes, history, "저장 값 불일치")
+            new_dates = tail_dates[check_rows:]
+            if len(new_dates) and np.any(np.diff(tail_dates[check_rows - 1:]) <= np.timedelta64(0, 'D')):
+                return self._parse_sheet_into_store(sheet_name, data_type, stock_codes, history, "날짜 순서 불일치")
+            
+            # 저장소 마지막 날짜 이후 행 추가, 새로 생긴 종목은 해당 열만 파일 전체 기간을 읽어 추가
+            last_stored = history.dates[-1]
+            new_codes = [i for i, code in enumerate(file_codes) if code not in history.code_index]
+            if len(new_dates) or new_codes:
+                history = self.panel_store.upsert(history, PanelData(new_dates, tail_values[check_rows:],
+                                                                     file_codes, file_names, data_type))
+                if new_codes:
+                    code_dates, code_values, _ = self.read_sheet_rows(sheet_name, [code_columns[i] for i in new_codes])
+                    history = self.panel_store.upsert(history, PanelData(
+                        np.array(code_dates, dtype='datetime64[D]'), code_values * scale,
+                        [file_codes[i] for i in new_codes], [file_names[i] for i in new_codes], data_type))
+                self.panel_store.save(sheet_name, data_type, history)
+            
+            print(f"  [정보] 누적 패널 마지막 {check_rows}행 일치, {last_stored} 이후 {len(new_dates)}행 추가"
+                  + (f", 신규 종목 {len(new_codes)}개" if new_codes else ""))
+            file_dates = np.array([first_date, tail_dates[-1]])
+            return self._store_window(history, file_dates, file_codes, file_names, stock_codes, data_type)
+            
+        except Exception as e:
+            print(f"[오류] {data_type} 데이터 증분 파싱 실패: {e}")
+            return None, 0
+    
+    def _parse_sheet_into_store(self, sheet_name, data_type, stock_codes, history, reason):
+        """전체 파싱 후 누적 패널 저장소 갱신 (이 파일 기간의 기존 행은 교체)"""
+        print(f"  [정보] {data_type} 전체 파싱 ({reason})")
+        panel, total_stock_count = self.parse_sheet(sheet_name, data_type)
+        if panel is None:
+            return None, 0
+        # 중복 종목코드나 날짜가 있는 파일은 누적 패널에 합칠 수 없으므로 저장하지 않음
+        if panel.n_dates and len(set(panel.codes)) == len(panel.codes) and np.all(np.diff(panel.dates) > np.timedelta64(0, 'D')):
+            try:
+                self.panel_store.save(sheet_name, data_type,
+                                      self.panel_store.upsert(history, panel, replace_dates=True))
+            except OSError as e:
+                print(f"  [경고] {data_type} 누적 패널 저장 실패: {e}")
+        if stock_codes is not None:
+            panel = self.project_columns(panel, stock_codes)
+        return panel, total_stock_count
+    
+    def _store_window(self, history, file_dates, file_codes, file_names, stock_codes, data_type):
+        """누적 패널에서 이 파일 기간 / 파일 열 순서의 패널 추출 (열 선택 로드 시 해당 종목만)"""
+        if stock_codes is not None:
+            wanted_codes = set(stock_codes)
+            selected = [i for i, code in enumerate(file_codes) if code in wanted_codes]
+            codes = [file_codes[i] for i in selected]
+            names = [file_names[i] for i in selected]
+        else:
+            codes, names = file_codes, file_names
+        panel = self.panel_store.window(history, file_dates[0], file_dates[-1], codes, names)
+        
+        print(f"{data_type} 데이터 추출 완료: {len(panel.stock_columns())}개 종목 (전체 {len(codes)}개 중)")
+        print(f"  [날짜] {data_type} 데이터 기간: {panel.dates[0]} ~ {panel.dates[-1]} ({panel.n_dates}일)")
+        return panel, len(file_codes)
+    
     def apply_eps_filter(self, eps_data):
         """EPS 필터 적용: (1개월 평균 - 3개월 평균) / abs(3개월 평균)"""
         try:
             print("EPS 필터 적용 중...")
             
-            eps_scores = {}
+            parameters = self.parameters
+            eps_panel = as_panel(eps_data, "eps")
+            kernel = WindowMeanKernel(eps_panel)
+            
+            # 데이터가 30개(min_valid_count) 이상인 종목만 점수 계산, 나머지는 데이터부족
+            stock_columns = np.array(eps_panel.stock_columns(), dtype=np.int64)
+            sufficient = eps_panel.valid_counts[stock_columns] >= parameters.min_valid_count
+            scored_columns = stock_columns[sufficient]
+            
+            # B6 날짜(종목의 마지막 데이터 날짜) 기준 1개월/3개월 평균 - 빈 셀 제외
+            one_month_start_rows, end_rows = kernel.trailing_window(scored_columns, parameters.eps_short_months)
+            three_month_start_rows, _ = kernel.trailing_window(scored_columns, parameters.eps_long_months)
+            one_month_avgs, one_month_counts = kernel.window_means(scored_columns, one_month_start_rows, end_rows)
+            three_month_avgs, three_month_counts = kernel.window_means(scored_columns, three_month_start_rows, end_rows)
+            
+            # EPS 점수 계산
+            denominators = np.abs(three_month_avgs)
+            scores = np.divide(one_month_avgs - three_month_avgs, denominators,
+                               out=np.zeros(len(scored_columns)), where=denominators > 1e-6)
+            
+            if len(scored_columns):
+                end_date = eps_panel.dates[end_rows[0]]
+                print(f"  [날짜] EPS 필터 계산 기간:")
+                print(f"     - {parameters.eps_short_months}개월 평균: "
+                      f"{month_start_dates(end_date, parameters.eps_short_months)} ~ {end_date} ({one_month_counts[0]}일)")
+                print(f"     - {parameters.eps_long_months}개월 평균: "
+                      f"{month_start_dates(end_date, parameters.eps_long_months)} ~ {end_date} ({three_month_counts[0]}일)")
             
-            for stock_code, data in eps_data.items():
-                eps_values = data.get('values', np.array([]))
-                dates = data.get('dates', [])
-                
-                if len(eps_values) < 30:
+            eps_scores = {}
+            scored_position = 0
+            for column, is_sufficient in zip(stock_columns, sufficient):
+                stock_code = eps_panel.codes[column]
+                if not is_sufficient:
                     eps_scores[stock_code] = {
-                        'name': data.get('name', f"종목_{stock_code}"),
+                        'name': eps_panel.names[column],
                         'eps_score': 0,
                         'status': '데이터부족'
                     }
                     continue
                 
-                # B6 날짜 기준으로 정확한 기간 계산
-                # 1개월 EPS 평균: B6 기준 1개월 전부터 B6까지
-                # 3개월 EPS 평균: B6 기준 3개월 전부터 B6까지
-                
-                # 날짜가 있는 경우 날짜 기반으로 계산, 없으면 개수 기반으로 계산
-                if dates and len(dates) == len(eps_values):
-                    # 날짜 기반 계산 (정확한 방식)
-                    from datetime import datetime, timedelta
-                    import calendar
-                    
-                    def get_month_start_date(target_date, months_back):
-                        """정확한 월 단위 계산 - N개월 전부터 현재까지"""
-                        year = target_date.year
-                        month = target_date.month
-                        
-                        # N개월 전 월 계산 (포함)
-                        month -= (months_back - 1)
-                        while month <= 0:
-                            month += 12
-                            year -= 1
-                        
-                        # 해당 월의 첫 번째 날
-                        return datetime(year, month, 1)
-                    
-                    # B6 날짜 (최종 날짜) - 실제로는 데이터의 마지막 날짜 사용
-                    end_date = dates[-1] if isinstance(dates[-1], datetime) else datetime.strptime(str(dates[-1]), '%Y%m%d')
-                    
-                    # 1개월 전 첫째 날
-                    one_month_start = get_month_start_date(end_date, 1)
-                    # 3개월 전 첫째 날
-                    three_month_start = get_month_start_date(end_date, 3)
-                    
-                    # 1개월 데이터 추출
-                    one_month_values = []
-                    three_month_values = []
-                    
-                    for i, date in enumerate(dates):
-                        if isinstance(date, str):
-                            date = datetime.strptime(date, '%Y%m%d')
-                        
-                        if date >= one_month_start:
-                            one_month_values.append(eps_values[i])
-                        if date >= three_month_start:
-                            three_month_values.append(eps_values[i])
-                    
-                    # 빈 셀은 이미 제외된 상태이므로 실제 데이터만으로 평균 계산
-                    one_month_avg = np.mean(one_month_values) if one_month_values else 0
-                    three_month_avg = np.mean(three_month_values) if three_month_values else 0
-                    
-                    # 첫 번째 종목에서만 날짜 범위 출력
-                    if stock_code == list(eps_data.keys())[0]:
-                        print(f"  [날짜] EPS 필터 계산 기간:")
-                        print(f"     - 1개월 평균: {one_month_start.strftime('%Y-%m-%d')} ~ {end_date.strftime('%Y-%m-%d')} ({len(one_month_values)}일)")
-                        print(f"     - 3개월 평균: {three_month_start.strftime('%Y-%m-%d')} ~ {end_date.strftime('%Y-%m-%d')} ({len(three_month_values)}일)")
-                    
-                else:
-                    # 날짜가 없는 경우 개수 기반 계산 (기존 방식)
-                    one_month_avg = np.mean(eps_values[-30:])
-                    three_month_avg = np.mean(eps_values[-90:]) if len(eps_values) >= 90 else np.mean(eps_values)
-                    
-                    # 첫 번째 종목에서만 정보 출력
-                    if stock_code == list(eps_data.keys())[0]:
-                        print(f"  [경고] EPS 필터: 날짜 정보 없음, 개수 기반 계산 (최근 30일, 90일)")
-                
-                # EPS 점수 계산
-                if abs(three_month_avg) > 1e-6:
-                    eps_score = (one_month_avg - three_month_avg) / abs(three_month_avg)
-                else:
-                    eps_score = 0
-                
                 eps_scores[stock_code] = {
-                    'name': data.get('name', f"종목_{stock_code}"),
-                    'eps_score': eps_score,
-                    'one_month_avg': one_month_avg,
-                    'three_month_avg': three_month_avg,
+                    'name': eps_panel.names[column],
+                    'eps_score': float(scores[scored_position]),
+                    'one_month_avg': float(one_month_avgs[scored_position]),
+                    'three_month_avg': float(three_month_avgs[scored_position]),
                     'status': '계산완료'
                 }
+                scored_position += 1
             
-            # EPS 점수 기준으로 정렬하여 상위 100개 선정
-            sorted_stocks = sorted(eps_scores.items(), key=lambda x: x[1]['eps_score'], reverse=True)
-            top_100_stocks = dict(sorted_stocks[:100])
+            # EPS 점수 기준 상위 100개(eps_top_k) 선정 (부분 선택)
+            eps_ranking = StageRanking(eps_scores.keys(), [data['eps_score'] for data in eps_scores.values()],
+                                       parameters.eps_top_k)
+            top_100_stocks = {stock_code: eps_scores[stock_code] for stock_code in eps_ranking.selected_codes()}
             
-            print(f"EPS 필터 적용 완료: 전체 {len(eps_scores)}개 종목 중 상위 100개 선정")
+            print(f"EPS 필터 적용 완료: 전체 {len(eps_scores)}개 종목 중 상위 {parameters.eps_top_k}개 선정")
             
             self.eps_scores = eps_scores
+            self.eps_ranking = eps_ranking
             self.eps_top_100 = top_100_stocks
             
             return top_100_stocks
@@ -309,29 +532,61 @@ class DeepSearchForeignBuyingTop20IndexSystem:
             print(f"EPS 필터 적용 실패: {e}")
             return None
     
+    def _flow_window_means(self, stock_codes, foreign_panel, cap_panel, window_months):
+        """외국인 순매수/시가총액 N개월 창 평균 (외국인 데이터의 마지막 날짜 기준, 같은 날짜 구간의 시가총액 사용)"""
+        # 외국인, 시가총액 모두 데이터가 30개(min_valid_count) 이상인 종목만 계산
+        min_valid_count = self.parameters.min_valid_count
+        eligible_codes = [stock_code for stock_code in stock_codes
+                          if foreign_panel.valid_count_of(stock_code) >= min_valid_count
+                          and cap_panel.valid_count_of(stock_code) >= min_valid_count]
+        foreign_columns = [foreign_panel.code_index[stock_code] for stock_code in eligible_codes]
+        cap_columns = [cap_panel.code_index[stock_code] for stock_code in eligible_codes]
+        foreign_kernel = WindowMeanKernel(foreign_panel)
+        cap_kernel = WindowMeanKernel(cap_panel)
+        
+        windows = {}
+        for months in window_months:
+            start_rows, end_rows = foreign_kernel.trailing_window(foreign_columns, months)
+            foreign_avgs, counts = foreign_kernel.window_means(foreign_columns, start_rows, end_rows)
+            cap_start_rows, cap_end_rows = cap_panel.calendar.align_rows(foreign_panel.calendar, start_rows, end_rows)
+            cap_avgs, _ = cap_kernel.window_means(cap_columns, cap_start_rows, cap_end_rows)
+            
+            # 시가총액 평균이 0 이하이면 지표 0
+            scores = np.divide(foreign_avgs, cap_avgs, out=np.zeros(len(eligible_codes)), where=cap_avgs > 1e-6)
+            windows[months] = {
+                'foreign_avgs': foreign_avgs,
+                'cap_avgs': cap_avgs,
+                'scores': scores,
+                'counts': counts,
+                'end_dates': foreign_panel.dates[end_rows]
+            }
+        return eligible_codes, windows
+    
     def calculate_foreign_intensity(self, eps_filtered_stocks, foreign_data, market_cap_data):
         """외국인 수급강도 지표 계산: 6개월 외국인 순매수 평균 / 6개월 시가총액 평균"""
         try:
             print("외국인 수급강도 지표 계산 중...")
             
-            intensity_scores = {}
+            parameters = self.parameters
+            foreign_panel = as_panel(foreign_data, "foreign")
+            cap_panel = as_panel(market_cap_data, "market_cap")
             
             # EPS 필터를 통과한 종목들만 처리
+            eligible_codes, windows = self._flow_window_means(
+                list(eps_filtered_stocks.keys()), foreign_panel, cap_panel, [parameters.intensity_months])
+            six_month = windows[parameters.intensity_months]
+            eligible_positions = {stock_code: i for i, stock_code in enumerate(eligible_codes)}
+            
+            if eligible_codes:
+                end_date = six_month['end_dates'][0]
+                print(f"  [날짜] 외국인 수급강도 계산 기간:")
+                print(f"     - {parameters.intensity_months}개월 평균: "
+                      f"{month_start_dates(end_date, parameters.intensity_months)} ~ {end_date} ({six_month['counts'][0]}일)")
+            
+            intensity_scores = {}
             for stock_code, eps_data in eps_filtered_stocks.items():
-                if stock_code not in foreign_data or stock_code not in market_cap_data:
-                    intensity_scores[stock_code] = {
-                        'name': eps_data.get('name', f"종목_{stock_code}"),
-                        'intensity_score': 0,
-                        'status': '데이터부족'
-                    }
-                    continue
-                
-                foreign_values = foreign_data[stock_code].get('values', np.array([]))
-                cap_values = market_cap_data[stock_code].get('values', np.array([]))
-                foreign_dates = foreign_data[stock_code].get('dates', [])
-                cap_dates = market_cap_data[stock_code].get('dates', [])
-                
-                if len(foreign_values) < 30 or len(cap_values) < 30:
+                position = eligible_positions.get(stock_code)
+                if position is None:
                     intensity_scores[stock_code] = {
                         'name': eps_data.get('name', f"종목_{stock_code}"),
                         'intensity_score': 0,
@@ -339,84 +594,25 @@ class DeepSearchForeignBuyingTop20IndexSystem:
                     }
                     continue
                 
-                # 6개월 평균 계산 - 날짜 기반으로 정확한 기간 계산
-                if foreign_dates and cap_dates and len(foreign_dates) == len(foreign_values) and len(cap_dates) == len(cap_values):
-                    # 날짜 기반 계산 (정확한 방식)
-                    from datetime import datetime, timedelta
-                    
-                    def get_month_start_date(target_date, months_back):
-                        """정확한 월 단위 계산 - N개월 전부터 현재까지"""
-                        year = target_date.year
-                        month = target_date.month
-                        
-                        # N개월 전 월 계산 (포함)
-                        month -= (months_back - 1)
-                        while month <= 0:
-                            month += 12
-                            year -= 1
-                        
-                        # 해당 월의 첫 번째 날
-                        return datetime(year, month, 1)
-                    
-                    # 최종 날짜 (데이터의 마지막 날짜)
-                    end_date = foreign_dates[-1] if isinstance(foreign_dates[-1], datetime) else datetime.strptime(str(foreign_dates[-1]), '%Y%m%d')
-                    
-                    # 6개월 전 첫째 날
-                    six_month_start = get_month_start_date(end_date, 6)
-                    
-                    # 6개월 데이터 추출
-                    foreign_6month_values = []
-                    cap_6month_values = []
-                    
-                    for i, date in enumerate(foreign_dates):
-                        if isinstance(date, str):
-                            date = datetime.strptime(date, '%Y%m%d')
-                        
-                        if date >= six_month_start:
-                            foreign_6month_values.append(foreign_values[i])
-                            if i < len(cap_values):
-                                cap_6month_values.append(cap_values[i])
-                    
-                    # 빈 셀은 이미 제외된 상태이므로 실제 데이터만으로 평균 계산
-                    foreign_avg = np.mean(foreign_6month_values) if foreign_6month_values else 0
-                    cap_avg = np.mean(cap_6month_values) if cap_6month_values else 0
-                    
-                    # 첫 번째 종목에서만 날짜 범위 출력
-                    if stock_code == list(eps_filtered_stocks.keys())[0]:
-                        print(f"  [날짜] 외국인 수급강도 계산 기간:")
-                        print(f"     - 6개월 평균: {six_month_start.strftime('%Y-%m-%d')} ~ {end_date.strftime('%Y-%m-%d')} ({len(foreign_6month_values)}일)")
-                    
-                else:
-                    # 날짜가 없는 경우 개수 기반 계산 (기존 방식)
-                    foreign_avg = np.mean(foreign_values[-min(180, len(foreign_values)):])
-                    cap_avg = np.mean(cap_values[-min(180, len(cap_values)):])
-                    
-                    # 첫 번째 종목에서만 정보 출력
-                    if stock_code == list(eps_filtered_stocks.keys())[0]:
-                        print(f"  [경고] 외국인 수급강도: 날짜 정보 없음, 개수 기반 계산 (최근 180일)")
-                
-                # 외국인 수급강도 지표 계산
-                if cap_avg > 1e-6:
-                    intensity_score = foreign_avg / cap_avg
-                else:
-                    intensity_score = 0
-                
                 intensity_scores[stock_code] = {
                     'name': eps_data.get('name', f"종목_{stock_code}"),
-                    'intensity_score': intensity_score,
-                    'foreign_avg': foreign_avg,
-                    'cap_avg': cap_avg,
+                    'intensity_score': float(six_month['scores'][position]),
+                    'foreign_avg': float(six_month['foreign_avgs'][position]),
+                    'cap_avg': float(six_month['cap_avgs'][position]),
                     'eps_score': eps_data.get('eps_score', 0),
                     'status': '계산완료'
                 }
             
-            # 외국인 수급강도 지표 기준으로 정렬하여 상위 50개 선정
-            sorted_stocks = sorted(intensity_scores.items(), key=lambda x: x[1]['intensity_score'], reverse=True)
-            top_50_stocks = dict(sorted_stocks[:50])
+            # 외국인 수급강도 지표 기준 상위 50개(intensity_top_k) 선정 (부분 선택)
+            intensity_ranking = StageRanking(intensity_scores.keys(),
+                                             [data['intensity_score'] for data in intensity_scores.values()],
+                                             parameters.intensity_top_k)
+            top_50_stocks = {stock_code: intensity_scores[stock_code] for stock_code in intensity_ranking.selected_codes()}
             
-            print(f"외국인 수급강도 지표 계산 완료: 상위 50개 종목 선정")
+            print(f"외국인 수급강도 지표 계산 완료: 상위 {parameters.intensity_top_k}개 종목 선정")
             
             self.intensity_scores = intensity_scores
+            self.intensity_ranking = intensity_ranking
             self.final_top_50 = top_50_stocks
             
             return top_50_stocks
@@ -430,134 +626,62 @@ class DeepSearchForeignBuyingTop20IndexSystem:
         try:
             print("1개월과 2개월 외국인 수급 상위 10종목 계산 중...")
             
+            parameters = self.parameters
+            short_months, long_months = parameters.flow_short_months, parameters.flow_long_months
+            foreign_panel = as_panel(foreign_data, "foreign")
+            cap_panel = as_panel(market_cap_data, "market_cap")
+            
+            eligible_codes, windows = self._flow_window_means(
+                list(final_stocks.keys()), foreign_panel, cap_panel, [short_months, long_months])
+            one_month, two_month = windows[short_months], windows[long_months]
+            
+            if eligible_codes:
+                end_date = one_month['end_dates'][0]
+                print(f"  [날짜] 월별 외국인 수급 계산 기간:")
+                print(f"     - {short_months}개월 평균: "
+                      f"{month_start_dates(end_date, short_months)} ~ {end_date} ({one_month['counts'][0]}일)")
+                print(f"     - {long_months}개월 평균: "
+                      f"{month_start_dates(end_date, long_months)} ~ {end_date} ({two_month['counts'][0]}일)")
+            
             one_month_scores = {}
             two_month_scores = {}
-            
-            for stock_code, data in final_stocks.items():
-                if stock_code not in foreign_data or stock_code not in market_cap_data:
-                    continue
-                
-                foreign_values = foreign_data[stock_code].get('values', np.array([]))
-                cap_values = market_cap_data[stock_code].get('values', np.array([]))
-                foreign_dates = foreign_data[stock_code].get('dates', [])
-                cap_dates = market_cap_data[stock_code].get('dates', [])
-                
-                if len(foreign_values) < 30 or len(cap_values) < 30:
-                    continue
-                
-                # 1개월과 2개월 평균 계산 - 날짜 기반으로 정확한 기간 계산
-                if foreign_dates and cap_dates and len(foreign_dates) == len(foreign_values) and len(cap_dates) == len(cap_values):
-                    # 날짜 기반 계산 (정확한 방식)
-                    from datetime import datetime, timedelta
-                    
-                    def get_month_start_date(target_date, months_back):
-                        """정확한 월 단위 계산 - N개월 전부터 현재까지"""
-                        year = target_date.year
-                        month = target_date.month
-                        
-                        # N개월 전 월 계산 (포함)
-                        month -= (months_back - 1)
-                        while month <= 0:
-                            month += 12
-                            year -= 1
-                        
-                        # 해당 월의 첫 번째 날
-                        return datetime(year, month, 1)
-                    
-                    # 최종 날짜 (데이터의 마지막 날짜)
-                    end_date = foreign_dates[-1] if isinstance(foreign_dates[-1], datetime) else datetime.strptime(str(foreign_dates[-1]), '%Y%m%d')
-                    
-                    # 1개월 전 첫째 날
-                    one_month_start = get_month_start_date(end_date, 1)
-                    # 2개월 전 첫째 날
-                    two_month_start = get_month_start_date(end_date, 2)
-                    
-                    # 1개월 데이터 추출
-                    one_month_foreign_values = []
-                    one_month_cap_values = []
-                    # 2개월 데이터 추출
-                    two_month_foreign_values = []
-                    two_month_cap_values = []
-                    
-                    for i, date in enumerate(foreign_dates):
-                        if isinstance(date, str):
-                            date = datetime.strptime(date, '%Y%m%d')
-                        
-                        if date >= one_month_start:
-                            one_month_foreign_values.append(foreign_values[i])
-                            if i < len(cap_values):
-                                one_month_cap_values.append(cap_values[i])
-                        
-                        if date >= two_month_start:
-                            two_month_foreign_values.append(foreign_values[i])
-                            if i < len(cap_values):
-                                two_month_cap_values.append(cap_values[i])
-                    
-                    # 빈 셀은 이미 제외된 상태이므로 실제 데이터만으로 평균 계산
-                    one_month_foreign = np.mean(one_month_foreign_values) if one_month_foreign_values else 0
-                    one_month_cap = np.mean(one_month_cap_values) if one_month_cap_values else 0
-                    two_month_foreign = np.mean(two_month_foreign_values) if two_month_foreign_values else 0
-                    two_month_cap = np.mean(two_month_cap_values) if two_month_cap_values else 0
-                    
-                    # 첫 번째 종목에서만 날짜 범위 출력
-                    if stock_code == list(final_stocks.keys())[0]:
-                        print(f"  [날짜] 월별 외국인 수급 계산 기간:")
-                        print(f"     - 1개월 평균: {one_month_start.strftime('%Y-%m-%d')} ~ {end_date.strftime('%Y-%m-%d')} ({len(one_month_foreign_values)}일)")
-                        print(f"     - 2개월 평균: {two_month_start.strftime('%Y-%m-%d')} ~ {end_date.strftime('%Y-%m-%d')} ({len(two_month_foreign_values)}일)")
-                    
-                else:
-                    # 날짜가 없는 경우 개수 기반 계산 (기존 방식)
-                    one_month_foreign = np.mean(foreign_values[-30:])
-                    one_month_cap = np.mean(cap_values[-30:])
-                    two_month_foreign = np.mean(foreign_values[-60:]) if len(foreign_values) >= 60 else np.mean(foreign_values)
-                    two_month_cap = np.mean(cap_values[-60:]) if len(cap_values) >= 60 else np.mean(cap_values)
-                    
-                    # 첫 번째 종목에서만 정보 출력
-                    if stock_code == list(final_stocks.keys())[0]:
-                        print(f"  [경고] 월별 외국인 수급: 날짜 정보 없음, 개수 기반 계산 (최근 30일, 60일)")
-                
-                # 1개월 외국인 수급 지표
-                if one_month_cap > 1e-6:
-                    one_month_score = one_month_foreign / one_month_cap
-                else:
-                    one_month_score = 0
-                
-                # 2개월 외국인 수급 지표
-                if two_month_cap > 1e-6:
-                    two_month_score = two_month_foreign / two_month_cap
-                else:
-                    two_month_score = 0
+            for position, stock_code in enumerate(eligible_codes):
+                data = final_stocks[stock_code]
                 
                 one_month_scores[stock_code] = {
                     'name': data.get('name', f"종목_{stock_code}"),
-                    'one_month_score': one_month_score,
-                    'one_month_foreign': one_month_foreign,
-                    'one_month_cap': one_month_cap,
+                    'one_month_score': float(one_month['scores'][position]),
+                    'one_month_foreign': float(one_month['foreign_avgs'][position]),
+                    'one_month_cap': float(one_month['cap_avgs'][position]),
                     'eps_score': data.get('eps_score', 0),
                     'intensity_score': data.get('intensity_score', 0)
                 }
                 
                 two_month_scores[stock_code] = {
                     'name': data.get('name', f"종목_{stock_code}"),
-                    'two_month_score': two_month_score,
-                    'two_month_foreign': two_month_foreign,
-                    'two_month_cap': two_month_cap,
+                    'two_month_score': float(two_month['scores'][position]),
+                    'two_month_foreign': float(two_month['foreign_avgs'][position]),
+                    'two_month_cap': float(two_month['cap_avgs'][position]),
                     'eps_score': data.get('eps_score', 0),
                     'intensity_score': data.get('intensity_score', 0)
                 }
             
-            # 1개월 상위 10개 선정
-            sorted_one_month = sorted(one_month_scores.items(), key=lambda x: x[1]['one_month_score'], reverse=True)
-            top_10_one_month = dict(sorted_one_month[:10])
+            # 1개월 상위 10개(flow_top_k) 선정 (부분 선택)
+            one_month_ranking = StageRanking(eligible_codes, one_month['scores'], parameters.flow_top_k)
+            top_10_one_month = {stock_code: one_month_scores[stock_code] for stock_code in one_month_ranking.selected_codes()}
             
-            # 2개월 상위 10개 선정
-            sorted_two_month = sorted(two_month_scores.items(), key=lambda x: x[1]['two_month_score'], reverse=True)
-            top_10_two_month = dict(sorted_two_month[:10])
+            # 2개월 상위 10개(flow_top_k) 선정 (부분 선택)
+            two_month_ranking = StageRanking(eligible_codes, two_month['scores'], parameters.flow_top_k)
+            top_10_two_month = {stock_code: two_month_scores[stock_code] for stock_code in two_month_ranking.selected_codes()}
             
-            print(f"1개월 외국인 수급 상위 10종목 선정 완료")
-            print(f"2개월 외국인 수급 상위 10종목 선정 완료")
+            print(f"{short_months}개월 외국인 수급 상위 {parameters.flow_top_k}종목 선정 완료")
+            print(f"{long_months}개월 외국인 수급 상위 {parameters.flow_top_k}종목 선정 완료")
             
             # 결과 저장
+            self.one_month_scores = one_month_scores
+            self.two_month_scores = two_month_scores
+            self.one_month_ranking = one_month_ranking
+            self.two_month_ranking = two_month_ranking
             self.one_month_top_10 = top_10_one_month
             self.two_month_top_10 = top_10_two_month
             
@@ -608,7 +732,7 @@ class DeepSearchForeignBuyingTop20IndexSystem:
                 # 1개월 정보
                 if stock_code in self.one_month_top_10:
                     stock_name = self.one_month_top_10[stock_code].get('name')
-                    one_month_rank = list(self.one_month_top_10.keys()).index(stock_code) + 1
+                    one_month_rank = self.one_month_ranking.selected_rank_of(stock_code)
                     one_month_score = self.one_month_top_10[stock_code].get('one_month_score', 0)
                     eps_score = self.one_month_top_10[stock_code].get('eps_score', 0)
                     intensity_score = self.one_month_top_10[stock_code].get('intensity_score', 0)
@@ -619,7 +743,7 @@ class DeepSearchForeignBuyingTop20IndexSystem:
                 if stock_code in self.two_month_top_10:
                     if not stock_name:
                         stock_name = self.two_month_top_10[stock_code].get('name')
-                    two_month_rank = list(self.two_month_top_10.keys()).index(stock_code) + 1
+                    two_month_rank = self.two_month_ranking.selected_rank_of(stock_code)
                     two_month_score = self.two_month_top_10[stock_code].get('two_month_score', 0)
                     # 1개월에서 가져오지 못한 점수 정보가 있다면 2개월에서 가져오기
                     if eps_score == 0:
@@ -645,166 +769,117 @@ class DeepSearchForeignBuyingTop20IndexSystem:
                 }
             
             # 최종 비중 순으로 정렬
-            sorted_final_weights = sorted(final_weights.items(), key=lambda x: x[1]['final_weight'], reverse=True)
+            weight_ranking = StageRanking(final_weights.keys(),
+                                          [data['final_weight'] for data in final_weights.values()], len(final_weights))
+            sorted_final_weights = {stock_code: final_weights[stock_code] for stock_code in weight_ranking.selected_codes()}
             
             print(f"최종 비중 계산 완료: {len(final_weights)}개 종목")
             
             # 결과 저장
-            self.final_weights = dict(sorted_final_weights)
+            self.final_weights = sorted_final_weights
             self.total_selection_count = total_selection_count
             
-            return dict(sorted_final_weights)
+            return sorted_final_weights
             
         except Exception as e:
             print(f"최종 비중 계산 실패: {e}")
             return None
     
-    def create_result_excel_full_stocks(self, final_stocks):
-        """전체 종목 결과 엑셀 파일 생성"""
+    def create_result_excel_full_stocks(self, final_stocks, output_path=None):
+        """전체 종목 결과 엑셀 파일 생성 (write-only 스트리밍 작성)"""
+        output_path = output_path or self.output_excel_path
         try:
             print("전체 종목 결과 Excel 파일 생성 중...")
             
-            # 새로운 워크북 생성
-            self.output_workbook = Workbook()
-            self.output_workbook.remove(self.output_workbook.active)
+            writer = StreamingResultWriter()
             
             # 1. 최종 결과 시트 (상위 50개)
-            final_ws = self.output_workbook.create_sheet("최종구성종목50개")
-            headers = ["순위", "종목코드", "종목명", "EPS점수", "외국인수급강도", "6개월외국인평균", "6개월시총평균", "상태"]
-            for col, header in enumerate(headers, 1):
-                final_ws.cell(row=1, column=col, value=header)
-            
-            row = 2
-            for rank, (stock_code, data) in enumerate(final_stocks.items(), 1):
-                final_ws.cell(row=row, column=1, value=rank)
-                final_ws.cell(row=row, column=2, value=stock_code)
-                final_ws.cell(row=row, column=3, value=data.get('name', f"종목_{stock_code}"))
-                final_ws.cell(row=row, column=4, value=round(data.get('eps_score', 0), 4))
-                final_ws.cell(row=row, column=5, value=round(data.get('intensity_score', 0), 6))
-                final_ws.cell(row=row, column=6, value=round(data.get('foreign_avg', 0), 2))
-                final_ws.cell(row=row, column=7, value=round(data.get('cap_avg', 0), 2))
-                final_ws.cell(row=row, column=8, value=data.get('status', '알수없음'))
-                row += 1
+            writer.add_sheet(
+                "최종구성종목50개",
+                ["순위", "종목코드", "종목명", "EPS점수", "외국인수급강도", "6개월외국인평균", "6개월시총평균", "상태"],
+                ([rank, stock_code, data.get('name', f"종목_{stock_code}"),
+                  data.get('eps_score', 0), data.get('intensity_score', 0),
+                  data.get('foreign_avg', 0), data.get('cap_avg', 0), data.get('status', '알수없음')]
+                 for rank, (stock_code, data) in enumerate(final_stocks.items(), 1)),
+                {3: SCORE_FORMAT, 4: INTENSITY_FORMAT, 5: AMOUNT_FORMAT, 6: AMOUNT_FORMAT}
+            )
             
             # 2. EPS 필터 전체 결과 시트
-            eps_ws = self.output_workbook.create_sheet("EPS필터전체결과")
-            headers = ["순위", "종목코드", "종목명", "EPS점수", "1개월EPS평균", "3개월EPS평균", "데이터개수", "상태", "통과여부"]
-            for col, header in enumerate(headers, 1):
-                eps_ws.cell(row=1, column=col, value=header)
-            
-            row = 2
-            sorted_eps = sorted(self.eps_scores.items(), key=lambda x: x[1]['eps_score'], reverse=True)
-            for rank, (stock_code, data) in enumerate(sorted_eps, 1):
-                eps_ws.cell(row=row, column=1, value=rank)
-                eps_ws.cell(row=row, column=2, value=stock_code)
-                eps_ws.cell(row=row, column=3, value=data.get('name', f"종목_{stock_code}"))
-                eps_ws.cell(row=row, column=4, value=round(data.get('eps_score', 0), 4))
-                eps_ws.cell(row=row, column=5, value=round(data.get('one_month_avg', 0), 2))
-                eps_ws.cell(row=row, column=6, value=round(data.get('three_month_avg', 0), 2))
-                eps_ws.cell(row=row, column=7, value=data.get('data_count', 0))
-                eps_ws.cell(row=row, column=8, value=data.get('status', '알수없음'))
-                eps_ws.cell(row=row, column=9, value="통과" if stock_code in self.eps_top_100 else "미통과")
-                row += 1
+            writer.add_sheet(
+                "EPS필터전체결과",
+                ["순위", "종목코드", "종목명", "EPS점수", "1개월EPS평균", "3개월EPS평균", "데이터개수", "상태", "통과여부"],
+                ([rank, stock_code, data.get('name', f"종목_{stock_code}"),
+                  data.get('eps_score', 0), data.get('one_month_avg', 0), data.get('three_month_avg', 0),
+                  data.get('data_count', 0), data.get('status', '알수없음'),
+                  "통과" if self.eps_ranking.is_selected(stock_code) else "미통과"]
+                 for rank, (stock_code, data) in enumerate(
+                     ((stock_code, self.eps_scores[stock_code]) for stock_code in self.eps_ranking.ordered_codes()), 1)),
+                {3: SCORE_FORMAT, 4: AMOUNT_FORMAT, 5: AMOUNT_FORMAT}
+            )
             
             # 3. 외국인 수급강도 전체 결과 시트
-            intensity_ws = self.output_workbook.create_sheet("외국인수급강도전체결과")
-            headers = ["순위", "종목코드", "종목명", "수급강도지표", "6개월외국인평균", "6개월시총평균", "EPS점수", "상태", "통과여부"]
-            for col, header in enumerate(headers, 1):
-                intensity_ws.cell(row=1, column=col, value=header)
-            
-            row = 2
-            sorted_intensity = sorted(self.intensity_scores.items(), key=lambda x: x[1]['intensity_score'], reverse=True)
-            for rank, (stock_code, data) in enumerate(sorted_intensity, 1):
-                intensity_ws.cell(row=row, column=1, value=rank)
-                intensity_ws.cell(row=row, column=2, value=stock_code)
-                intensity_ws.cell(row=row, column=3, value=data.get('name', f"종목_{stock_code}"))
-                intensity_ws.cell(row=row, column=4, value=round(data.get('intensity_score', 0), 6))
-                intensity_ws.cell(row=row, column=5, value=round(data.get('foreign_avg', 0), 2))
-                intensity_ws.cell(row=row, column=6, value=round(data.get('cap_avg', 0), 2))
-                intensity_ws.cell(row=row, column=7, value=round(data.get('eps_score', 0), 4))
-                intensity_ws.cell(row=row, column=8, value=data.get('status', '알수없음'))
-                intensity_ws.cell(row=row, column=9, value="통과" if stock_code in self.final_top_50 else "미통과")
-                row += 1
+            writer.add_sheet(
+                "외국인수급강도전체결과",
+                ["순위", "종목코드", "종목명", "수급강도지표", "6개월외국인평균", "6개월시총평균", "EPS점수", "상태", "통과여부"],
+                ([rank, stock_code, data.get('name', f"종목_{stock_code}"),
+                  data.get('intensity_score', 0), data.get('foreign_avg', 0), data.get('cap_avg', 0),
+                  data.get('eps_score', 0), data.get('status', '알수없음'),
+                  "통과" if self.intensity_ranking.is_selected(stock_code) else "미통과"]
+                 for rank, (stock_code, data) in enumerate(
+                     ((stock_code, self.intensity_scores[stock_code]) for stock_code in self.intensity_ranking.ordered_codes()), 1)),
+                {3: INTENSITY_FORMAT, 4: AMOUNT_FORMAT, 5: AMOUNT_FORMAT, 6: SCORE_FORMAT}
+            )
             
             # 4. 1개월 외국인 수급 상위 10종목 시트
-            one_month_ws = self.output_workbook.create_sheet("1개월외국인수급상위10개")
-            headers = ["순위", "종목코드", "종목명", "1개월수급지표", "1개월외국인평균", "1개월시총평균", "EPS점수", "6개월수급지표"]
-            for col, header in enumerate(headers, 1):
-                one_month_ws.cell(row=1, column=col, value=header)
-            
-            row = 2
-            for rank, (stock_code, data) in enumerate(self.one_month_top_10.items(), 1):
-                one_month_ws.cell(row=row, column=1, value=rank)
-                one_month_ws.cell(row=row, column=2, value=stock_code)
-                one_month_ws.cell(row=row, column=3, value=data.get('name', f"종목_{stock_code}"))
-                one_month_ws.cell(row=row, column=4, value=round(data.get('one_month_score', 0), 6))
-                one_month_ws.cell(row=row, column=5, value=round(data.get('one_month_foreign', 0), 2))
-                one_month_ws.cell(row=row, column=6, value=round(data.get('one_month_cap', 0), 2))
-                one_month_ws.cell(row=row, column=7, value=round(data.get('eps_score', 0), 4))
-                one_month_ws.cell(row=row, column=8, value=round(data.get('intensity_score', 0), 6))
-                row += 1
+            writer.add_sheet(
+                "1개월외국인수급상위10개",
+                ["순위", "종목코드", "종목명", "1개월수급지표", "1개월외국인평균", "1개월시총평균", "EPS점수", "6개월수급지표"],
+                ([rank, stock_code, data.get('name', f"종목_{stock_code}"),
+                  data.get('one_month_score', 0), data.get('one_month_foreign', 0), data.get('one_month_cap', 0),
+                  data.get('eps_score', 0), data.get('intensity_score', 0)]
+                 for rank, (stock_code, data) in enumerate(self.one_month_top_10.items(), 1)),
+                {3: INTENSITY_FORMAT, 4: AMOUNT_FORMAT, 5: AMOUNT_FORMAT, 6: SCORE_FORMAT, 7: INTENSITY_FORMAT}
+            )
             
             # 5. 2개월 외국인 수급 상위 10종목 시트
-            two_month_ws = self.output_workbook.create_sheet("2개월외국인수급상위10개")
-            headers = ["순위", "종목코드", "종목명", "2개월수급지표", "2개월외국인평균", "2개월시총평균", "EPS점수", "6개월수급지표"]
-            for col, header in enumerate(headers, 1):
-                two_month_ws.cell(row=1, column=col, value=header)
-            
-            row = 2
-            for rank, (stock_code, data) in enumerate(self.two_month_top_10.items(), 1):
-                two_month_ws.cell(row=row, column=1, value=rank)
-                two_month_ws.cell(row=row, column=2, value=stock_code)
-                two_month_ws.cell(row=row, column=3, value=data.get('name', f"종목_{stock_code}"))
-                two_month_ws.cell(row=row, column=4, value=round(data.get('two_month_score', 0), 6))
-                two_month_ws.cell(row=row, column=5, value=round(data.get('two_month_foreign', 0), 2))
-                two_month_ws.cell(row=row, column=6, value=round(data.get('two_month_cap', 0), 2))
-                two_month_ws.cell(row=row, column=7, value=round(data.get('eps_score', 0), 4))
-                two_month_ws.cell(row=row, column=8, value=round(data.get('intensity_score', 0), 6))
-                row += 1
+            writer.add_sheet(
+                "2개월외국인수급상위10개",
+                ["순위", "종목코드", "종목명", "2개월수급지표", "2개월외국인평균", "2개월시총평균", "EPS점수", "6개월수급지표"],
+                ([rank, stock_code, data.get('name', f"종목_{stock_code}"),
+                  data.get('two_month_score', 0), data.get('two_month_foreign', 0), data.get('two_month_cap', 0),
+                  data.get('eps_score', 0), data.get('intensity_score', 0)]
+                 for rank, (stock_code, data) in enumerate(self.two_month_top_10.items(), 1)),
+                {3: INTENSITY_FORMAT, 4: AMOUNT_FORMAT, 5: AMOUNT_FORMAT, 6: SCORE_FORMAT, 7: INTENSITY_FORMAT}
+            )
             
             # 6. 최종 비중 시트
-            final_weight_ws = self.output_workbook.create_sheet("최종비중순위")
-            headers = ["순위", "종목코드", "종목명", "선정횟수", "최종비중", "1개월순위", "2개월순위", "1개월점수", "2개월점수", "EPS점수", "6개월수급지표"]
-            for col, header in enumerate(headers, 1):
-                final_weight_ws.cell(row=1, column=col, value=header)
-            
-            row = 2
-            for rank, (stock_code, data) in enumerate(self.final_weights.items(), 1):
-                final_weight_ws.cell(row=row, column=1, value=rank)
-                final_weight_ws.cell(row=row, column=2, value=stock_code)
-                final_weight_ws.cell(row=row, column=3, value=data.get('name', f"종목_{stock_code}"))
-                final_weight_ws.cell(row=row, column=4, value=data.get('selection_count', 0))
-                final_weight_ws.cell(row=row, column=5, value=round(data.get('final_weight', 0), 4))
-                final_weight_ws.cell(row=row, column=6, value=data.get('one_month_rank', "-"))
-                final_weight_ws.cell(row=row, column=7, value=data.get('two_month_rank', "-"))
-                final_weight_ws.cell(row=row, column=8, value=round(data.get('one_month_score', 0), 6))
-                final_weight_ws.cell(row=row, column=9, value=round(data.get('two_month_score', 0), 6))
-                final_weight_ws.cell(row=row, column=10, value=round(data.get('eps_score', 0), 4))
-                final_weight_ws.cell(row=row, column=11, value=round(data.get('intensity_score', 0), 6))
-                row += 1
+            writer.add_sheet(
+                "최종비중순위",
+                ["순위", "종목코드", "종목명", "선정횟수", "최종비중", "1개월순위", "2개월순위", "1개월점수", "2개월점수", "EPS점수", "6개월수급지표"],
+                ([rank, stock_code, data.get('name', f"종목_{stock_code}"),
+                  data.get('selection_count', 0), data.get('final_weight', 0),
+                  data.get('one_month_rank', "-"), data.get('two_month_rank', "-"),
+                  data.get('one_month_score', 0), data.get('two_month_score', 0),
+                  data.get('eps_score', 0), data.get('intensity_score', 0)]
+                 for rank, (stock_code, data) in enumerate(self.final_weights.items(), 1)),
+                {4: SCORE_FORMAT, 7: INTENSITY_FORMAT, 8: INTENSITY_FORMAT, 9: SCORE_FORMAT, 10: INTENSITY_FORMAT}
+            )
             
             # 7. 요약 시트
-            summary_ws = self.output_workbook.create_sheet("요약")
-            summary_ws.cell(row=1, column=1, value="구분")
-            summary_ws.cell(row=1, column=2, value="개수")
-            summary_ws.cell(row=2, column=1, value="전체 종목 수")
-            summary_ws.cell(row=2, column=2, value=getattr(self, 'total_stock_count', len(self.eps_scores)))
-            summary_ws.cell(row=3, column=1, value="EPS 필터 통과 종목 수")
-            summary_ws.cell(row=3, column=2, value=len(self.eps_top_100))
-            summary_ws.cell(row=4, column=1, value="최종 선정 종목 수")
-            summary_ws.cell(row=4, column=2, value=len(self.final_top_50))
-            summary_ws.cell(row=5, column=1, value="1개월 외국인 수급 상위 종목 수")
-            summary_ws.cell(row=5, column=2, value=len(self.one_month_top_10))
-            summary_ws.cell(row=6, column=1, value="2개월 외국인 수급 상위 종목 수")
-            summary_ws.cell(row=6, column=2, value=len(self.two_month_top_10))
-            summary_ws.cell(row=7, column=1, value="최종 비중 계산 종목 수")
-            summary_ws.cell(row=7, column=2, value=len(self.final_weights))
-            summary_ws.cell(row=8, column=1, value="총 선정 종목 수 (중복 포함)")
-            summary_ws.cell(row=8, column=2, value=self.total_selection_count)
-            
-            # 파일 저장 (UTF-8 인코딩)
-            self.output_workbook.save(self.output_excel_path)
-            print(f"전체 종목 결과 Excel 파일 저장 완료: {self.output_excel_path}")
+            writer.add_sheet("요약", ["구분", "개수"], [
+                ["전체 종목 수", getattr(self, 'total_stock_count', len(self.eps_scores))],
+                ["EPS 필터 통과 종목 수", len(self.eps_top_100)],
+                ["최종 선정 종목 수", len(self.final_top_50)],
+                ["1개월 외국인 수급 상위 종목 수", len(self.one_month_top_10)],
+                ["2개월 외국인 수급 상위 종목 수", len(self.two_month_top_10)],
+                ["최종 비중 계산 종목 수", len(self.final_weights)],
+                ["총 선정 종목 수 (중복 포함)", self.total_selection_count],
+            ])
+            
+            # 파일 저장
+            writer.save(output_path)
+            self.output_workbook = writer.workbook
+            print(f"전체 종목 결과 Excel 파일 저장 완료: {output_path}")
             
             return True
             
@@ -814,87 +889,250 @@ class DeepSearchForeignBuyingTop20IndexSystem:
     
     def run_full_stock_system(self, use_market_cap=True):
         """전체 종목 지수 리밸런싱 시스템 실행"""
+        return self.run_cap_variants([(use_market_cap, self.output_excel_path)])
+    
+    def run_dual_cap_system(self, ff_output_excel_path):
+        """시가총액(output_excel_path)과 유동시가총액(ff_output_excel_path) 결과를 한 번에 생성"""
+        return self.run_cap_variants([(True, self.output_excel_path), (False, ff_output_excel_path)])
+    
+    def run_cap_variants(self, variants):
+        """공통 단계는 한 번만 실행하고 variants [(use_market_cap, 결과 파일 경로)]별로 수급강도·비중 단계만 분기"""
+        report = self.start_run_report("analysis", outputs=[output_path for _, output_path in variants])
+        success = False
+        try:
+            success = self._run_cap_variants(variants, report)
+            return success
+        finally:
+            self.finish_run_report(report, success, [output_path for _, output_path in variants])
+    
+    def start_run_report(self, name, **metadata):
+        """단계 계측 보고서 시작 (스케줄러에서 받은 보고서가 있으면 그 아래에 기록)"""
+        metadata.update(source=self.source_excel_path, reader_engine=self.reader_engine)
+        if self.run_report is not None:
+            report = self.run_report.child(name)
+            report.metadata.setdefault(name, metadata)
+        else:
+            report = RunReport(name, self.trace_memory, self.report_logger, metadata)
+        self.last_run_report = report
+        return report
+    
+    def finish_run_report(self, report, success, result_paths):
+        """단계별 요약 출력 후 결과 파일마다 옆에 JSON 보고서 저장"""
+        if self.run_report is None:
+            report.finish(success)
+        report.print_summary()
+        for result_path in result_paths:
+            if not result_path:
+                continue
+            try:
+                saved_path = report.save(run_report_path(result_path))
+                print(f"실행 보고서 저장: {saved_path}")
+            except OSError as e:
+                print(f"  [경고] 실행 보고서 저장 실패: {e}")
+    
+    @staticmethod
+    def record_panel_counts(record, panel, total_stock_count=None):
+        """패널 크기(행=날짜, 열=종목)를 단계 기록에 추가"""
+        if panel is None:
+            return
+        record.counts.update(rows=panel.n_dates, columns=panel.n_stocks)
+        if total_stock_count is not None:
+            record.counts["total_stocks"] = total_stock_count
+    
+    def _run_cap_variants(self, variants, report):
         start_time = time.time()
         
-        if not self.load_source_excel_file():
-            return False
+        with report.stage("load") as record:
+            if not self.load_source_excel_file():
+                record.status = "failed"
+                return False
+            record.counts["sheets"] = len(self.source_sheetnames)
         
         print("=" * 80)
         print("DeepSearch 외인수급Top20 지수 (PR) 구성종목 선정 시스템 시작")
         print("영문명: DeepSearch Net Foreign BuyingTop20 Index PR")
-        cap_type = "시가총액" if use_market_cap else "유동시가총액"
-        print(f"사용 데이터: {cap_type}")
+        cap_types = ["시가총액" if use_market_cap else "유동시가총액" for use_market_cap, _ in variants]
+        print(f"사용 데이터: {' + '.join(cap_types)}")
         print("=" * 80)
         
-        # 1. 데이터 시트 찾기
-        sheets = self.find_data_sheets(use_market_cap)
-        if not sheets:
-            return False
-        
-        # 2. 전체 종목 데이터 파싱
-        eps_data, total_stock_count = self.parse_data(sheets.get('eps_sheet', ''), "eps")
-        foreign_data, _ = self.parse_data(sheets.get('foreign_sheet', ''), "foreign")
-        market_cap_data, _ = self.parse_data(sheets.get('market_cap_sheet', ''), "market_cap")
-        
-        # 전체 종목 수 저장 (원본 엑셀에서 추출한 종목코드 수)
-        self.total_stock_count = total_stock_count
-        
-        if not eps_data or not foreign_data or not market_cap_data:
-            print("필요한 데이터가 부족합니다.")
-            return False
-        
-        # 3. EPS 필터 전체 종목 적용
-        eps_filtered_stocks = self.apply_eps_filter(eps_data)
-        if not eps_filtered_stocks:
-            return False
-        
-        # 4. 외국인 수급강도 지표 전체 종목 계산
-        final_stocks = self.calculate_foreign_intensity(eps_filtered_stocks, foreign_data, market_cap_data)
-        if not final_stocks:
-            return False
-        
-        # 5. 1개월과 2개월 외국인 수급 상위 10종목 계산
-        one_month_top_10, two_month_top_10 = self.calculate_monthly_foreign_intensity(final_stocks, foreign_data, market_cap_data)
-        if not one_month_top_10 or not two_month_top_10:
-            return False
-        
-        # 6. 최종 비중 계산
-        final_weights = self.calculate_final_weights()
-        if not final_weights:
-            return False
-        
-        # 7. 결과 Excel 파일 생성
-        if not self.create_result_excel_full_stocks(self.final_top_50):
-            print("결과 Excel 파일 생성 실패")
-            return False
-        
-        end_time = time.time()
-        execution_time = end_time - start_time
-        
-        print("=" * 80)
-        print("DeepSearch 외인수급Top20 지수 (PR) 구성종목 선정 시스템 완료!")
-        print("영문명: DeepSearch Net Foreign BuyingTop20 Index PR")
-        print(f"- 전체 종목 수: {getattr(self, 'total_stock_count', len(self.eps_scores))}")
-        print(f"- EPS 필터 통과 종목 수: {len(self.eps_top_100)}")
-        print(f"- 최종 선정 종목 수: {len(self.final_top_50)}")
-        print(f"- 1개월 외국인 수급 상위 종목 수: {len(self.one_month_top_10)}")
-        print(f"- 2개월 외국인 수급 상위 종목 수: {len(self.two_month_top_10)}")
-        print(f"- 최종 비중 계산 종목 수: {len(self.final_weights)}")
-        print(f"- 총 선정 종목 수 (중복 포함): {self.total_selection_count}")
-        print(f"- 실행 시간: {execution_time:.2f}초")
-        print(f"- 결과 파일: {self.output_excel_path}")
-        print("=" * 80)
-        
-        return True
+        try:
+            # 1. 데이터 시트 찾기
+            variant_sheets = [(use_market_cap, output_path, self.find_data_sheets(use_market_cap))
+                              for use_market_cap, output_path in variants]
+            sheets = variant_sheets[0][2]
+            if not sheets:
+                return False
+            
+            # 2. EPS 데이터 파싱 (전체 종목)
+            with report.stage("parse.eps") as record:
+                eps_data, total_stock_count = self.parse_data(sheets.get('eps_sheet', ''), "eps")
+                self.record_panel_counts(record, eps_data, total_stock_count)
+            
+            # 전체 종목 수 저장 (원본 엑셀에서 추출한 종목코드 수)
+            self.total_stock_count = total_stock_count
+            
+            if not eps_data:
+                print("필요한 데이터가 부족합니다.")
+                return False
+            
+            # 3. EPS 필터 전체 종목 적용 (시가총액 종류와 무관하므로 한 번만 계산)
+            with report.stage("eps_filter") as record:
+                eps_filtered_stocks = self.apply_eps_filter(eps_data)
+                record.counts.update(candidates=len(eps_data), selected=len(eps_filtered_stocks or {}))
+            if not eps_filtered_stocks:
+                return False
+            
+            # 이후 단계는 EPS 필터 통과 종목만 사용하므로 외국인/시가총액 시트는 해당 종목 열만 로드
+            projected_codes = list(eps_filtered_stocks.keys()) if self.column_projection else None
+            
+            # foreign/시가총액 시트는 서로 독립이므로 시트마다 별도 프로세스에서 동시에 파싱
+            with report.stage("parallel_parse") as record:
+                record.counts["executed"] = self.prefetch_sheets(
+                    [(sheets.get('foreign_sheet'), "foreign")]
+                    + [(variant_sheet.get('market_cap_sheet'), "market_cap") for _, _, variant_sheet in variant_sheets],
+                    projected_codes)
+            with report.stage("parse.foreign") as record:
+                foreign_data, _ = self.parse_data(sheets.get('foreign_sheet', ''), "foreign", projected_codes)
+                self.record_panel_counts(record, foreign_data)
+            if not foreign_data:
+                print("필요한 데이터가 부족합니다.")
+                return False
+            
+            for use_market_cap, output_path, variant_sheet in variant_sheets:
+                cap_type = "시가총액" if use_market_cap else "유동시가총액"
+                # 두 종류를 함께 실행하면 단계 이름에 시가총액 종류를 붙여 구분
+                stage_prefix = "" if len(variants) == 1 else ("market_cap." if use_market_cap else "market_ff_cap.")
+                if len(variants) > 1:
+                    print(f"[{cap_type}] 외국인 수급 단계 실행")
+                
+                with report.stage(f"{stage_prefix}parse.market_cap") as record:
+                    market_cap_data, _ = self.parse_data(variant_sheet.get('market_cap_sheet', ''), "market_cap", projected_codes)
+                    self.record_panel_counts(record, market_cap_data)
+                if not market_cap_data:
+                    print("필요한 데이터가 부족합니다.")
+                    return False
+                
+                # 4. 외국인 수급강도 지표 계산
+                with report.stage(f"{stage_prefix}foreign_intensity") as record:
+                    final_stocks = self.calculate_foreign_intensity(eps_filtered_stocks, foreign_data, market_cap_data)
+                    record.counts.update(candidates=len(eps_filtered_stocks), selected=len(final_stocks or {}))
+                if not final_stocks:
+                    return False
+                
+                # 5. 1개월과 2개월 외국인 수급 상위 10종목 계산
+                with report.stage(f"{stage_prefix}monthly_flow") as record:
+                    one_month_top_10, two_month_top_10 = self.calculate_monthly_foreign_intensity(final_stocks, foreign_data, market_cap_data)
+                    record.counts.update(one_month=len(one_month_top_10 or []), two_month=len(two_month_top_10 or []))
+                if not one_month_top_10 or not two_month_top_10:
+                    return False
+                
+                # 6. 최종 비중 계산
+                with report.stage(f"{stage_prefix}final_weights") as record:
+                    final_weights = self.calculate_final_weights()
+                    record.counts["stocks"] = len(final_weights or {})
+                if not final_weights:
+                    return False
+                
+                # 7. 결과 Excel 파일 생성
+                with report.stage(f"{stage_prefix}write_result") as record:
+                    written = self.create_result_excel_full_stocks(self.final_top_50, output_path)
+                    record.counts["rows"] = len(self.final_top_50)
+                    if not written:
+                        record.status = "failed"
+                if not written:
+                    print("결과 Excel 파일 생성 실패")
+                    return False
+                
+                execution_time = time.time() - start_time
+                
+                print("=" * 80)
+                print("DeepSearch 외인수급Top20 지수 (PR) 구성종목 선정 시스템 완료!")
+                print("영문명: DeepSearch Net Foreign BuyingTop20 Index PR")
+                print(f"- 사용 데이터: {cap_type}")
+                print(f"- 전체 종목 수: {getattr(self, 'total_stock_count', len(self.eps_scores))}")
+                print(f"- EPS 필터 통과 종목 수: {len(self.eps_top_100)}")
+                print(f"- 최종 선정 종목 수: {len(self.final_top_50)}")
+                print(f"- 1개월 외국인 수급 상위 종목 수: {len(self.one_month_top_10)}")
+                print(f"- 2개월 외국인 수급 상위 종목 수: {len(self.two_month_top_10)}")
+                print(f"- 최종 비중 계산 종목 수: {len(self.final_weights)}")
+                print(f"- 총 선정 종목 수 (중복 포함): {self.total_selection_count}")
+                print(f"- 실행 시간: {execution_time:.2f}초")
+                print(f"- 결과 파일: {output_path}")
+                print("=" * 80)
+            
+            return True
+        finally:
+            self.close_source_excel_file()
+
+    def run_backtest(self, use_market_cap=True, start_date=None, end_date=None, output_path=None, price_panel=None):
+        """전체 기간 raw_data로 매 월말 리밸런싱을 한 번에 재계산해 구성종목/비중 이력 생성 (price_panel: 지수(PR)용 종가 패널)"""
+        return backtest_runner.run_backtest(self, use_market_cap, start_date, end_date, output_path, price_panel)
+    
+    def run_parameter_sweep(self, parameter_sets, use_market_cap=True, rebalance_dates=None, output_path=None):
+        """선정 기준값 조합 전체를 한 번 로드한 패널로 평가해 조합별 구성종목/비중 표 생성"""
+        return backtest_runner.run_parameter_sweep(self, parameter_sets, use_market_cap, rebalance_dates, output_path)
+    
+    def run_robustness(self, runs=1000, perturbation=None, use_market_cap=True, as_of_date=None, max_workers=None,
+                       seed=0, output_path=None):
+        """외국인 수급/EPS 입력을 교란한 선정을 runs번 반복해 종목별 단계 선정 빈도 집계"""
+        return backtest_runner.run_robustness(self, runs, perturbation, use_market_cap, as_of_date, max_workers, seed,
+                                              output_path)
 
 class MonthlyRebalancingScheduler:
     """매달 리밸런싱 자동화 시스템"""
     
-    def __init__(self, base_directory="excel_data"):
+    def __init__(self, base_directory="excel_data", reader_engine="openpyxl", use_cache=True,
+                 refresh_backend_factory=None, refresh_waiter=None, incremental=False, parse_workers=None,
+                 trace_memory=False, report_logger=None, session_pool=None, parameters=None,
+                 fetch_margin_months=FETCH_MARGIN_MONTHS, full_year_fetch=True):
         self.base_directory = base_directory
+        self.reader_engine = reader_engine
+        self.use_cache = use_cache
+        self.incremental = incremental
+        self.parse_workers = parse_workers
+        # refresh 백엔드 (기본: pywin32 Excel), 완료 감지 대기 설정
+        self.refresh_backend_factory = refresh_backend_factory or Win32RefreshBackend
+        self.refresh_waiter = refresh_waiter or RefreshWaiter()
+        # Excel 세션 풀 (지정하면 파일마다 Excel을 새로 띄우지 않고 실행 중인 세션을 재사용)
+        self.session_pool = session_pool
+        # 선정 기준값과 데이터 받기 구간(B5) - 기본 1년 전체, full_year_fetch=False면 가장 긴 창 + 여유 개월
+        # (백테스트도 같은 설정으로 기준일별 구간을 정함)
+        self.parameters = parameters or DEFAULT_PARAMETERS
+        self.fetch_margin_months = fetch_margin_months
+        self.full_year_fetch = full_year_fetch
+        # 단계별 계측 보고서 (start_run_report 이후 복사/날짜 업데이트/refresh/분석 단계 기록)
+        self.trace_memory = trace_memory
+        self.report_logger = report_logger
+        self.run_report = None
         self.file_prefix = "deepsearch_net_foreign_buying_top20_index_raw_data_"
         self.result_prefix = "deepsearch_foreign_buying_top20_index_result_"
     
+    def start_run_report(self, **metadata):
+        """리밸런싱 실행 보고서 시작"""
+        metadata.setdefault("base_directory", self.base_directory)
+        self.run_report = RunReport("monthly_rebalancing", self.trace_memory, self.report_logger, metadata)
+        return self.run_report
+    
+    def finish_run_report(self, success, result_filenames=()):
+        """리밸런싱 실행 보고서 종료 후 결과 파일마다 옆에 저장 (저장 경로 목록 반환)"""
+        if self.run_report is None:
+            return []
+        self.run_report.finish(success)
+        saved_paths = []
+        for result_filename in result_filenames:
+            try:
+                saved_paths.append(self.run_report.save(
+                    run_report_path(os.path.join(self.base_directory, result_filename))))
+            except OSError as e:
+                print(f"실행 보고서 저장 실패: {e}")
+        return saved_paths
+    
+    def stage(self, name, **counts):
+        """실행 보고서 단계 계측 (보고서가 없으면 기록만 하고 버림)"""
+        if self.run_report is None:
+            return contextlib.nullcontext(StageRecord(name, 0.0, counts))
+        return self.run_report.stage(name, **counts)
+    
     def copy_file_with_custom_date(self, source_file, target_date):
         """사용자 지정 날짜로 파일 복사"""
         try:
@@ -903,7 +1141,9 @@ class MonthlyRebalancingScheduler:
             source_path = os.path.join(self.base_directory, source_file)
             target_path = os.path.join(self.base_directory, new_filename)
             
-            shutil.copy2(source_path, target_path)
+            with self.stage("copy") as record:
+                shutil.copy2(source_path, target_path)
+                record.counts["bytes"] = os.path.getsize(target_path)
             print(f"파일 복사 완료: {source_file} → {new_filename}")
             
             return new_filename, target_date
@@ -913,50 +1153,34 @@ class MonthlyRebalancingScheduler:
             return None, None
     
     def update_dates_in_excel(self, filename, b5_value, b6_value):
-        """Excel 파일 내의 날짜들을 사용자 입력값으로 업데이트 (전체 시트 순환)"""
+        """Excel 파일 내의 날짜들을 사용자 입력값으로 업데이트 (전체 시트 순환, 시트 XML 직접 패치)"""
         try:
             file_path = os.path.join(self.base_directory, filename)
-            workbook = load_workbook(file_path, data_only=True)
             
-            # 사용자 입력값 사용
-            date_str = b5_value
-            date_str_korean = b6_value
+            # 모든 시트의 B5, B6 셀만 직접 교체 (나머지 내용은 원본 그대로 유지)
+            with self.stage("date_update") as record:
+                sheet_results = patch_date_cells(file_path, b5_value, b6_value)
+                record.counts.update(sheets=len(sheet_results),
+                                     updated_sheets=sum(1 for _, changes in sheet_results if changes))
             
             # 전체 시트 개수 파악
-            total_sheets = len(workbook.sheetnames)
+            total_sheets = len(sheet_results)
             print(f"전체 시트 개수: {total_sheets}개")
             
             updated_sheets = 0
             
-            # 모든 시트를 순환하면서 B5, B6 셀 업데이트 (첫 번째 시트부터 순서대로)
-            for i, sheet_name in enumerate(workbook.sheetnames, 1):
-                try:
-                    sheet = workbook[sheet_name]
-                    print(f"   - [{i}/{total_sheets}] {sheet_name} 시트 확인 중...")
-                    
-                    # B5 셀 확인 및 업데이트
-                    current_b5_value = sheet['B5'].value
-                    if current_b5_value:
-                        sheet['B5'] = date_str
-                        print(f"     B5 셀 업데이트: {current_b5_value} → {date_str}")
-                    
-                    # B6 셀 확인 및 업데이트
-                    current_b6_value = sheet['B6'].value
-                    if current_b6_value:
-                        sheet['B6'] = date_str_korean
-                        print(f"     B6 셀 업데이트: {current_b6_value} → {date_str_korean}")
-                    
-                    if current_b5_value or current_b6_value:
-                        updated_sheets += 1
-                        print(f"   {sheet_name} 시트 날짜 업데이트 완료")
-                    else:
-                        print(f"   {sheet_name} 시트는 날짜 셀이 비어있음")
-                        
-                except Exception as e:
-                    print(f"   {sheet_name} 시트 처리 중 오류: {e}")
+            for i, (sheet_name, changes) in enumerate(sheet_results, 1):
+                print(f"   - [{i}/{total_sheets}] {sheet_name} 시트 확인 중...")
+                
+                for cell_ref, current_value, new_value in changes:
+                    print(f"     {cell_ref} 셀 업데이트: {current_value} → {new_value}")
+                
+                if changes:
+                    updated_sheets += 1
+                    print(f"   {sheet_name} 시트 날짜 업데이트 완료")
+                else:
+                    print(f"   {sheet_name} 시트는 날짜 셀이 비어있음")
             
-            # 파일 저장 (UTF-8 인코딩)
-            workbook.save(file_path)
             print(f"Excel 파일 날짜 업데이트 완료: {filename}")
             print(f"업데이트된 시트 수: {updated_sheets}개")
             
@@ -966,8 +1190,8 @@ class MonthlyRebalancingScheduler:
             print(f"Excel 파일 날짜 업데이트 중 오류 발생: {e}")
             return False
     
-    def open_excel_and_refresh_data(self, filename, automation_mode="macro"):
-        """Excel 파일을 열어서 Quantiwise refresh 후 저장"""
+    def open_excel_and_refresh_data(self, filename, automation_mode="macro", on_refreshed=None):
+        """Excel 파일을 열어서 Quantiwise refresh 후 저장 (on_refreshed: 저장과 동시에 실행 중인 통합 문서 값으로 실행)"""
         try:
             import os
             
@@ -976,9 +1200,13 @@ class MonthlyRebalancingScheduler:
             if automation_mode == "macro":
                 print(f"Excel 매크로 자동화 모드: {filename}")
                 
+                backend = None
+                session = None
+                refreshed = False
+                # refresh 단계는 열기~값 읽기까지만 기록하고 on_refreshed 분석 전에 닫음 (분석은 analysis 단계)
+                refresh_stage = contextlib.ExitStack()
+                refresh_record = refresh_stage.enter_context(self.stage("refresh"))
                 try:
-                    import win32com.client as win32
-                    
                     # 절대 경로로 변환
                     absolute_file_path = os.path.abspath(file_path)
                     print(f"Excel 파일 열기: {absolute_file_path}")
@@ -988,71 +1216,68 @@ class MonthlyRebalancingScheduler:
                         print(f"파일이 존재하지 않습니다: {absolute_file_path}")
                         return False
                     
-                    # Excel 인스턴스 생성
-                    excel = win32.Dispatch("Excel.Application")
-                    excel.Visible = True
-                    
-                    # Excel 파일 열기
-                    workbook = excel.Workbooks.Open(absolute_file_path)
+                    # Excel 파일 열기 (세션 풀이 있으면 실행 중인 Excel 세션에서 열기)
+                    if self.session_pool is not None:
+                        session = self.session_pool.acquire()
+                        backend = session.create_backend()
+                    else:
+                        backend = self.refresh_backend_factory()
+                    backend.open(absolute_file_path)
                     
                     print("Quantiwise refresh 매크로 실행 중...")
                     
                     # 전체 시트 개수 파악 및 순환 처리
-                    total_sheets = workbook.Worksheets.Count
+                    sheet_names = backend.sheet_names()
+                    total_sheets = len(sheet_names)
                     print(f"전체 시트 개수: {total_sheets}개")
                     
                     # 첫 번째 시트로 먼저 이동
                     print("첫 번째 시트로 이동 중...")
-                    first_sheet = workbook.Worksheets(1)
-                    first_sheet.Activate()
-                    print(f"첫 번째 시트 활성화: {first_sheet.Name}")
+                    backend.activate(sheet_names[0])
+                    print(f"첫 번째 시트 활성화: {sheet_names[0]}")
                     
                     refresh_success_count = 0
                     processed_sheets = 0
                     
                     # 모든 시트를 순환하면서 refresh 버튼이 있는 시트만 처리 (첫 번째 시트부터 순서대로)
-                    for i in range(1, total_sheets + 1):
+                    for i, sheet_name in enumerate(sheet_names, 1):
                         try:
-                            worksheet = workbook.Worksheets(i)
-                            sheet_name = worksheet.Name
-                            
                             print(f"   - [{i}/{total_sheets}] {sheet_name} 시트 확인 중...")
                             
                             # 각 시트를 활성화
-                            worksheet.Activate()
+                            backend.activate(sheet_name)
                             print(f"   {sheet_name} 시트 활성화 완료")
                             
                             # A1 셀에 refresh 버튼이 있는지 확인 (퀀티와이즈 가이드 기반)
                             try:
-                                # A1 셀 직접 접근
-                                a1_cell = worksheet.Range("A1")
+                                cell_value = backend.refresh_link_value(sheet_name)
                                 
-                                # A1 셀에 hyperlink가 있는지 확인
-                                hyperlink_count = a1_cell.Hyperlinks.Count
-                                
-                                if hyperlink_count > 0:
-                                    # A1 셀 값이 "Refresh"인지 확인
-                                    cell_value = str(a1_cell.Value).strip()
-                                    if "Refresh" in cell_value:
-                                        print(f"   {sheet_name} 시트 refresh 실행 중...")
-                                        
-                                        # 퀀티와이즈 가이드에 따른 Refresh 버튼 실행
-                                        # Range("A1").Select
-                                        worksheet.Range("A1").Select()
-                                        
-                                        # Selection.Hyperlinks(1).Follow NewWindow:=False, AddHistory:=True
-                                        excel.Selection.Hyperlinks(1).Follow(NewWindow=False, AddHistory=True)
-                                        
-                                        # 데이터 로딩 대기
-                                        time.sleep(5)
-                                        
-                                        print(f"   {sheet_name} 시트 refresh 완료")
+                                if cell_value is None:
+                                    print(f"   {sheet_name} 시트는 refresh 버튼이 없습니다")
+                                elif "Refresh" in cell_value:
+                                    print(f"   {sheet_name} 시트 refresh 실행 중...")
+                                    processed_sheets += 1
+                                    
+                                    # refresh 전 상태를 기준으로 완료 신호(계산 상태/센티널/범위) 대기
+                                    with self.stage(f"refresh.{sheet_name}") as record:
+                                        before = backend.probe(sheet_name)
+                                        backend.trigger_refresh(sheet_name)
+                                        result = self.refresh_waiter.wait(backend, sheet_name, before)
+                                        after = backend.probe(sheet_name)
+                                        record.counts.update(polls=result.polls, detected=result.reason,
+                                                             rows=after.used_rows, columns=after.used_columns)
+                                        if not result.completed:
+                                            record.status = "timeout"
+                                    
+                                    if result.completed:
+                                        print(f"   {sheet_name} 시트 refresh 완료 "
+                                              f"({result.elapsed:.1f}초, 감지: {result.reason}, 확인 {result.polls}회)")
                                         refresh_success_count += 1
-                                        processed_sheets += 1
                                     else:
-                                        print(f"   {sheet_name} 시트는 refresh 대상이 아닙니다 (A1 값: {cell_value})")
+                                        print(f"   {sheet_name} 시트 refresh 시간 초과 "
+                                              f"({self.refresh_waiter.timeout_for(sheet_name):.0f}초)")
                                 else:
-                                    print(f"   {sheet_name} 시트는 refresh 버튼이 없습니다")
+                                    print(f"   {sheet_name} 시트는 refresh 대상이 아닙니다 (A1 값: {cell_value})")
                                     
                             except Exception as hyperlink_error:
                                 print(f"   {sheet_name} 시트 refresh 버튼 확인 실패: {hyperlink_error}")
@@ -1065,27 +1290,36 @@ class MonthlyRebalancingScheduler:
                     # 매크로 실행 결과 확인
                     if processed_sheets == 0:
                         print("refresh 대상 시트를 찾을 수 없습니다.")
-                        workbook.Close()
-                        excel.Quit()
                         return False
                     elif refresh_success_count == 0:
                         print("모든 refresh 대상 시트에서 실패했습니다.")
-                        workbook.Close()
-                        excel.Quit()
                         return False
                     elif refresh_success_count < processed_sheets:
                         print(f"{refresh_success_count}/{processed_sheets} 시트에서만 refresh 성공했습니다.")
-                        workbook.Close()
-                        excel.Quit()
                         return False
                     
-                    # 파일 저장
-                    print("파일 저장 중...")
-                    workbook.Save()
-                    
-                    # Excel 닫기
-                    workbook.Close()
-                    excel.Quit()
+                    if on_refreshed is not None:
+                        # 시트마다 사용 범위를 한 번에 읽어 두고 저장은 보관용으로 백그라운드 진행
+                        with self.stage("refresh_capture") as record:
+                            live_reader = InMemoryWorkbookReader(
+                                {sheet_name: backend.read_used_range(sheet_name) for sheet_name in sheet_names},
+                                absolute_file_path)
+                            record.counts.update(sheets=len(sheet_names), cells=live_reader.cell_count())
+                        print("파일 저장 중 (백그라운드)...")
+                        pending_save = backend.save_async()
+                        refresh_stage.close()
+                        try:
+                            on_refreshed(live_reader)
+                        finally:
+                            live_reader.close()
+                            with self.stage("refresh_save"):
+                                pending_save.wait()
+                    else:
+                        # 파일 저장
+                        print("파일 저장 중...")
+                        with self.stage("refresh_save"):
+                            backend.save()
+                    refreshed = True
                     
                     print("Excel 매크로 자동화 완료")
                     
@@ -1096,6 +1330,17 @@ class MonthlyRebalancingScheduler:
                 except Exception as e:
                     print(f"Excel 매크로 자동화 실패: {e}")
                     return False
+                finally:
+                    # Excel 닫기 (세션은 풀에 반납 - 실패한 세션은 재시작)
+                    try:
+                        if backend is not None:
+                            backend.close()
+                    finally:
+                        if session is not None:
+                            self.session_pool.release(session, failed=not refreshed)
+                        if not refreshed and refresh_record.status == "running":
+                            refresh_record.status = "failed"
+                        refresh_stage.close()
             
             print(f"Excel 파일 처리 완료: {filename}")
             return True
@@ -1103,30 +1348,96 @@ class MonthlyRebalancingScheduler:
         except Exception as e:
             print(f"Excel 파일 열기 중 오류 발생: {e}")
             return False
+
+    def date_cell_values(self, target_date):
+        """대상 날짜의 B5(기본 1년 전, full_year_fetch=False면 가장 긴 창 + 여유 개월의 월초), B6(대상일) 셀 값 (YYYYMMDD)"""
+        b5_date = fetch_start_date(target_date, self.parameters, self.fetch_margin_months, self.full_year_fetch)
+        return b5_date.strftime('%Y%m%d'), target_date.strftime('%Y%m%d')
     
-    def run_analysis(self, filename, use_market_cap=True):
-        """업데이트된 파일로 분석 실행"""
+    def fetch_window_description(self):
+        """B5 계산 방식 설명 (출력용)"""
+        if self.full_year_fetch:
+            return "B6 기준 1년 전"
+        return f"가장 긴 창 {self.parameters.longest_window_months()}개월 + 여유 {self.fetch_margin_months}개월의 월초"
+
+    def raw_data_files(self):
+        """base_directory의 raw_data 파일 {날짜: 파일명} (백업 등 이름이 다른 파일 제외)"""
+        files = {}
+        if not os.path.isdir(self.base_directory):
+            return files
+        for name in os.listdir(self.base_directory):
+            if not (name.startswith(self.file_prefix) and name.endswith('.xlsx')):
+                continue
+            date_str = name[len(self.file_prefix):-len('.xlsx')]
+            try:
+                files[datetime.strptime(date_str, '%Y%m%d')] = name
+            except ValueError:
+                continue
+        return files
+
+    def ingest_history(self, store=None):
+        """base_directory의 raw_data 파일을 날짜 순서대로 이력 저장소에 추가 → 추가한 스냅샷 수 (실패 시 None)"""
+        return history_runner.ingest_history(self, store)
+    
+    def run_history_backtest(self, use_market_cap=True, start_date=None, end_date=None, store=None, price_panel=None):
+        """이력 저장소의 전체 기간 최신 값으로 월말 리밸런싱 백테스트 (raw_data 파일을 다시 파싱하지 않음)"""
+        return history_runner.run_history_backtest(self, use_market_cap, start_date, end_date, store, price_panel)
+    
+    def get_result_filename(self, filename, use_market_cap=True):
+        """raw_data 파일명에 대응하는 결과 파일명"""
+        date_str = filename.replace(self.file_prefix, '').replace('.xlsx', '')
+        if use_market_cap:
+            return f"{self.result_prefix}{date_str}.xlsx"
+        return f"{self.result_prefix}ff_{date_str}.xlsx"
+    
+    def get_backtest_filename(self, filename, use_market_cap=True):
+        """raw_data 파일명에 대응하는 백테스트 결과 파일명"""
+        date_str = filename.replace(self.file_prefix, '').replace('.xlsx', '')
+        if use_market_cap:
+            return f"{self.result_prefix}backtest_{date_str}.xlsx"
+        return f"{self.result_prefix}backtest_ff_{date_str}.xlsx"
+    
+    def run_backtest(self, filename, use_market_cap=True, start_date=None, end_date=None, price_panel=None):
+        """여러 해 기간의 raw_data 파일로 월말 리밸런싱 백테스트 실행 (price_panel이 없으면 시가총액 근사지수)"""
+        return backtest_runner.run_backtest_file(self, filename, use_market_cap, start_date, end_date, price_panel)
+    
+    def run_analysis(self, filename, use_market_cap=True, both_cap_types=False, source_reader=None):
+        """업데이트된 파일로 분석 실행 (both_cap_types: 두 결과를 한 번에 생성, source_reader: 파일 대신 읽을 시트 값)"""
         try:
             input_file = os.path.join(self.base_directory, filename)
             
             # 결과 파일명 생성
-            date_str = filename.replace(self.file_prefix, '').replace('.xlsx', '')
-            if use_market_cap:
-                result_filename = f"{self.result_prefix}{date_str}.xlsx"
+            if both_cap_types:
+                result_filenames = [self.get_result_filename(filename, True), self.get_result_filename(filename, False)]
+                cap_type_name = "시가총액 + 유동시가총액"
             else:
-                result_filename = f"{self.result_prefix}ff_{date_str}.xlsx"
-            output_file = os.path.join(self.base_directory, result_filename)
+                result_filenames = [self.get_result_filename(filename, use_market_cap)]
+                cap_type_name = "시가총액" if use_market_cap else "유동시가총액"
+            output_files = [os.path.join(self.base_directory, result_filename) for result_filename in result_filenames]
             
             print(f"분석 시작: {filename}")
-            print(f"사용 데이터: {'시가총액' if use_market_cap else '유동시가총액'}")
-            print(f"결과 파일: {result_filename}")
+            print(f"사용 데이터: {cap_type_name}")
+            print(f"결과 파일: {', '.join(result_filenames)}")
             
             # DeepSearch 시스템 실행
-            system = DeepSearchForeignBuyingTop20IndexSystem(input_file, output_file)
-            success = system.run_full_stock_system(use_market_cap)
+            system = DeepSearchForeignBuyingTop20IndexSystem(input_file, output_files[0], self.reader_engine, self.use_cache,
+                                                             incremental=self.incremental,
+                                                             parse_workers=self.parse_workers,
+                                                             run_report=self.run_report,
+                                                             trace_memory=self.trace_memory,
+                                                             report_logger=self.report_logger,
+                                                             parameters=self.parameters,
+                                                             source_reader=source_reader)
+            with self.stage("analysis") as record:
+                if both_cap_types:
+                    success = system.run_dual_cap_system(output_files[1])
+                else:
+                    success = system.run_full_stock_system(use_market_cap)
+                if not success:
+                    record.status = "failed"
             
             if success:
-                print(f"분석 완료: {result_filename}")
+                print(f"분석 완료: {', '.join(result_filenames)}")
                 return True
             else:
                 print(f"분석 실패: {filename}")
@@ -1162,16 +1473,22 @@ def main():
         print("\n2. 시가총액 타입을 선택하세요:")
         print("   1) 시가총액 사용")
         print("   2) 유동시가총액 사용")
-        cap_choice = input("선택 (1 또는 2): ").strip()
+        print("   3) 둘 다 사용 (한 번의 분석으로 두 결과 파일 생성)")
+        cap_choice = input("선택 (1, 2 또는 3): ").strip()
         
+        both_cap_types = False
         if cap_choice == "1":
             use_market_cap = True
             cap_type_name = "시가총액"
         elif cap_choice == "2":
             use_market_cap = False
             cap_type_name = "유동시가총액"
+        elif cap_choice == "3":
+            use_market_cap = True
+            both_cap_types = True
+            cap_type_name = "시가총액 + 유동시가총액"
         else:
-            print("잘못된 선택입니다. 1 또는 2를 입력해주세요.")
+            print("잘못된 선택입니다. 1, 2 또는 3을 입력해주세요.")
             return
         
         # 3. 작업 방식 선택
@@ -1188,6 +1505,17 @@ def main():
             new_date_input = input("새 파일 날짜: ").strip()
             new_date = datetime.strptime(new_date_input, '%Y-%m-%d')
             create_new_file = True
+            
+            # 데이터 받기 구간 (기본: 전체 1년, 선택: 분석에 필요한 구간만)
+            print("\n데이터 받기 구간을 선택하세요 (Enter: 1):")
+            print("   1) 전체 1년")
+            print(f"   2) 분석에 필요한 구간만 (가장 긴 창 {scheduler.parameters.longest_window_months()}개월 + "
+                  f"여유 {scheduler.fetch_margin_months}개월의 월초, 유효 데이터 개수가 줄어 선정이 달라질 수 있음)")
+            fetch_choice = input("선택 (1 또는 2): ").strip()
+            if fetch_choice not in ("", "1", "2"):
+                print("잘못된 선택입니다. 1 또는 2를 입력해주세요.")
+                return
+            scheduler.full_year_fetch = fetch_choice != "2"
         elif choice == "2":
             # 기존 파일 사용 모드
             print("\n기존 파일 사용 모드:")
@@ -1210,11 +1538,9 @@ def main():
         print(f"   대상 파일 날짜: {new_date_input}")
         print(f"   B6 셀 값 (자동 변환): {b6_value_input}")
         
-        # B5 셀 값은 B6 기준으로 1년 전 날짜 자동 계산
-        b6_date = datetime.strptime(b6_value_input, '%Y%m%d')
-        b5_date = b6_date - timedelta(days=365)  # 1년 전
-        b5_value_input = b5_date.strftime('%Y%m%d')
-        print(f"   B5 셀 값 (자동 계산): {b5_value_input} (B6 기준 1년 전)")
+        # B5 셀 값은 B6 기준으로 가장 긴 창 + 여유 개월 (또는 1년 전) 자동 계산
+        b5_value_input, _ = scheduler.date_cell_values(new_date)
+        print(f"   B5 셀 값 (자동 계산): {b5_value_input} ({scheduler.fetch_window_description()})")
         
         # 날짜 파싱
         existing_date = datetime.strptime(existing_date_input, '%Y-%m-%d')
@@ -1239,6 +1565,15 @@ def main():
     # 리밸런싱 프로세스 시작
     start_time = time.time()
     new_filename = None  # 새로 생성된 파일명 추적
+    # 결과 파일명 (실행 보고서도 첫 번째 결과 파일 옆에 저장)
+    target_filename = f"{scheduler.file_prefix}{new_date.strftime('%Y%m%d')}.xlsx"
+    if both_cap_types:
+        result_filenames = [scheduler.get_result_filename(target_filename, True), scheduler.get_result_filename(target_filename, False)]
+    else:
+        result_filenames = [scheduler.get_result_filename(target_filename, use_market_cap)]
+    scheduler.start_run_report(existing_date=existing_date.strftime('%Y-%m-%d'), target_date=new_date.strftime('%Y-%m-%d'),
+                               cap_type=cap_type_name, create_new_file=create_new_file,
+                               b5=b5_value_input, b6=b6_value_input, outputs=result_filenames)
     
     try:
         if create_new_file:
@@ -1298,28 +1633,40 @@ def main():
             print("기존 파일 사용 모드: 날짜 업데이트 건너뜀")
         
         # 4. Excel 파일 열기 및 Quantiwise refresh (새 파일 생성 모드에서만)
+        # refresh가 끝나면 저장한 파일을 다시 읽지 않고 실행 중인 통합 문서 값으로 바로 분석 (저장은 백그라운드)
+        analysis_results = []
+        
+        def analyze_live(live_reader):
+            print("데이터 분석 실행 중 (실행 중인 Excel 통합 문서 값 사용)...")
+            analysis_results.append(scheduler.run_analysis(new_filename, use_market_cap, both_cap_types, live_reader))
+        
         if create_new_file:
             print("Excel 파일 열기 및 데이터 새로고침 중...")
-            if not scheduler.open_excel_and_refresh_data(new_filename, "macro"):
+            if not scheduler.open_excel_and_refresh_data(new_filename, "macro", analyze_live):
                 raise Exception("Excel 파일 refresh 실패")
         else:
             print("기존 파일 사용 모드: Excel refresh 건너뜀")
         
-        # 5. 분석 실행
-        print("데이터 분석 실행 중...")
-        if not scheduler.run_analysis(new_filename, use_market_cap):
+        # 5. 분석 실행 (refresh 중에 분석하지 않은 경우 파일로 분석)
+        if not analysis_results:
+            print("데이터 분석 실행 중...")
+            analysis_results.append(scheduler.run_analysis(new_filename, use_market_cap, both_cap_types))
+        if not analysis_results[0]:
             raise Exception("데이터 분석 실패")
         
         # 6. 완료 메시지
         end_time = time.time()
         execution_time = end_time - start_time
+        report_paths = scheduler.finish_run_report(True, result_filenames)
         
         print("=" * 80)
         print("DeepSearch 외인수급Top20 지수 매달 리밸런싱 완료!")
         print(f"- 기존 파일: {existing_filename}")
         print(f"- 새 파일: {new_filename}")
-        print(f"- 결과 파일: {scheduler.result_prefix}{new_date.strftime('%Y%m%d')}.xlsx")
+        print(f"- 결과 파일: {', '.join(result_filenames)}")
         print(f"- 실행 시간: {execution_time:.2f}초")
+        if report_paths:
+            print(f"- 실행 보고서: {', '.join(report_paths)}")
         print("=" * 80)
         
     except Exception as e:
@@ -1334,6 +1681,9 @@ def main():
                 print(f"파일 삭제 중 오류 발생: {cleanup_error}")
         
         print(f"리밸런싱 프로세스 실패: {e}")
+        report_paths = scheduler.finish_run_report(False, result_filenames)
+        if report_paths:
+            print(f"실행 보고서: {', '.join(report_paths)}")
         print("=" * 80)
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+"""
+파싱된 패널 디스크 캐시
+
+raw_data 워크북의 내용 해시(SHA-256)와 파서 버전을 키로 eps/foreign/cap 패널을
+.npz 파일로 저장해 두고, 같은 파일을 다시 분석할 때는 openpyxl 없이 바로 불러온다.
+캐시 전체 크기가 상한을 넘으면 가장 오래 사용하지 않은 항목부터 삭제한다.
+"""
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from panel_data import PanelData
+
+DEFAULT_CACHE_DIRNAME = ".panel_cache"
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """파일 내용의 SHA-256 해시"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def projection_key(stock_codes):
+    """열 선택 로드 조건의 캐시 키 (전체 열이면 'all')"""
+    if stock_codes is None:
+        return "all"
+    joined = "\n".join(sorted(set(stock_codes)))
+    return hashlib.sha256(joined.encode('utf-8')).hexdigest()[:16]
+
+
+def write_atomic(path, write):
+    """임시 파일에 기록한 뒤 교체 (중간에 실패해도 기존 파일 유지)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as file:
+            write(file)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class PanelCache:
+    """워크북 내용 해시 + 파서 버전 기반 패널 캐시"""
+
+    def __init__(self, cache_directory, parser_version, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.cache_directory = cache_directory
+        self.parser_version = parser_version
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def for_source(cls, source_excel_path, parser_version, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        """raw_data 파일과 같은 폴더(excel_data/) 아래의 기본 캐시"""
+        directory = os.path.join(os.path.dirname(os.path.abspath(source_excel_path)), DEFAULT_CACHE_DIRNAME)
+        return cls(directory, parser_version, max_bytes)
+
+    def _key(self, digest, *parts):
+        key_source = "|".join([digest, f"v{self.parser_version}", *[str(part) for part in parts]])
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()[:40]
+
+    def _path(self, key, extension):
+        return os.path.join(self.cache_directory, f"{key}{extension}")
+
+    @staticmethod
+    def _touch(path):
+        # 최근 사용 시각 갱신 (LRU 삭제 기준)
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def load_sheetnames(self, digest):
+        """워크북 시트 이름 목록 (캐시에 없으면 None)"""
+        path = self._path(self._key(digest, "sheetnames"), ".json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                sheetnames = json.load(file)
+        except (OSError, ValueError):
+            return None
+        self._touch(path)
+        return sheetnames
+
+    def store_sheetnames(self, digest, sheetnames):
+        path = self._path(self._key(digest, "sheetnames"), ".json")
+        payload = json.dumps(list(sheetnames), ensure_ascii=False).encode('utf-8')
+        write_atomic(path, lambda file: file.write(payload))
+
+    def load_panel(self, digest, sheet_name, data_type, projection="all"):
+        """캐시된 (패널, 시트 전체 종목 수) - 없거나 손상된 경우 None"""
+        path = self._path(self._key(digest, sheet_name, data_type, projection), ".npz")
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                panel = PanelData(archive['dates'], archive['values'], archive['codes'].tolist(),
+                                  archive['names'].tolist(), str(archive['data_type']))
+                total_stock_count = int(archive['total_stock_count'])
+        except (OSError, ValueError, KeyError):
+            return None
+        self._touch(path)
+        return panel, total_stock_count
+
+    def store_panel(self, digest, sheet_name, data_type, panel, total_stock_count=None, projection="all"):
+        """패널 저장 후 캐시 크기 상한 적용"""
+        path = self._path(self._key(digest, sheet_name, data_type, projection), ".npz")
+        if total_stock_count is None:
+            total_stock_count = panel.n_stocks
+        write_atomic(path, lambda file: np.savez(
+            file,
+            dates=panel.dates,
+            values=panel.values,
+            codes=np.array(panel.codes, dtype=str),
+            names=np.array(panel.names, dtype=str),
+            data_type=np.array(data_type),
+            total_stock_count=np.array(total_stock_count)
+        ))
+        self.evict()
+
+    def evict(self):
+        """캐시 전체 크기가 상한을 넘으면 오래 사용하지 않은 파일부터 삭제"""
+        if not os.path.isdir(self.cache_directory):
+            return 0
+        entries = []
+        for entry in os.scandir(self.cache_directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total_bytes -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
@@ -0,0 +1,143 @@
+"""
+날짜×종목 패널 데이터 구조
+
+종목별 dict-of-lists 대신 공유 날짜축(datetime64) 하나와 값 행렬(빈 셀은 NaN),
+종목코드 → 열 인덱스 매핑으로 시계열 데이터를 보관한다.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from scoring_kernel import MonthCalendar
+
+
+class PanelData:
+    """날짜×종목 패널 (dates: [날짜], values: [날짜, 종목], codes: [종목])"""
+
+    def __init__(self, dates, values, codes, names=None, data_type=None):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.values = np.asarray(values, dtype=np.float64).reshape(len(self.dates), len(codes))
+        self.codes = list(codes)
+        self.names = list(names) if names is not None else [f"종목_{code}" for code in self.codes]
+        self.data_type = data_type
+        # 중복 종목코드는 뒤쪽 열이 우선 (기존 dict 덮어쓰기와 동일)
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+        self._valid_counts = None
+        self._last_valid_rows = None
+        self._calendar = None
+
+    @property
+    def n_dates(self):
+        return self.values.shape[0]
+
+    @property
+    def n_stocks(self):
+        return self.values.shape[1]
+
+    @property
+    def valid_counts(self):
+        """종목별 유효(비어 있지 않은) 데이터 개수"""
+        if self._valid_counts is None:
+            self._valid_counts = np.count_nonzero(~np.isnan(self.values), axis=0)
+        return self._valid_counts
+
+    @property
+    def last_valid_rows(self):
+        """종목별 마지막 유효 데이터 행 (유효 데이터가 없으면 -1)"""
+        if self._last_valid_rows is None:
+            valid = ~np.isnan(self.values)
+            if self.n_dates == 0:
+                self._last_valid_rows = np.full(self.n_stocks, -1)
+                return self._last_valid_rows
+            last_rows = self.n_dates - 1 - np.argmax(valid[::-1], axis=0)
+            self._last_valid_rows = np.where(valid.any(axis=0), last_rows, -1)
+        return self._last_valid_rows
+
+    @property
+    def calendar(self):
+        """날짜축의 월 경계 인덱스 (패널당 한 번만 생성)"""
+        if self._calendar is None:
+            self._calendar = MonthCalendar(self.dates)
+        return self._calendar
+
+    def __len__(self):
+        # 기존 dict 형식과 동일하게 유효 데이터가 있는 종목 수
+        return len(self.stock_columns())
+
+    def __contains__(self, stock_code):
+        return stock_code in self.code_index
+
+    def stock_columns(self):
+        """유효 데이터가 있는 종목의 열 인덱스 (열 순서 유지, 중복 코드는 한 번만)"""
+        counts = self.valid_counts
+        return [i for i, code in enumerate(self.codes)
+                if counts[i] > 0 and self.code_index[code] == i]
+
+    def name_of(self, stock_code):
+        """종목명 조회"""
+        column = self.code_index.get(stock_code)
+        if column is None:
+            return f"종목_{stock_code}"
+        return self.names[column]
+
+    def valid_count_of(self, stock_code):
+        """종목의 유효 데이터 개수 (종목이 없으면 0)"""
+        column = self.code_index.get(stock_code)
+        return 0 if column is None else int(self.valid_counts[column])
+
+    def series(self, stock_code):
+        """종목의 유효 데이터만 (값 배열, datetime64 날짜 배열)로 반환"""
+        column = self.values[:, self.code_index[stock_code]]
+        mask = ~np.isnan(column)
+        return column[mask], self.dates[mask]
+
+    def select_columns(self, stock_codes):
+        """지정한 종목들만 담은 패널 생성 (없는 종목은 제외)"""
+        columns = [self.code_index[code] for code in stock_codes if code in self.code_index]
+        return PanelData(self.dates, self.values[:, columns],
+                         [self.codes[i] for i in columns], [self.names[i] for i in columns],
+                         self.data_type)
+
+    def to_stock_dict(self):
+        """기존 종목별 dict 형식 {code: {'name', 'values', 'dates', 'valid_indices'}}으로 변환"""
+        data = {}
+        date_list = self.dates.astype('datetime64[us]').astype(datetime)
+        for column in self.stock_columns():
+            column_values = self.values[:, column]
+            valid_indices = np.flatnonzero(~np.isnan(column_values))
+            data[self.codes[column]] = {
+                'name': self.names[column],
+                'values': column_values[valid_indices],
+                'dates': [date_list[i] for i in valid_indices],
+                'valid_indices': valid_indices.tolist()
+            }
+        return data
+
+    @classmethod
+    def from_stock_dict(cls, data, data_type=None):
+        """기존 종목별 dict 형식을 패널로 변환 (날짜 합집합을 공유 날짜축으로 사용)"""
+        all_dates = set()
+        for stock in data.values():
+            all_dates.update(np.datetime64(date, 'D') for date in stock.get('dates', []))
+        dates = np.array(sorted(all_dates), dtype='datetime64[D]')
+
+        codes = list(data.keys())
+        values = np.full((len(dates), len(codes)), np.nan)
+        for column, code in enumerate(codes):
+            stock_dates = np.array([np.datetime64(date, 'D') for date in data[code].get('dates', [])],
+                                   dtype='datetime64[D]')
+            stock_values = np.asarray(data[code].get('values', []), dtype=np.float64)
+            count = min(len(stock_dates), len(stock_values))
+            rows = np.searchsorted(dates, stock_dates[:count])
+            values[rows, column] = stock_values[:count]
+
+        names = [data[code].get('name', f"종목_{code}") for code in codes]
+        return cls(dates, values, codes, names, data_type)
+
+
+def as_panel(data, data_type=None):
+    """PanelData 또는 기존 종목별 dict를 PanelData로 통일"""
+    if data is None or isinstance(data, PanelData):
+        return data
+    return PanelData.from_stock_dict(data, data_type)
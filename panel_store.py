@@ -0,0 +1,107 @@
+"""
+시트별 누적 패널 저장소
+
+매달 받는 raw_data 파일은 1년 구간(B5 ~ B6) 중 대부분이 지난달 파일과 같은 행이다.
+raw_data 계열(파일명에서 날짜를 뺀 부분)과 시트(eps/foreign/시가총액)별로 지금까지 받은
+전체 날짜×종목 패널을 누적 보관하고, 새 파일은 겹치는 기간이 저장 값과 같을 때만 이후 행을 덧붙인다.
+
+파일 내용 해시 기반의 PanelCache와 달리 파일이 바뀌어도 유지되는 저장소이다.
+"""
+
+import os
+import re
+import hashlib
+
+import numpy as np
+
+from panel_data import PanelData
+from panel_cache import write_atomic
+
+DEFAULT_STORE_DIRNAME = ".panel_store"
+
+
+class PanelStore:
+    """시트별 누적 패널 저장소 (날짜 합집합 × 종목코드 합집합)"""
+
+    def __init__(self, store_directory, series=""):
+        self.store_directory = store_directory
+        # raw_data 계열 이름 (다른 계열 파일의 패널은 따로 누적)
+        self.series = series
+
+    @classmethod
+    def for_source(cls, source_excel_path):
+        """raw_data 파일과 같은 폴더(excel_data/) 아래의 기본 저장소 (파일명의 _YYYYMMDD 앞부분이 계열 이름)"""
+        source_excel_path = os.path.abspath(source_excel_path)
+        series = re.sub(r'_\d{8}$', '', os.path.splitext(os.path.basename(source_excel_path))[0])
+        return cls(os.path.join(os.path.dirname(source_excel_path), DEFAULT_STORE_DIRNAME), series)
+
+    def _path(self, sheet_name, data_type):
+        key = hashlib.sha256(f"{self.series}|{sheet_name}|{data_type}".encode('utf-8')).hexdigest()[:24]
+        return os.path.join(self.store_directory, f"{data_type}_{key}.npz")
+
+    def load(self, sheet_name, data_type):
+        """누적 패널 (없거나 손상된 경우 None)"""
+        path = self._path(sheet_name, data_type)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                return PanelData(archive['dates'], archive['values'], archive['codes'].tolist(),
+                                 archive['names'].tolist(), data_type)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, sheet_name, data_type, panel):
+        write_atomic(self._path(sheet_name, data_type), lambda file: np.savez(
+            file,
+            dates=panel.dates,
+            values=panel.values,
+            codes=np.array(panel.codes, dtype=str),
+            names=np.array(panel.names, dtype=str)
+        ))
+
+    @staticmethod
+    def upsert(history, panel, replace_dates=False):
+        """누적 패널에 새 패널 값을 덮어써서 합친 패널 반환
+
+        - 날짜/종목코드는 합집합 (새 종목은 뒤쪽 열로 추가, 없는 기간은 NaN)
+        - panel의 날짜×종목 칸은 panel 값으로 교체
+        - replace_dates: True면 panel 기간 안의 기존 행은 버리고 panel 행만 사용 (전체 재파싱 시)
+        """
+        if history is None:
+            return PanelData(panel.dates, panel.values, panel.codes, panel.names, panel.data_type)
+
+        history_dates = history.dates
+        history_values = history.values
+        if replace_dates and panel.n_dates:
+            keep = (history_dates < panel.dates[0]) | (history_dates > panel.dates[-1])
+            history_dates = history_dates[keep]
+            history_values = history_values[keep]
+
+        codes = list(history.codes)
+        names = list(history.names)
+        code_index = dict(history.code_index)
+        for code, name in zip(panel.codes, panel.names):
+            if code in code_index:
+                # 종목명은 최신 파일 기준
+                names[code_index[code]] = name
+            else:
+                code_index[code] = len(codes)
+                codes.append(code)
+                names.append(name)
+
+        dates = np.union1d(history_dates, panel.dates)
+        values = np.full((len(dates), len(codes)), np.nan)
+        values[np.searchsorted(dates, history_dates)[:, None], np.arange(history.n_stocks)[None, :]] = history_values
+        panel_columns = np.array([code_index[code] for code in panel.codes], dtype=np.int64)
+        values[np.searchsorted(dates, panel.dates)[:, None], panel_columns[None, :]] = panel.values
+        return PanelData(dates, values, codes, names, panel.data_type)
+
+    @staticmethod
+    def window(history, first_date, last_date, codes, names):
+        """누적 패널에서 [first_date, last_date] 기간, 지정 종목 순서의 패널 추출"""
+        start_row = np.searchsorted(history.dates, np.datetime64(first_date, 'D'), side='left')
+        end_row = np.searchsorted(history.dates, np.datetime64(last_date, 'D'), side='right')
+        columns = [history.code_index[code] for code in codes]
+        return PanelData(history.dates[start_row:end_row], history.values[start_row:end_row][:, columns],
+                         codes, names, history.data_type)
@@ -0,0 +1,127 @@
+"""
+시트 병렬 파싱
+
+eps / foreign / 시가총액 시트는 서로 독립이므로 시트마다 별도 프로세스에서 파싱한다.
+워커는 파싱한 날짜축과 값 행렬을 작업 폴더의 .npy 파일로 기록하고, 부모 프로세스에는
+파일 경로와 종목코드/종목명, 파싱 로그만 돌려준다 (값 행렬은 pickle로 주고받지 않음).
+부모는 .npy 파일을 memory-map으로 열어 복사 없이 패널을 만들므로, 작업 폴더는 패널을 다 쓴 뒤 지운다.
+"""
+
+import io
+import os
+import time
+import shutil
+import zipfile
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from panel_data import PanelData
+from raw_data_reader import XmlIterparseReader
+
+# 측정값 (실제 raw_data 시트 기준): 시트 XML 1MB(압축 해제 기준) 파싱 약 0.05초,
+# 워커 프로세스 시작(모듈 import 포함) 약 0.3초 - 병렬로 줄어드는 파싱 시간이 시작 비용보다 클 때만 병렬 파싱
+PARSE_SECONDS_PER_SHEET_MB = 0.05
+WORKER_START_SECONDS = 0.3
+
+WORK_DIRECTORY_PREFIX = "panel_parse_"
+# 이전 실행에서 지우지 못한 작업 폴더 정리 기준 (Windows는 매핑 중인 파일을 지울 수 없음)
+STALE_WORK_DIRECTORY_SECONDS = 24 * 60 * 60
+
+
+def sheet_xml_sizes(source_excel_path, sheet_names):
+    """시트별 XML 크기 (압축 해제 기준 바이트) - 파싱 시간은 압축된 파일 크기보다 이 크기에 비례"""
+    with XmlIterparseReader(source_excel_path) as reader:
+        return [reader.archive.getinfo(reader.sheet_parts[sheet_name]).file_size for sheet_name in sheet_names]
+
+
+def default_worker_count(job_count, source_excel_path=None, sheet_names=None):
+    """작업 수와 CPU 코어 수 중 작은 값 (시트 크기로 보아 병렬 이득이 없으면 1 = 순차 파싱)"""
+    workers = max(1, min(job_count, os.cpu_count() or 1))
+    if workers <= 1 or source_excel_path is None or not sheet_names:
+        return workers
+    try:
+        sizes = sorted(sheet_xml_sizes(source_excel_path, sheet_names), reverse=True)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return 1
+    # 병렬이면 가장 큰 시트를 파싱하는 동안 나머지 시트도 끝나므로 나머지 시트 파싱 시간만큼 줄어듦
+    saved_seconds = sum(sizes[1:]) / (1024 * 1024) * PARSE_SECONDS_PER_SHEET_MB
+    return workers if saved_seconds > WORKER_START_SECONDS else 1
+
+
+def create_work_directory():
+    """병렬 파싱 작업 폴더 생성 (이전 실행에서 남은 오래된 작업 폴더는 정리)"""
+    temp_root = tempfile.gettempdir()
+    now = time.time()
+    try:
+        for entry in os.scandir(temp_root):
+            if entry.name.startswith(WORK_DIRECTORY_PREFIX) and entry.is_dir() \
+                    and now - entry.stat().st_mtime > STALE_WORK_DIRECTORY_SECONDS:
+                shutil.rmtree(entry.path, ignore_errors=True)
+    except OSError:
+        pass
+    return tempfile.mkdtemp(prefix=WORK_DIRECTORY_PREFIX)
+
+
+def remove_work_directory(work_directory):
+    """작업 폴더 삭제 (매핑 중인 파일이 있어 지우지 못하면 다음 실행에서 정리)"""
+    shutil.rmtree(work_directory, ignore_errors=True)
+
+
+def _parse_sheet_worker(source_excel_path, reader_engine, incremental, sheet_name, data_type, output_prefix,
+                        stock_codes=None):
+    """워커 프로세스: 시트 하나를 파싱해 날짜축/값 행렬을 .npy 파일로 기록
+
+    stock_codes: 지정하면 해당 종목 열만 로드 (열 선택 로드)
+    반환: (종목코드, 종목명, 전체 종목 수, 파싱 로그) - 파싱 실패 시 종목코드는 None
+    """
+    # 부모 모듈과의 순환 import를 피하기 위해 워커 안에서 import
+    from monthly_rebalancing_scheduler import DeepSearchForeignBuyingTop20IndexSystem
+
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        system = DeepSearchForeignBuyingTop20IndexSystem(source_excel_path, None, reader_engine, use_cache=False,
+                                                         incremental=incremental, parse_workers=1)
+        try:
+            panel, total_stock_count = system.parse_data(sheet_name, data_type, stock_codes)
+        finally:
+            system.close_source_excel_file()
+
+    if panel is None:
+        return None, None, 0, log.getvalue()
+    np.save(f"{output_prefix}_dates.npy", panel.dates)
+    np.save(f"{output_prefix}_values.npy", panel.values)
+    return panel.codes, panel.names, total_stock_count, log.getvalue()
+
+
+def parse_sheets_parallel(source_excel_path, reader_engine, jobs, work_directory, max_workers=None,
+                          incremental=False, stock_codes=None):
+    """여러 시트를 프로세스 풀로 동시에 파싱
+
+    jobs: [(시트명, 데이터 종류), ...]
+    work_directory: 값 행렬 .npy 파일을 둘 폴더 (반환된 패널이 memory-map으로 참조하므로 패널을 다 쓴 뒤 삭제)
+    stock_codes: 지정하면 모든 시트에서 해당 종목 열만 로드
+    반환: {(시트명, 데이터 종류): (패널 또는 None, 전체 종목 수, 파싱 로그)} - jobs 순서
+    """
+    max_workers = max_workers or default_worker_count(len(jobs))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for index, (sheet_name, data_type) in enumerate(jobs):
+            output_prefix = os.path.join(work_directory, f"{index}_{data_type}")
+            futures.append((sheet_name, data_type, output_prefix, executor.submit(
+                _parse_sheet_worker, source_excel_path, reader_engine, incremental,
+                sheet_name, data_type, output_prefix, stock_codes)))
+
+        results = {}
+        for sheet_name, data_type, output_prefix, future in futures:
+            codes, names, total_stock_count, log = future.result()
+            panel = None
+            if codes is not None:
+                dates = np.load(f"{output_prefix}_dates.npy")
+                # 값 행렬은 복사하지 않고 읽기 전용 memory-map으로 사용
+                values = np.load(f"{output_prefix}_values.npy", mmap_mode='r')
+                panel = PanelData(dates, values, codes, names, data_type)
+            results[(sheet_name, data_type)] = (panel, total_stock_count, log)
+        return results
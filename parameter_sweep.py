@@ -0,0 +1,112 @@
+"""
+선정 기준값(상위 종목 수, 창 길이) 조합별 구성종목 일괄 계산
+
+한 번 로드한 eps/foreign/시가총액 패널로 SelectionParameters 조합 전체를 평가한다.
+기준일마다 RebalanceWindows가 창 길이별 평균을 한 번만 계산해 두므로 조합이 늘어나도
+추가 비용은 순위 선정(부분 선택)과 비중 계산뿐이다. 받기 구간(B5)이 같은 조합끼리 RebalanceWindows를 공유한다
+(기본 1년 받기는 모든 조합이 같은 구간).
+
+결과는 조합 × 기준일 × 구성종목 한 행씩인 표(records)와 조합 × 기준일 요약(summaries)이다.
+
+사용 예:
+    engine = BacktestEngine(eps_data, foreign_data, market_cap_data)
+    grid = parameter_grid(eps_top_k=[50, 100, 150], intensity_top_k=[30, 50], flow_top_k=[5, 10])
+    result = ParameterSweep(engine).run(grid)
+"""
+
+from result_excel_writer import StreamingResultWriter, SCORE_FORMAT, INTENSITY_FORMAT
+from selection_parameters import SelectionParameters
+
+
+class SweepResult:
+    """기준값 조합별 구성종목/비중 표"""
+
+    RECORD_HEADERS = ["조합번호"] + list(SelectionParameters.FIELDS) + [
+        "기준일", "순위", "종목코드", "종목명", "최종비중", "선정횟수",
+        "단기순위", "장기순위", "단기점수", "장기점수", "EPS점수", "수급강도지표"]
+
+    def __init__(self, parameter_sets):
+        self.parameter_sets = list(parameter_sets)
+        self.rebalance_dates = []
+        self.records = []
+        self.summaries = []
+
+    def add(self, set_index, rebalance_date, constituents, summary):
+        parameters = self.parameter_sets[set_index].to_dict()
+        for rank, data in enumerate(constituents, 1):
+            record = {'set_index': set_index, 'rebalance_date': rebalance_date, 'rank': rank}
+            record.update(parameters)
+            record.update(data)
+            self.records.append(record)
+        self.summaries.append(dict(summary, set_index=set_index, rebalance_date=rebalance_date, **parameters))
+
+    def constituents(self, parameters, rebalance_date=None):
+        """조합(SelectionParameters 또는 조합번호)의 구성종목 레코드 (기준일 미지정 시 마지막 기준일)"""
+        set_index = parameters if isinstance(parameters, int) else self.parameter_sets.index(parameters)
+        rebalance_date = rebalance_date or self.rebalance_dates[-1]
+        return [record for record in self.records
+                if record['set_index'] == set_index and record['rebalance_date'] == rebalance_date]
+
+    def weights(self, parameters, rebalance_date=None):
+        """조합의 {종목코드: 최종비중}"""
+        return {record['code']: record['final_weight'] for record in self.constituents(parameters, rebalance_date)}
+
+    def record_rows(self):
+        for record in self.records:
+            yield ([record['set_index']] + [record[field] for field in SelectionParameters.FIELDS] +
+                   [record['rebalance_date'].strftime('%Y-%m-%d'), record['rank'], record['code'], record['name'],
+                    record['final_weight'], record['selection_count'],
+                    record['one_month_rank'] or "-", record['two_month_rank'] or "-",
+                    record['one_month_score'], record['two_month_score'],
+                    record['eps_score'], record['intensity_score']])
+
+    def save_excel(self, output_path):
+        """조합별 구성종목/요약 시트를 가진 결과 엑셀 저장"""
+        offset = 1 + len(SelectionParameters.FIELDS)
+        writer = StreamingResultWriter()
+        writer.add_sheet("조합별구성종목", self.RECORD_HEADERS, self.record_rows(),
+                         {offset + 4: SCORE_FORMAT, offset + 8: INTENSITY_FORMAT, offset + 9: INTENSITY_FORMAT,
+                          offset + 10: SCORE_FORMAT, offset + 11: INTENSITY_FORMAT})
+        writer.add_sheet(
+            "조합별요약",
+            ["조합번호"] + list(SelectionParameters.FIELDS) + [
+                "기준일", "EPS 계산 종목 수", "EPS 필터 통과 종목 수", "최종 선정 종목 수",
+                "단기 상위 종목 수", "장기 상위 종목 수", "최종 비중 계산 종목 수"],
+            ([summary['set_index']] + [summary[field] for field in SelectionParameters.FIELDS] +
+             [summary['rebalance_date'].strftime('%Y-%m-%d'), summary['eps_count'], summary['eps_selected'],
+              summary['intensity_selected'], summary['one_month_selected'], summary['two_month_selected'],
+              summary['constituent_count']] for summary in self.summaries)
+        )
+        writer.save(output_path)
+
+
+class ParameterSweep:
+    """BacktestEngine 패널로 기준값 조합 전체를 평가"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def default_dates(self):
+        """기본 기준일: 패널 마지막 날짜가 속한 월말 (월간 분석과 같은 기준일)"""
+        return self.engine.rebalance_dates(require_full_lookback=False)[-1:]
+
+    def run(self, parameter_sets, rebalance_dates=None):
+        """조합 × 기준일 전체 평가 → SweepResult (기준일마다 창 평균은 창 길이별 한 번만 계산)"""
+        if rebalance_dates is None:
+            rebalance_dates = self.default_dates()
+        result = SweepResult(parameter_sets)
+        result.rebalance_dates = list(rebalance_dates)
+        # 받기 구간을 가장 긴 창으로 줄인 경우 조합마다 B5가 달라지므로 같은 B5 조합끼리 창을 공유
+        windows_by_start = {}
+        set_windows = []
+        for parameters in result.parameter_sets:
+            fetch_starts = tuple(self.engine.fetch_start(date, parameters) for date in rebalance_dates)
+            if fetch_starts not in windows_by_start:
+                windows_by_start[fetch_starts] = self.engine.as_of_windows(rebalance_dates, parameters)
+            set_windows.append(windows_by_start[fetch_starts])
+        for date_index, rebalance_date in enumerate(rebalance_dates):
+            for set_index, parameters in enumerate(result.parameter_sets):
+                constituents, summary = self.engine.select_constituents(set_windows[set_index][date_index],
+                                                                        parameters)
+                result.add(set_index, rebalance_date, constituents, summary)
+        return result
@@ -0,0 +1,92 @@
+"""
+단계별 순위 엔진
+
+전체 정렬 대신 부분 선택(argpartition)으로 상위 k개를 고르고,
+동점은 원래 순서(앞쪽 우선)로 결정해 기존 sorted(..., reverse=True)와 같은 결과를 낸다.
+종목코드별 순위/통과 여부는 배열과 인덱스로 O(1) 조회한다.
+"""
+
+import numpy as np
+
+
+def _descending_keys(scores):
+    """내림차순 정렬 키 (NaN은 최하위)"""
+    keys = -np.asarray(scores, dtype=np.float64)
+    keys[np.isnan(keys)] = np.inf
+    return keys
+
+
+def top_k_positions(scores, top_k):
+    """점수 상위 k개의 위치를 순위 순서로 반환 (동점은 앞쪽 위치 우선)"""
+    keys = _descending_keys(scores)
+    n = len(keys)
+    top_k = max(0, min(top_k, n))
+    if top_k == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    if top_k < n:
+        # k번째 값 이상인 후보만 남긴 뒤 후보끼리만 정렬 (경계 동점은 모두 후보에 포함)
+        kth_key = np.partition(keys, top_k - 1)[top_k - 1]
+        candidates = np.flatnonzero(keys <= kth_key)
+    else:
+        candidates = np.arange(n)
+
+    ordered = candidates[np.lexsort((candidates, keys[candidates]))]
+    return ordered[:top_k]
+
+
+class StageRanking:
+    """한 선정 단계의 점수 순위 (상위 k개 선정 + 종목별 O(1) 순위 조회)"""
+
+    def __init__(self, codes, scores, top_k):
+        self.codes = list(codes)
+        self.scores = np.asarray(scores, dtype=np.float64)
+        self.top_k = top_k
+        self.code_positions = {code: i for i, code in enumerate(self.codes)}
+
+        self.selected_positions = top_k_positions(self.scores, top_k)
+        # 선정 순위 배열: 선정 종목은 1부터 시작하는 순위, 미선정은 0
+        self.selected_ranks = np.zeros(len(self.codes), dtype=np.int64)
+        self.selected_ranks[self.selected_positions] = np.arange(1, len(self.selected_positions) + 1)
+
+        self._full_order = None
+        self._full_ranks = None
+
+    def __len__(self):
+        return len(self.selected_positions)
+
+    def selected_codes(self):
+        """선정 종목코드 (순위 순서)"""
+        return [self.codes[i] for i in self.selected_positions]
+
+    def is_selected(self, stock_code):
+        """선정(통과) 여부"""
+        position = self.code_positions.get(stock_code)
+        return position is not None and self.selected_ranks[position] > 0
+
+    def selected_rank_of(self, stock_code):
+        """선정 순위 (1부터 시작, 미선정이면 None)"""
+        position = self.code_positions.get(stock_code)
+        if position is None or self.selected_ranks[position] == 0:
+            return None
+        return int(self.selected_ranks[position])
+
+    def full_order(self):
+        """전체 종목 위치를 순위 순서로 반환 (결과 시트 작성 시에만 필요)"""
+        if self._full_order is None:
+            self._full_order = top_k_positions(self.scores, len(self.scores))
+        return self._full_order
+
+    def ordered_codes(self):
+        """전체 종목코드 (순위 순서)"""
+        return [self.codes[i] for i in self.full_order()]
+
+    def rank_of(self, stock_code):
+        """전체 순위 (1부터 시작, 없는 종목이면 None)"""
+        position = self.code_positions.get(stock_code)
+        if position is None:
+            return None
+        if self._full_ranks is None:
+            self._full_ranks = np.empty(len(self.codes), dtype=np.int64)
+            self._full_ranks[self.full_order()] = np.arange(1, len(self.codes) + 1)
+        return int(self._full_ranks[position])
@@ -0,0 +1,352 @@
+"""
+Quantiwise raw_data 워크북 스트리밍 리더
+
+parse_data가 사용하는 시트만 열어서 행 단위로 한 번만 읽어 들이는 리더 엔진.
+- openpyxl: openpyxl read-only 모드의 iter_rows(values_only=True) 사용
+- xml: xlsx(zip) 안의 시트 XML을 직접 iterparse로 스트리밍
+- InMemoryWorkbookReader: refresh 직후 실행 중인 Excel에서 읽어 둔 시트 값(2차원 배열)을 같은 인터페이스로 제공
+"""
+
+import io
+import re
+import zipfile
+import posixpath
+from datetime import datetime, timedelta
+from xml.etree.ElementTree import iterparse
+
+from openpyxl import load_workbook
+
+SPREADSHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_SHEET_DATA_PATTERN = re.compile(rb'<(?:\w+:)?sheetData(?:\s[^>]*)?>')
+_SHEET_DATA_END_PATTERN = re.compile(rb'</(?:\w+:)?sheetData>')
+_ROW_PATTERN = re.compile(rb'<(?:\w+:)?row[\s>/]')
+_ROW_NUMBER_PATTERN = re.compile(rb'<(?:\w+:)?row(?=\s)[^>]*?\sr="(\d+)"')
+
+# 날짜 서식으로 취급되는 Excel 기본 numFmtId
+BUILTIN_DATE_FORMAT_IDS = set(range(14, 23)) | set(range(27, 37)) | {45, 46, 47} | set(range(50, 59))
+
+
+def column_letter_to_index(letters):
+    """열 문자(A, B, ..., AA)를 1부터 시작하는 열 번호로 변환"""
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - 64)
+    return index
+
+
+def excel_serial_to_datetime(serial, date1904=False):
+    """Excel 일련번호를 datetime으로 변환"""
+    if date1904:
+        base = datetime(1904, 1, 1)
+    elif serial < 60:
+        base = datetime(1899, 12, 31)
+    else:
+        base = datetime(1899, 12, 30)
+    return base + timedelta(days=serial)
+
+
+def _is_date_format_code(format_code):
+    """사용자 정의 숫자 서식 문자열이 날짜 서식인지 확인"""
+    # 따옴표 문자열, 대괄호(색상/조건) 제거 후 날짜 토큰 확인
+    cleaned = re.sub(r'"[^"]*"|\[[^\]]*\]|\\.', "", format_code)
+    return bool(re.search(r"[dmyhs]", cleaned, re.IGNORECASE))
+
+
+class RawWorkbookReader:
+    """raw_data 워크북 리더 기본 클래스 (시트 단위 행 스트리밍)"""
+
+    engine_name = None
+    # 파일이 아니라 메모리의 시트 값을 읽는 리더 (파일 기반 병렬 파싱/파싱 캐시 대상 아님)
+    in_memory = False
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def sheetnames(self):
+        raise NotImplementedError
+
+    def iter_rows(self, sheet_name, min_row=1, max_row=None, max_col=None, columns=None):
+        """시트의 행을 min_row부터 순서대로 값 튜플로 반환 (빈 행은 빈 튜플)
+        
+        columns: 값이 필요한 열 번호(0부터) 집합. 지정하면 리더가 나머지 열의 값 변환을 생략할 수 있음 (None 반환)
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class OpenpyxlReadOnlyReader(RawWorkbookReader):
+    """openpyxl read-only 모드 기반 리더"""
+
+    engine_name = "openpyxl"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.workbook = load_workbook(path, read_only=True, data_only=True)
+
+    @property
+    def sheetnames(self):
+        return self.workbook.sheetnames
+
+    def iter_rows(self, sheet_name, min_row=1, max_row=None, max_col=None, columns=None):
+        # openpyxl은 셀 단위 선택을 지원하지 않으므로 columns와 무관하게 전체 값 반환
+        worksheet = self.workbook[sheet_name]
+        for row in worksheet.iter_rows(min_row=min_row, max_row=max_row, max_col=max_col, values_only=True):
+            yield row
+
+    def close(self):
+        if self.workbook is not None:
+            self.workbook.close()
+            self.workbook = None
+
+
+class XmlIterparseReader(RawWorkbookReader):
+    """시트 XML 직접 iterparse 기반 리더 (openpyxl 객체 모델 미사용)"""
+
+    engine_name = "xml"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.archive = zipfile.ZipFile(path)
+        self.date1904 = False
+        self.sheet_parts = self._read_sheet_parts()
+        self._shared_strings = None
+        self._date_styles = None
+        # 마지막으로 읽은 시트 XML (같은 시트를 헤더/열/행 단위로 여러 번 읽을 때 압축 해제 1회)
+        self._part_cache = (None, None)
+
+    @property
+    def sheetnames(self):
+        return list(self.sheet_parts.keys())
+
+    def _read_sheet_parts(self):
+        """workbook.xml과 관계 파일에서 시트명 → 시트 XML 경로 매핑 추출"""
+        targets = {}
+        with self.archive.open("xl/_rels/workbook.xml.rels") as rels_file:
+            for _, element in iterparse(rels_file):
+                if element.tag == f"{PACKAGE_REL_NS}Relationship":
+                    target = element.get("Target")
+                    if target.startswith("/"):
+                        target = target.lstrip("/")
+                    else:
+                        target = posixpath.normpath(posixpath.join("xl", target))
+                    targets[element.get("Id")] = target
+
+        sheet_parts = {}
+        with self.archive.open("xl/workbook.xml") as workbook_file:
+            for _, element in iterparse(workbook_file):
+                if element.tag == f"{SPREADSHEET_NS}workbookPr":
+                    self.date1904 = element.get("date1904") in ("1", "true")
+                elif element.tag == f"{SPREADSHEET_NS}sheet":
+                    relation_id = element.get(f"{RELATIONSHIP_NS}id")
+                    if relation_id in targets:
+                        sheet_parts[element.get("name")] = targets[relation_id]
+        return sheet_parts
+
+    @property
+    def shared_strings(self):
+        """공유 문자열 테이블 (처음 필요할 때 한 번만 로드)"""
+        if self._shared_strings is None:
+            strings = []
+            if "xl/sharedStrings.xml" in self.archive.namelist():
+                with self.archive.open("xl/sharedStrings.xml") as strings_file:
+                    for _, element in iterparse(strings_file):
+                        if element.tag == f"{SPREADSHEET_NS}si":
+                            # 윗주(rPh)는 제외하고 본문(t)과 서식 런(r)의 텍스트만 결합
+                            texts = []
+                            for child in element:
+                                if child.tag == f"{SPREADSHEET_NS}t":
+                                    texts.append(child.text or "")
+                                elif child.tag == f"{SPREADSHEET_NS}r":
+                                    texts.append(child.findtext(f"{SPREADSHEET_NS}t") or "")
+                            strings.append("".join(texts))
+                            element.clear()
+            self._shared_strings = strings
+        return self._shared_strings
+
+    @property
+    def date_styles(self):
+        """날짜 서식이 적용된 셀 스타일 인덱스 집합"""
+        if self._date_styles is None:
+            date_styles = set()
+            if "xl/styles.xml" in self.archive.namelist():
+                custom_date_ids = set()
+                style_index = 0
+                in_cell_xfs = False
+                with self.archive.open("xl/styles.xml") as styles_file:
+                    for event, element in iterparse(styles_file, events=("start", "end")):
+                        if element.tag == f"{SPREADSHEET_NS}cellXfs":
+                            in_cell_xfs = event == "start"
+                        elif event != "end":
+                            continue
+                        elif element.tag == f"{SPREADSHEET_NS}numFmt":
+                            if _is_date_format_code(element.get("formatCode", "")):
+                                custom_date_ids.add(int(element.get("numFmtId")))
+                        elif element.tag == f"{SPREADSHEET_NS}xf" and in_cell_xfs:
+                            number_format_id = int(element.get("numFmtId", 0))
+                            if number_format_id in BUILTIN_DATE_FORMAT_IDS or number_format_id in custom_date_ids:
+                                date_styles.add(style_index)
+                            style_index += 1
+            self._date_styles = date_styles
+        return self._date_styles
+
+    def _cell_value(self, cell):
+        """셀 XML 요소를 파이썬 값으로 변환"""
+        cell_type = cell.get("t", "n")
+        if cell_type == "inlineStr":
+            return "".join(node.text or "" for node in cell.iter(f"{SPREADSHEET_NS}t"))
+
+        raw_value = cell.findtext(f"{SPREADSHEET_NS}v")
+        if raw_value is None:
+            return None
+
+        if cell_type == "n":
+            if "." in raw_value or "E" in raw_value or "e" in raw_value:
+                value = float(raw_value)
+            else:
+                value = int(raw_value)
+            style = cell.get("s")
+            if style is not None and int(style) in self.date_styles:
+                return excel_serial_to_datetime(value, self.date1904)
+            return value
+        if cell_type == "s":
+            return self.shared_strings[int(raw_value)]
+        if cell_type == "b":
+            return raw_value == "1"
+        # str(수식 결과 문자열), e(오류) 등은 문자열 그대로 반환
+        return raw_value
+
+    def _read_part(self, part_name):
+        """시트 XML 전체 바이트 (직전에 읽은 시트는 재사용)"""
+        cached_name, cached_bytes = self._part_cache
+        if cached_name != part_name:
+            cached_bytes = self.archive.read(part_name)
+            self._part_cache = (part_name, cached_bytes)
+        return cached_bytes
+
+    def _open_sheet_from_row(self, part_name, min_row):
+        """min_row 이상 첫 행부터 시작하는 시트 XML 스트림 (앞쪽 행은 XML 파싱 없이 건너뜀)
+
+        sheetData 시작 태그까지의 머리 부분(네임스페이스 선언)은 유지한다.
+        행 번호(r)가 없는 시트는 None을 반환해 전체 스트리밍으로 처리한다.
+        """
+        xml_bytes = self._read_part(part_name)
+        data_tag = _SHEET_DATA_PATTERN.search(xml_bytes)
+        if data_tag is None:
+            return None
+        head = xml_bytes[:data_tag.end()]
+        for match in _ROW_NUMBER_PATTERN.finditer(xml_bytes, data_tag.end()):
+            if int(match.group(1)) >= min_row:
+                return io.BytesIO(head + xml_bytes[match.start():])
+
+        data_end = _SHEET_DATA_END_PATTERN.search(xml_bytes, data_tag.end())
+        if data_end is None:
+            return None
+        if _ROW_PATTERN.search(xml_bytes, data_tag.end(), data_end.start()) \
+                and _ROW_NUMBER_PATTERN.search(xml_bytes, data_tag.end(), data_end.start()) is None:
+            return None
+        # min_row 이후 행이 없으면 빈 sheetData만 남김
+        return io.BytesIO(head + xml_bytes[data_end.start():])
+
+    def iter_rows(self, sheet_name, min_row=1, max_row=None, max_col=None, columns=None):
+        part_name = self.sheet_parts[sheet_name]
+        expected_row = min_row
+        sheet_stream = self._open_sheet_from_row(part_name, min_row) if min_row > 1 else None
+        if sheet_stream is None:
+            sheet_stream = self.archive.open(part_name)
+        with sheet_stream as sheet_file:
+            for _, element in iterparse(sheet_file):
+                if element.tag != f"{SPREADSHEET_NS}row":
+                    continue
+
+                row_number = int(element.get("r", expected_row))
+                if row_number < min_row:
+                    element.clear()
+                    continue
+                if max_row is not None and row_number > max_row:
+                    break
+
+                # 중간에 비어 있는 행은 빈 튜플로 채움
+                while expected_row < row_number:
+                    yield ()
+                    expected_row += 1
+
+                values = []
+                for cell in element.iter(f"{SPREADSHEET_NS}c"):
+                    reference = cell.get("r")
+                    if reference:
+                        column = column_letter_to_index(reference.rstrip("0123456789"))
+                    else:
+                        column = len(values) + 1
+                    if max_col is not None and column > max_col:
+                        break
+                    while len(values) < column - 1:
+                        values.append(None)
+                    if columns is None or column - 1 in columns:
+                        values.append(self._cell_value(cell))
+                    else:
+                        values.append(None)
+
+                element.clear()
+                expected_row = row_number + 1
+                yield tuple(values)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        self._part_cache = (None, None)
+
+
+class InMemoryWorkbookReader(RawWorkbookReader):
+    """메모리의 시트 값 기반 리더
+
+    sheets: {시트명: A1부터의 행 목록} - 행은 값 시퀀스 (빈 셀은 None, 날짜 셀은 datetime)
+    path: 값의 출처 파일 경로 (표시용, 읽지 않음)
+    """
+
+    engine_name = "memory"
+    in_memory = True
+
+    def __init__(self, sheets, path=None):
+        super().__init__(path)
+        self.sheets = {sheet_name: [tuple(row) for row in rows] for sheet_name, rows in sheets.items()}
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets.keys())
+
+    def iter_rows(self, sheet_name, min_row=1, max_row=None, max_col=None, columns=None):
+        for row in self.sheets[sheet_name][min_row - 1:max_row]:
+            yield row if max_col is None else row[:max_col]
+
+    def cell_count(self):
+        return sum(len(row) for rows in self.sheets.values() for row in rows)
+
+    def close(self):
+        self.sheets = {}
+
+
+READER_ENGINES = {
+    OpenpyxlReadOnlyReader.engine_name: OpenpyxlReadOnlyReader,
+    XmlIterparseReader.engine_name: XmlIterparseReader,
+}
+
+
+def open_raw_workbook(path, engine="openpyxl"):
+    """리더 엔진 이름으로 raw_data 워크북 리더 생성"""
+    if engine not in READER_ENGINES:
+        raise ValueError(f"지원하지 않는 리더 엔진입니다: {engine} (사용 가능: {', '.join(READER_ENGINES)})")
+    return READER_ENGINES[engine](path)
@@ -0,0 +1,424 @@
+"""
+Quantiwise refresh 백엔드와 완료 감지 대기
+
+시트마다 A1 Refresh 링크를 실행한 뒤 고정 시간(time.sleep) 대신
+refresh 완료 신호를 폴링해서 기다린다.
+- 완료 셀: refresh 매크로가 끝날 때 쓰는 셀(completion_cell) 값이 refresh 전과 달라지면 완료
+- 센티널 셀: B1 "Last Update : ..." 값이 refresh 전과 달라지면 완료
+- 계산 상태: Excel CalculationState가 계산 중(또는 호출 거부)이었다가 완료로 바뀐 뒤 최소 안정 시간 동안 유지되면 완료
+- 데이터 범위: 사용 범위(UsedRange)가 바뀐 뒤 최소 안정 시간 동안 그대로이면 완료
+시트별 제한 시간과 폴링 간격 점진 증가(adaptive backoff)를 적용한다.
+
+refresh가 끝난 통합 문서는 read_used_range로 시트 사용 범위를 한 번에 2차원 배열로 읽을 수 있고,
+저장(save_async)은 백그라운드로 진행해 저장한 파일을 다시 읽지 않고 바로 분석할 수 있다.
+
+Win32RefreshBackend는 실제 Excel(pywin32), FakeRefreshBackend는 Linux에서도
+대기 로직을 검증/벤치마크할 수 있는 가상 시간 기반 백엔드이다.
+"""
+
+import time
+import threading
+from datetime import datetime
+from decimal import Decimal
+from contextlib import contextmanager
+
+from raw_data_reader import open_raw_workbook
+
+SENTINEL_CELL = "B1"
+REFRESH_CELL = "A1"
+
+# Excel XlCalculationState
+XL_CALCULATION_DONE = 0
+
+
+@contextmanager
+def com_thread_scope():
+    """작업 스레드에서 COM(pywin32) 사용 전후 초기화/해제 (pywin32가 없으면 아무것도 하지 않음)"""
+    try:
+        import pythoncom
+    except ImportError:
+        yield
+        return
+    pythoncom.CoInitialize()
+    try:
+        yield
+    finally:
+        pythoncom.CoUninitialize()
+
+
+def plain_cell_value(value):
+    """COM으로 읽은 셀 값을 파일 리더와 같은 파이썬 값으로 변환 (날짜 → tz 없는 datetime, 통화 → float)"""
+    if isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day, value.hour, value.minute, value.second)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class PendingSave:
+    """백그라운드 저장 (wait에서 완료를 기다리고 저장 중 예외는 다시 발생)"""
+
+    def __init__(self, save):
+        self.error = None
+        self._thread = threading.Thread(target=self._run, args=(save,), name="workbook-save", daemon=True)
+        self._thread.start()
+
+    def _run(self, save):
+        try:
+            save()
+        except BaseException as e:
+            self.error = e
+
+    def wait(self):
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class RefreshProbe:
+    """한 번의 폴링에서 관측한 시트 상태"""
+
+    def __init__(self, calculating=False, sentinel=None, used_rows=0, used_columns=0, busy=False, completion=None):
+        self.calculating = calculating
+        self.sentinel = sentinel
+        # refresh 매크로가 완료 시 쓰는 셀 값 (완료 셀을 쓰지 않으면 None)
+        self.completion = completion
+        self.used_rows = used_rows
+        self.used_columns = used_columns
+        # Excel이 COM 호출을 거부한 경우 (refresh 처리 중)
+        self.busy = busy
+
+    @property
+    def used_range(self):
+        return self.used_rows, self.used_columns
+
+
+class RefreshWaitResult:
+    """시트 한 개의 refresh 대기 결과"""
+
+    def __init__(self, completed, reason, elapsed, polls):
+        self.completed = completed
+        self.reason = reason
+        self.elapsed = elapsed
+        self.polls = polls
+
+
+class RefreshBackend:
+    """refresh 백엔드 기본 클래스"""
+
+    def open(self, path):
+        raise NotImplementedError
+
+    def sheet_names(self):
+        raise NotImplementedError
+
+    def activate(self, sheet_name):
+        raise NotImplementedError
+
+    def refresh_link_value(self, sheet_name):
+        """A1 셀에 하이퍼링크가 있으면 셀 값, 없으면 None"""
+        raise NotImplementedError
+
+    def trigger_refresh(self, sheet_name):
+        raise NotImplementedError
+
+    def probe(self, sheet_name):
+        """현재 시트 상태(RefreshProbe) 관측"""
+        raise NotImplementedError
+
+    def read_used_range(self, sheet_name):
+        """A1부터 사용 범위 끝까지의 시트 값 (행 목록, 빈 셀은 None)"""
+        raise NotImplementedError
+
+    def save(self):
+        raise NotImplementedError
+
+    def save_async(self):
+        """저장을 백그라운드로 시작 (반환된 PendingSave.wait()로 완료 대기, close 전에 기다려야 함)"""
+        return PendingSave(self.save)
+
+    def close(self):
+        raise NotImplementedError
+
+
+class Win32RefreshBackend(RefreshBackend):
+    """pywin32 Excel COM 자동화 백엔드
+
+    application: 세션 풀에서 빌린 실행 중인 Excel (지정하면 close 시 통합 문서만 닫고 Excel은 유지)
+    completion_cell: refresh 매크로가 완료 시 값을 쓰는 셀 (예: "C1", 없으면 None)
+    """
+
+    def __init__(self, visible=True, application=None, completion_cell=None):
+        self.visible = visible
+        self.application = application
+        self.completion_cell = completion_cell
+        self.excel = None
+        self.workbook = None
+
+    def open(self, path):
+        if self.application is not None:
+            self.excel = self.application
+        else:
+            import win32com.client as win32
+
+            self.excel = win32.Dispatch("Excel.Application")
+            self.excel.Visible = self.visible
+        self.workbook = self.excel.Workbooks.Open(path)
+
+    def sheet_names(self):
+        return [self.workbook.Worksheets(i).Name for i in range(1, self.workbook.Worksheets.Count + 1)]
+
+    def activate(self, sheet_name):
+        self.workbook.Worksheets(sheet_name).Activate()
+
+    def refresh_link_value(self, sheet_name):
+        cell = self.workbook.Worksheets(sheet_name).Range(REFRESH_CELL)
+        if cell.Hyperlinks.Count == 0:
+            return None
+        return str(cell.Value).strip()
+
+    def trigger_refresh(self, sheet_name):
+        # 퀀티와이즈 가이드: Range("A1").Select → Selection.Hyperlinks(1).Follow
+        self.workbook.Worksheets(sheet_name).Range(REFRESH_CELL).Select()
+        self.excel.Selection.Hyperlinks(1).Follow(NewWindow=False, AddHistory=True)
+
+    def probe(self, sheet_name):
+        try:
+            worksheet = self.workbook.Worksheets(sheet_name)
+            used_range = worksheet.UsedRange
+            sentinel = worksheet.Range(SENTINEL_CELL).Value
+            completion = worksheet.Range(self.completion_cell).Value if self.completion_cell else None
+            return RefreshProbe(
+                calculating=self.excel.CalculationState != XL_CALCULATION_DONE,
+                sentinel=None if sentinel is None else str(sentinel),
+                used_rows=used_range.Row + used_range.Rows.Count - 1,
+                used_columns=used_range.Column + used_range.Columns.Count - 1,
+                completion=None if completion is None else str(completion)
+            )
+        except Exception:
+            # refresh 중 Excel이 호출을 거부하면(RPC_E_CALL_REJECTED 등) 처리 중으로 간주
+            return RefreshProbe(busy=True)
+
+    def read_used_range(self, sheet_name):
+        # 셀 단위 COM 호출 대신 Range.Value 한 번으로 전체 값을 가져옴
+        worksheet = self.workbook.Worksheets(sheet_name)
+        used_range = worksheet.UsedRange
+        last_row = used_range.Row + used_range.Rows.Count - 1
+        last_column = used_range.Column + used_range.Columns.Count - 1
+        values = worksheet.Range(worksheet.Cells(1, 1), worksheet.Cells(last_row, last_column)).Value
+        if not isinstance(values, tuple):
+            # 셀 하나짜리 범위는 값 하나로 반환됨
+            values = ((values,),)
+        return [tuple(plain_cell_value(value) for value in row) for row in values]
+
+    def save(self):
+        self.workbook.Save()
+
+    def save_async(self):
+        import pythoncom
+        import win32com.client as win32
+
+        # 통합 문서 인터페이스를 저장 스레드로 마샬링 (저장 중 호출 스레드는 COM을 쓰지 않음)
+        stream = pythoncom.CoMarshalInterThreadInterfaceInStream(pythoncom.IID_IDispatch, self.workbook._oleobj_)
+
+        def save():
+            with com_thread_scope():
+                workbook = win32.Dispatch(pythoncom.CoGetInterfaceAndReleaseStream(stream, pythoncom.IID_IDispatch))
+                workbook.Save()
+
+        return PendingSave(save)
+
+    def close(self):
+        if self.application is not None:
+            # 빌린 세션: 저장하지 않은 변경은 버리고 통합 문서만 닫음 (저장은 save에서 이미 완료)
+            if self.workbook is not None:
+                self.workbook.Close(False)
+                self.workbook = None
+            self.excel = None
+            return
+        if self.workbook is not None:
+            self.workbook.Close()
+            self.workbook = None
+        if self.excel is not None:
+            self.excel.Quit()
+            self.excel = None
+
+
+class RefreshWaiter:
+    """refresh 완료 감지 대기 (시트별 제한 시간 + 폴링 간격 점진 증가)
+
+    stable_seconds: 계산 완료/범위 변경 후 완료로 판단하기 전 상태가 그대로 유지되어야 하는 최소 시간(초)
+    """
+
+    def __init__(self, timeout=180.0, sheet_timeouts=None, initial_interval=0.25, max_interval=3.0,
+                 backoff=1.5, stable_seconds=2.0, clock=time.monotonic, sleep=time.sleep):
+        self.timeout = timeout
+        self.sheet_timeouts = dict(sheet_timeouts or {})
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.stable_seconds = stable_seconds
+        self.clock = clock
+        self.sleep = sleep
+
+    def timeout_for(self, sheet_name):
+        return self.sheet_timeouts.get(sheet_name, self.timeout)
+
+    def wait(self, backend, sheet_name, before):
+        """refresh 실행 후 완료될 때까지 폴링
+
+        before: refresh 실행 직전의 RefreshProbe (완료 셀/센티널/사용 범위 비교 기준)
+        """
+        start = self.clock()
+        deadline = start + self.timeout_for(sheet_name)
+        interval = self.initial_interval
+        polls = 0
+        # refresh 처리 중(계산 중 또는 호출 거부)을 한 번이라도 관측했는지
+        processing_seen = False
+        # 완료 후보 상태 (감지 이유, 사용 범위, 시작 시각) - 최소 안정 시간 동안 유지되면 완료
+        settled = None
+
+        while True:
+            self.sleep(min(interval, max(0.0, deadline - self.clock())))
+            probe = backend.probe(sheet_name)
+            polls += 1
+            now = self.clock()
+
+            if probe.busy or probe.calculating:
+                processing_seen = True
+                settled = None
+            elif probe.completion is not None and probe.completion != before.completion:
+                return RefreshWaitResult(True, "completion", now - start, polls)
+            elif probe.sentinel is not None and probe.sentinel != before.sentinel:
+                return RefreshWaitResult(True, "sentinel", now - start, polls)
+            else:
+                if processing_seen:
+                    reason = "calculation"
+                elif probe.used_range != before.used_range:
+                    reason = "range"
+                else:
+                    reason = None
+                if reason is None:
+                    settled = None
+                elif settled is None or settled[1] != probe.used_range:
+                    # 계산이 끝났거나 범위가 바뀜: 지금부터 안정 시간 측정
+                    settled = (reason, probe.used_range, now)
+                elif now - settled[2] >= self.stable_seconds:
+                    return RefreshWaitResult(True, settled[0], now - start, polls)
+
+            if settled is not None:
+                # 완료 후보 상태 유지 확인: 짧은 간격으로 폴링
+                interval = self.initial_interval
+            else:
+                # 완료 신호 없음: 폴링 간격 점진 증가
+                interval = min(interval * self.backoff, self.max_interval)
+
+            if now >= deadline:
+                return RefreshWaitResult(False, "timeout", now - start, polls)
+
+
+class FakeClock:
+    """가상 시간 (sleep 호출 시 즉시 시간만 진행)"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+
+class FakeRefreshSheet:
+    """가상 refresh 시트 설정
+
+    duration: refresh 소요 시간(초), 그동안 사용 범위가 rows_before → rows_after로 선형 증가
+    report_calculation: False면 계산 상태 신호 없이 범위/센티널로만 완료 판단
+    update_sentinel: False면 완료 후에도 B1 센티널 값이 바뀌지 않음
+    write_completion: True면 완료 시 refresh 매크로처럼 완료 셀 값을 씀
+    values: refresh 후 시트 값 (A1부터의 행 목록), None이면 열린 파일의 같은 시트 값
+    """
+
+    def __init__(self, name, duration=5.0, rows_before=15, rows_after=500, columns=2000,
+                 has_refresh_link=True, report_calculation=True, update_sentinel=True, write_completion=False,
+                 values=None):
+        self.name = name
+        self.duration = duration
+        self.rows_before = rows_before
+        self.rows_after = rows_after
+        self.columns = columns
+        self.has_refresh_link = has_refresh_link
+        self.report_calculation = report_calculation
+        self.update_sentinel = update_sentinel
+        self.write_completion = write_completion
+        self.values = values
+        self.triggered_at = None
+        self.refresh_count = 0
+
+
+class FakeRefreshBackend(RefreshBackend):
+    """가상 시간 기반 in-process refresh 백엔드 (대기 로직 검증/벤치마크용)
+
+    save_seconds: 저장 소요 시간(실제 초) - 백그라운드 저장과 분석이 겹치는지 확인용
+    """
+
+    def __init__(self, sheets, clock=None, save_seconds=0.0):
+        self.sheets = {sheet.name: sheet for sheet in sheets}
+        self.clock = clock or FakeClock()
+        self.save_seconds = save_seconds
+        self.path = None
+        self.active_sheet = None
+        self.saved = False
+        self.closed = False
+
+    def open(self, path):
+        self.path = path
+
+    def sheet_names(self):
+        return list(self.sheets.keys())
+
+    def activate(self, sheet_name):
+        self.active_sheet = sheet_name
+
+    def refresh_link_value(self, sheet_name):
+        return "Refresh" if self.sheets[sheet_name].has_refresh_link else None
+
+    def trigger_refresh(self, sheet_name):
+        sheet = self.sheets[sheet_name]
+        sheet.triggered_at = self.clock()
+        sheet.refresh_count += 1
+
+    def probe(self, sheet_name):
+        sheet = self.sheets[sheet_name]
+        if sheet.triggered_at is None:
+            return RefreshProbe(sentinel="Last Update : 0", used_rows=sheet.rows_before,
+                                used_columns=sheet.columns)
+
+        elapsed = self.clock() - sheet.triggered_at
+        if elapsed < sheet.duration:
+            progress = elapsed / sheet.duration if sheet.duration > 0 else 1.0
+            rows = sheet.rows_before + int((sheet.rows_after - sheet.rows_before) * progress)
+            return RefreshProbe(calculating=sheet.report_calculation,
+                                sentinel=f"Last Update : {sheet.refresh_count - 1}",
+                                used_rows=rows, used_columns=sheet.columns)
+
+        refresh_count = sheet.refresh_count if sheet.update_sentinel else 0
+        completion = f"Done {sheet.refresh_count}" if sheet.write_completion else None
+        return RefreshProbe(sentinel=f"Last Update : {refresh_count}", used_rows=sheet.rows_after,
+                            used_columns=sheet.columns, completion=completion)
+
+    def read_used_range(self, sheet_name):
+        sheet = self.sheets[sheet_name]
+        if sheet.values is not None:
+            return [tuple(row) for row in sheet.values]
+        with open_raw_workbook(self.path, "xml") as reader:
+            return list(reader.iter_rows(sheet_name))
+
+    def save(self):
+        if self.save_seconds:
+            time.sleep(self.save_seconds)
+        self.saved = True
+
+    def close(self):
+        self.closed = True
@@ -0,0 +1,53 @@
+"""
+결과 Excel 스트리밍 작성기
+
+openpyxl write-only 모드로 시트를 행 단위 append만 하여 작성한다.
+셀 객체 모델을 메모리에 만들지 않고, 소수점 자리수는 값 반올림 대신 열 단위 숫자 서식으로 표시한다.
+"""
+
+from numbers import Number
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+# 결과 시트에서 사용하는 열 숫자 서식
+SCORE_FORMAT = "0.0000"
+INTENSITY_FORMAT = "0.000000"
+AMOUNT_FORMAT = "0.00"
+
+
+class StreamingResultWriter:
+    """write-only 결과 워크북 작성기 (행 단위 append + 열 단위 숫자 서식)"""
+
+    def __init__(self):
+        self.workbook = Workbook(write_only=True)
+
+    def add_sheet(self, title, headers, rows, column_formats=None):
+        """헤더와 행들을 시트에 순서대로 기록
+
+        column_formats: {열 번호(0부터): 숫자 서식} - 숫자 값에만 적용
+        """
+        worksheet = self.workbook.create_sheet(title)
+        if headers:
+            worksheet.append(headers)
+
+        column_formats = column_formats or {}
+        row_count = 0
+        for row in rows:
+            if column_formats:
+                row = [self._formatted_cell(worksheet, value, column_formats.get(column))
+                       for column, value in enumerate(row)]
+            worksheet.append(row)
+            row_count += 1
+        return row_count
+
+    @staticmethod
+    def _formatted_cell(worksheet, value, number_format):
+        if number_format is None or not isinstance(value, Number) or isinstance(value, bool):
+            return value
+        cell = WriteOnlyCell(worksheet, value=value)
+        cell.number_format = number_format
+        return cell
+
+    def save(self, output_path):
+        self.workbook.save(output_path)
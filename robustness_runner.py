@@ -0,0 +1,362 @@
+"""
+구성종목 선정 안정성(robustness) 평가
+
+외국인 수급/EPS 입력에 잡음·데이터 수정(재작성)·누락을 준 교란 실행을 수천 번 반복해
+종목별로 각 선정 단계(EPS 필터, 수급강도, 1/2개월 상위, 최종 구성종목)에 뽑힌 빈도를 집계한다.
+
+run_full_stock_system을 교란마다 다시 실행하면 파일 로드/파싱/결과 저장을 매번 하므로,
+파싱한 패널을 공유 메모리(multiprocessing.shared_memory)에 한 번만 올리고 프로세스 풀의 워커가
+복사 없이 붙어서(zero-copy) 읽는다. 워커는 기준일 데이터 구간(B5 ~ B6)의 행만 잘라 교란한 뒤
+BacktestEngine의 선정 단계를 그대로 실행하고, 부모에는 종목별 선정 횟수 배열만 돌려준다.
+
+교란 방식 (Perturbation):
+- eps_noise / foreign_noise: 셀마다 값 × (1 + σ·N(0, 1)) - 추정치 수정/잡음
+- missing_rate: 셀을 이 비율만큼 빈 값으로 - 늦게 들어오거나 빠진 데이터
+- resample_days: 같은 달 안의 거래일을 복원 추출 (일별 부트스트랩, 창 구간은 그대로)
+
+실행마다 난수는 (seed, 실행 번호)로 정하므로 워커 수와 무관하게 같은 결과가 나온다.
+
+사용 예:
+    engine = BacktestEngine(eps_data, foreign_data, market_cap_data)
+    result = RobustnessRunner(engine, max_workers=4).run(runs=2000, perturbation=Perturbation(foreign_noise=0.1))
+    result.selection_frequencies()  # {종목코드: 최종 구성종목 선정 빈도}
+"""
+
+import os
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from panel_data import PanelData
+from backtest_engine import BacktestEngine
+from selection_parameters import fetch_start_date
+from result_excel_writer import StreamingResultWriter, SCORE_FORMAT
+
+# 종목별 선정 횟수를 세는 단계 (BacktestEngine.select_constituents의 stage_codes + 최종 구성종목)
+STAGES = ("eps", "intensity", "one_month", "two_month", "final")
+# 워커당 작업 묶음 수 (묶음이 작을수록 워커 간 부하가 고르지만 결과 전달 횟수가 늘어남)
+CHUNKS_PER_WORKER = 4
+
+
+class Perturbation:
+    """교란 실행 한 번에 줄 변화의 크기"""
+
+    FIELDS = ("eps_noise", "foreign_noise", "missing_rate", "resample_days")
+
+    def __init__(self, eps_noise=0.02, foreign_noise=0.05, missing_rate=0.0, resample_days=False):
+        self.eps_noise = eps_noise
+        self.foreign_noise = foreign_noise
+        self.missing_rate = missing_rate
+        self.resample_days = bool(resample_days)
+
+        for field in ("eps_noise", "foreign_noise", "missing_rate"):
+            value = getattr(self, field)
+            if not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"{field}는 0 이상의 숫자여야 합니다: {value}")
+        if self.missing_rate >= 1:
+            raise ValueError(f"missing_rate는 1보다 작아야 합니다: {self.missing_rate}")
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return "Perturbation(" + ", ".join(f"{field}={getattr(self, field)}" for field in self.FIELDS) + ")"
+
+
+class SharedPanel:
+    """공유 메모리에 올린 패널 값 행렬 (날짜축/종목코드는 작아서 설명자에 담아 전달)"""
+
+    def __init__(self, panel):
+        values = np.ascontiguousarray(panel.values, dtype=np.float64)
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=np.float64, buffer=self.shared_memory.buf)[...] = values
+        self.descriptor = {
+            'name': self.shared_memory.name,
+            'shape': values.shape,
+            'dates': panel.dates,
+            'codes': panel.codes,
+            'names': panel.names,
+            'data_type': panel.data_type,
+        }
+
+    @staticmethod
+    def attach(descriptor):
+        """설명자로 공유 메모리에 붙어 (공유 메모리 핸들, 값을 복사하지 않은 PanelData) 반환"""
+        try:
+            # 붙기만 하는 프로세스가 종료 시 공유 메모리를 지우지 않도록 (Python 3.13+)
+            handle = shared_memory.SharedMemory(name=descriptor['name'], track=False)
+        except TypeError:
+            handle = shared_memory.SharedMemory(name=descriptor['name'])
+        values = np.ndarray(descriptor['shape'], dtype=np.float64, buffer=handle.buf)
+        values.flags.writeable = False
+        return handle, PanelData(descriptor['dates'], values, descriptor['codes'], descriptor['names'],
+                                 descriptor['data_type'])
+
+    def close(self):
+        self.shared_memory.close()
+        try:
+            self.shared_memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class RobustnessTrials:
+    """한 기준일의 교란 실행 (부모 프로세스와 워커가 같은 코드로 실행)
+
+    패널 전체가 아니라 기준일 데이터 구간(B5 이후 첫 거래일 ~ B6)의 행만 잘라 교란하므로
+    교란하지 않은 실행은 전체 패널 백테스트의 같은 기준일 결과와 같다.
+    B5는 BacktestEngine과 같은 받기 구간 설정(fetch_margin_months, full_year_fetch)으로 계산한다.
+    """
+
+    def __init__(self, eps_panel, foreign_panel, cap_panel, as_of_date, parameters, fetch_margin_months,
+                 full_year_fetch):
+        self.as_of_date = as_of_date
+        self.parameters = parameters
+        self.fetch_margin_months = fetch_margin_months
+        self.full_year_fetch = full_year_fetch
+        fetch_start = np.datetime64(fetch_start_date(as_of_date, parameters, fetch_margin_months,
+                                                     full_year_fetch).strftime('%Y-%m-%d'), 'D')
+        as_of = np.datetime64(as_of_date.strftime('%Y-%m-%d'), 'D')
+
+        self.blocks = []
+        for panel in (eps_panel, foreign_panel, cap_panel):
+            start_row = int(np.searchsorted(panel.dates, fetch_start, side='left'))
+            end_row = int(np.searchsorted(panel.dates, as_of, side='right'))
+            dates = panel.dates[start_row:end_row]
+            months = dates.astype('datetime64[M]')
+            # 같은 달 거래일 구간 [시작 행, 끝 행) - 일별 부트스트랩용
+            month_bounds = (np.searchsorted(months, months, side='left'), np.searchsorted(months, months, side='right'))
+            self.blocks.append((panel, dates, panel.values[start_row:end_row], month_bounds))
+        self.cap_block = self._panel(self.blocks[2], self.blocks[2][2])
+
+        self.codes = list(dict.fromkeys(eps_panel.codes))
+        self.names = [eps_panel.name_of(code) for code in self.codes]
+        self.code_positions = {code: i for i, code in enumerate(self.codes)}
+
+    @staticmethod
+    def _panel(block, values):
+        panel, dates, _, _ = block
+        return PanelData(dates, values, panel.codes, panel.names, panel.data_type)
+
+    @staticmethod
+    def _perturbed(block, rng, noise, perturbation):
+        _, _, values, (month_starts, month_ends) = block
+        if perturbation.resample_days and len(values):
+            rows = month_starts + np.floor(rng.random(len(values)) * (month_ends - month_starts)).astype(np.int64)
+            values = values[rows]
+        if noise > 0:
+            values = values * (1.0 + noise * rng.standard_normal(values.shape))
+        if perturbation.missing_rate > 0:
+            values = np.array(values)
+            values[rng.random(values.shape) < perturbation.missing_rate] = np.nan
+        return values
+
+    def select(self, eps_values=None, foreign_values=None):
+        """(교란한) 구간 값으로 선정 단계 실행 → (단계별 선정 종목코드, 구성종목 레코드)"""
+        eps_block, foreign_block, _ = self.blocks
+        engine = BacktestEngine(self._panel(eps_block, eps_block[2] if eps_values is None else eps_values),
+                                self._panel(foreign_block, foreign_block[2] if foreign_values is None else foreign_values),
+                                self.cap_block, self.parameters, self.fetch_margin_months, self.full_year_fetch)
+        stage_codes = {}
+        constituents, _ = engine.select_constituents(engine.as_of_windows([self.as_of_date])[0], self.parameters,
+                                                     stage_codes)
+        stage_codes['final'] = [record['code'] for record in constituents]
+        return stage_codes, constituents
+
+    def run(self, seed, perturbation, first_run, run_count, baseline_codes):
+        """실행 번호 first_run부터 run_count번 교란 실행 → (단계별 선정 횟수, 비중 합, 구성종목 동일 횟수, 중복도 합)"""
+        counts = np.zeros((len(STAGES), len(self.codes)), dtype=np.int64)
+        weight_sums = np.zeros(len(self.codes))
+        baseline = set(baseline_codes)
+        exact_matches = 0
+        overlap_sum = 0.0
+        eps_block, foreign_block, _ = self.blocks
+        for run_index in range(first_run, first_run + run_count):
+            rng = np.random.default_rng([seed, run_index])
+            stage_codes, constituents = self.select(
+                self._perturbed(eps_block, rng, perturbation.eps_noise, perturbation),
+                self._perturbed(foreign_block, rng, perturbation.foreign_noise, perturbation))
+            for stage_index, stage in enumerate(STAGES):
+                counts[stage_index, [self.code_positions[code] for code in stage_codes[stage]]] += 1
+            for record in constituents:
+                weight_sums[self.code_positions[record['code']]] += record['final_weight']
+            selected = set(stage_codes['final'])
+            exact_matches += selected == baseline
+            union = selected | baseline
+            overlap_sum += len(selected & baseline) / len(union) if union else 1.0
+        return counts, weight_sums, exact_matches, overlap_sum
+
+
+# 워커 프로세스 상태: 공유 메모리 핸들과 그 위의 패널 (워커 시작 시 한 번 붙음)
+_worker_handles = []
+_worker_panels = None
+
+
+def _init_worker(descriptors):
+    global _worker_panels
+    attached = [SharedPanel.attach(descriptor) for descriptor in descriptors]
+    _worker_handles[:] = [handle for handle, _ in attached]
+    _worker_panels = [panel for _, panel in attached]
+
+
+def _run_chunk(as_of_date, parameters, fetch_window, perturbation, seed, first_run, run_count, baseline_codes):
+    trials = RobustnessTrials(*_worker_panels, as_of_date, parameters, *fetch_window)
+    return trials.run(seed, perturbation, first_run, run_count, baseline_codes)
+
+
+class RobustnessResult:
+    """교란 실행의 종목별 단계 선정 빈도"""
+
+    def __init__(self, as_of_date, parameters, perturbation, runs, seed, codes, names,
+                 baseline_stages, baseline_constituents, counts, weight_sums, exact_matches, overlap_sum):
+        self.as_of_date = as_of_date
+        self.parameters = parameters
+        self.perturbation = perturbation
+        self.runs = runs
+        self.seed = seed
+        self.codes = codes
+        self.names = names
+        self.baseline_stages = baseline_stages
+        self.baseline_constituents = baseline_constituents
+        self.counts = counts
+        self.weight_sums = weight_sums
+        self.exact_matches = exact_matches
+        self.overlap_sum = overlap_sum
+
+    def frequencies(self, stage="final"):
+        """codes 순서의 단계 선정 빈도 배열 (0 ~ 1)"""
+        return self.counts[STAGES.index(stage)] / max(self.runs, 1)
+
+    def mean_weights(self):
+        """codes 순서의 평균 최종비중 (미선정 실행은 0)"""
+        return self.weight_sums / max(self.runs, 1)
+
+    def selection_frequencies(self, stage="final", min_frequency=0.0):
+        """{종목코드: 선정 빈도} - 빈도 내림차순, min_frequency 이하(0 포함)는 제외"""
+        frequencies = self.frequencies(stage)
+        order = np.argsort(-frequencies, kind='stable')
+        return {self.codes[i]: float(frequencies[i]) for i in order
+                if frequencies[i] > 0 and frequencies[i] >= min_frequency}
+
+    def stable_codes(self, threshold=0.9):
+        """최종 구성종목 선정 빈도가 threshold 이상인 종목코드"""
+        return list(self.selection_frequencies("final", threshold))
+
+    @property
+    def exact_match_rate(self):
+        """구성종목이 교란하지 않은 결과와 완전히 같은 실행 비율"""
+        return self.exact_matches / max(self.runs, 1)
+
+    @property
+    def mean_overlap(self):
+        """교란하지 않은 구성종목과의 평균 중복도 (교집합 / 합집합)"""
+        return self.overlap_sum / max(self.runs, 1)
+
+    def frequency_rows(self):
+        baseline_weights = {record['code']: record['final_weight'] for record in self.baseline_constituents}
+        final_frequencies = self.frequencies("final")
+        mean_weights = self.mean_weights()
+        stage_frequencies = [self.frequencies(stage) for stage in STAGES]
+        candidates = [i for i, code in enumerate(self.codes)
+                      if self.counts[:, i].any() or code in baseline_weights]
+        for i in sorted(candidates, key=lambda i: (-final_frequencies[i], -stage_frequencies[0][i])):
+            code = self.codes[i]
+            yield ([code, self.names[i], "O" if code in baseline_weights else "-", baseline_weights.get(code, 0),
+                    float(final_frequencies[i]), float(mean_weights[i])] +
+                   [float(stage_frequencies[STAGES.index(stage)][i])
+                    for stage in ("one_month", "two_month", "intensity", "eps")])
+
+    def summary_rows(self):
+        yield ["기준일", self.as_of_date.strftime('%Y-%m-%d')]
+        yield ["교란 실행 횟수", self.runs]
+        yield ["난수 seed", self.seed]
+        for field, value in self.perturbation.to_dict().items():
+            yield [field, value]
+        for field, value in self.parameters.to_dict().items():
+            yield [field, value]
+        yield ["교란 없는 구성종목 수", len(self.baseline_constituents)]
+        yield ["구성종목 동일 비율", self.exact_match_rate]
+        yield ["평균 중복도(교집합/합집합)", self.mean_overlap]
+
+    def save_excel(self, output_path):
+        """종목별 선정 빈도 / 설정 요약 시트를 가진 결과 엑셀 저장"""
+        writer = StreamingResultWriter()
+        writer.add_sheet("종목별선정빈도",
+                         ["종목코드", "종목명", "교란없음선정", "교란없음비중", "최종선정빈도", "평균비중",
+                          "1개월상위빈도", "2개월상위빈도", "수급강도통과빈도", "EPS통과빈도"],
+                         self.frequency_rows(), {column: SCORE_FORMAT for column in range(3, 10)})
+        writer.add_sheet("요약", ["항목", "값"], self.summary_rows())
+        writer.save(output_path)
+
+
+class RobustnessRunner:
+    """BacktestEngine 패널로 교란 실행을 프로세스 풀에 나눠 실행
+
+    max_workers: 워커 프로세스 수 (None이면 CPU 코어 수, 1이면 공유 메모리 없이 현재 프로세스에서 실행)
+    """
+
+    def __init__(self, engine, max_workers=None):
+        self.engine = engine
+        self.max_workers = max_workers
+
+    def default_date(self):
+        """기본 기준일: 패널 마지막 날짜가 속한 월말 (월간 분석과 같은 기준일)"""
+        dates = self.engine.rebalance_dates(require_full_lookback=False)
+        return dates[-1] if dates else None
+
+    def run(self, runs=1000, perturbation=None, as_of_date=None, parameters=None, seed=0):
+        """교란 실행 runs번 → RobustnessResult"""
+        engine = self.engine
+        perturbation = perturbation or Perturbation()
+        parameters = parameters or engine.parameters
+        as_of_date = as_of_date or self.default_date()
+        if as_of_date is None:
+            raise ValueError("평가 기준일이 없습니다.")
+        as_of_date = datetime(as_of_date.year, as_of_date.month, as_of_date.day)
+        panels = (engine.eps_panel, engine.foreign_panel, engine.cap_panel)
+
+        trials = RobustnessTrials(*panels, as_of_date, parameters, engine.fetch_margin_months, engine.full_year_fetch)
+        baseline_stages, baseline_constituents = trials.select()
+        baseline_codes = baseline_stages['final']
+
+        max_workers = max(1, min(self.max_workers or os.cpu_count() or 1, runs))
+        if max_workers == 1:
+            outputs = [trials.run(seed, perturbation, 0, runs, baseline_codes)]
+        else:
+            outputs = self._run_parallel(panels, as_of_date, parameters, perturbation, seed, runs,
+                                         baseline_codes, max_workers)
+
+        counts = np.zeros((len(STAGES), len(trials.codes)), dtype=np.int64)
+        weight_sums = np.zeros(len(trials.codes))
+        exact_matches = 0
+        overlap_sum = 0.0
+        for chunk_counts, chunk_weight_sums, chunk_exact_matches, chunk_overlap_sum in outputs:
+            counts += chunk_counts
+            weight_sums += chunk_weight_sums
+            exact_matches += chunk_exact_matches
+            overlap_sum += chunk_overlap_sum
+        return RobustnessResult(as_of_date, parameters, perturbation, runs, seed, trials.codes, trials.names,
+                                baseline_stages, baseline_constituents, counts, weight_sums,
+                                exact_matches, overlap_sum)
+
+    def _run_parallel(self, panels, as_of_date, parameters, perturbation, seed, runs, baseline_codes, max_workers):
+        """패널을 공유 메모리에 올리고 실행 번호 구간을 워커에 나눠 실행"""
+        shared_panels = []
+        try:
+            for panel in panels:
+                shared_panels.append(SharedPanel(panel))
+            descriptors = [shared_panel.descriptor for shared_panel in shared_panels]
+
+            chunk_size = -(-runs // (max_workers * CHUNKS_PER_WORKER))
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(descriptors,)) as executor:
+                fetch_window = (self.engine.fetch_margin_months, self.engine.full_year_fetch)
+                futures = [executor.submit(_run_chunk, as_of_date, parameters, fetch_window, perturbation, seed,
+                                           first_run, min(chunk_size, runs - first_run), baseline_codes)
+                           for first_run in range(0, runs, chunk_size)]
+                return [future.result() for future in futures]
+        finally:
+            for shared_panel in shared_panels:
+                shared_panel.close()
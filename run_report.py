@@ -0,0 +1,195 @@
+"""
+실행 단계별 계측과 실행 보고서(JSON)
+
+분석 단계(로드, 시트 파싱, EPS 필터, 수급강도, 비중, 결과 저장)와 스케줄러 단계
+(파일 복사, 날짜 업데이트, 시트별 refresh, 분석)마다 경과 시간, CPU 시간,
+메모리 최대 사용량(tracemalloc, 선택), 행/열 수 등 건수를 기록한다.
+보고서는 결과 파일 옆에 JSON으로 저장하고, logger를 지정하면 단계 완료 기록을 logging으로 남긴다.
+"""
+
+import os
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from panel_cache import write_atomic
+
+REPORT_FORMAT_VERSION = 1
+
+
+def run_report_path(result_path):
+    """결과 파일 옆 실행 보고서 경로 (..._result_YYYYMMDD.xlsx → ..._result_YYYYMMDD_run_report.json)"""
+    return f"{os.path.splitext(result_path)[0]}_run_report.json"
+
+
+class StageRecord:
+    """단계 한 개의 계측 결과"""
+
+    def __init__(self, name, started_offset, counts=None):
+        self.name = name
+        self.started_offset = started_offset
+        self.counts = dict(counts or {})
+        self.status = "running"
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_memory_mb = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "status": self.status,
+            "started_offset_seconds": round(self.started_offset, 6),
+            "wall_seconds": None if self.wall_seconds is None else round(self.wall_seconds, 6),
+            "cpu_seconds": None if self.cpu_seconds is None else round(self.cpu_seconds, 6),
+            "peak_memory_mb": self.peak_memory_mb,
+            "counts": self.counts,
+            "error": self.error,
+        }
+
+
+class RunReport:
+    """실행 단계 계측 보고서
+
+    trace_memory: True면 tracemalloc으로 단계별 최대 메모리 증가량 측정 (실행이 느려지므로 기본 False)
+    logger: logging.Logger를 지정하면 단계가 끝날 때마다 logger.info로 기록하고 요약도 print 대신 logger로 출력
+    """
+
+    def __init__(self, name, trace_memory=False, logger=None, metadata=None):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.logger = logger
+        self.metadata = dict(metadata or {})
+        self.stages = []
+        self.success = None
+        self.started_at = datetime.now()
+        self.ended_at = None
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._wall_seconds = None
+        self._cpu_seconds = None
+        # 진행 중인 단계의 [시작 시점 메모리, 최대 메모리] (중첩 단계의 최대값을 바깥 단계에 반영)
+        self._memory_stack = []
+        self._peak_bytes = 0
+        self._started_tracing = False
+        self._prefix = ""
+        self._root = self
+
+    def child(self, prefix):
+        """같은 보고서에 '<prefix>.' 이름으로 단계를 기록하는 보고서 (스케줄러 → 분석 시스템 전달용)"""
+        child = RunReport.__new__(RunReport)
+        child.__dict__.update(self.__dict__)
+        child._prefix = f"{self._prefix}{prefix}."
+        child._root = self._root
+        return child
+
+    @staticmethod
+    def _stage_line(record):
+        memory_text = f", 메모리 +{record.peak_memory_mb:.1f}MB" if record.peak_memory_mb is not None else ""
+        counts_text = "".join(f", {key}={value}" for key, value in record.counts.items())
+        status_text = "" if record.status == "ok" else f" [{record.status}]"
+        return (f"{record.name}: {record.wall_seconds:.3f}초 (CPU {record.cpu_seconds:.3f}초"
+                f"{memory_text}{counts_text}){status_text}")
+
+    def _start_memory(self):
+        root = self._root
+        if not root.trace_memory:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            root._started_tracing = True
+        current, peak = tracemalloc.get_traced_memory()
+        # 바깥 단계의 지금까지 최대값을 반영한 뒤 이 단계 기준으로 초기화
+        for frame in root._memory_stack:
+            frame[1] = max(frame[1], peak)
+        root._peak_bytes = max(root._peak_bytes, peak)
+        tracemalloc.reset_peak()
+        root._memory_stack.append([current, current])
+
+    def _stop_memory(self):
+        root = self._root
+        if not root.trace_memory or not root._memory_stack:
+            return None
+        peak = tracemalloc.get_traced_memory()[1]
+        start, stage_peak = root._memory_stack.pop()
+        stage_peak = max(stage_peak, peak)
+        for frame in root._memory_stack:
+            frame[1] = max(frame[1], stage_peak)
+        root._peak_bytes = max(root._peak_bytes, stage_peak)
+        return round((stage_peak - start) / (1024 * 1024), 3)
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """단계 계측 (with 블록 안에서 record.counts에 행/열 수 등을 추가 기록)
+
+        블록에서 예외가 나면 status="failed"로 기록하고 예외는 그대로 전달한다.
+        """
+        root = self._root
+        record = StageRecord(f"{self._prefix}{name}", time.perf_counter() - root._wall_start, counts)
+        root.stages.append(record)
+        self._start_memory()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+            if record.status == "running":
+                record.status = "ok"
+        except BaseException as e:
+            record.status = "failed"
+            record.error = str(e)
+            raise
+        finally:
+            record.wall_seconds = time.perf_counter() - wall_start
+            record.cpu_seconds = time.process_time() - cpu_start
+            record.peak_memory_mb = self._stop_memory()
+            if root.logger is not None:
+                root.logger.info(self._stage_line(record))
+
+    def finish(self, success):
+        """전체 실행 종료 기록 (직접 시작한 tracemalloc은 종료)"""
+        root = self._root
+        root.success = bool(success)
+        root.ended_at = datetime.now()
+        root._wall_seconds = time.perf_counter() - root._wall_start
+        root._cpu_seconds = time.process_time() - root._cpu_start
+        if root.trace_memory and tracemalloc.is_tracing():
+            root._peak_bytes = max(root._peak_bytes, tracemalloc.get_traced_memory()[1])
+            if root._started_tracing and not root._memory_stack:
+                tracemalloc.stop()
+                root._started_tracing = False
+        return root
+
+    def print_summary(self, title="단계별 실행 시간"):
+        """단계별 계측 요약 출력 (logger가 있으면 logger.info)"""
+        root = self._root
+        emit = root.logger.info if root.logger is not None else print
+        emit(f"{title}:")
+        for record in root.stages:
+            if record.wall_seconds is not None:
+                emit(f"  - {self._stage_line(record)}")
+
+    def to_dict(self):
+        root = self._root
+        wall_seconds = root._wall_seconds if root._wall_seconds is not None else time.perf_counter() - root._wall_start
+        cpu_seconds = root._cpu_seconds if root._cpu_seconds is not None else time.process_time() - root._cpu_start
+        return {
+            "format_version": REPORT_FORMAT_VERSION,
+            "name": root.name,
+            "success": root.success,
+            "started_at": root.started_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "ended_at": None if root.ended_at is None else root.ended_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "wall_seconds": round(wall_seconds, 6),
+            "cpu_seconds": round(cpu_seconds, 6),
+            "trace_memory": root.trace_memory,
+            "peak_memory_mb": round(root._peak_bytes / (1024 * 1024), 3) if root.trace_memory else None,
+            "metadata": root.metadata,
+            "stages": [record.to_dict() for record in root.stages],
+        }
+
+    def save(self, path):
+        """JSON 보고서 저장 (원자적 교체)"""
+        content = json.dumps(self.to_dict(), ensure_ascii=False, indent=2, default=str)
+        write_atomic(os.path.abspath(path), lambda file: file.write(content.encode("utf-8")))
+        return path
@@ -0,0 +1,87 @@
+"""
+월 단위 창 평균 점수 계산 커널
+
+날짜축의 월 경계 행 오프셋을 searchsorted로 한 번만 계산해 두고,
+전체 종목의 N개월 창 평균(빈 셀 제외)을 배열 연산으로 한꺼번에 계산한다.
+
+창 정의 (기존 get_month_start_date와 동일):
+- 종료일: 종목의 마지막 유효 데이터 날짜
+- 시작일: 종료일 기준 (N-1)개월 전 월의 1일
+"""
+
+import numpy as np
+
+
+def month_start_dates(end_dates, months_back):
+    """종료일 기준 N개월 창의 시작일 (N-1개월 전 월의 1일)"""
+    end_months = np.asarray(end_dates, dtype='datetime64[D]').astype('datetime64[M]')
+    return (end_months - (months_back - 1)).astype('datetime64[D]')
+
+
+class MonthCalendar:
+    """날짜축의 월 경계 행 오프셋 인덱스"""
+
+    def __init__(self, dates):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        months = self.dates.astype('datetime64[M]')
+        if len(months):
+            self.first_month = months[0]
+            month_axis = np.arange(months[0], months[-1] + 1)
+            # month_offsets[k]: (첫 달 + k)월 이후 첫 행
+            self.month_offsets = np.searchsorted(months, month_axis, side='left')
+            self.row_months = (months - months[0]).astype(np.int64)
+        else:
+            self.first_month = None
+            self.month_offsets = np.zeros(0, dtype=np.int64)
+            self.row_months = np.zeros(0, dtype=np.int64)
+
+    def window_start_rows(self, end_rows, months_back):
+        """각 종료 행 기준 N개월 창의 시작 행 (날짜축 시작 이전이면 0)"""
+        month_index = self.row_months[end_rows] - (months_back - 1)
+        return np.where(month_index <= 0, 0, self.month_offsets[np.clip(month_index, 0, None)])
+
+    def rows_between(self, start_dates, end_dates):
+        """날짜 구간 [start, end]에 해당하는 (시작 행, 종료 행) - 종료 행은 포함"""
+        start_rows = np.searchsorted(self.dates, np.asarray(start_dates, dtype='datetime64[D]'), side='left')
+        end_rows = np.searchsorted(self.dates, np.asarray(end_dates, dtype='datetime64[D]'), side='right') - 1
+        return start_rows, end_rows
+
+    def align_rows(self, other, start_rows, end_rows):
+        """다른 날짜축(other)의 행 구간을 이 날짜축의 행 구간으로 변환"""
+        if other is self or np.array_equal(other.dates, self.dates):
+            return start_rows, end_rows
+        return self.rows_between(other.dates[start_rows], other.dates[end_rows])
+
+
+class WindowMeanKernel:
+    """패널 전체 종목의 창 평균을 한 번에 계산하는 커널"""
+
+    def __init__(self, panel):
+        self.panel = panel
+        self.calendar = panel.calendar
+
+    def window_means(self, columns, start_rows, end_rows):
+        """열별 [start_row, end_row] 구간의 NaN 제외 평균과 유효 개수 (유효값이 없으면 평균 0)"""
+        columns = np.asarray(columns, dtype=np.int64)
+        start_rows = np.asarray(start_rows, dtype=np.int64)
+        end_rows = np.asarray(end_rows, dtype=np.int64)
+        if len(columns) == 0:
+            return np.zeros(0), np.zeros(0, dtype=np.int64)
+
+        # 창이 걸친 행 구간만 잘라서 계산 (구간 밖은 어차피 제외되므로 결과 동일)
+        first_row = max(int(start_rows.min()), 0)
+        last_row = max(int(end_rows.max()), first_row - 1)
+        values = self.panel.values[first_row:last_row + 1, columns]
+        row_axis = np.arange(first_row, last_row + 1)[:, None]
+        in_window = (row_axis >= start_rows[None, :]) & (row_axis <= end_rows[None, :])
+        in_window &= ~np.isnan(values)
+
+        counts = np.count_nonzero(in_window, axis=0)
+        sums = np.where(in_window, values, 0.0).sum(axis=0)
+        means = np.divide(sums, counts, out=np.zeros(len(columns)), where=counts > 0)
+        return means, counts
+
+    def trailing_window(self, columns, months_back):
+        """종목별 마지막 유효일 기준 N개월 창의 (시작 행, 종료 행)"""
+        end_rows = self.panel.last_valid_rows[np.asarray(columns, dtype=np.int64)]
+        return self.calendar.window_start_rows(end_rows, months_back), end_rows
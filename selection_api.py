@@ -0,0 +1,232 @@
+"""
+구성종목 선정 라이브러리 API
+
+run_full_stock_system은 진행 상황을 출력하고 결과를 항상 엑셀로 저장하므로, 다른 작업(리스크, 주문 관리 등)이
+선정 결과를 쓰려면 결과 엑셀을 다시 읽어야 했다. select_constituents는 raw_data 파일 경로나 이미 파싱한 패널을 받아
+단계별 결과(EPS 점수, 수급강도, 1/2개월 상위, 최종 비중)를 배열 기반 객체로 돌려준다.
+- 출력 없음 (verbose=True면 기존 진행 메시지 출력), 엑셀은 output_path를 줄 때만 저장 (결과 엑셀과 같은 형식)
+- 파싱 캐시/누적 패널은 기본으로 쓰지 않음 (파일을 만들지 않음, use_cache/incremental로 사용 가능)
+- 단계 계산은 월간 분석과 같은 DeepSearchForeignBuyingTop20IndexSystem 메서드를 사용하므로 숫자가 결과 엑셀과 같다
+
+사용 예:
+    result = select_constituents("excel_data/deepsearch_..._raw_data_20250831.xlsx")
+    result.final.weights            # 최종비중 배열 (비중 순위 순서)
+    result.weights()                # {종목코드: 최종비중}
+    result.eps.selected_codes()     # EPS 필터 통과 종목코드
+
+    result = select_constituents({"eps": eps_panel, "foreign": foreign_panel, "market_cap": cap_panel})
+"""
+
+import io
+import contextlib
+
+import numpy as np
+
+from panel_data import as_panel
+from monthly_rebalancing_scheduler import DeepSearchForeignBuyingTop20IndexSystem
+
+# 단계 결과 배열에서 데이터부족 등으로 값이 없는 칸
+MISSING = np.nan
+
+
+class StageResult:
+    """선정 단계 한 개의 결과 (모든 배열은 단계 순위 순서, 1순위가 0번)
+
+    codes / names: 종목코드 / 종목명, scores: 단계 점수, ranks: 순위(1부터),
+    selected: 통과(상위 top_k) 여부, details: {항목: 배열} - 창 평균 등 단계별 부가 값 (없으면 NaN)
+    """
+
+    def __init__(self, name, codes, names, scores, selected_count, details=None):
+        self.name = name
+        self.codes = list(codes)
+        self.names = list(names)
+        self.scores = np.asarray(scores, dtype=np.float64)
+        self.ranks = np.arange(1, len(self.codes) + 1, dtype=np.int64)
+        self.selected = self.ranks <= selected_count
+        self.details = details or {}
+        self.code_positions = {code: i for i, code in enumerate(self.codes)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, stock_code):
+        return stock_code in self.code_positions
+
+    def selected_codes(self):
+        """통과 종목코드 (순위 순서)"""
+        return self.codes[:int(self.selected.sum())]
+
+    def score_of(self, stock_code):
+        """종목 점수 (단계 대상이 아니면 None)"""
+        position = self.code_positions.get(stock_code)
+        return None if position is None else float(self.scores[position])
+
+    def rank_of(self, stock_code):
+        """종목 순위 (1부터, 단계 대상이 아니면 None)"""
+        position = self.code_positions.get(stock_code)
+        return None if position is None else int(self.ranks[position])
+
+    @classmethod
+    def from_ranking(cls, name, ranking, stock_data, detail_keys):
+        """StageRanking(점수/순위)과 종목별 dict 결과(종목명, 부가 값)를 순위 순서 배열로 변환"""
+        codes = ranking.ordered_codes()
+        rows = [stock_data[code] for code in codes]
+        details = {key: np.array([row.get(key, MISSING) for row in rows], dtype=np.float64) for key in detail_keys}
+        return cls(name, codes, [row.get('name', f"종목_{code}") for code, row in zip(codes, rows)],
+                   ranking.scores[ranking.full_order()], len(ranking), details)
+
+
+class FinalWeights:
+    """최종 비중 (모든 배열은 비중 순위 순서)
+
+    weights: 최종비중, selection_counts: 1/2개월 상위 선정 횟수,
+    one_month_ranks / two_month_ranks: 각 상위 목록의 순위 (선정되지 않았으면 0)
+    """
+
+    def __init__(self, codes, names, weights, selection_counts, one_month_ranks, two_month_ranks,
+                 total_selection_count):
+        self.codes = list(codes)
+        self.names = list(names)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.selection_counts = np.asarray(selection_counts, dtype=np.int64)
+        self.one_month_ranks = np.asarray(one_month_ranks, dtype=np.int64)
+        self.two_month_ranks = np.asarray(two_month_ranks, dtype=np.int64)
+        self.total_selection_count = total_selection_count
+
+    def __len__(self):
+        return len(self.codes)
+
+    def to_dict(self):
+        """{종목코드: 최종비중}"""
+        return {code: float(weight) for code, weight in zip(self.codes, self.weights)}
+
+    @classmethod
+    def from_system(cls, final_weights, total_selection_count):
+        rows = list(final_weights.values())
+        return cls(final_weights.keys(), [row['name'] for row in rows], [row['final_weight'] for row in rows],
+                   [row['selection_count'] for row in rows], [row['one_month_rank'] or 0 for row in rows],
+                   [row['two_month_rank'] or 0 for row in rows], total_selection_count)
+
+
+class SelectionResult:
+    """구성종목 선정 전체 결과
+
+    eps / intensity / one_month / two_month: StageResult, final: FinalWeights,
+    as_of: EPS 데이터 마지막 날짜(datetime64), total_stock_count: 원본의 전체 종목 수
+    """
+
+    def __init__(self, eps, intensity, one_month, two_month, final, parameters, as_of, total_stock_count,
+                 system=None):
+        self.eps = eps
+        self.intensity = intensity
+        self.one_month = one_month
+        self.two_month = two_month
+        self.final = final
+        self.parameters = parameters
+        self.as_of = as_of
+        self.total_stock_count = total_stock_count
+        # 엑셀 저장용 (결과 엑셀과 같은 시트를 같은 코드로 작성)
+        self._system = system
+
+    def stages(self):
+        return {'eps': self.eps, 'intensity': self.intensity, 'one_month': self.one_month,
+                'two_month': self.two_month}
+
+    def weights(self):
+        """{종목코드: 최종비중} (비중 순위 순서)"""
+        return self.final.to_dict()
+
+    def save_excel(self, output_path, verbose=False):
+        """월간 분석 결과 엑셀과 같은 형식으로 저장 → 성공 여부"""
+        with _quiet(verbose):
+            return self._system.create_result_excel_full_stocks(self._system.final_top_50, output_path)
+
+
+def _quiet(verbose):
+    """verbose가 아니면 진행 메시지를 버림"""
+    return contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+
+def _required(value, stage_name):
+    if not value:
+        raise RuntimeError(f"{stage_name} 단계 실패")
+    return value
+
+
+def select_constituents(source, use_market_cap=True, parameters=None, reader_engine="xml", use_cache=False,
+                        incremental=False, output_path=None, verbose=False):
+    """raw_data 파일 또는 패널로 구성종목 선정 → SelectionResult
+
+    source: raw_data 파일 경로, 또는 {"eps": 패널, "foreign": 패널, "market_cap": 패널}
+            (PanelData 또는 종목별 dict, market_cap은 시가총액/유동시가총액 중 사용할 패널)
+    use_market_cap: 파일 경로일 때 시가총액(True) / 유동시가총액(False) 시트 선택
+    output_path: 지정하면 결과 엑셀 저장
+    실패하면 RuntimeError (파일/시트 문제, 데이터 부족 등)
+    """
+    from_file = isinstance(source, str)
+    system = DeepSearchForeignBuyingTop20IndexSystem(source if from_file else None, None, reader_engine,
+                                                     use_cache=use_cache and from_file,
+                                                     incremental=incremental and from_file,
+                                                     parse_workers=1, parameters=parameters)
+    with _quiet(verbose):
+        try:
+            if from_file:
+                eps_data, foreign_data, market_cap_data = _parse_source(system, use_market_cap)
+            else:
+                missing = [key for key in ("eps", "foreign", "market_cap") if source.get(key) is None]
+                if missing:
+                    raise RuntimeError(f"패널이 없습니다: {', '.join(missing)}")
+                eps_data = as_panel(source["eps"], "eps")
+                foreign_data = as_panel(source["foreign"], "foreign")
+                market_cap_data = as_panel(source["market_cap"], "market_cap")
+                system.total_stock_count = len(dict.fromkeys(eps_data.codes))
+                _required(system.apply_eps_filter(eps_data), "EPS 필터")
+
+            final_stocks = _required(system.calculate_foreign_intensity(system.eps_top_100, foreign_data,
+                                                                        market_cap_data), "외국인 수급강도")
+            one_month_top, two_month_top = system.calculate_monthly_foreign_intensity(final_stocks, foreign_data,
+                                                                                      market_cap_data)
+            _required(one_month_top and two_month_top, "1/2개월 외국인 수급")
+            final_weights = _required(system.calculate_final_weights(), "최종 비중")
+        finally:
+            system.close_source_excel_file()
+
+    eps_panel = as_panel(eps_data, "eps")
+    result = SelectionResult(
+        StageResult.from_ranking("eps", system.eps_ranking, system.eps_scores, ('one_month_avg', 'three_month_avg')),
+        StageResult.from_ranking("intensity", system.intensity_ranking, system.intensity_scores,
+                                 ('foreign_avg', 'cap_avg', 'eps_score')),
+        StageResult.from_ranking("one_month", system.one_month_ranking, system.one_month_scores,
+                                 ('one_month_foreign', 'one_month_cap', 'eps_score', 'intensity_score')),
+        StageResult.from_ranking("two_month", system.two_month_ranking, system.two_month_scores,
+                                 ('two_month_foreign', 'two_month_cap', 'eps_score', 'intensity_score')),
+        FinalWeights.from_system(final_weights, system.total_selection_count),
+        system.parameters,
+        eps_panel.dates[-1] if eps_panel.n_dates else None,
+        system.total_stock_count,
+        system)
+
+    if output_path and not result.save_excel(output_path, verbose):
+        raise RuntimeError(f"결과 Excel 파일 생성 실패: {output_path}")
+    return result
+
+
+def _parse_source(system, use_market_cap):
+    """raw_data 파일 파싱 + EPS 필터 (월간 분석과 같이 외국인/시가총액은 EPS 통과 종목 열만 로드)"""
+    if not system.load_source_excel_file():
+        raise RuntimeError(f"소스 Excel 파일 로드 실패: {system.source_excel_path}")
+    sheets = system.find_data_sheets(use_market_cap)
+    for sheet_key in ('eps_sheet', 'foreign_sheet', 'market_cap_sheet'):
+        if sheet_key not in sheets:
+            raise RuntimeError(f"데이터 시트가 없습니다: {sheet_key}")
+
+    eps_data, system.total_stock_count = system.parse_data(sheets['eps_sheet'], "eps")
+    _required(eps_data, "EPS 데이터 파싱")
+    eps_filtered = _required(system.apply_eps_filter(eps_data), "EPS 필터")
+
+    projected_codes = list(eps_filtered.keys()) if system.column_projection else None
+    foreign_data, _ = system.parse_data(sheets['foreign_sheet'], "foreign", projected_codes)
+    market_cap_data, _ = system.parse_data(sheets['market_cap_sheet'], "market_cap", projected_codes)
+    _required(foreign_data, "외국인 데이터 파싱")
+    _required(market_cap_data, "시가총액 데이터 파싱")
+    return eps_data, foreign_data, market_cap_data
@@ -0,0 +1,104 @@
+"""
+구성종목 선정 단계 기준값
+
+EPS 필터 상위 종목 수, 외국인 수급강도 상위 종목 수, 1/2개월 수급 상위 종목 수와
+각 단계의 창 길이(개월), 최소 유효 데이터 개수를 한 객체로 묶는다.
+기본값은 지수 방법론(EPS 1/3개월 → 상위 100, 수급강도 6개월 → 상위 50, 1/2개월 수급 → 각 상위 10)과 같다.
+
+raw_data 파일의 데이터 받기 구간(B5 ~ B6)은 기본이 기준일 1년 전부터이고, 가장 긴 창 길이로 줄일 수 있다
+(fetch_start_date). 최소 유효 데이터 개수는 받은 구간에서 세므로 구간을 줄이면 데이터부족 판정이 달라질 수 있고,
+백테스트(backtest_engine)도 같은 받기 구간 설정으로 기준일별 구간을 정해야 월간 분석과 결과가 같다.
+"""
+
+import itertools
+from datetime import datetime, timedelta
+
+# 기본 받기 구간 (B5 = B6 기준 365일 전) - 최소 유효 데이터 개수 기준(30개)이 이 구간을 전제로 함
+FULL_YEAR_LOOKBACK_DAYS = 365
+# 가장 긴 창 시작 월보다 더 받아 두는 개월 수 (마지막 유효일이 기준월 이전인 종목의 창 여유분)
+FETCH_MARGIN_MONTHS = 1
+
+
+class SelectionParameters:
+    """선정 단계 기준값 한 세트"""
+
+    FIELDS = ("eps_top_k", "intensity_top_k", "flow_top_k",
+              "eps_short_months", "eps_long_months", "intensity_months",
+              "flow_short_months", "flow_long_months", "min_valid_count")
+
+    def __init__(self, eps_top_k=100, intensity_top_k=50, flow_top_k=10,
+                 eps_short_months=1, eps_long_months=3, intensity_months=6,
+                 flow_short_months=1, flow_long_months=2, min_valid_count=30):
+        self.eps_top_k = eps_top_k
+        self.intensity_top_k = intensity_top_k
+        self.flow_top_k = flow_top_k
+        self.eps_short_months = eps_short_months
+        self.eps_long_months = eps_long_months
+        self.intensity_months = intensity_months
+        self.flow_short_months = flow_short_months
+        self.flow_long_months = flow_long_months
+        self.min_valid_count = min_valid_count
+
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if not isinstance(value, int) or value < 1:
+                raise ValueError(f"{field}는 1 이상의 정수여야 합니다: {value}")
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def longest_window_months(self):
+        """모든 단계 중 가장 긴 창 길이(개월)"""
+        return max(self.eps_short_months, self.eps_long_months, self.intensity_months,
+                   self.flow_short_months, self.flow_long_months)
+
+    def replace(self, **changes):
+        """일부 값만 바꾼 새 기준값"""
+        values = self.to_dict()
+        values.update(changes)
+        return SelectionParameters(**values)
+
+    def key(self):
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def __eq__(self, other):
+        return isinstance(other, SelectionParameters) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return "SelectionParameters(" + ", ".join(f"{field}={getattr(self, field)}" for field in self.FIELDS) + ")"
+
+
+DEFAULT_PARAMETERS = SelectionParameters()
+
+
+def fetch_start_date(as_of_date, parameters=None, margin_months=FETCH_MARGIN_MONTHS, full_year=True):
+    """기준일(B6) 분석에 필요한 데이터 받기 시작일(B5)
+
+    full_year=True(기본)면 기준일 365일 전.
+    False면 가장 긴 창의 시작 월(기준월의 (N-1)개월 전)에서 margin_months개월 더 앞 월의 1일.
+    """
+    if full_year:
+        return as_of_date - timedelta(days=FULL_YEAR_LOOKBACK_DAYS)
+    parameters = parameters or DEFAULT_PARAMETERS
+    if not isinstance(margin_months, int) or margin_months < 0:
+        raise ValueError(f"margin_months는 0 이상의 정수여야 합니다: {margin_months}")
+    month_index = as_of_date.year * 12 + (as_of_date.month - 1) - (parameters.longest_window_months() - 1) - margin_months
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def parameter_grid(base=None, **grid):
+    """기준값 조합 목록 (지정한 항목의 값 목록을 모두 조합, 나머지는 base 값 사용)
+
+    예: parameter_grid(eps_top_k=[50, 100, 150], flow_top_k=[5, 10]) → 6개 조합
+    """
+    base = base or DEFAULT_PARAMETERS
+    unknown = set(grid) - set(SelectionParameters.FIELDS)
+    if unknown:
+        raise ValueError(f"알 수 없는 기준값 항목: {', '.join(sorted(unknown))}")
+    fields = list(grid)
+    value_lists = [list(grid[field]) if isinstance(grid[field], (list, tuple, range)) else [grid[field]]
+                   for field in fields]
+    return [base.replace(**dict(zip(fields, values))) for values in itertools.product(*value_lists)]
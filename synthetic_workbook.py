@@ -0,0 +1,246 @@
+"""
+가상 raw_data 워크북 생성기 (벤치마크용)
+
+Quantiwise raw_data 파일과 같은 배치로 eps / foreign / market_cap / market_ff_cap 시트를 만든다.
+- 1행: A1 Refresh 링크 문구, B1 "Last Update : ..."
+- 4~6행: Frequency, Period(From) = B5, Period(To) = B6 (YYYYMMDD 숫자)
+- 8행 종목코드, 9행 종목명, 10행 Item Code, 11행 Unit (B열부터)
+- 14행 "D A T E" 헤더, 15행부터 A열 날짜 + 종목별 값 (빈 셀은 생략)
+
+종목 수 × 거래일 수가 커도 빠르게 만들 수 있도록 openpyxl 없이 시트 XML을 zip에 직접 스트리밍한다.
+"""
+
+import zipfile
+from datetime import datetime, date
+
+import numpy as np
+
+SPREADSHEET_NAMESPACE = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+# 시트별 (Item Code, Unit, 14행 헤더, 값 서식 스타일 인덱스)
+SHEET_LAYOUTS = {
+    "eps_sheet": ("E312080.M", "Local/Shares", "EPS(Fwd.12M)", 2),
+    "foreign_sheet": ("U130320", "Local mn", "외국인총합계순매수대금(일간)", 3),
+    "market_cap_sheet": ("S102100", "Local", "시가총액", 2),
+    "market_ff_cap_sheet": ("S102306", "Local", "유동시가총액", 2),
+}
+
+# cellXfs: 0 General, 1 날짜(mm-dd-yy), 2 #,##0, 3 #,##0.00, 4 텍스트(@)
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<styleSheet xmlns="{SPREADSHEET_NAMESPACE}">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="3" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="49" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def _column_letters(index):
+    """1부터 시작하는 열 번호 → 열 문자 (1 → A)"""
+    letters = ""
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _escape(text):
+    return str(text).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _text_cell(reference, text, style=0):
+    style_attribute = f' s="{style}"' if style else ""
+    return (f'<c r="{reference}"{style_attribute} t="inlineStr">'
+            f'<is><t xml:space="preserve">{_escape(text)}</t></is></c>')
+
+
+def _number_cell(reference, value, style=0):
+    style_attribute = f' s="{style}"' if style else ""
+    return f'<c r="{reference}"{style_attribute}><v>{value}</v></c>'
+
+
+def trading_days(end_date, day_count):
+    """end_date 이전(포함) 평일 day_count개 (오름차순 datetime64[D])"""
+    end = np.busday_offset(np.datetime64(end_date, 'D'), 0, roll='backward')
+    return np.busday_offset(end, np.arange(-(day_count - 1), 1), roll='backward')
+
+
+class SyntheticMarket:
+    """종목별 가상 시계열 (시가총액 랜덤워크, 유동비율, 외국인 순매수, EPS 추정치)"""
+
+    def __init__(self, stock_count, day_count, empty_density=0.02, end_date="2025-08-29", seed=0):
+        rng = np.random.default_rng(seed)
+        self.stock_count = stock_count
+        self.day_count = day_count
+        self.empty_density = empty_density
+        self.dates = trading_days(end_date, day_count)
+        self.codes = [f"A{index:06d}" for index in range(stock_count)]
+        self.names = [f"가상종목{index:05d}" for index in range(stock_count)]
+
+        # 시가총액: 로그정규 초기값 × 일간 수익률 누적
+        base_cap = np.exp(rng.normal(26.5, 1.3, stock_count))
+        returns = rng.normal(0.0003, 0.02, (day_count, stock_count))
+        market_cap = base_cap * np.exp(np.cumsum(returns, axis=0))
+        free_float_ratio = rng.uniform(0.25, 0.95, stock_count)
+
+        # 외국인 순매수대금(백만원): 시가총액 대비 일간 순매수 비율
+        foreign = market_cap * rng.normal(0.0, 0.0008, (day_count, stock_count)) / 1e6
+
+        # EPS(Fwd.12M): 초기값 + 월 단위로 바뀌는 추정치 조정
+        base_eps = rng.normal(2500, 4000, stock_count)
+        revisions = rng.normal(0.0, 0.01, (day_count, stock_count)) * (rng.random((day_count, stock_count)) < 0.05)
+        eps = base_eps * np.exp(np.cumsum(revisions, axis=0))
+
+        self.values = {
+            "eps_sheet": np.round(eps),
+            "foreign_sheet": np.round(foreign, 2),
+            "market_cap_sheet": np.round(market_cap),
+            "market_ff_cap_sheet": np.round(market_cap * free_float_ratio),
+        }
+        # 빈 셀 (시트마다 따로 결측)
+        for sheet_name, values in self.values.items():
+            values[rng.random(values.shape) < empty_density] = np.nan
+
+    @property
+    def period(self):
+        """B5, B6 셀 값 (YYYYMMDD 숫자)"""
+        first = self.dates[0].astype(datetime)
+        last = self.dates[-1].astype(datetime)
+        return int(first.strftime("%Y%m%d")), int(last.strftime("%Y%m%d"))
+
+
+def _write_sheet(stream, sheet_name, market, updated_at):
+    """시트 XML 한 개를 행 단위로 스트리밍 기록"""
+    item_code, unit, header, value_style = SHEET_LAYOUTS[sheet_name]
+    period_from, period_to = market.period
+    letters = [_column_letters(column) for column in range(2, market.stock_count + 2)]
+
+    def write_row(row_number, cells):
+        stream.write(f'<row r="{row_number}">{"".join(cells)}</row>'.encode('utf-8'))
+
+    stream.write((f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                  f'<worksheet xmlns="{SPREADSHEET_NAMESPACE}"><sheetData>').encode('utf-8'))
+    write_row(1, [_text_cell("A1", "     Refresh     "), _text_cell("B1", f"Last Update : {updated_at}")])
+    write_row(2, [_number_cell("A2", 0)])
+    write_row(3, [_text_cell("A3", "Time Series (Company)")])
+    write_row(4, [_text_cell("A4", "Frequency"), _text_cell("B4", "D"), _text_cell("C4", "Ascending"),
+                  _number_cell("D4", 0)])
+    write_row(5, [_text_cell("A5", "Period(From)"), _number_cell("B5", period_from), _text_cell("C5", "Korean"),
+                  _number_cell("D5", 0)])
+    write_row(6, [_text_cell("A6", "Period(To)"), _number_cell("B6", period_to), _number_cell("D6", 0)])
+    for row_number, label, texts in ((8, "Code", market.codes), (9, "Name", market.names),
+                                     (10, "Item Code", [item_code] * market.stock_count),
+                                     (11, "Unit", [unit] * market.stock_count)):
+        write_row(row_number, [_text_cell(f"A{row_number}", label)]
+                  + [_text_cell(f"{letter}{row_number}", text, 4) for letter, text in zip(letters, texts)])
+    write_row(12, [_text_cell("A12", "Base Date")])
+    write_row(14, [_text_cell("A14", "D A T E")] + [_text_cell(f"{letter}14", header) for letter in letters])
+
+    excel_epoch = np.datetime64("1899-12-30", 'D')
+    serials = (market.dates - excel_epoch).astype(np.int64)
+    values = market.values[sheet_name]
+    integer_values = value_style == 2
+    for offset, (serial, row_values) in enumerate(zip(serials.tolist(), values)):
+        row_number = 15 + offset
+        valid = ~np.isnan(row_values)
+        present = row_values[valid].astype(np.int64) if integer_values else row_values[valid]
+        cells = [_number_cell(f"A{row_number}", serial, 1)]
+        cells.extend(f'<c r="{letters[column]}{row_number}" s="{value_style}"><v>{value}</v></c>'
+                     for column, value in zip(np.flatnonzero(valid).tolist(), present.tolist()))
+        write_row(row_number, cells)
+    stream.write(b'</sheetData></worksheet>')
+
+
+def generate_raw_workbook(path, stock_count=500, day_count=250, empty_density=0.02, end_date="2025-08-29",
+                          seed=0, compression_level=1):
+    """Quantiwise raw_data 배치의 가상 워크북 생성
+
+    stock_count: 종목 수 (B열부터), day_count: 거래일 수 (15행부터)
+    empty_density: 값 셀 중 비워 둘 비율 (0~1)
+    반환: 생성에 사용한 SyntheticMarket
+    """
+    market = SyntheticMarket(stock_count, day_count, empty_density, end_date, seed)
+    sheet_names = list(SHEET_LAYOUTS.keys())
+    updated_at = datetime.combine(date.today(), datetime.min.time()).strftime("%Y-%m-%d %H:%M:%S")
+
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        + "".join(f'<Override PartName="/xl/worksheets/sheet{index}.xml" '
+                  'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                  for index in range(1, len(sheet_names) + 1))
+        + '</Types>'
+    )
+    package_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+        'officeDocument" Target="xl/workbook.xml"/></Relationships>'
+    )
+    workbook = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<workbook xmlns="{SPREADSHEET_NAMESPACE}" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+        + "".join(f'<sheet name="{name}" sheetId="{index}" r:id="rId{index}"/>'
+                  for index, name in enumerate(sheet_names, start=1))
+        + '</sheets></workbook>'
+    )
+    workbook_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + "".join(f'<Relationship Id="rId{index}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                  f'relationships/worksheet" Target="worksheets/sheet{index}.xml"/>'
+                  for index in range(1, len(sheet_names) + 1))
+        + f'<Relationship Id="rId{len(sheet_names) + 1}" Type="http://schemas.openxmlformats.org/officeDocument/'
+        '2006/relationships/styles" Target="styles.xml"/></Relationships>'
+    )
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=compression_level) as archive:
+        archive.writestr("[Content_Types].xml", content_types)
+        archive.writestr("_rels/.rels", package_rels)
+        archive.writestr("xl/workbook.xml", workbook)
+        archive.writestr("xl/_rels/workbook.xml.rels", workbook_rels)
+        archive.writestr("xl/styles.xml", STYLES_XML)
+        for index, sheet_name in enumerate(sheet_names, start=1):
+            with archive.open(f"xl/worksheets/sheet{index}.xml", 'w', force_zip64=True) as stream:
+                _write_sheet(stream, sheet_name, market, updated_at)
+    return market
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Quantiwise raw_data 배치의 가상 워크북 생성")
+    parser.add_argument("path")
+    parser.add_argument("--stocks", type=int, default=500)
+    parser.add_argument("--days", type=int, default=250)
+    parser.add_argument("--empty-density", type=float, default=0.02)
+    parser.add_argument("--end-date", default="2025-08-29")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    market = generate_raw_workbook(args.path, args.stocks, args.days, args.empty_density, args.end_date, args.seed)
+    period_from, period_to = market.period
+    print(f"가상 워크북 생성 완료: {args.path} ({market.stock_count}개 종목 × {market.day_count}일, "
+          f"기간 {period_from} ~ {period_to})")
+
+
+if __name__ == "__main__":
+    main()
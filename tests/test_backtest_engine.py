@@ -0,0 +1,21 @@
+import numpy as np
+
+from backtest_engine import AsOfIndex
+from panel_data import PanelData
+
+# 2025-01-03(금), 2025-01-06(월) ~ 2025-01-10(금), 2025-01-13(월)
+DATES = np.array(['2025-01-03', '2025-01-06', '2025-01-07', '2025-01-08', '2025-01-09', '2025-01-10',
+                  '2025-01-13'], dtype='datetime64[D]')
+
+
+def test_rows_for_starts_on_or_after_b5():
+    panel = PanelData(DATES, np.ones((len(DATES), 1)), ["A0"])
+    index = AsOfIndex(panel)
+    start_rows, end_rows = index.rows_for(
+        np.array(['2025-01-04', '2025-01-06', '2025-01-01', '2025-01-14'], dtype='datetime64[D]'),
+        np.array(['2025-01-12', '2025-01-13', '2025-01-05', '2025-01-20'], dtype='datetime64[D]'))
+    # B5가 주말이면 다음 거래일, 거래일이면 당일, 데이터 시작 이전이면 첫 행, 데이터 이후면 빈 구간
+    assert start_rows.tolist() == [1, 1, 0, 7]
+    assert end_rows.tolist() == [5, 6, 0, 6]
+    assert index.valid_counts(start_rows, end_rows)[:, 0].tolist() == [5, 6, 1, 0]
+    assert index.last_valid_rows(start_rows, end_rows)[:, 0].tolist() == [5, 6, 0, -1]
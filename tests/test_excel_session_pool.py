@@ -0,0 +1,158 @@
+import queue
+import threading
+from datetime import datetime
+
+import pytest
+
+import batch_rebalancing
+from batch_rebalancing import BatchMonthResult, _refresh_stage
+from excel_session_pool import ExcelSessionPool, FakeExcelSession
+
+
+def make_pool(max_sessions=1, max_workbooks=20, fail_after=None):
+    sessions = []
+
+    def factory():
+        session = FakeExcelSession(lambda: None, fail_after=fail_after)
+        sessions.append(session)
+        return session
+    return ExcelSessionPool(factory, max_sessions, max_workbooks), sessions
+
+
+def run_in_thread(target):
+    outcome = {}
+
+    def run():
+        try:
+            outcome["value"] = target()
+        except BaseException as e:
+            outcome["error"] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def test_unhealthy_session_is_replaced():
+    pool, sessions = make_pool(fail_after=1)
+    session = pool.acquire()
+    session.create_backend()
+    pool.release(session)
+
+    replacement = pool.acquire()
+    assert replacement is not session
+    assert session.closed and session.closed_thread == threading.get_ident()
+    assert pool.started_count == 2 and pool.recycled_count == 1 and pool.session_count == 1
+    pool.release(replacement)
+    pool.close()
+    assert replacement.closed and pool.session_count == 0
+
+
+def test_session_recycled_after_max_workbooks():
+    pool, sessions = make_pool(max_workbooks=2)
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    pool.release(first)
+    assert first.closed and pool.recycled_count == 1
+
+    second = pool.acquire()
+    assert second is not first and pool.started_count == 2
+    # 실패한 세션은 처리 문서 수와 관계없이 종료
+    pool.release(second, failed=True)
+    assert second.closed and pool.session_count == 0
+    pool.close()
+
+
+def test_acquire_blocks_at_max_sessions_until_owner_closes_session():
+    pool, sessions = make_pool(max_sessions=1)
+    held = pool.acquire()
+
+    def acquire_and_release():
+        session = pool.acquire()
+        pool.release(session)
+        return session
+
+    waiter, outcome = run_in_thread(acquire_and_release)
+    waiter.join(0.2)
+    assert waiter.is_alive()
+
+    # 반납해도 세션은 시작한 스레드 전용이므로 다른 스레드는 계속 대기
+    pool.release(held)
+    waiter.join(0.2)
+    assert waiter.is_alive()
+
+    # 시작한 스레드가 자기 세션을 종료하면 자리가 생겨 다른 스레드가 새 세션 시작
+    pool.close_thread_session()
+    waiter.join(2.0)
+    assert not waiter.is_alive()
+    other = outcome["value"]
+    assert other is not held and held.closed_thread == threading.get_ident()
+    assert other.owner_thread != threading.get_ident()
+
+    # 다른 스레드가 시작한 세션은 반납할 수 없음
+    with pytest.raises(RuntimeError):
+        pool.release(other)
+    # 풀 종료 시 다른 스레드의 대기 세션은 이 스레드에서 Quit하지 않고 풀에서만 제거
+    pool.close()
+    assert not other.closed and pool.session_count == 0 and not pool.idle_sessions
+
+
+def test_each_thread_reuses_and_closes_its_own_session():
+    pool, sessions = make_pool(max_sessions=2, max_workbooks=10)
+    seen = {}
+
+    def work(name):
+        for _ in range(3):
+            session = pool.acquire()
+            assert session.owner_thread == threading.get_ident()
+            seen.setdefault(name, set()).add(id(session))
+            pool.release(session)
+        pool.close_thread_session()
+
+    threads = [threading.Thread(target=work, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5.0)
+    assert all(len(ids) == 1 for ids in seen.values()) and seen["a"] != seen["b"]
+    assert pool.started_count == 2 and pool.session_count == 0
+    assert all(session.closed_thread == session.owner_thread for session in sessions)
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+
+class PoolScheduler:
+    """세션 풀만 가진 가상 스케줄러"""
+
+    file_prefix = "raw_data_"
+
+    def __init__(self, session_pool):
+        self.session_pool = session_pool
+        self.used_threads = []
+
+
+def produce_with_session(scheduler, target_date, automation_mode=True, source_filename=None):
+    """refresh 대신 세션을 빌려 쓰고 반납"""
+    session = scheduler.session_pool.acquire()
+    scheduler.used_threads.append((session.owner_thread, threading.get_ident()))
+    scheduler.session_pool.release(session)
+    return f"{scheduler.file_prefix}{target_date.strftime('%Y%m%d')}.xlsx"
+
+
+def test_refresh_threads_close_their_own_sessions(monkeypatch):
+    monkeypatch.setattr(batch_rebalancing, "produce_raw_file", produce_with_session)
+    pool, sessions = make_pool(max_sessions=2)
+    scheduler = PoolScheduler(pool)
+    existing_files = {datetime(2025, 1, 31): "raw_data_20250131.xlsx"}
+    results = [BatchMonthResult(datetime(2025, month, 28)) for month in range(2, 8)]
+    ready = queue.Queue()
+
+    _refresh_stage(scheduler, results, existing_files, True, True, 2, ready)
+
+    assert ready.qsize() == len(results) and all(result.error is None for result in results)
+    assert all(owner == user for owner, user in scheduler.used_threads)
+    assert {owner for owner, _ in scheduler.used_threads} != {threading.get_ident()}
+    # refresh 스레드가 끝날 때 자기 세션을 종료하므로 풀에 남은 세션 없음
+    assert sessions and all(session.closed_thread == session.owner_thread for session in sessions)
+    assert pool.session_count == 0 and not pool.idle_sessions
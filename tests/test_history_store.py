@@ -0,0 +1,136 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import history_store
+from history_store import HistoryStore, MANIFEST_FILENAME
+from panel_data import PanelData
+
+SHEET = ("eps_sheet", "eps")
+AS_OF = [datetime(2024, 12, 31), datetime(2025, 1, 31), datetime(2025, 2, 28)]
+
+
+def business_days(first, last):
+    dates = np.arange(np.datetime64(first), np.datetime64(last) + 1, dtype='datetime64[D]')
+    return dates[np.is_busday(dates)]
+
+
+def base_values(dates, codes):
+    ordinals = dates.astype(np.int64).astype(float)
+    return ordinals[:, None] / 100.0 + np.array([ord(code[-1]) for code in codes], dtype=float)[None, :]
+
+
+def set_cell(panel, day, code, value):
+    panel.values[np.searchsorted(panel.dates, np.datetime64(day)), panel.codes.index(code)] = value
+
+
+def make_panel(first, last, codes, name_suffix=""):
+    dates = business_days(first, last)
+    return PanelData(dates, base_values(dates, codes), list(codes), [f"종목{code[-1]}{name_suffix}" for code in codes],
+                     "eps")
+
+
+def snapshot_panels():
+    """연도 경계를 넘는 세 파일 - 과거 값 정정, 셀 삭제, 빈 칸 채움, 열 순서 변경, 종목 편출/편입"""
+    first = make_panel('2024-10-01', '2024-12-31', ["A000001", "A000002", "A000003"])
+    set_cell(first, '2024-12-10', "A000001", np.nan)
+
+    second = make_panel('2024-11-01', '2025-01-31', ["A000002", "A000001", "A000004"], "(변경)")
+    set_cell(second, '2024-11-05', "A000001", 1.5)       # 정정
+    set_cell(second, '2024-12-02', "A000002", np.nan)    # 삭제
+    set_cell(second, '2024-12-10', "A000001", 7.0)       # 빈 칸 → 값 (이전 스냅샷이 본 칸)
+
+    third = make_panel('2024-12-01', '2025-02-28', ["A000001", "A000002", "A000004"])
+    set_cell(third, '2024-12-10', "A000001", 8.0)        # 같은 칸 두 번째 정정
+    set_cell(third, '2024-12-02', "A000002", 3.0)        # 삭제된 칸 복원
+    set_cell(third, '2025-01-15', "A000004", -2.0)
+    return [first, second, third]
+
+
+def assert_same_panel(actual, expected):
+    assert np.array_equal(actual.dates, expected.dates)
+    assert list(actual.codes) == list(expected.codes)
+    assert list(actual.names) == list(expected.names)
+    assert np.array_equal(actual.values, expected.values, equal_nan=True)
+
+
+def ingest_all(store, panels, count=None):
+    for as_of, panel in list(zip(AS_OF, panels))[:count]:
+        store.ingest(as_of, {SHEET: panel}, source=f"raw_data_{as_of:%Y%m%d}.xlsx", digest=f"digest_{as_of:%Y%m%d}")
+
+
+def test_snapshot_panel_reproduces_each_ingested_file(tmp_path):
+    panels = snapshot_panels()
+    store = HistoryStore(str(tmp_path / "store"))
+    ingest_all(store, panels)
+
+    # 새로 연 저장소에서도 기준일 / 스냅샷 번호 / 사이 날짜로 각 파일을 그대로 복원
+    store = HistoryStore(str(tmp_path / "store"))
+    for snapshot_id, (as_of, panel) in enumerate(zip(AS_OF, panels)):
+        assert_same_panel(store.snapshot_panel(*SHEET, as_of), panel)
+        assert_same_panel(store.snapshot_panel(*SHEET, snapshot_id), panel)
+    assert_same_panel(store.snapshot_panel(*SHEET, datetime(2025, 1, 15)), panels[0])
+    # 2번째 파일 3칸(정정, 삭제, 빈 칸 채움) + 3번째 파일 3칸
+    assert store.revision_count(*SHEET) == 6
+
+    history = store.history_panel(*SHEET)
+    assert np.array_equal(history.dates, business_days('2024-10-01', '2025-02-28'))
+    assert history.codes == ["A000001", "A000002", "A000003", "A000004"]
+    latest = history.values[np.searchsorted(history.dates, panels[2].dates)][:, [0, 1, 3]]
+    assert np.array_equal(latest, panels[2].values, equal_nan=True)
+
+
+def test_rejects_out_of_order_as_of(tmp_path):
+    panels = snapshot_panels()
+    store = HistoryStore(str(tmp_path / "store"))
+    ingest_all(store, panels, 2)
+    with pytest.raises(ValueError):
+        store.ingest(datetime(2025, 1, 15), {SHEET: panels[2]}, digest="late_file")
+    assert len(store.snapshots()) == 2 and HistoryStore(str(tmp_path / "store")).manifest["generation"] == 2
+    assert_same_panel(store.snapshot_panel(*SHEET), panels[1])
+
+
+def test_skips_identical_digest(tmp_path):
+    panels = snapshot_panels()
+    store = HistoryStore(str(tmp_path / "store"))
+    ingest_all(store, panels, 2)
+    generation = store.manifest["generation"]
+
+    # 같은 내용의 _backup 사본은 기준일이 달라도 기존 스냅샷 반환
+    snapshot = store.ingest(AS_OF[2], {SHEET: panels[2]}, source="raw_data_20250131_backup.xlsx",
+                            digest="digest_20250131")
+    assert snapshot.snapshot_id == 1 and snapshot.source == "raw_data_20250131.xlsx"
+    assert len(store.snapshots()) == 2 and store.manifest["generation"] == generation
+
+
+@pytest.mark.parametrize("failing_file", ["chunk_2025", "snapshots_", MANIFEST_FILENAME])
+def test_interrupted_generation_keeps_previous_manifest(tmp_path, monkeypatch, failing_file):
+    panels = snapshot_panels()
+    directory = str(tmp_path / "store")
+    store = HistoryStore(directory)
+    ingest_all(store, panels, 2)
+    write_atomic = history_store.write_atomic
+
+    def failing_write_atomic(path, write):
+        if os.path.basename(path).startswith(failing_file):
+            raise OSError("디스크 쓰기 실패")
+        write_atomic(path, write)
+    monkeypatch.setattr(history_store, "write_atomic", failing_write_atomic)
+    with pytest.raises(OSError):
+        store.ingest(AS_OF[2], {SHEET: panels[2]}, digest="digest_20250228")
+    monkeypatch.undo()
+
+    # manifest는 이전 세대를 가리키므로 이전 스냅샷이 그대로 복원됨
+    reopened = HistoryStore(directory)
+    assert reopened.manifest == store.manifest and len(reopened.snapshots()) == 2
+    for as_of, panel in zip(AS_OF[:2], panels[:2]):
+        assert_same_panel(reopened.snapshot_panel(*SHEET, as_of), panel)
+
+    # 다시 추가하면 같은 세대로 기록하고, manifest가 가리키지 않는 파일은 남지 않음
+    reopened.ingest(AS_OF[2], {SHEET: panels[2]}, digest="digest_20250228")
+    assert_same_panel(HistoryStore(directory).snapshot_panel(*SHEET), panels[2])
+    series = reopened.manifest["series"]["eps_sheet|eps"]
+    referenced = set(series["chunks"].values()) | {series["dates"], series["revisions"], series["snapshots"]}
+    assert set(os.listdir(os.path.join(directory, series["directory"]))) == referenced
@@ -0,0 +1,102 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from index_calculator import IndexCalculator, backtest_index_levels, rebalance_effective_date
+from panel_data import PanelData
+
+CODES = ["A1", "B2", "C3", "D4"]
+SELECTION_DATES = [datetime(2024, 1, 31), datetime(2024, 2, 29), datetime(2024, 3, 29)]
+WEIGHTS = np.array([[0.4, 0.3, 0.3, 0.0],
+                    [0.0, 0.5, 0.25, 0.25],
+                    [0.2, 0.2, 0.2, 0.4]])
+
+
+def price_panel(holiday=None):
+    dates = np.arange(np.datetime64('2024-01-01'), np.datetime64('2024-06-29'), dtype='datetime64[D]')
+    dates = dates[np.is_busday(dates)]
+    if holiday is not None:
+        dates = dates[dates != np.datetime64(holiday)]
+    rng = np.random.default_rng(7)
+    values = 100.0 * np.cumprod(1.0 + rng.normal(0.0, 0.02, (len(dates), len(CODES))), axis=0)
+    return PanelData(dates, values, CODES, [f"종목{code}" for code in CODES], "price")
+
+
+@pytest.mark.parametrize("year", range(2019, 2027))
+def test_effective_date_is_monday_between_8th_and_14th_of_next_month(year):
+    for month in range(1, 13):
+        selection_date = datetime(year, month, 28)
+        effective_date = rebalance_effective_date(selection_date)
+        assert effective_date.weekday() == 0 and 8 <= effective_date.day <= 14
+        assert (effective_date.year, effective_date.month) == \
+            ((year + 1, 1) if month == 12 else (year, month + 1))
+
+
+def test_effective_date_known_values():
+    # 2024-12-31 → 2025-01-08(수) 이후 첫 월요일, 8일이 월요일이면 당일
+    assert rebalance_effective_date(datetime(2024, 12, 31)) == datetime(2025, 1, 13)
+    assert rebalance_effective_date(datetime(2024, 6, 28)) == datetime(2024, 7, 8)
+    assert rebalance_effective_date(datetime(2024, 8, 30)) == datetime(2024, 9, 9)
+
+
+def test_effective_row_moves_to_next_trading_day_on_holiday():
+    panel = price_panel(holiday='2024-03-11')
+    rows = IndexCalculator(panel).effective_rows(SELECTION_DATES)
+    assert [str(panel.dates[row]) for row in rows] == ['2024-02-12', '2024-03-12', '2024-04-08']
+
+
+def reference_levels(prices, anchor_rows, weights, base_level):
+    """리밸런싱마다 직전 지수로 보유 수량을 다시 정하는 순차 계산"""
+    levels = []
+    holdings = weights[0] * base_level / prices[anchor_rows[0]]
+    segment = 0
+    for row in range(anchor_rows[0], len(prices)):
+        level = float(holdings @ prices[row])
+        levels.append(level)
+        if segment + 1 < len(anchor_rows) and row == anchor_rows[segment + 1]:
+            segment += 1
+            holdings = weights[segment] * level / prices[row]
+    return np.array(levels)
+
+
+def test_levels_continuous_across_rebalances():
+    panel = price_panel(holiday='2024-03-11')
+    result = IndexCalculator(panel, gradual=False).calculate(SELECTION_DATES, CODES, WEIGHTS)
+    anchor_rows = IndexCalculator(panel).effective_rows(SELECTION_DATES) - 1
+    first_row = anchor_rows[0]
+
+    assert str(result.dates[0]) == '2024-02-09' and result.levels[0] == pytest.approx(1000.0)
+    np.testing.assert_allclose(result.levels, reference_levels(panel.values, anchor_rows, WEIGHTS, 1000.0))
+    # I_t = M_t / B_t × 1000
+    np.testing.assert_allclose(result.levels, result.comparison_caps / result.divisors * 1000.0)
+
+    for k in range(1, len(anchor_rows)):
+        # 기준시가총액은 편입 행 다음 날부터 B_new = B_old × M_new / M_old로 바뀌고 구간 안에서는 일정
+        row = anchor_rows[k] - first_row
+        new_cap = panel.values[anchor_rows[k]][WEIGHTS[k] > 0].sum()
+        assert result.divisors[row + 1] / result.divisors[row] == \
+            pytest.approx(new_cap / result.comparison_caps[row])
+    changes = np.flatnonzero(np.diff(result.divisors) != 0) + 1
+    np.testing.assert_array_equal(changes, anchor_rows[1:] - first_row + 1)
+
+
+def test_gradual_rebalancing_averages_with_previous_weights():
+    result = IndexCalculator(price_panel()).calculate(SELECTION_DATES, CODES, WEIGHTS)
+    np.testing.assert_allclose(result.applied_weights[0], WEIGHTS[0])
+    np.testing.assert_allclose(result.applied_weights[1], (WEIGHTS[0] + WEIGHTS[1]) / 2.0)
+    np.testing.assert_allclose(result.applied_weights[2], (result.applied_weights[1] + WEIGHTS[2]) / 2.0)
+
+
+class WeightHistory:
+    def weight_matrix(self):
+        return SELECTION_DATES, CODES, WEIGHTS
+
+
+def test_backtest_index_is_labelled_as_cap_proxy_without_price_panel():
+    panel = price_panel()
+    proxy = backtest_index_levels(WeightHistory(), panel)
+    assert proxy.cap_proxy and proxy.label == "시가총액 근사지수"
+    priced = backtest_index_levels(WeightHistory(), None, price_panel=panel)
+    assert not priced.cap_proxy and priced.label == "지수(PR)"
+    np.testing.assert_allclose(proxy.levels, priced.levels)
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+
+from panel_cache import PanelCache, file_digest, projection_key
+from panel_data import PanelData
+from synthetic_workbook import generate_raw_workbook
+from monthly_rebalancing_scheduler import DeepSearchForeignBuyingTop20IndexSystem
+
+
+def make_panel(stock_count=3, day_count=4, offset=0.0):
+    dates = np.datetime64('2025-01-01') + np.arange(day_count)
+    values = np.arange(day_count * stock_count, dtype=float).reshape(day_count, stock_count) + offset
+    return PanelData(dates, values, [f"A{i}" for i in range(stock_count)], [f"종목{i}" for i in range(stock_count)],
+                     "eps")
+
+
+def test_round_trip_and_projection_key(tmp_path):
+    cache = PanelCache(str(tmp_path), 1)
+    panel = make_panel()
+    cache.store_panel("digest", "eps_sheet", "eps", panel, 10)
+    loaded, total_stock_count = cache.load_panel("digest", "eps_sheet", "eps")
+    assert total_stock_count == 10
+    assert loaded.codes == panel.codes and loaded.names == panel.names
+    assert np.array_equal(loaded.values, panel.values)
+    assert cache.load_panel("digest", "eps_sheet", "eps", projection_key(["A0"])) is None
+    assert projection_key(["A1", "A0", "A1"]) == projection_key(["A0", "A1"])
+
+
+def test_changed_file_and_parser_version_miss(tmp_path):
+    workbook_path = tmp_path / "raw.xlsx"
+    workbook_path.write_bytes(b"first")
+    first_digest = file_digest(str(workbook_path))
+    workbook_path.write_bytes(b"second")
+    assert file_digest(str(workbook_path)) != first_digest
+
+    cache = PanelCache(str(tmp_path / "cache"), 1)
+    cache.store_panel(first_digest, "eps_sheet", "eps", make_panel())
+    cache.store_sheetnames(first_digest, ["eps_sheet"])
+    assert cache.load_panel(file_digest(str(workbook_path)), "eps_sheet", "eps") is None
+
+    bumped = PanelCache(str(tmp_path / "cache"), 2)
+    assert bumped.load_panel(first_digest, "eps_sheet", "eps") is None
+    assert bumped.load_sheetnames(first_digest) is None
+    assert cache.load_panel(first_digest, "eps_sheet", "eps") is not None
+
+
+def test_lru_eviction_at_byte_limit(tmp_path):
+    cache = PanelCache(str(tmp_path), 1, max_bytes=10 ** 9)
+    for digest in ("old", "used", "new"):
+        cache.store_panel(digest, "eps_sheet", "eps", make_panel(50, 50))
+    paths = sorted(os.path.join(tmp_path, name) for name in os.listdir(tmp_path))
+    entry_bytes = os.path.getsize(paths[0])
+
+    # 사용 시각: old < new < used (load가 사용 시각을 갱신)
+    for mtime, digest in ((1000, "old"), (2000, "used"), (3000, "new")):
+        path = cache._path(cache._key(digest, "eps_sheet", "eps", "all"), ".npz")
+        os.utime(path, (mtime, mtime))
+    assert cache.load_panel("used", "eps_sheet", "eps") is not None
+
+    cache.max_bytes = entry_bytes * 2
+    assert cache.evict() == 1
+    assert cache.load_panel("old", "eps_sheet", "eps") is None
+    assert cache.load_panel("used", "eps_sheet", "eps") is not None
+    assert cache.load_panel("new", "eps_sheet", "eps") is not None
+
+    cache.max_bytes = entry_bytes
+    assert cache.evict() == 1
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def parse_eps(path):
+    system = DeepSearchForeignBuyingTop20IndexSystem(str(path), None, "xml", use_cache=True, incremental=False,
+                                                     parse_workers=1)
+    assert system.load_source_excel_file()
+    panel, _ = system.parse_data("eps_sheet", "eps")
+    system.close_source_excel_file()
+    return panel
+
+
+def test_system_reparses_changed_workbook_and_new_parser_version(tmp_path, capsys, monkeypatch):
+    path = tmp_path / "raw.xlsx"
+    generate_raw_workbook(str(path), stock_count=5, day_count=30, seed=1)
+    first = parse_eps(path)
+    assert "캐시 사용" not in capsys.readouterr().out
+    assert np.array_equal(parse_eps(path).values, first.values, equal_nan=True)
+    assert "캐시 사용" in capsys.readouterr().out
+
+    generate_raw_workbook(str(path), stock_count=5, day_count=30, seed=2)
+    second = parse_eps(path)
+    assert "캐시 사용" not in capsys.readouterr().out
+    assert not np.array_equal(second.values, first.values, equal_nan=True)
+
+    monkeypatch.setattr(DeepSearchForeignBuyingTop20IndexSystem, "PARSER_VERSION",
+                        DeepSearchForeignBuyingTop20IndexSystem.PARSER_VERSION + 1)
+    parse_eps(path)
+    assert "캐시 사용" not in capsys.readouterr().out
+    parse_eps(path)
+    assert "캐시 사용" in capsys.readouterr().out
@@ -0,0 +1,149 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import openpyxl
+
+from monthly_rebalancing_scheduler import DeepSearchForeignBuyingTop20IndexSystem
+from panel_store import PanelStore
+
+CODES = ["A000001", "A000002", "A000003"]
+
+
+def trading_dates(start, count):
+    dates = []
+    day = start
+    while len(dates) < count:
+        if day.weekday() < 5:
+            dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+
+def write_raw(path, dates, values, codes=CODES):
+    """raw_data 배치(8행 종목코드, 9행 종목명, 15행부터 날짜 + 값)의 eps 시트 워크북"""
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "eps_sheet"
+    for column, code in enumerate(codes, 2):
+        sheet.cell(row=8, column=column, value=code)
+        sheet.cell(row=9, column=column, value=f"종목{code[-1]}")
+    for row, (date, row_values) in enumerate(zip(dates, values), 15):
+        sheet.cell(row=row, column=1, value=date)
+        for column, value in enumerate(row_values, 2):
+            if not np.isnan(value):
+                sheet.cell(row=row, column=column, value=float(value))
+    workbook.save(path)
+
+
+def parse(path, incremental=True):
+    system = DeepSearchForeignBuyingTop20IndexSystem(str(path), None, "xml", use_cache=False, incremental=incremental,
+                                                     parse_workers=1)
+    assert system.load_source_excel_file()
+    panel, _ = system.parse_data("eps_sheet", "eps")
+    system.close_source_excel_file()
+    return panel
+
+
+def make_values(dates, offset=0.0):
+    ordinals = np.array([date.toordinal() for date in dates], dtype=float)
+    return ordinals[:, None] / 1000.0 + np.arange(len(CODES))[None, :] + offset
+
+
+def test_appends_rows_after_matching_tail(tmp_path, capsys, monkeypatch):
+    dates = trading_dates(datetime(2025, 1, 1), 60)
+    first_path = tmp_path / "raw_data_20250301.xlsx"
+    second_path = tmp_path / "raw_data_20250331.xlsx"
+    write_raw(first_path, dates[:40], make_values(dates[:40]))
+    write_raw(second_path, dates[20:], make_values(dates[20:]))
+
+    parse(first_path)
+    capsys.readouterr()
+    start_rows = []
+    read_sheet_rows = DeepSearchForeignBuyingTop20IndexSystem.read_sheet_rows
+
+    def recording_read_sheet_rows(self, sheet_name, code_columns, start_row=15):
+        start_rows.append(start_row)
+        return read_sheet_rows(self, sheet_name, code_columns, start_row)
+    monkeypatch.setattr(DeepSearchForeignBuyingTop20IndexSystem, "read_sheet_rows", recording_read_sheet_rows)
+    panel = parse(second_path)
+    monkeypatch.undo()
+    output = capsys.readouterr().out
+    assert "마지막 5행 일치" in output and "이후 20행 추가" in output and "전체 파싱" not in output
+    # 저장된 20행 중 대조할 마지막 5행(파일 15행 + 15)부터만 읽음
+    assert start_rows == [30]
+    expected = parse(second_path, incremental=False)
+    assert np.array_equal(panel.dates, expected.dates)
+    assert np.array_equal(panel.values, expected.values, equal_nan=True)
+
+    history = PanelStore.for_source(str(second_path)).load("eps_sheet", "eps")
+    assert history.n_dates == 60
+
+
+def test_revision_inside_overlap_reparses_sheet(tmp_path, capsys):
+    dates = trading_dates(datetime(2025, 1, 1), 60)
+    first_path = tmp_path / "raw_data_20250301.xlsx"
+    second_path = tmp_path / "raw_data_20250331.xlsx"
+    write_raw(first_path, dates[:40], make_values(dates[:40]))
+    revised = make_values(dates[20:])
+    # 벤더 수정: 대조 대상인 마지막 저장 행들 중 하나의 값 변경
+    revised[17, 1] += 1.0
+    write_raw(second_path, dates[20:], revised)
+
+    parse(first_path)
+    capsys.readouterr()
+    panel = parse(second_path)
+    assert "전체 파싱 (저장 값 불일치)" in capsys.readouterr().out
+    assert np.array_equal(panel.values, revised, equal_nan=True)
+
+    # 누적 패널의 해당 기간도 수정된 값으로 교체
+    history = PanelStore.for_source(str(second_path)).load("eps_sheet", "eps")
+    assert history.values[37, 1] == revised[17, 1]
+    assert history.n_dates == 60
+
+
+def test_missing_overlap_date_reparses_sheet(tmp_path, capsys):
+    dates = trading_dates(datetime(2025, 1, 1), 60)
+    first_path = tmp_path / "raw_data_20250301.xlsx"
+    second_path = tmp_path / "raw_data_20250331.xlsx"
+    write_raw(first_path, dates[:40], make_values(dates[:40]))
+    kept = dates[20:30] + dates[31:]
+    write_raw(second_path, kept, make_values(kept))
+
+    parse(first_path)
+    capsys.readouterr()
+    parse(second_path)
+    assert "전체 파싱 (날짜축 불일치)" in capsys.readouterr().out
+
+
+def test_new_code_is_backfilled_over_file_period(tmp_path, capsys):
+    dates = trading_dates(datetime(2025, 1, 1), 60)
+    first_path = tmp_path / "raw_data_20250301.xlsx"
+    second_path = tmp_path / "raw_data_20250331.xlsx"
+    write_raw(first_path, dates[:40], make_values(dates[:40])[:, :2], CODES[:2])
+    write_raw(second_path, dates[20:], make_values(dates[20:]))
+
+    parse(first_path)
+    capsys.readouterr()
+    panel = parse(second_path)
+    output = capsys.readouterr().out
+    assert "신규 종목 1개" in output and "전체 파싱" not in output
+    expected = parse(second_path, incremental=False)
+    assert panel.codes == expected.codes
+    assert np.array_equal(panel.values, expected.values, equal_nan=True)
+
+
+def test_store_is_keyed_by_series_and_disabled_by_default(tmp_path):
+    first = PanelStore.for_source(str(tmp_path / "alpha_raw_data_20250831.xlsx"))
+    assert first._path("eps_sheet", "eps") == \
+        PanelStore.for_source(str(tmp_path / "alpha_raw_data_20250930.xlsx"))._path("eps_sheet", "eps")
+    assert first._path("eps_sheet", "eps") != \
+        PanelStore.for_source(str(tmp_path / "beta_raw_data_20250831.xlsx"))._path("eps_sheet", "eps")
+
+    dates = trading_dates(datetime(2025, 1, 1), 5)
+    path = tmp_path / "raw_data_20250110.xlsx"
+    write_raw(path, dates, make_values(dates))
+    system = DeepSearchForeignBuyingTop20IndexSystem(str(path), None, "xml", use_cache=False, parse_workers=1)
+    assert system.panel_store is None
+    parse(path, incremental=False)
+    assert not os.path.exists(tmp_path / ".panel_store")
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+
+import parallel_parser
+from parallel_parser import create_work_directory, default_worker_count, parse_sheets_parallel, sheet_xml_sizes
+from synthetic_workbook import generate_raw_workbook
+from monthly_rebalancing_scheduler import DeepSearchForeignBuyingTop20IndexSystem
+
+
+def make_workbook(tmp_path, stock_count=40, day_count=60):
+    path = str(tmp_path / "raw.xlsx")
+    generate_raw_workbook(path, stock_count=stock_count, day_count=day_count)
+    return path
+
+
+def test_worker_count_follows_sheet_xml_size(tmp_path, monkeypatch):
+    path = make_workbook(tmp_path)
+    sheets = ["eps_sheet", "foreign_sheet", "market_cap_sheet"]
+    sizes = sheet_xml_sizes(path, sheets)
+    assert all(size > os.path.getsize(path) / 3 for size in sizes)
+
+    monkeypatch.setattr(parallel_parser.os, "cpu_count", lambda: 8)
+    # 작은 시트: 병렬로 줄어드는 시간이 워커 시작 비용보다 작음
+    assert default_worker_count(3, path, sheets) == 1
+    # 같은 시트도 MB당 파싱 시간이 길면 병렬
+    monkeypatch.setattr(parallel_parser, "PARSE_SECONDS_PER_SHEET_MB",
+                        2 * parallel_parser.WORKER_START_SECONDS * 1024 * 1024 / min(sizes))
+    assert default_worker_count(3, path, sheets) == 3
+    assert default_worker_count(2, path, sheets[:2]) == 2
+    # 파일 정보가 없으면 작업 수와 코어 수 기준
+    assert default_worker_count(12) == 8
+
+
+def test_parallel_parse_maps_values_without_copy(tmp_path):
+    path = make_workbook(tmp_path)
+    system = DeepSearchForeignBuyingTop20IndexSystem(path, None, "xml", use_cache=False, parse_workers=1)
+    assert system.load_source_excel_file()
+    expected, total_stock_count = system.parse_data("foreign_sheet", "foreign")
+    system.close_source_excel_file()
+
+    codes = expected.codes[::3]
+    work_directory = create_work_directory()
+    try:
+        results = parse_sheets_parallel(path, "xml", [("foreign_sheet", "foreign"), ("eps_sheet", "eps")],
+                                        work_directory, 2, stock_codes=codes)
+        panel, parsed_total, _ = results[("foreign_sheet", "foreign")]
+        assert parsed_total == total_stock_count
+        assert panel.codes == codes
+        assert np.array_equal(panel.values, expected.values[:, ::3], equal_nan=True)
+        # memory-map 그대로 사용 (읽기 전용)
+        assert not panel.values.flags.writeable
+        assert results[("eps_sheet", "eps")][0].codes == codes
+        del panel, results
+    finally:
+        parallel_parser.remove_work_directory(work_directory)
+    assert not os.path.exists(work_directory)
+
+
+def test_prefetch_uses_projection_and_removes_work_directory(tmp_path):
+    path = make_workbook(tmp_path)
+    system = DeepSearchForeignBuyingTop20IndexSystem(path, None, "xml", use_cache=False, parse_workers=2)
+    assert system.load_source_excel_file()
+    codes = ["A000001", "A000003"]
+    assert system.prefetch_sheets([("foreign_sheet", "foreign"), ("market_cap_sheet", "market_cap")], codes)
+    work_directory = system.parse_work_directory
+    assert os.path.isdir(work_directory)
+
+    panel, _ = system.parse_data("foreign_sheet", "foreign", codes)
+    assert panel.codes == codes
+    # 병렬 파싱에서 로드하지 않은 종목이 필요하면 다시 파싱
+    assert ("foreign_sheet", "foreign") in system.prefetched_panels
+    full_panel, total_stock_count = system.parse_data("foreign_sheet", "foreign")
+    assert len(full_panel.codes) == total_stock_count == 40
+
+    system.close_source_excel_file()
+    assert system.parse_work_directory is None
+    assert not os.path.exists(work_directory)
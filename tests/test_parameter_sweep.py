@@ -0,0 +1,47 @@
+import pytest
+
+from backtest_engine import BacktestEngine
+from panel_data import PanelData
+from parameter_sweep import ParameterSweep
+from selection_parameters import DEFAULT_PARAMETERS, parameter_grid
+from synthetic_workbook import SyntheticMarket
+
+
+def make_engine(full_year_fetch=True):
+    market = SyntheticMarket(stock_count=160, day_count=320, empty_density=0.05, seed=5)
+    panels = [PanelData(market.dates, market.values[sheet_name], market.codes, market.names, data_type)
+              for sheet_name, data_type in (("eps_sheet", "eps"), ("foreign_sheet", "foreign"),
+                                            ("market_cap_sheet", "market_cap"))]
+    return BacktestEngine(*panels, full_year_fetch=full_year_fetch)
+
+
+def assert_sweep_matches_engine(engine, parameter_sets, rebalance_dates):
+    result = ParameterSweep(engine).run(parameter_sets, rebalance_dates)
+    for parameters in parameter_sets:
+        for rebalance_date, windows in zip(rebalance_dates, engine.as_of_windows(rebalance_dates, parameters)):
+            expected, _ = engine.select_constituents(windows, parameters)
+            actual = result.constituents(parameters, rebalance_date)
+            assert [record['code'] for record in actual] == [record['code'] for record in expected]
+            for record, expected_record in zip(actual, expected):
+                assert {key: record[key] for key in expected_record} == expected_record
+    return result
+
+
+def test_default_parameters_match_select_constituents():
+    engine = make_engine()
+    rebalance_dates = engine.rebalance_dates()[-3:]
+    result = assert_sweep_matches_engine(engine, [DEFAULT_PARAMETERS], rebalance_dates)
+    # 백테스트 실행 결과와도 같음
+    backtest = engine.run(rebalance_dates)
+    for rebalance_date in rebalance_dates:
+        assert result.weights(DEFAULT_PARAMETERS, rebalance_date) == \
+            {record['code']: record['final_weight'] for record in backtest.constituents(rebalance_date)}
+
+
+@pytest.mark.parametrize("full_year_fetch", [True, False])
+def test_grid_matches_select_constituents(full_year_fetch):
+    # 받기 구간을 줄이면 수급강도 창 길이에 따라 조합마다 B5가 달라짐
+    engine = make_engine(full_year_fetch)
+    grid = parameter_grid(eps_top_k=[60, 100], intensity_months=[3, 6], flow_top_k=[5, 10])
+    result = assert_sweep_matches_engine(engine, grid, engine.rebalance_dates()[-2:])
+    assert len(result.summaries) == len(grid) * 2
@@ -0,0 +1,50 @@
+import numpy as np
+
+from ranking_engine import StageRanking, top_k_positions
+
+
+def reference_order(scores):
+    """기존 sorted(..., reverse=True) 순서 (NaN은 최하위, 동점은 앞 순서 우선)"""
+    keyed = [(-np.inf if np.isnan(score) else score, position) for position, score in enumerate(scores)]
+    return [position for _, position in sorted(keyed, key=lambda item: item[0], reverse=True)]
+
+
+def test_ties_keep_original_order():
+    scores = [3.0, 5.0, 3.0, 5.0, 1.0, 3.0]
+    assert top_k_positions(scores, 3).tolist() == [1, 3, 0]
+    # k번째 경계의 동점도 앞 순서 우선
+    assert top_k_positions(scores, 4).tolist() == [1, 3, 0, 2]
+
+
+def test_nan_ranks_last():
+    scores = [np.nan, 2.0, np.nan, -1.0]
+    assert top_k_positions(scores, 4).tolist() == [1, 3, 0, 2]
+    assert top_k_positions(scores, 2).tolist() == [1, 3]
+
+
+def test_k_at_least_n_returns_full_order():
+    scores = [0.5, 2.0, 0.5, np.nan]
+    assert top_k_positions(scores, 4).tolist() == reference_order(scores)
+    assert top_k_positions(scores, 10).tolist() == reference_order(scores)
+    assert top_k_positions(scores, 0).tolist() == []
+    assert top_k_positions([], 3).tolist() == []
+
+
+def test_matches_sorted_reference_on_random_ties():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        scores = rng.integers(0, 5, rng.integers(1, 40)).astype(float)
+        scores[rng.random(len(scores)) < 0.1] = np.nan
+        k = int(rng.integers(0, len(scores) + 3))
+        assert top_k_positions(scores, k).tolist() == reference_order(scores)[:k]
+
+
+def test_stage_ranking_lookups():
+    ranking = StageRanking(["A", "B", "C", "D"], [1.0, 3.0, 3.0, np.nan], 2)
+    assert ranking.selected_codes() == ["B", "C"]
+    assert ranking.selected_rank_of("C") == 2
+    assert ranking.selected_rank_of("A") is None
+    assert ranking.is_selected("B") and not ranking.is_selected("D")
+    assert ranking.ordered_codes() == ["B", "C", "A", "D"]
+    assert ranking.rank_of("D") == 4
+    assert ranking.rank_of("Z") is None
@@ -0,0 +1,128 @@
+import re
+import zipfile
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+import pytest
+from openpyxl.utils.datetime import CALENDAR_MAC_1904
+
+from monthly_rebalancing_scheduler import DeepSearchForeignBuyingTop20IndexSystem
+from raw_data_reader import open_raw_workbook
+from synthetic_workbook import SHEET_LAYOUTS, generate_raw_workbook
+
+
+def sheet_rows(path, engine, sheet_name, min_row=1):
+    """리더 엔진별 행 값 (openpyxl은 행 끝을 None으로 채우므로 끝의 None 제거)"""
+    with open_raw_workbook(str(path), engine) as reader:
+        rows = []
+        for row in reader.iter_rows(sheet_name, min_row=min_row):
+            row = list(row)
+            while row and row[-1] is None:
+                row.pop()
+            rows.append(tuple(row))
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def parsed_sheet(path, engine, sheet_name):
+    """시스템의 헤더 / 데이터 행 읽기 결과"""
+    system = DeepSearchForeignBuyingTop20IndexSystem(str(path), None, engine, use_cache=False, parse_workers=1)
+    try:
+        code_columns, codes, name_row = system.read_sheet_header(sheet_name)
+        names = system.header_stock_names(name_row, code_columns, codes)
+        dates, values, row_count = system.read_sheet_rows(sheet_name, code_columns)
+        return code_columns, codes, names, dates, values, row_count
+    finally:
+        system.close_source_excel_file()
+
+
+def assert_same_parse(path, sheet_name):
+    expected = parsed_sheet(path, "openpyxl", sheet_name)
+    actual = parsed_sheet(path, "xml", sheet_name)
+    assert actual[:4] == expected[:4] and actual[5] == expected[5]
+    assert np.array_equal(actual[4], expected[4], equal_nan=True)
+    return actual
+
+
+def convert_to_shared_strings(path):
+    """인라인 문자열 셀을 공유 문자열(xl/sharedStrings.xml) 참조로 바꿔 다시 저장"""
+    with zipfile.ZipFile(path) as archive:
+        parts = {name: archive.read(name) for name in archive.namelist()}
+    strings = []
+
+    def shared(match):
+        strings.append(match.group(2))
+        return match.group(1) + b't="s"><v>' + str(len(strings) - 1).encode() + b'</v></c>'
+    for name in [name for name in parts if name.startswith("xl/worksheets/")]:
+        parts[name] = re.sub(rb'(<c [^>]*?)t="inlineStr"><is>(<t[^>]*>.*?</t>)</is></c>', shared, parts[name])
+    namespace = b'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    parts["xl/sharedStrings.xml"] = (b'<sst xmlns="' + namespace + b'" count="%d">' % len(strings)
+                                     + b"".join(b"<si>" + text + b"</si>" for text in strings) + b"</sst>")
+    parts["[Content_Types].xml"] = parts["[Content_Types].xml"].replace(
+        b"</Types>", b'<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-'
+                     b'officedocument.spreadsheetml.sharedStrings+xml"/></Types>')
+    parts["xl/_rels/workbook.xml.rels"] = parts["xl/_rels/workbook.xml.rels"].replace(
+        b"</Relationships>", b'<Relationship Id="rIdShared" Type="http://schemas.openxmlformats.org/officeDocument/'
+                             b'2006/relationships/sharedStrings" Target="sharedStrings.xml"/></Relationships>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in parts.items():
+            archive.writestr(name, content)
+    return len(strings)
+
+
+def test_synthetic_workbook_matches_openpyxl(tmp_path):
+    path = tmp_path / "raw_data_20250829.xlsx"
+    market = generate_raw_workbook(str(path), stock_count=30, day_count=40, empty_density=0.1)
+
+    for sheet_name in SHEET_LAYOUTS:
+        # 인라인 문자열(inlineStr), 날짜 서식 A열, 숫자 서식 값, 생략된 빈 셀
+        assert sheet_rows(path, "xml", sheet_name) == sheet_rows(path, "openpyxl", sheet_name)
+        assert sheet_rows(path, "xml", sheet_name, min_row=15) == sheet_rows(path, "openpyxl", sheet_name, 15)
+        _, codes, names, dates, values, row_count = assert_same_parse(path, sheet_name)
+        assert codes == market.codes and names == market.names and row_count == market.day_count
+        assert np.array_equal(np.array(dates, dtype='datetime64[D]'), market.dates)
+        assert np.isnan(values).sum() == np.isnan(market.values[sheet_name]).sum()
+
+
+@pytest.mark.parametrize("date1904", [False, True])
+@pytest.mark.parametrize("shared_strings", [False, True])
+def test_openpyxl_written_workbook_matches_openpyxl(tmp_path, date1904, shared_strings):
+    path = tmp_path / "raw_data_20250131.xlsx"
+    workbook = openpyxl.Workbook()
+    if date1904:
+        workbook.epoch = CALENDAR_MAC_1904
+    sheet = workbook.active
+    sheet.title = "eps_sheet"
+    sheet["A1"] = "Refresh"
+    sheet["B5"] = 20250102
+    sheet["B6"] = 20250131
+    for column, (code, name) in enumerate([("A000001", "종목1"), ("A000002", None), ("A000003", "종목3")], 2):
+        sheet.cell(row=8, column=column, value=code)
+        sheet.cell(row=9, column=column, value=name)
+    sheet.cell(row=8, column=6, value="A000005")
+    sheet["A14"] = "D A T E"
+    rows = [
+        (datetime(2025, 1, 2), 1.5, None, 3, "-"),
+        (datetime(2025, 1, 3), None, None, None, None),
+        ("2025-01-06", 2.25, -4.0, 0, None),
+        (datetime(2025, 1, 7), True, 1e-7, 12345678901, 7.0),
+    ]
+    for row_number, row in enumerate(rows, 15):
+        for column, value in enumerate(row, 1):
+            if value is not None:
+                sheet.cell(row=row_number, column=column, value=value)
+    sheet.cell(row=15, column=1).number_format = "yyyy-mm-dd"
+    workbook.save(path)
+    if shared_strings:
+        # 문자열 셀 형식: 인라인(t="inlineStr") / 공유 문자열(t="s")
+        assert convert_to_shared_strings(path) == 10
+
+    assert sheet_rows(path, "xml", "eps_sheet") == sheet_rows(path, "openpyxl", "eps_sheet")
+    assert sheet_rows(path, "xml", "eps_sheet", min_row=9) == sheet_rows(path, "openpyxl", "eps_sheet", 9)
+    with open_raw_workbook(str(path), "xml") as reader:
+        assert reader.date1904 == date1904
+    code_columns, codes, names, dates, _, row_count = assert_same_parse(path, "eps_sheet")
+    assert code_columns == [1, 2, 3, 5] and names[1] == "종목_A000002"
+    assert dates[0] == datetime(2025, 1, 2) and dates[-1] == datetime(2025, 1, 7) and row_count == 4
@@ -0,0 +1,141 @@
+from monthly_rebalancing_scheduler import MonthlyRebalancingScheduler
+from refresh_backend import FakeClock, FakeRefreshBackend, FakeRefreshSheet, RefreshProbe, RefreshWaiter
+
+
+def make_waiter(clock, sleeps=None, **options):
+    def sleep(seconds):
+        if sleeps is not None:
+            sleeps.append(seconds)
+        clock.sleep(seconds)
+    return RefreshWaiter(clock=clock, sleep=sleep, **options)
+
+
+def refresh(sheet, waiter_options=None, sleeps=None):
+    clock = FakeClock()
+    backend = FakeRefreshBackend([sheet], clock=clock)
+    waiter = make_waiter(clock, sleeps, **(waiter_options or {}))
+    before = backend.probe(sheet.name)
+    backend.trigger_refresh(sheet.name)
+    return waiter.wait(backend, sheet.name, before)
+
+
+class ScriptedBackend:
+    """시각별 RefreshProbe를 돌려주는 백엔드 (script: [(시작 시각, probe), ...])"""
+
+    def __init__(self, clock, script):
+        self.clock = clock
+        self.script = script
+
+    def probe(self, sheet_name):
+        current = self.script[0][1]
+        for start, probe in self.script:
+            if self.clock() >= start:
+                current = probe
+        return current
+
+
+def test_sentinel_signal():
+    result = refresh(FakeRefreshSheet("eps_sheet", duration=5.0))
+    assert result.completed and result.reason == "sentinel"
+    assert 5.0 <= result.elapsed < 8.0
+
+
+def test_completion_cell_signal_without_sentinel_or_range_change():
+    sheet = FakeRefreshSheet("eps_sheet", duration=5.0, rows_before=500, rows_after=500, report_calculation=False,
+                             update_sentinel=False, write_completion=True)
+    result = refresh(sheet)
+    assert result.completed and result.reason == "completion"
+    assert 5.0 <= result.elapsed < 8.0
+
+
+def test_calculation_state_signal_with_same_dimensions_and_unchanged_sentinel():
+    sheet = FakeRefreshSheet("eps_sheet", duration=5.0, rows_before=500, rows_after=500, update_sentinel=False)
+    result = refresh(sheet, {"stable_seconds": 2.0})
+    assert result.completed and result.reason == "calculation"
+    # 계산 완료 후 안정 시간(2초) 동안 유지를 확인한 뒤 완료
+    assert 7.0 <= result.elapsed < 9.0
+
+
+def test_range_signal_requires_minimum_stable_duration():
+    clock = FakeClock()
+    before = RefreshProbe(sentinel="same", used_rows=15, used_columns=10)
+    # 채우는 도중 1.5초씩 범위가 멈췄다가 다시 늘어남 → 안정 시간(2초)에 못 미치므로 완료가 아님
+    backend = ScriptedBackend(clock, [
+        (0.0, before),
+        (1.0, RefreshProbe(sentinel="same", used_rows=200, used_columns=10)),
+        (2.5, RefreshProbe(sentinel="same", used_rows=400, used_columns=10)),
+        (4.0, RefreshProbe(sentinel="same", used_rows=500, used_columns=10)),
+    ])
+    waiter = make_waiter(clock, stable_seconds=2.0)
+    result = waiter.wait(backend, "eps_sheet", before)
+    assert result.completed and result.reason == "range"
+    assert 6.0 <= result.elapsed < 7.0
+
+
+def test_busy_probe_counts_as_processing():
+    clock = FakeClock()
+    before = RefreshProbe(sentinel="same", used_rows=500, used_columns=10)
+    backend = ScriptedBackend(clock, [(0.0, RefreshProbe(busy=True)), (3.0, before)])
+    result = make_waiter(clock, stable_seconds=1.0).wait(backend, "eps_sheet", before)
+    assert result.completed and result.reason == "calculation"
+    assert 4.0 <= result.elapsed < 5.0
+
+
+def test_timeout_without_any_signal():
+    sheet = FakeRefreshSheet("eps_sheet", duration=0.0, rows_before=500, rows_after=500, report_calculation=False,
+                             update_sentinel=False)
+    result = refresh(sheet, {"timeout": 30.0, "sheet_timeouts": {"other": 5.0}})
+    assert not result.completed and result.reason == "timeout"
+    assert result.elapsed == 30.0
+
+
+def test_sheet_timeout_and_backoff_intervals():
+    sheet = FakeRefreshSheet("eps_sheet", duration=0.0, rows_before=500, rows_after=500, report_calculation=False,
+                             update_sentinel=False)
+    sleeps = []
+    result = refresh(sheet, {"timeout": 60.0, "sheet_timeouts": {"eps_sheet": 10.0}, "initial_interval": 0.5,
+                             "backoff": 2.0, "max_interval": 3.0}, sleeps)
+    assert not result.completed and result.elapsed == 10.0
+    # 0.5 → 1 → 2 → 3(상한) ... 마지막은 제한 시간까지 남은 시간만큼
+    assert sleeps[:5] == [0.5, 1.0, 2.0, 3.0, 3.0]
+    assert abs(sum(sleeps) - 10.0) < 1e-9 and sleeps[-1] == 0.5
+    assert result.polls == len(sleeps)
+
+
+
+def make_scheduler(tmp_path, sheets):
+    (tmp_path / "raw_data_20250131.xlsx").write_bytes(b"")
+    clock = FakeClock()
+    scheduler = MonthlyRebalancingScheduler(
+        str(tmp_path), refresh_backend_factory=lambda: FakeRefreshBackend(sheets, clock=clock),
+        refresh_waiter=make_waiter(clock))
+    scheduler.start_run_report()
+    return scheduler
+
+
+def stage_records(scheduler):
+    return {record.name: record for record in scheduler.run_report.stages}
+
+
+def test_refresh_stage_closes_before_live_analysis(tmp_path):
+    scheduler = make_scheduler(tmp_path, [FakeRefreshSheet("eps_sheet", values=[("Refresh",)])])
+    seen = []
+
+    def analyze(live_reader):
+        # 분석 시작 시 refresh 단계는 이미 끝나 있고 분석은 자체 단계로 기록
+        record = stage_records(scheduler)["refresh"]
+        seen.append((record.status, record.wall_seconds is not None))
+        with scheduler.stage("analysis"):
+            pass
+
+    assert scheduler.open_excel_and_refresh_data("raw_data_20250131.xlsx", "macro", analyze)
+    stages = stage_records(scheduler)
+    assert seen == [("ok", True)]
+    assert stages["refresh"].status == stages["refresh_save"].status == "ok"
+    assert stages["analysis"].started_offset >= stages["refresh"].started_offset + stages["refresh"].wall_seconds
+
+
+def test_refresh_stage_failed_when_refresh_fails(tmp_path):
+    scheduler = make_scheduler(tmp_path, [FakeRefreshSheet("eps_sheet", has_refresh_link=False)])
+    assert not scheduler.open_excel_and_refresh_data("raw_data_20250131.xlsx", "macro", lambda live_reader: None)
+    assert stage_records(scheduler)["refresh"].status == "failed"
@@ -0,0 +1,87 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import robustness_runner
+from backtest_engine import BacktestEngine
+from panel_data import PanelData
+from robustness_runner import Perturbation, RobustnessRunner, SharedPanel
+from synthetic_workbook import SyntheticMarket
+
+
+def make_engine():
+    market = SyntheticMarket(stock_count=160, day_count=320, empty_density=0.05, seed=11)
+    panels = [PanelData(market.dates, market.values[sheet_name], market.codes, market.names, data_type)
+              for sheet_name, data_type in (("eps_sheet", "eps"), ("foreign_sheet", "foreign"),
+                                            ("market_cap_sheet", "market_cap"))]
+    return BacktestEngine(*panels)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return make_engine()
+
+
+def test_zero_perturbation_matches_backtest(engine):
+    # 패널 마지막 월말과 그 이전 월말 (기준일 뒤 행이 남아 있는 경우)
+    for as_of_date in engine.rebalance_dates()[-3::2]:
+        expected = engine.run([as_of_date]).constituents(as_of_date)
+        result = RobustnessRunner(engine, max_workers=1).run(4, Perturbation(eps_noise=0, foreign_noise=0),
+                                                             as_of_date)
+        assert [record['code'] for record in result.baseline_constituents] == \
+            [record['code'] for record in expected]
+        for actual_record, expected_record in zip(result.baseline_constituents, expected):
+            # 백테스트 레코드에는 기준일/순위가 더 있음
+            assert actual_record == pytest.approx({key: expected_record[key] for key in actual_record})
+        assert result.exact_match_rate == 1.0 and result.mean_overlap == 1.0
+        assert set(result.stable_codes(1.0)) == {record['code'] for record in expected}
+
+
+def test_results_do_not_depend_on_max_workers(engine):
+    perturbation = Perturbation(eps_noise=0.05, foreign_noise=0.2, missing_rate=0.02, resample_days=True)
+    results = [RobustnessRunner(engine, max_workers=workers).run(10, perturbation, seed=7) for workers in (1, 3)]
+    sequential, parallel = results
+    assert np.array_equal(sequential.counts, parallel.counts)
+    assert np.allclose(sequential.weight_sums, parallel.weight_sums)
+    assert sequential.exact_matches == parallel.exact_matches
+    assert sequential.overlap_sum == pytest.approx(parallel.overlap_sum)
+    assert sequential.exact_match_rate < 1.0
+    # seed가 다르면 다른 교란
+    other = RobustnessRunner(engine, max_workers=1).run(10, perturbation, seed=8)
+    assert not np.array_equal(other.counts, sequential.counts)
+
+
+def fail_chunk(*args):
+    raise RuntimeError("워커 실패")
+
+
+def recording_shared_panels(monkeypatch):
+    names = []
+
+    class RecordingSharedPanel(SharedPanel):
+        def __init__(self, panel):
+            super().__init__(panel)
+            names.append(self.shared_memory.name)
+    monkeypatch.setattr(robustness_runner, "SharedPanel", RecordingSharedPanel)
+    return names
+
+
+def assert_unlinked(names):
+    assert len(names) == 3
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_shared_memory_is_unlinked_after_run(engine, monkeypatch):
+    names = recording_shared_panels(monkeypatch)
+    RobustnessRunner(engine, max_workers=2).run(4, Perturbation(), seed=1)
+    assert_unlinked(names)
+
+    # 워커가 실패해도 공유 메모리는 지움
+    names.clear()
+    monkeypatch.setattr(robustness_runner, "_run_chunk", fail_chunk)
+    with pytest.raises(RuntimeError):
+        RobustnessRunner(engine, max_workers=2).run(4, Perturbation(), seed=1)
+    assert_unlinked(names)
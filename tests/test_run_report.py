@@ -0,0 +1,23 @@
+import json
+
+from monthly_rebalancing_scheduler import DeepSearchForeignBuyingTop20IndexSystem
+from run_report import run_report_path
+from synthetic_workbook import generate_raw_workbook
+
+
+def test_dual_cap_run_saves_report_next_to_each_output(tmp_path):
+    source_path = str(tmp_path / "raw_data_20250829.xlsx")
+    generate_raw_workbook(source_path, stock_count=150, day_count=260)
+    output_path = str(tmp_path / "result_20250829.xlsx")
+    ff_output_path = str(tmp_path / "result_ff_20250829.xlsx")
+
+    system = DeepSearchForeignBuyingTop20IndexSystem(source_path, output_path, "xml", use_cache=False,
+                                                     parse_workers=1)
+    assert system.run_dual_cap_system(ff_output_path)
+
+    reports = []
+    for path in (output_path, ff_output_path):
+        with open(run_report_path(path), encoding='utf-8') as file:
+            reports.append(json.load(file))
+    assert reports[0] == reports[1]
+    assert reports[0]["metadata"]["outputs"] == [output_path, ff_output_path]
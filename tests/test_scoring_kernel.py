@@ -0,0 +1,65 @@
+import numpy as np
+
+from panel_data import PanelData
+from scoring_kernel import MonthCalendar, WindowMeanKernel, month_start_dates
+
+DATES = np.array(['2025-01-30', '2025-01-31', '2025-02-03', '2025-02-28', '2025-03-03', '2025-03-31'],
+                 dtype='datetime64[D]')
+
+
+def make_panel(values):
+    return PanelData(DATES, np.array(values, dtype=float).reshape(len(DATES), -1), [f"A{i}" for i in range(
+        np.array(values).reshape(len(DATES), -1).shape[1])])
+
+
+def test_month_start_dates():
+    assert month_start_dates(np.datetime64('2025-03-31'), 1) == np.datetime64('2025-03-01')
+    assert month_start_dates(np.datetime64('2025-03-31'), 3) == np.datetime64('2025-01-01')
+    assert month_start_dates(np.datetime64('2025-01-15'), 2) == np.datetime64('2024-12-01')
+
+
+def test_window_start_rows_at_month_boundaries():
+    calendar = MonthCalendar(DATES)
+    end_rows = np.array([5, 3, 1, 4])
+    # 1개월 창은 종료 행이 속한 달의 첫 거래일부터
+    assert calendar.window_start_rows(end_rows, 1).tolist() == [4, 2, 0, 4]
+    # 2개월 창은 전월 첫 거래일부터
+    assert calendar.window_start_rows(end_rows, 2).tolist() == [2, 0, 0, 2]
+    # 날짜축 시작 이전으로 넘어가면 0행
+    assert calendar.window_start_rows(end_rows, 6).tolist() == [0, 0, 0, 0]
+
+
+def test_trailing_window_means_skip_nan_and_follow_last_valid_date():
+    values = [[1.0, 10.0],
+              [2.0, 20.0],
+              [3.0, np.nan],
+              [np.nan, 40.0],
+              [5.0, np.nan],
+              [7.0, np.nan]]
+    panel = make_panel(values)
+    kernel = WindowMeanKernel(panel)
+    columns = [0, 1]
+
+    start_rows, end_rows = kernel.trailing_window(columns, 1)
+    # A0: 마지막 유효일 3/31 → 3월 (5, 7), A1: 마지막 유효일 2/28 → 2월 (빈 셀 제외 40)
+    assert end_rows.tolist() == [5, 3]
+    means, counts = kernel.window_means(columns, start_rows, end_rows)
+    assert means.tolist() == [6.0, 40.0]
+    assert counts.tolist() == [2, 1]
+
+    start_rows, end_rows = kernel.trailing_window(columns, 2)
+    means, counts = kernel.window_means(columns, start_rows, end_rows)
+    # A0: 2~3월 (3, 5, 7), A1: 1~2월 (10, 20, 40)
+    assert np.allclose(means, [5.0, 70.0 / 3])
+    assert counts.tolist() == [3, 3]
+
+    start_rows, end_rows = kernel.trailing_window(columns, 3)
+    means, counts = kernel.window_means(columns, start_rows, end_rows)
+    assert np.allclose(means, [18.0 / 5, 70.0 / 3])
+
+
+def test_window_without_valid_values_has_zero_mean():
+    panel = make_panel([[np.nan]] * len(DATES))
+    means, counts = WindowMeanKernel(panel).window_means([0], [0], [5])
+    assert means.tolist() == [0.0]
+    assert counts.tolist() == [0]
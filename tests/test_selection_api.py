@@ -0,0 +1,58 @@
+import openpyxl
+import pytest
+
+from monthly_rebalancing_scheduler import DeepSearchForeignBuyingTop20IndexSystem
+from panel_data import PanelData
+from selection_api import select_constituents
+from selection_parameters import DEFAULT_PARAMETERS
+from synthetic_workbook import generate_raw_workbook
+
+
+@pytest.fixture(scope="module")
+def raw_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("raw") / "raw_data_20250829.xlsx"
+    generate_raw_workbook(str(path), stock_count=220, day_count=260, empty_density=0.03, seed=3)
+    return str(path)
+
+
+def result_sheet(output_path, sheet_name):
+    workbook = openpyxl.load_workbook(output_path, read_only=True)
+    try:
+        return list(workbook[sheet_name].iter_rows(min_row=2, values_only=True))
+    finally:
+        workbook.close()
+
+
+@pytest.mark.parametrize("use_market_cap", [True, False])
+def test_matches_result_excel(raw_path, tmp_path, use_market_cap):
+    output_path = str(tmp_path / "result.xlsx")
+    system = DeepSearchForeignBuyingTop20IndexSystem(raw_path, output_path, "xml", use_cache=False, parse_workers=1)
+    assert system.run_full_stock_system(use_market_cap)
+
+    result = select_constituents(raw_path, use_market_cap)
+    expected_weights = {row[1]: row[4] for row in result_sheet(output_path, "최종비중순위")}
+    assert list(result.weights()) == list(expected_weights)
+    assert result.weights() == pytest.approx(expected_weights)
+    assert len(result.eps.selected_codes()) == DEFAULT_PARAMETERS.eps_top_k
+    assert result.intensity.selected_codes() == [row[1] for row in result_sheet(output_path, "최종구성종목50개")]
+    assert result.total_stock_count == 220
+
+
+def test_parameters_change_stage_sizes(raw_path):
+    parameters = DEFAULT_PARAMETERS.replace(eps_top_k=60, intensity_top_k=30, flow_top_k=5)
+    result = select_constituents(raw_path, parameters=parameters)
+    assert len(result.eps.selected_codes()) == 60 and len(result.intensity.selected_codes()) == 30
+    assert len(result.one_month.selected_codes()) == 5 and result.parameters == parameters
+
+
+def test_missing_sheet_or_panel_raises_runtime_error(tmp_path):
+    path = str(tmp_path / "raw_data_20250829.xlsx")
+    workbook = openpyxl.Workbook()
+    workbook.active.title = "eps_sheet"
+    workbook.save(path)
+    with pytest.raises(RuntimeError):
+        select_constituents(path)
+
+    eps_panel = PanelData([], [], [], [], "eps")
+    with pytest.raises(RuntimeError):
+        select_constituents({"eps": eps_panel, "foreign": eps_panel})
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from backtest_engine import BacktestEngine
+from monthly_rebalancing_scheduler import MonthlyRebalancingScheduler
+from panel_data import PanelData
+from selection_parameters import DEFAULT_PARAMETERS, fetch_start_date
+
+
+def test_default_fetch_start_is_one_year_before():
+    assert fetch_start_date(datetime(2025, 8, 31)) == datetime(2024, 8, 31)
+    # 윤일이 낀 구간도 365일 전
+    assert fetch_start_date(datetime(2024, 3, 31)) == datetime(2023, 4, 1)
+
+
+@pytest.mark.parametrize("as_of_date, margin_months, expected", [
+    # 가장 긴 창 6개월: 기준월 포함 6개월 전 시작 월에서 여유 개월만큼 더 앞 월의 1일
+    (datetime(2025, 8, 31), 1, datetime(2025, 2, 1)),
+    (datetime(2025, 12, 31), 1, datetime(2025, 6, 1)),
+    (datetime(2025, 6, 30), 0, datetime(2025, 1, 1)),
+    # 연도 경계
+    (datetime(2025, 6, 30), 1, datetime(2024, 12, 1)),
+    (datetime(2025, 3, 31), 1, datetime(2024, 9, 1)),
+    (datetime(2025, 1, 31), 2, datetime(2024, 6, 1)),
+    (datetime(2025, 1, 31), 12, datetime(2023, 8, 1)),
+])
+def test_trimmed_fetch_start_month_arithmetic(as_of_date, margin_months, expected):
+    assert fetch_start_date(as_of_date, DEFAULT_PARAMETERS, margin_months, full_year=False) == expected
+
+
+def test_trimmed_fetch_start_follows_longest_window():
+    parameters = DEFAULT_PARAMETERS.replace(intensity_months=12)
+    assert fetch_start_date(datetime(2025, 1, 31), parameters, 1, full_year=False) == datetime(2024, 1, 1)
+    parameters = DEFAULT_PARAMETERS.replace(eps_long_months=14)
+    assert fetch_start_date(datetime(2025, 2, 28), parameters, 0, full_year=False) == datetime(2024, 1, 1)
+    with pytest.raises(ValueError):
+        fetch_start_date(datetime(2025, 1, 31), margin_months=-1, full_year=False)
+
+
+@pytest.mark.parametrize("full_year_fetch", [True, False])
+def test_backtest_window_matches_scheduler_fetch_start(tmp_path, full_year_fetch):
+    dates = np.arange(np.datetime64('2023-01-02'), np.datetime64('2025-07-01'), dtype='datetime64[D]')
+    dates = dates[np.is_busday(dates)]
+    panel = PanelData(dates, np.ones((len(dates), 1)), ["A000001"])
+    engine = BacktestEngine(panel, panel, panel, full_year_fetch=full_year_fetch)
+    scheduler = MonthlyRebalancingScheduler(str(tmp_path), full_year_fetch=full_year_fetch)
+
+    for as_of_date in (datetime(2024, 1, 31), datetime(2025, 6, 30)):
+        b5_value, _ = scheduler.date_cell_values(as_of_date)
+        assert engine.fetch_start(as_of_date).strftime('%Y%m%d') == b5_value
+        # 기준일 데이터 구간은 B5 당일 또는 이후 첫 거래일부터
+        windows = engine.as_of_windows([as_of_date])[0]
+        first_row = int(np.searchsorted(dates, np.datetime64(engine.fetch_start(as_of_date), 'D')))
+        assert windows.eps_counts[0] == int(np.searchsorted(dates, np.datetime64(as_of_date, 'D'), side='right')) \
+            - first_row
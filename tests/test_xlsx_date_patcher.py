@@ -0,0 +1,108 @@
+import re
+import zipfile
+
+import openpyxl
+
+from xlsx_date_patcher import CALC_CHAIN_PART, patch_date_cells
+
+CALC_CHAIN_XML = (b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                  b'<calcChain xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                  b'<c r="B5" i="2"/></calcChain>')
+
+
+def add_calc_chain(path):
+    """openpyxl은 calcChain/수식 캐시 값을 쓰지 않으므로 Excel이 저장한 파일처럼 추가"""
+    with zipfile.ZipFile(path) as archive:
+        parts = [(info, archive.read(info)) for info in archive.infolist()]
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for info, data in parts:
+            if info.filename == "xl/worksheets/sheet1.xml":
+                data = data.replace(b'<f>20250101+0</f><v />', b'<f>20250101+0</f><v>20250101</v>')
+            elif info.filename == "[Content_Types].xml":
+                data = data.replace(b'</Types>', b'<Override PartName="/xl/calcChain.xml" ContentType="application/'
+                                    b'vnd.openxmlformats-officedocument.spreadsheetml.calcChain+xml"/></Types>')
+            elif info.filename == "xl/_rels/workbook.xml.rels":
+                data = data.replace(b'</Relationships>', b'<Relationship Id="rIdCalc" Type="http://schemas.'
+                                    b'openxmlformats.org/officeDocument/2006/relationships/calcChain" '
+                                    b'Target="calcChain.xml"/></Relationships>')
+            archive.writestr(info, data)
+        archive.writestr(CALC_CHAIN_PART, CALC_CHAIN_XML)
+
+
+def make_workbook(path, eps_b5=20250101, formula_b5=False):
+    workbook = openpyxl.Workbook()
+    eps_sheet = workbook.active
+    eps_sheet.title = "eps_sheet"
+    eps_sheet["B5"] = "=20250101+0" if formula_b5 else eps_b5
+    eps_sheet["B6"] = "20250831"
+    eps_sheet["B7"] = 7
+    foreign_sheet = workbook.create_sheet("foreign_sheet")
+    foreign_sheet["B5"] = 20250101
+    # B6 비어 있음
+    workbook.save(path)
+    if formula_b5:
+        add_calc_chain(path)
+
+
+def sheet_xml(path, index):
+    with zipfile.ZipFile(path) as archive:
+        return archive.read(f"xl/worksheets/sheet{index}.xml").decode('utf-8')
+
+
+def cell_element(xml, cell_ref):
+    return re.search(r'<c r="%s"[^>]*?(?:/>|>.*?</c>)' % cell_ref, xml).group(0)
+
+
+def test_numeric_cell_stays_numeric_and_string_cell_uses_inline_string(tmp_path):
+    path = str(tmp_path / "raw.xlsx")
+    make_workbook(path)
+    results = patch_date_cells(path, 20240901, 20250930)
+
+    assert results == [("eps_sheet", [("B5", 20250101, 20240901), ("B6", "20250831", 20250930)]),
+                       ("foreign_sheet", [("B5", 20250101, 20240901)])]
+    xml = sheet_xml(path, 1)
+    assert 't=' not in cell_element(xml, "B5") and '<v>20240901</v>' in cell_element(xml, "B5")
+    assert 't="inlineStr"' in cell_element(xml, "B6") and '<t>20250930</t>' in cell_element(xml, "B6")
+    assert '<v>7</v>' in cell_element(xml, "B7")
+
+    workbook = openpyxl.load_workbook(path)
+    assert workbook["eps_sheet"]["B5"].value == 20240901
+    assert workbook["eps_sheet"]["B6"].value == "20250930"
+    # 비어 있던 셀은 그대로
+    assert workbook["foreign_sheet"]["B6"].value is None
+    workbook.close()
+
+
+def test_non_numeric_value_in_numeric_cell_becomes_inline_string(tmp_path):
+    path = str(tmp_path / "raw.xlsx")
+    make_workbook(path)
+    patch_date_cells(path, "2024-09-01", 20250930, sheet_names=["eps_sheet"])
+    assert 't="inlineStr"' in cell_element(sheet_xml(path, 1), "B5")
+    # 지정하지 않은 시트는 변경 없음
+    assert '<v>20250101</v>' in cell_element(sheet_xml(path, 2), "B5")
+
+
+def test_replacing_formula_drops_calc_chain(tmp_path):
+    path = str(tmp_path / "raw.xlsx")
+    make_workbook(path, formula_b5=True)
+    patch_date_cells(path, 20240901, 20250930)
+
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        content_types = archive.read("[Content_Types].xml")
+        relationships = archive.read("xl/_rels/workbook.xml.rels")
+    assert CALC_CHAIN_PART not in names
+    assert b'calcChain' not in content_types
+    assert b'calcChain' not in relationships
+    assert '<f>' not in cell_element(sheet_xml(path, 1), "B5")
+    assert openpyxl.load_workbook(path)["eps_sheet"]["B5"].value == 20240901
+
+
+def test_calc_chain_kept_without_formula_change(tmp_path):
+    path = str(tmp_path / "raw.xlsx")
+    make_workbook(path, formula_b5=True)
+    # B5 수식 셀이 없는 시트만 패치
+    patch_date_cells(path, 20240901, 20250930, sheet_names=["foreign_sheet"])
+    with zipfile.ZipFile(path) as archive:
+        assert archive.read(CALC_CHAIN_PART) == CALC_CHAIN_XML
+        assert b'calcChain' in archive.read("[Content_Types].xml")
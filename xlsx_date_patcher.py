@@ -0,0 +1,165 @@
+"""
+xlsx 셀 직접 패치기
+
+복사된 raw_data 워크북의 B5/B6 날짜 셀만 시트 XML에서 직접 바꿔 쓴다.
+openpyxl로 전체를 로드/저장하지 않으므로 수식 캐시, 주석, 서식 등
+나머지 부분은 원본 내용 그대로 유지된다 (Quantiwise refresh 대상 보존).
+"""
+
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape, unescape
+
+from raw_data_reader import XmlIterparseReader
+
+DATE_CELLS = ("B5", "B6")
+
+_ATTRIBUTE_PATTERN = re.compile(rb'([\w:]+)="([^"]*)"')
+_NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?\Z')
+CALC_CHAIN_PART = "xl/calcChain.xml"
+
+
+def _cell_pattern(cell_ref):
+    """<c r="B5" ...>...</c> 또는 <c r="B5" .../> 형태의 셀 요소"""
+    ref = re.escape(cell_ref.encode('ascii'))
+    return re.compile(
+        rb'<(?P<prefix>(?:\w+:)?)c(?=\s)(?P<attrs>[^>]*?\sr="' + ref + rb'"[^>]*?)'
+        rb'(?:/>|>(?P<body>.*?)</(?P=prefix)c>)',
+        re.DOTALL
+    )
+
+
+def _element_text(body, tag):
+    match = re.search(rb'<(?:\w+:)?' + tag + rb'(?:\s[^>]*)?>(.*?)</(?:\w+:)?' + tag + rb'>', body, re.DOTALL)
+    return None if match is None else unescape(match.group(1).decode('utf-8'))
+
+
+def _drop_calc_chain(part_bytes, part_name):
+    """수식 셀을 값으로 바꾼 경우 calcChain 참조 제거 (Excel이 열 때 재생성)"""
+    if part_name == "[Content_Types].xml":
+        return re.sub(rb'<Override[^>]*PartName="/xl/calcChain\.xml"[^>]*/>', b'', part_bytes)
+    if part_name == "xl/_rels/workbook.xml.rels":
+        return re.sub(rb'<Relationship[^>]*Target="(?:/xl/)?calcChain\.xml"[^>]*/>', b'', part_bytes)
+    return part_bytes
+
+
+class XlsxCellPatcher:
+    """시트 XML 안의 지정 셀만 교체하고 나머지 zip 항목은 그대로 복사하는 패치기"""
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def _cell_value(attributes, body, reader):
+        """패치 전 셀 값 (표시/빈 셀 판정용)"""
+        if body is None:
+            return None
+        cell_type = attributes.get(b't', b'n')
+        if cell_type == b'inlineStr':
+            texts = re.findall(rb'<(?:\w+:)?t(?:\s[^>]*)?>(.*?)</(?:\w+:)?t>', body, re.DOTALL)
+            return unescape(b"".join(texts).decode('utf-8'))
+        raw_value = _element_text(body, rb'v')
+        if raw_value is None:
+            return None
+        if cell_type == b's':
+            return reader.shared_strings[int(raw_value)]
+        if cell_type == b'n':
+            return float(raw_value) if any(c in raw_value for c in ".Ee") else int(raw_value)
+        return raw_value
+
+    @staticmethod
+    def _new_cell(prefix, attributes, value, numeric):
+        """새 셀 요소 (위치/스타일 속성 유지, 수식은 제거)"""
+        kept = b"".join(b' %s="%s"' % (name, attributes[name]) for name in (b'r', b's') if name in attributes)
+        if numeric:
+            return b'<%sc%s><%sv>%s</%sv></%sc>' % (prefix, kept, prefix, str(value).encode('utf-8'),
+                                                    prefix, prefix)
+        text = escape(str(value)).encode('utf-8')
+        return b'<%sc%s t="inlineStr"><%sis><%st>%s</%st></%sis></%sc>' % (
+            prefix, kept, prefix, prefix, text, prefix, prefix, prefix)
+
+    def _patch_part(self, xml_bytes, cell_values, reader, only_nonempty):
+        """시트 XML 한 개의 셀 교체 → (새 XML, [(셀, 이전 값, 새 값)], 수식 셀 포함 여부)"""
+        changes = []
+        removed_formula = False
+        for cell_ref, value in cell_values.items():
+            match = _cell_pattern(cell_ref).search(xml_bytes)
+            if match is None:
+                continue
+            attributes = dict(_ATTRIBUTE_PATTERN.findall(match.group('attrs')))
+            body = match.group('body')
+            current_value = self._cell_value(attributes, body, reader)
+            if only_nonempty and not current_value:
+                continue
+
+            # 기존 셀이 숫자형이고 새 값도 숫자 형태이면 숫자형 유지, 그 외에는 인라인 문자열
+            numeric = attributes.get(b't', b'n') == b'n' and _NUMBER_PATTERN.match(str(value)) is not None
+            if body is not None and re.search(rb'<(?:\w+:)?f[\s/>]', body):
+                removed_formula = True
+
+            new_cell = self._new_cell(match.group('prefix'), attributes, value, numeric)
+            xml_bytes = xml_bytes[:match.start()] + new_cell + xml_bytes[match.end():]
+            changes.append((cell_ref, current_value, value))
+        return xml_bytes, changes, removed_formula
+
+    def patch(self, cell_values, sheet_names=None, only_nonempty=True):
+        """모든(또는 지정) 시트의 셀 값 교체 후 원래 경로에 저장
+
+        cell_values: {셀 주소: 새 값}
+        only_nonempty: True면 기존 값이 비어 있는 셀은 건드리지 않음 (기존 동작과 동일)
+        반환: [(시트명, [(셀, 이전 값, 새 값), ...])] - 워크북 시트 순서
+        """
+        with XmlIterparseReader(self.path) as reader:
+            targets = [name for name in reader.sheetnames if sheet_names is None or name in sheet_names]
+            part_to_sheet = {reader.sheet_parts[name]: name for name in targets}
+
+            results = {}
+            patched_parts = {}
+            removed_formula = False
+            for part_name, sheet_name in part_to_sheet.items():
+                xml_bytes = reader.archive.read(part_name)
+                new_bytes, changes, formula = self._patch_part(xml_bytes, cell_values, reader, only_nonempty)
+                results[sheet_name] = changes
+                if changes:
+                    patched_parts[part_name] = new_bytes
+                    removed_formula = removed_formula or formula
+
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            if patched_parts:
+                self._write_archive(reader.archive, temp_path, patched_parts, removed_formula)
+
+        # 원본 zip을 닫은 뒤 교체 (Windows에서는 열린 파일을 덮어쓸 수 없음)
+        if patched_parts:
+            try:
+                os.replace(temp_path, self.path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+        return [(name, results.get(name, [])) for name in targets]
+
+    @staticmethod
+    def _write_archive(archive, temp_path, patched_parts, removed_formula):
+        """패치된 시트만 교체하고 나머지 항목은 내용/순서/압축 방식 그대로 새 zip에 기록"""
+        try:
+            with zipfile.ZipFile(temp_path, 'w') as output:
+                output.comment = archive.comment
+                for info in archive.infolist():
+                    if removed_formula and info.filename == CALC_CHAIN_PART:
+                        continue
+                    data = patched_parts.get(info.filename)
+                    if data is None:
+                        data = archive.read(info)
+                        if removed_formula:
+                            data = _drop_calc_chain(data, info.filename)
+                    output.writestr(info, data, compress_type=info.compress_type)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def patch_date_cells(path, b5_value, b6_value, sheet_names=None):
+    """raw_data 워크북 전체 시트의 B5/B6 날짜 셀 교체 (비어 있는 셀은 유지)"""
+    return XlsxCellPatcher(path).patch(dict(zip(DATE_CELLS, (b5_value, b6_value))), sheet_names)